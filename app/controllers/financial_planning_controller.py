@@ -436,123 +436,53 @@ class FinancialPlanningController:
             }
     
     def _get_real_financial_data(self, company_id: int, year: int, month: Optional[str], metric: str) -> Dict:
-        """Busca dados financeiros reais"""
+        """Busca dados financeiros reais (snapshots mensais)"""
         try:
-            from datetime import datetime, timedelta
-            from sqlalchemy import and_, extract
+            from app.services.financial_snapshot_service import FinancialSnapshotService, sum_statuses
             
             # Definir período
-            if month:
-                start_date = datetime(year, int(month), 1)
-                if int(month) == 12:
-                    end_date = datetime(year + 1, 1, 1)
-                else:
-                    end_date = datetime(year, int(month) + 1, 1)
-            else:
-                start_date = datetime(year, 1, 1)
-                end_date = datetime(year + 1, 1, 1)
-            
-            real_data = {}
+            months = [(year, int(month))] if month else [(year, m) for m in range(1, 13)]
+            snapshots = FinancialSnapshotService(self.db).get_months(company_id, months)
+            
+            ml_data = {}
+            receivables_data = {}
+            expenses_data = {}
+            for (snapshot_year, snapshot_month), totals in snapshots.items():
+                month_key = f"{snapshot_month:02d}/{snapshot_year}"
+                # Mercado Livre - pedidos pagos/confirmados por data de criação
+                ml_total = sum_statuses(totals["ml_gross"], ["PAID", "PENDING"])
+                # Contas a Receber - por vencimento
+                receivables_total = sum_statuses(totals["receivables_due"], ["pending", "paid"])
+                # Despesas - transações do tipo expense
+                expense_total = float(totals["expense_transactions"])
+                
+                if ml_total:
+                    ml_data[month_key] = ml_total
+                if receivables_total:
+                    receivables_data[month_key] = receivables_total
+                if expense_total:
+                    expenses_data[month_key] = expense_total
             
             if metric == "revenue":
-                # Buscar receitas reais separadas: Mercado Livre e Contas a Receber
-                from app.models.saas_models import MLOrder
-                from app.models.financial_models import AccountReceivable
-                
-                logger.info(f"🔍 DEBUG - Buscando dados reais para company_id={company_id}, período={start_date} a {end_date}")
-                logger.info(f"🔍 DEBUG - Tipo do company_id: {type(company_id)}, Valor: {company_id}")
-                
-                # 1. Mercado Livre - Pedidos pagos/confirmados
-                from app.models.saas_models import OrderStatus
-                orders = self.db.query(MLOrder).filter(
-                    and_(
-                        MLOrder.company_id == company_id,
-                        MLOrder.date_created >= start_date,
-                        MLOrder.date_created < end_date,
-                        MLOrder.status.in_([OrderStatus.PAID, OrderStatus.PENDING])
-                    )
-                ).all()
-                
-                logger.info(f"🔍 DEBUG - Encontrados {len(orders)} pedidos ML")
-                for order in orders[:3]:  # Log dos primeiros 3 pedidos
-                    logger.info(f"🔍 DEBUG - Pedido ML: {order.id}, status={order.status}, amount={order.total_amount}, date={order.date_created}")
-                
-                # 2. Contas a Receber - Receivables
-                receivables = self.db.query(AccountReceivable).filter(
-                    and_(
-                        AccountReceivable.company_id == company_id,
-                        AccountReceivable.due_date >= start_date,
-                        AccountReceivable.due_date < end_date,
-                        AccountReceivable.status.in_(['pending', 'paid'])
-                    )
-                ).all()
-                
-                logger.info(f"🔍 DEBUG - Encontradas {len(receivables)} contas a receber")
-                for receivable in receivables[:3]:  # Log das primeiras 3 contas
-                    logger.info(f"🔍 DEBUG - Conta a receber: {receivable.id}, status={receivable.status}, amount={receivable.amount}, date={receivable.due_date}")
-                
-                # Agrupar por mês - Mercado Livre
-                ml_data = {}
-                for order in orders:
-                    order_month = order.date_created.strftime('%m/%Y')
-                    if order_month not in ml_data:
-                        ml_data[order_month] = 0.0
-                    ml_data[order_month] += float(order.total_amount or 0)
-                
-                # Agrupar por mês - Contas a Receber
-                receivables_data = {}
-                for receivable in receivables:
-                    receivable_month = receivable.due_date.strftime('%m/%Y')
-                    if receivable_month not in receivables_data:
-                        receivables_data[receivable_month] = 0.0
-                    receivables_data[receivable_month] += float(receivable.amount or 0)
-                
-                logger.info(f"🔍 DEBUG - ML data: {ml_data}")
-                logger.info(f"🔍 DEBUG - Receivables data: {receivables_data}")
-                
                 # Retornar dados separados
-                real_data = {
+                return {
                     'ml': ml_data,
                     'receivables': receivables_data
                 }
-                
-            elif metric == "expenses":
-                # Buscar despesas reais
-                from app.models.database_models import FinancialTransaction
-                
-                expenses = self.db.query(FinancialTransaction).filter(
-                    and_(
-                        FinancialTransaction.company_id == company_id,
-                        FinancialTransaction.date >= start_date,
-                        FinancialTransaction.date < end_date,
-                        FinancialTransaction.type == 'expense'
-                    )
-                ).all()
-                
-                # Agrupar por mês
-                monthly_data = {}
-                for expense in expenses:
-                    expense_month = expense.date.strftime('%m/%Y')
-                    if expense_month not in monthly_data:
-                        monthly_data[expense_month] = 0.0
-                    monthly_data[expense_month] += float(expense.amount or 0)
-                
-                real_data = monthly_data
-                
-            elif metric == "profit":
+            
+            if metric == "expenses":
+                return expenses_data
+            
+            if metric == "profit":
                 # Calcular resultado (receitas - despesas)
-                revenue_data = self._get_real_financial_data(company_id, year, month, "revenue")
-                expense_data = self._get_real_financial_data(company_id, year, month, "expenses")
-                
-                # Combinar dados
-                all_months = set(revenue_data.keys()) | set(expense_data.keys())
-                real_data = {}
-                for month_key in all_months:
-                    revenue = revenue_data.get(month_key, 0.0)
-                    expense = expense_data.get(month_key, 0.0)
-                    real_data[month_key] = revenue - expense
-            
-            return real_data
+                all_months = set(ml_data) | set(receivables_data) | set(expenses_data)
+                return {
+                    month_key: ml_data.get(month_key, 0.0) + receivables_data.get(month_key, 0.0)
+                    - expenses_data.get(month_key, 0.0)
+                    for month_key in all_months
+                }
+            
+            return {}
             
         except Exception as e:
             logger.error(f"Erro ao buscar dados reais: {e}")
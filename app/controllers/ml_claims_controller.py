@@ -24,7 +24,7 @@ class MLClaimsController:
     
     def __init__(self, db: Session):
         self.db = db
-        self.service = MLClaimsService()
+        self.service = MLClaimsService(db)
     
     def get_claims(
         self,
@@ -537,6 +537,45 @@ class MLClaimsController:
                 "error": str(e)
             }
     
+    def get_returns_metrics(self, company_id: int, date_from: datetime, date_to: datetime) -> Dict:
+        """
+        Métricas de devoluções do período (vendas fechadas no período com devolução confirmada)
+        
+        Args:
+            company_id: ID da empresa
+            date_from: Data inicial do período
+            date_to: Data final do período
+            
+        Returns:
+            Dict com returns_count, returns_value e detalhes
+        """
+        try:
+            token_manager = TokenManager(self.db)
+            ml_accounts = self.db.query(MLAccount).filter(
+                MLAccount.company_id == company_id,
+                MLAccount.status == MLAccountStatus.ACTIVE
+            ).all()
+            
+            # Token de cada conta: claims e pedidos são consultados com a conta dona deles
+            account_tokens = {}
+            for ml_account in ml_accounts:
+                access_token = token_manager.get_access_token_for_account(ml_account.id, company_id)
+                if access_token:
+                    account_tokens[ml_account.id] = access_token
+            if not account_tokens:
+                return {"success": False, "error": "Token não encontrado"}
+            
+            metrics = self.service.get_returns_metrics(
+                account_tokens,
+                date_from,
+                date_to,
+                company_id=company_id
+            )
+            return {"success": True, **metrics}
+        except Exception as e:
+            logger.error(f"Erro ao calcular métricas de devoluções: {e}", exc_info=True)
+            return {"success": False, "error": str(e)}
+    
     def process_notification(self, resource: str, ml_user_id: int, company_id: int) -> bool:
         """
         Processa notificação de claim (chamado pelo notification controller)
@@ -13,6 +13,7 @@ import logging
 from app.config.settings import settings
 from app.models.saas_models import MLAccount, UserMLAccount, Token, User, Company
 from app.models.saas_models import MLAccountStatus
+from app.services.token_manager import invalidate_account_token
 
 logger = logging.getLogger(__name__)
 
@@ -266,6 +267,7 @@ class MLController:
                 db.add(refresh_token)
             
             db.commit()
+            invalidate_account_token(ml_account_id)
             
         except Exception as e:
             db.rollback()
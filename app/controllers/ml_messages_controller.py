@@ -5,10 +5,11 @@ import logging
 from datetime import datetime
 from typing import Dict, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, and_
+from sqlalchemy import desc, and_, func
 
 from app.models.saas_models import MLMessageThread, MLMessage, MLAccount, MLAccountStatus, MLMessageThreadStatus
 from app.services.ml_messages_service import MLMessagesService
+from app.services.ml_inbox_sync_service import request_inbox_sync
 from app.services.token_manager import TokenManager
 from app.utils.notification_logger import global_logger
 
@@ -59,37 +60,25 @@ class MLMessagesController:
                 .all()
             )
 
-            result_threads = [self._thread_to_dict(t) for t in threads]
-
-            # Se não houver conversas válidas (sem mensagens), tentar sincronizar rapidamente
-            if not result_threads:
-                logger.info(
-                    "Nenhuma conversa encontrada localmente. Tentando sincronizar mensagens."
-                )
-                try:
-                    sync_result = self.service.sync_messages(
-                        company_id=company_id,
-                        user_id=None,
-                        ml_account_id=ml_account_id,
-                        fetch_all=False,
-                    )
-                    logger.info("Resultado da sincronização rápida: %s", sync_result)
-                    # Recarregar threads após sincronização rápida
-                    threads = (
-                        query.order_by(desc(MLMessageThread.last_message_date))
-                        .limit(limit)
-                        .all()
-                    )
-                except Exception as sync_error:
-                    logger.exception(
-                        "Erro ao sincronizar mensagens automaticamente: %s",
-                        sync_error,
-                    )
+            # Sem conversas locais e conta nunca sincronizada: importa em background,
+            # a listagem sempre responde a partir das tabelas locais
+            sync_pending = False
+            if not threads and self._needs_initial_sync(company_id, ml_account_id):
+                sync_pending = request_inbox_sync(company_id, ml_account_id)
+            
+            # Contagem de mensagens em uma única query (evita carregar as mensagens de cada conversa)
+            message_counts = dict(
+                self.db.query(MLMessage.thread_id, func.count(MLMessage.id))
+                .filter(MLMessage.thread_id.in_([t.id for t in threads]))
+                .group_by(MLMessage.thread_id)
+                .all()
+            ) if threads else {}
             
             return {
                 "success": True,
-                "threads": [self._thread_to_dict(t) for t in threads],
-                "total": len(threads)
+                "threads": [self._thread_to_dict(t, message_counts.get(t.id, 0)) for t in threads],
+                "total": len(threads),
+                "sync_pending": sync_pending
             }
         except Exception as e:
             logger.error(f"Erro ao listar threads: {e}", exc_info=True)
@@ -100,6 +89,17 @@ class MLMessagesController:
                 "total": 0
             }
     
+    def _needs_initial_sync(self, company_id: int, ml_account_id: Optional[int] = None) -> bool:
+        """Alguma conta ativa da empresa ainda sem cursor de mensagens"""
+        query = self.db.query(MLAccount.id).filter(
+            MLAccount.company_id == company_id,
+            MLAccount.status == MLAccountStatus.ACTIVE,
+            MLAccount.messages_synced_until.is_(None)
+        )
+        if ml_account_id:
+            query = query.filter(MLAccount.id == ml_account_id)
+        return query.first() is not None
+    
     def _ensure_thread_details(self, thread: MLMessageThread) -> bool:
         """Garante que a thread possui dados essenciais do comprador e mensagens"""
         updated = False
@@ -518,7 +518,7 @@ class MLMessagesController:
                 "deleted_threads": 0
             }
     
-    def _thread_to_dict(self, thread: MLMessageThread) -> Dict:
+    def _thread_to_dict(self, thread: MLMessageThread, message_count: Optional[int] = None) -> Dict:
         """Converte thread para dicionário"""
         return {
             "id": thread.id,
@@ -535,7 +535,7 @@ class MLMessagesController:
             "order_ids": thread.order_ids if thread.order_ids else [],
             "created_at": thread.created_at.isoformat() if thread.created_at else None,
             "updated_at": thread.updated_at.isoformat() if thread.updated_at else None,
-            "message_count": len(thread.messages) if thread.messages else 0
+            "message_count": message_count if message_count is not None else len(thread.messages or [])
         }
     
     def _message_to_dict(self, message: MLMessage) -> Dict:
@@ -9,6 +9,7 @@ from datetime import datetime
 from pathlib import Path
 
 from app.utils.notification_logger import global_logger
+from app.utils.logistics import order_is_fulfillment, product_is_fulfillment, product_logistic_type
 
 logger = logging.getLogger(__name__)
 
@@ -788,6 +789,12 @@ class MLNotificationsController:
             logger.info(f"🔑 Buscando token para ml_account_id={ml_account_id}, company_id={company_id}, ml_user_id={ml_user_id}")
 
             token_manager = TokenManager(db)
+
+            # Caminho rápido: token da conta em cache (renovação single-flight por conta)
+            credentials = token_manager.get_account_credentials(ml_account_id, company_id)
+            if credentials and credentials["seller_id"] == str(ml_user_id):
+                return credentials["access_token"]
+
             token_record = token_manager.get_token_record_for_account(
                 ml_account_id,
                 company_id,
@@ -914,6 +921,7 @@ class MLNotificationsController:
             from datetime import timedelta
             from sqlalchemy import text
             from app.config.settings import Settings
+            from app.services.token_manager import invalidate_account_token
             
             settings = Settings()
             
@@ -977,6 +985,7 @@ class MLNotificationsController:
                 
                 db.add(new_token)
                 db.commit()
+                invalidate_account_token(ml_account_id)
                 
                 logger.info(f"✅ Novo token salvo para ml_account_id: {ml_account_id}")
                 return token_data["access_token"]
@@ -1156,6 +1165,8 @@ class MLNotificationsController:
                     return None
                 elif response.status_code == 401:
                     logger.error(f"❌ Token inválido ao buscar invoice {invoice_id} (401 Unauthorized)")
+                    from app.services.token_manager import invalidate_access_token
+                    invalidate_access_token(access_token)
                     return None
                 elif response.status_code == 403:
                     logger.error(f"❌ Acesso negado ao buscar invoice {invoice_id} (403 Forbidden)")
@@ -1265,6 +1276,7 @@ class MLNotificationsController:
                         paid_amount = :paid_amount,
                         shipping_cost = :shipping_cost,
                         shipping_type = :shipping_type,
+                        is_fulfillment = :is_fulfillment,
                         shipping_status = :shipping_status,
                         shipping_id = :shipping_id,
                         shipping_method = :shipping_method,
@@ -1457,6 +1469,7 @@ class MLNotificationsController:
                     "paid_amount": new_paid_amount,
                     "shipping_cost": new_shipping_cost,
                     "shipping_type": logistic_type,
+                    "is_fulfillment": order_is_fulfillment(shipment_data_json, logistic_type),
                     "shipping_status": shipping_status,
                     "shipping_id": str(shipping_id) if shipping_id else None,
                     "shipping_method": shipping_method,
@@ -1475,7 +1488,10 @@ class MLNotificationsController:
                     logger.warning(f"⚠️ [NOTIF] ATENÇÃO: Múltiplas linhas foram atualizadas ({rows_affected})! Isso não deveria acontecer.")
                 else:
                     logger.info(f"✅ [NOTIF] UPDATE executado com sucesso! 1 linha atualizada.")
-                
+                    # UPDATE em SQL puro não passa pelo listener do ORM
+                    from app.services.financial_snapshot_service import mark_ml_order_dirty
+                    mark_ml_order_dirty(db, company_id, str(order_id))
+
                 # IMPORTANTE: Fazer commit da atualização
                 logger.info(f"💾 [NOTIF] ========== REALIZANDO COMMIT ==========")
                 try:
@@ -1601,7 +1617,7 @@ class MLNotificationsController:
                                     logger.info(f"💾 [WEBHOOK] ETAPA 2: Iniciando sincronização de estoque para pedido {order_id} (ID interno: {order_obj.id})")
                                     logger.info(f"💾 [WEBHOOK] Order items: {len(order_obj.order_items or [])} item(s)")
                                     
-                                    orders_service._sync_order_to_stock(order_obj, company_id, sync_ml_skus=False)
+                                    orders_service._sync_order_to_stock(order_obj, company_id)
                                     logger.info(f"✅ [WEBHOOK] ETAPA 2: Sincronização de estoque concluída para pedido {order_id}")
                                     
                                     # Verificar movimentações criadas
@@ -1979,6 +1995,7 @@ class MLNotificationsController:
             db_status = status_mapping.get(api_status, "ACTIVE")
             
             if existing:
+                logistic_type = product_logistic_type(item_data.get("shipping"))
                 # Atualizar produto
                 update_query = text("""
                     UPDATE ml_products SET
@@ -1987,6 +2004,8 @@ class MLNotificationsController:
                         available_quantity = :available_quantity,
                         sold_quantity = :sold_quantity,
                         status = :status,
+                        logistic_type = COALESCE(:logistic_type, logistic_type),
+                        is_fulfillment = COALESCE(:is_fulfillment, is_fulfillment),
                         updated_at = NOW()
                     WHERE ml_item_id = :item_id AND company_id = :company_id
                 """)
@@ -1998,7 +2017,13 @@ class MLNotificationsController:
                     "price": item_data.get("price"),
                     "available_quantity": item_data.get("available_quantity"),
                     "sold_quantity": item_data.get("sold_quantity"),
-                    "status": db_status
+                    "status": db_status,
+                    "logistic_type": logistic_type,
+                    # Sem shipping/tags no payload, mantém os valores atuais
+                    "is_fulfillment": (
+                        product_is_fulfillment(logistic_type, item_data.get("tags"))
+                        if item_data.get("shipping") or item_data.get("tags") else None
+                    )
                 })
                 
                 db.commit()
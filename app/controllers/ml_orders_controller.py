@@ -6,6 +6,8 @@ import logging
 import json
 
 from app.services.ml_orders_service import MLOrdersService
+from app.utils.batch_loader import BatchLoader
+from app.utils.pagination import clamp_limit, count_rows, encode_cursor, keyset_paginate
 from app.models.saas_models import MLAccount, MLAccountStatus, MLProduct, MLOrder, MLOrderProcessingStatus
 
 logger = logging.getLogger(__name__)
@@ -30,8 +32,15 @@ class MLOrdersController:
                        date_from: Optional[str] = None,
                        date_to: Optional[str] = None,
                        buffering_date: Optional[str] = None,
-                       search_query: Optional[str] = None) -> Dict:
-        """Busca lista de orders para exibição"""
+                       search_query: Optional[str] = None,
+                       cursor: Optional[str] = None,
+                       count_mode: str = "exact") -> Dict:
+        """
+        Busca lista de orders para exibição
+
+        Com `cursor` a paginação é feita por keyset em (date_created, id) e o
+        `offset` é ignorado; `count_mode` aceita exact, estimated ou none.
+        """
         try:
             logger.info(f"Buscando lista de orders para company_id: {company_id}")
             
@@ -208,14 +217,26 @@ class MLOrdersController:
                 except Exception as e:
                     logger.error(f"Erro ao filtrar por buffering_date: {e}")
             
-            # Ordenar por data de criação (mais recentes primeiro)
-            query = query.order_by(MLOrder.date_created.desc())
+            limit = clamp_limit(limit)
             
             # Contar total
-            total_orders = query.count()
-            
-            # Aplicar paginação
-            orders = query.offset(offset).limit(limit).all()
+            total_orders = count_rows(query, count_mode)
+            
+            # Aplicar paginação (mais recentes primeiro)
+            if cursor:
+                page_data = keyset_paginate(query, MLOrder.date_created, MLOrder.id, limit, cursor=cursor)
+                orders = page_data["items"]
+                has_more = page_data["has_next"]
+                next_cursor = page_data["next_cursor"]
+            else:
+                rows = query.order_by(
+                    MLOrder.date_created.desc().nullslast(), MLOrder.id.desc()
+                ).offset(offset).limit(limit + 1).all()
+                has_more = len(rows) > limit
+                orders = rows[:limit]
+                next_cursor = None
+                if has_more and orders:
+                    next_cursor = encode_cursor(orders[-1].date_created, orders[-1].id)
             
             # Funções auxiliares para processar itens e produtos
             def _parse_order_items(order_items_raw):
@@ -656,12 +677,14 @@ class MLOrdersController:
                 all_orders.append(order_data)
             
             # Criar lista de contas com contagem de orders
+            accounts_orders_counts = BatchLoader(self.db).count_many(
+                MLOrder.ml_account_id,
+                [account.id for account in accounts],
+                MLOrder.company_id == company_id
+            )
             accounts_data = []
             for account in accounts:
-                account_orders_count = self.db.query(MLOrder).filter(
-                    MLOrder.ml_account_id == account.id,
-                    MLOrder.company_id == company_id
-                ).count()
+                account_orders_count = accounts_orders_counts.get(account.id, 0)
                 
                 accounts_data.append({
                     "id": account.id,
@@ -677,7 +700,8 @@ class MLOrdersController:
                 "total": total_orders,
                 "limit": limit,
                 "offset": offset,
-                "has_more": (offset + limit) < total_orders,
+                "has_more": has_more,
+                "next_cursor": next_cursor,
                 "accounts": accounts_data
             }
             
@@ -18,6 +18,7 @@ from app.models.saas_models import (
     MLProductStatus,
 )
 from app.services.ml_product_service import MLProductService
+from app.services.ml_category_cache_service import MLCategoryCacheService
 from app.services.token_manager import TokenManager
 from pathlib import Path
 import requests
@@ -112,12 +113,8 @@ class MLProductController:
                 category_id = product.get("category_id")
                 if category_id:
                     try:
-                        cat_response = requests.get(
-                            f"https://api.mercadolibre.com/categories/{category_id}",
-                            timeout=15,
-                        )
-                        if cat_response.status_code == 200:
-                            cat_data = cat_response.json()
+                        cat_data = MLCategoryCacheService(self.db).get_category(category_id)
+                        if cat_data:
                             product["category_name"] = cat_data.get("name", product.get("category_name"))
                     except Exception as cat_exc:
                         logger.warning("⚠️ Erro ao buscar categoria %s: %s", category_id, cat_exc)
@@ -154,23 +151,14 @@ class MLProductController:
             )
             return None
 
-        headers = {"Accept": "application/json", "Authorization": f"Bearer {token_record.access_token}"}
-
         try:
-            response = requests.get(
-                f"https://api.mercadolibre.com/categories/{category_id}/attributes",
-                headers=headers,
-                timeout=15,
+            attributes_data = MLCategoryCacheService(self.db).get_category_attributes(
+                category_id, access_token=token_record.access_token
             )
-            if response.status_code != 200:
-                logger.warning(
-                    "⚠️ Não foi possível buscar atributos da categoria %s: %s",
-                    category_id,
-                    response.status_code,
-                )
+            if attributes_data is None:
+                logger.warning("⚠️ Não foi possível buscar atributos da categoria %s", category_id)
                 return None
 
-            attributes_data = response.json()
             main_attributes: List[Dict[str, Any]] = []
             other_attributes: List[Dict[str, Any]] = []
             variation_attributes: List[Dict[str, Any]] = []
@@ -462,7 +450,8 @@ class MLProductController:
     
     def import_products(self, company_id: int, ml_account_id: int, user_id: int, 
                        import_type: str, product_id: str = None, 
-                       product_statuses: list = None, limit: int = 100) -> Dict:
+                       product_statuses: list = None, limit: int = 100,
+                       include_details: bool = False) -> Dict:
         """Importa produtos do Mercado Livre (individual ou em massa)"""
         try:
             # Verificar se conta ML pertence à empresa
@@ -515,7 +504,8 @@ class MLProductController:
                     }
                 
                 result = self.product_service.import_bulk_products(
-                    ml_account_id, company_id, product_statuses, limit
+                    ml_account_id, company_id, product_statuses, limit,
+                    include_details=include_details
                 )
                 
                 return {
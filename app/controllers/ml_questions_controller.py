@@ -2,11 +2,11 @@
 Controller para gerenciar perguntas do Mercado Livre
 """
 import logging
-from datetime import datetime
 from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
 
 from app.services.ml_questions_service import MLQuestionsService
+from app.services.ml_inbox_sync_service import request_inbox_sync
 from app.models.saas_models import MLQuestion, MLQuestionStatus, MLAccount, MLAccountStatus, User
 from app.services.token_manager import TokenManager
 from app.utils.notification_logger import global_logger
@@ -62,30 +62,25 @@ class MLQuestionsController:
                 .all()
             )
 
-            any_updated = False
-            for question in questions:
-                try:
-                    if self._ensure_question_item_details(question, company_id):
-                        any_updated = True
-                except Exception:
-                    self.db.rollback()
-                    logger.exception(
-                        "Erro ao enriquecer dados da pergunta %s", question.id
-                    )
+            # Sem perguntas locais e conta nunca sincronizada: importa em background,
+            # a listagem sempre responde a partir da tabela local
+            sync_pending = False
+            if not questions:
+                pending_query = self.db.query(MLAccount.id).filter(
+                    MLAccount.company_id == company_id,
+                    MLAccount.status == MLAccountStatus.ACTIVE,
+                    MLAccount.questions_synced_until.is_(None)
+                )
+                if ml_account_id:
+                    pending_query = pending_query.filter(MLAccount.id == ml_account_id)
+                if pending_query.first():
+                    sync_pending = request_inbox_sync(company_id, ml_account_id)
 
-            if any_updated:
-                try:
-                    self.db.commit()
-                    for question in questions:
-                        self.db.refresh(question)
-                except Exception:
-                    self.db.rollback()
-                    logger.exception("Erro ao salvar enriquecimento de perguntas")
-            
             return {
                 "success": True,
                 "questions": [self._question_to_dict(q) for q in questions],
                 "total": total_items,
+                "sync_pending": sync_pending,
             }
         except Exception as e:
             logger.error(f"Erro ao listar perguntas: {e}", exc_info=True)
@@ -184,10 +179,11 @@ class MLQuestionsController:
                 "error": str(e)
             }
     
-    def sync_questions(self, company_id: int, user_id: int, ml_account_id: Optional[int] = None, status: Optional[str] = None) -> Dict:
+    def sync_questions(self, company_id: int, user_id: int, ml_account_id: Optional[int] = None, status: Optional[str] = None,
+                       full: bool = False) -> Dict:
         """Sincroniza perguntas com o Mercado Livre (todas as contas ou uma conta específica)"""
         try:
-            result = self.service.sync_questions(company_id, user_id, ml_account_id, status)
+            result = self.service.sync_questions(company_id, user_id, ml_account_id, status, full=full)
             return result
         except Exception as e:
             logger.error(f"Erro ao sincronizar perguntas: {e}", exc_info=True)
@@ -417,93 +413,3 @@ class MLQuestionsController:
             "hold": question.hold
         }
 
-    def _ensure_question_item_details(self, question: MLQuestion, company_id: int) -> bool:
-        """Garante que a pergunta possui dados essenciais do produto e comprador"""
-        try:
-            needs_title = not question.item_title or not question.item_title.strip()
-            needs_thumbnail = not question.item_thumbnail or not question.item_thumbnail.strip()
-            needs_buyer = not question.buyer_nickname or not question.buyer_nickname.strip() or not question.ml_buyer_id
-
-            if not (needs_title or needs_thumbnail or needs_buyer):
-                return False
-
-            if not question.ml_item_id:
-                # Ainda podemos tentar preencher via question details
-                needs_item_id = True
-            else:
-                needs_item_id = False
-
-            token_manager = TokenManager(self.db)
-            token_record = token_manager.get_token_record_for_account(question.ml_account_id, company_id)
-            if not token_record:
-                logger.debug(
-                    "Token não encontrado para enriquecer pergunta %s (ml_account_id=%s)",
-                    question.id,
-                    question.ml_account_id,
-                )
-                return False
-
-            # Buscar detalhes completos da pergunta quando faltarem dados do comprador ou item
-            question_data = None
-            buyer_updated = False
-            if needs_buyer or needs_item_id or needs_title or needs_thumbnail:
-                question_data = self.service.get_question_details(question.ml_question_id, token_record.access_token)
-                if question_data:
-                    from_data = question_data.get("from", {})
-                    if from_data:
-                        if needs_buyer and from_data.get("nickname"):
-                            question.buyer_nickname = from_data.get("nickname")
-                            buyer_updated = True
-                        if from_data.get("id"):
-                            question.ml_buyer_id = str(from_data.get("id"))
-                            buyer_updated = True
-                    if not question.question_text and question_data.get("text"):
-                        question.question_text = question_data.get("text")
-                    if (needs_item_id or not question.ml_item_id) and question_data.get("item_id"):
-                        question.ml_item_id = str(question_data.get("item_id"))
-                    # Algumas respostas trazem campos básicos do item
-                    item_block = question_data.get("item") if isinstance(question_data.get("item"), dict) else None
-                    if item_block:
-                        if needs_title and item_block.get("title"):
-                            question.item_title = item_block.get("title")
-                            needs_title = False
-                        if needs_thumbnail and item_block.get("thumbnail"):
-                            question.item_thumbnail = item_block.get("thumbnail")
-                            needs_thumbnail = False
-
-            # Após possível hidratação, reavaliar se ainda precisamos buscar o item completo
-            if not question.ml_item_id:
-                return buyer_updated
-
-            item_data = None
-            if needs_title or needs_thumbnail:
-                item_data = self.service.get_item_details(question.ml_item_id, token_record.access_token)
-                if not item_data:
-                    return buyer_updated
-
-            updated = False
-            if item_data:
-                if needs_title and item_data.get("title"):
-                    question.item_title = item_data["title"]
-                    updated = True
-
-                if needs_thumbnail:
-                    thumb = item_data.get("secure_thumbnail") or item_data.get("thumbnail")
-                    if not thumb and item_data.get("pictures"):
-                        first_pic = item_data["pictures"][0]
-                        thumb = first_pic.get("secure_url") or first_pic.get("url")
-                    if thumb:
-                        question.item_thumbnail = thumb
-                        updated = True
-
-            if buyer_updated:
-                updated = True
-
-            if updated:
-                question.updated_at = datetime.utcnow()
-                return True
-            return False
-        except Exception as e:
-            logger.error("Erro ao enriquecer dados da pergunta %s: %s", question.id, e, exc_info=True)
-            return False
-
@@ -3,7 +3,7 @@ Controller para gerenciar assistentes OpenAI
 """
 import logging
 import json
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, and_
@@ -149,7 +149,10 @@ class OpenAIAssistantController:
                         "last_used_at": a.last_used_at.isoformat() if a.last_used_at else None,
                         "is_reasoning_model": is_reasoning,
                         "provider": getattr(a, "provider", "openai") or "openai",
-                        "api_config": getattr(a, "api_config", None)
+                        "api_config": getattr(a, "api_config", None),
+                        "response_cache_enabled": getattr(a, "response_cache_enabled", None),
+                        "response_cache_ttl": getattr(a, "response_cache_ttl", None),
+                        "context_token_budget": getattr(a, "context_token_budget", None)
                     })
                 except Exception as e_item:
                     logger.error(f"❌ Erro ao processar assistente ID {a.id} (índice {idx}): {e_item}", exc_info=True)
@@ -185,7 +188,10 @@ class OpenAIAssistantController:
         welcome_use_model: Optional[bool] = False,
         welcome_message: Optional[str] = None,
         provider: str = "openai",
-        api_config: Optional[Dict] = None
+        api_config: Optional[Dict] = None,
+        response_cache_enabled: Optional[bool] = None,
+        response_cache_ttl: Optional[int] = None,
+        context_token_budget: Optional[int] = None
     ) -> Dict:
         """Cria um novo assistente"""
         try:
@@ -206,7 +212,10 @@ class OpenAIAssistantController:
                 initial_prompt=initial_prompt,
                 welcome_enabled=welcome_enabled,
                 welcome_use_model=welcome_use_model,
-                welcome_message=welcome_message
+                welcome_message=welcome_message,
+                response_cache_enabled=response_cache_enabled,
+                response_cache_ttl=response_cache_ttl,
+                context_token_budget=context_token_budget
             )
         except Exception as e:
             logger.error(f"❌ Erro ao criar assistente: {e}", exc_info=True)
@@ -268,7 +277,10 @@ class OpenAIAssistantController:
                     "last_used_at": assistant.last_used_at.isoformat() if assistant.last_used_at else None,
                     "is_reasoning_model": assistant.is_reasoning_model(),
                     "provider": getattr(assistant, "provider", "openai") or "openai",
-                    "api_config": getattr(assistant, "api_config", None)
+                    "api_config": getattr(assistant, "api_config", None),
+                    "response_cache_enabled": getattr(assistant, "response_cache_enabled", None),
+                    "response_cache_ttl": getattr(assistant, "response_cache_ttl", None),
+                    "context_token_budget": getattr(assistant, "context_token_budget", None)
                 }
             }
         except Exception as e:
@@ -297,7 +309,10 @@ class OpenAIAssistantController:
         welcome_use_model: Optional[bool] = None,
         welcome_message: Optional[str] = None,
         provider: Optional[str] = None,
-        api_config: Optional[Dict] = None
+        api_config: Optional[Dict] = None,
+        response_cache_enabled: Optional[bool] = None,
+        response_cache_ttl: Optional[int] = None,
+        context_token_budget: Optional[int] = None
     ) -> Dict:
         """Atualiza um assistente existente"""
         try:
@@ -322,7 +337,10 @@ class OpenAIAssistantController:
                 welcome_use_model=welcome_use_model,
                 welcome_message=welcome_message,
                 provider=provider,
-                api_config=api_config
+                api_config=api_config,
+                response_cache_enabled=response_cache_enabled,
+                response_cache_ttl=response_cache_ttl,
+                context_token_budget=context_token_budget
             )
         except Exception as e:
             logger.error(f"❌ Erro ao atualizar assistente: {e}", exc_info=True)
@@ -367,7 +385,8 @@ class OpenAIAssistantController:
         message: str,
         thread_id: Optional[str] = None,
         context_data: Optional[Dict] = None,
-        use_case: Optional[str] = None
+        use_case: Optional[str] = None,
+        stream_callback: Optional[Callable[[Dict], None]] = None
     ) -> Dict:
         """Usa um assistente em modo chat"""
         try:
@@ -378,7 +397,8 @@ class OpenAIAssistantController:
                 message=message,
                 thread_id=thread_id,
                 context_data=context_data,
-                use_case=use_case
+                use_case=use_case,
+                stream_callback=stream_callback
             )
         except Exception as e:
             logger.error(f"❌ Erro ao usar assistente em modo chat: {e}", exc_info=True)
@@ -407,6 +427,11 @@ class OpenAIAssistantController:
             logger.error(f"❌ Erro ao obter histórico: {e}", exc_info=True)
             return {"success": False, "error": str(e)}
     
+    def get_response_cache_stats(self, assistant_id: Optional[int] = None) -> Dict:
+        """Obtém métricas do cache de respostas (hits, chamadas ao provider e tokens economizados)"""
+        from app.services.ai_response_cache_service import AIResponseCacheService
+        return AIResponseCacheService(self.db).get_stats(assistant_id=assistant_id)
+    
     def get_usage_stats(self, company_id: Optional[int] = None, days: int = 30) -> Dict:
         """Obtém estatísticas gerais de uso de tokens"""
         try:
@@ -162,6 +162,18 @@ class PricingAnalysisController:
             logger.error(f"Erro ao obter análise de preços em lote: {str(e)}")
             return {"error": f"Erro interno: {str(e)}"}
     
+    def simulate_catalog_pricing(self, company_id: int, user_id: Optional[int] = None, **scenario) -> Dict[str, Any]:
+        """Simula preços/margens de todos os anúncios vinculados da empresa para um cenário"""
+        try:
+            from app.services.pricing_simulation_service import PricingSimulationService
+            result = PricingSimulationService(self.db).simulate(company_id, user_id=user_id, **scenario)
+            if not result.get("success"):
+                return {"error": result.get("error", "Erro na simulação")}
+            return result
+        except Exception as e:
+            logger.error(f"Erro na simulação de preços: {str(e)}")
+            return {"error": f"Erro interno: {str(e)}"}
+    
     def _calculate_pricing_analysis(self, internal_data: Dict, ml_data: Optional[Dict]) -> Dict[str, Any]:
         """Calcula análise comparativa entre produto interno e ML"""
         analysis = {
@@ -301,8 +301,15 @@ class ShipmentController:
             from app.models.saas_models import MLOrder, OrderStatus
             import json
             
-            # Buscar todos os pedidos da empresa
-            all_orders = self.db.query(MLOrder).filter(
+            # Buscar pedidos da empresa (apenas as colunas usadas nos contadores)
+            all_orders = self.db.query(
+                MLOrder.order_id,
+                MLOrder.status,
+                MLOrder.shipping_status,
+                MLOrder.shipping_details,
+                MLOrder.shipping_date,
+                MLOrder.is_fulfillment
+            ).filter(
                 MLOrder.company_id == company_id
             ).all()
             
@@ -423,16 +430,8 @@ class ShipmentController:
                         debug_excludes["ready_to_ship"] += 1
 
                     # Excluir Fulfillment (não-Fulfillment na aba)
-                    try:
-                        logistic_type = None
-                        details = shipping_details if 'shipping_details' in locals() and shipping_details else {}
-                        if isinstance(details, dict):
-                            logistic_type = details.get('logistic_type') or (details.get('logistic', {}) or {}).get('type')
-                        shipping_type = getattr(order, 'shipping_type', None)
-                        if (shipping_type == 'fulfillment') or (str(logistic_type).lower() == 'fulfillment'):
-                            exclude = True
-                    except Exception:
-                        pass
+                    if order.is_fulfillment:
+                        exclude = True
 
                     if not exclude:
                         counts["READY_TO_PREPARE"] += 1
@@ -1,7 +1,7 @@
 """
 Controller para SuperAdmin - Gerenciamento do sistema SaaS
 """
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import text, func, desc
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
@@ -10,6 +10,7 @@ import secrets
 import string
 
 from app.models.saas_models import SuperAdmin, Company, User, Subscription, MLAccount, TokenPackage, TokenPackagePurchase
+from app.utils.batch_loader import BatchLoader
 
 # Configuração para hash de senhas
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -115,23 +116,21 @@ class SuperAdminController:
         offset = (page - 1) * per_page
         companies = query.order_by(desc(Company.created_at)).offset(offset).limit(per_page).all()
         
-        # Adicionar estatísticas para cada empresa
+        # Estatísticas de todas as empresas da página em queries agrupadas
+        company_ids = [company.id for company in companies]
+        loader = BatchLoader(self.db)
+        users_counts = loader.count_many(User.company_id, company_ids, User.is_active == True)
+        ml_accounts_counts = loader.count_many(MLAccount.company_id, company_ids, MLAccount.status == 'ACTIVE')
+        active_subscriptions = loader.group_many(
+            Subscription.company_id, company_ids, Subscription.status == 'active', order_by=Subscription.id
+        )
+        
         companies_data = []
         for company in companies:
-            users_count = self.db.query(User).filter(
-                User.company_id == company.id,
-                User.is_active == True
-            ).count()
-            
-            ml_accounts_count = self.db.query(MLAccount).filter(
-                MLAccount.company_id == company.id,
-                MLAccount.status == 'ACTIVE'
-            ).count()
-            
-            active_subscription = self.db.query(Subscription).filter(
-                Subscription.company_id == company.id,
-                Subscription.status == 'active'
-            ).first()
+            users_count = users_counts.get(company.id, 0)
+            ml_accounts_count = ml_accounts_counts.get(company.id, 0)
+            company_subscriptions = active_subscriptions.get(company.id)
+            active_subscription = company_subscriptions[0] if company_subscriptions else None
             
             companies_data.append({
                 "id": company.id,
@@ -160,12 +159,17 @@ class SuperAdminController:
     
     def get_company_details(self, company_id: int) -> Optional[Dict]:
         """Obtém detalhes completos de uma empresa"""
-        company = self.db.query(Company).filter(Company.id == company_id).first()
+        # Usuários, contas ML e assinaturas carregados junto com a empresa (selectin)
+        company = self.db.query(Company).options(
+            selectinload(Company.users),
+            selectinload(Company.ml_accounts),
+            selectinload(Company.subscriptions)
+        ).filter(Company.id == company_id).first()
         if not company:
             return None
         
         # Usuários da empresa
-        users = self.db.query(User).filter(User.company_id == company_id).all()
+        users = company.users
         users_data = []
         for user in users:
             users_data.append({
@@ -180,7 +184,7 @@ class SuperAdminController:
             })
         
         # Contas ML da empresa
-        ml_accounts = self.db.query(MLAccount).filter(MLAccount.company_id == company_id).all()
+        ml_accounts = company.ml_accounts
         ml_accounts_data = []
         for account in ml_accounts:
             ml_accounts_data.append({
@@ -194,7 +198,7 @@ class SuperAdminController:
             })
         
         # Assinaturas da empresa
-        subscriptions = self.db.query(Subscription).filter(Subscription.company_id == company_id).all()
+        subscriptions = company.subscriptions
         subscriptions_data = []
         for sub in subscriptions:
             subscriptions_data.append({
@@ -825,6 +829,7 @@ class SuperAdminController:
                 "cost_center_planning",          # FK: monthly_planning, cost_centers
                 "ml_product_attributes",         # FK: ml_products
                 "ai_product_analysis",           # FK: ml_products
+                "product_analysis_snapshots",    # FK: ml_products
                 "ml_catalog_history",           # FK: ml_catalog_monitoring, ml_products
                 "ml_messages",                  # FK: ml_message_threads
             ]
@@ -843,6 +848,8 @@ class SuperAdminController:
                 "accounts_receivable",           # FK: accounts_receivable (self), financial_accounts, financial_categories, cost_centers
                 "accounts_payable",              # FK: fornecedores, ordem_compra, accounts_payable (self), financial_accounts, financial_categories, cost_centers
                 "financial_transactions",        # FK: financial_accounts, financial_categories, cost_centers, financial_customers, financial_suppliers
+                "financial_ledger_entries",      # FK: financial_accounts
+                "financial_ledger_checkpoints",  # FK: financial_accounts
                 "ml_orders",                     # FK: ml_accounts, financial_accounts
                 "ml_questions",                 # FK: ml_accounts
                 "ml_message_threads",           # FK: ml_accounts
@@ -871,6 +878,7 @@ class SuperAdminController:
                 "financial_suppliers",          # FK: companies
                 "financial_goals",              # FK: companies
                 "financial_alerts",             # FK: companies
+                "financial_monthly_snapshots",  # FK: companies
                 "financial_planning",           # FK: companies
                 "fornecedores",                 # FK: companies
                 "ordem_compra",                 # FK: companies, fornecedores
@@ -1048,6 +1056,7 @@ class SuperAdminController:
                         ("ml_campaign_products", "campaign_id", "ml_campaigns", "ml_account_id"),
                         ("ml_product_attributes", "ml_product_id", "ml_products", "ml_account_id"),
                         ("ai_product_analysis", "ml_product_id", "ml_products", "ml_account_id"),
+                        ("product_analysis_snapshots", "ml_product_id", "ml_products", "ml_account_id"),
                         ("ml_catalog_history", "monitoring_id", "ml_catalog_monitoring", "ml_account_id"),
                         ("ml_messages", "thread_id", "ml_message_threads", "ml_account_id"),
                         ("tokens", "ml_account_id", None, None),
@@ -216,7 +216,8 @@ def run_asaas_daily_sync():
             result = sync_service.sync_all_subscriptions()
             if result.get("success"):
                 stats = result.get("stats", {})
-                print(f"✅ [ASAAS SYNC] Concluído: {stats.get('updated', 0)} atualizadas, {stats.get('inactivated', 0)} inativadas, {stats.get('errors', 0)} erros")
+                print(f"✅ [ASAAS SYNC] Concluído: {stats.get('updated', 0)} atualizadas, {stats.get('unchanged', 0)} sem alteração, {stats.get('inactivated', 0)} inativadas, {stats.get('errors', 0)} erros")
+                print(f"   - Chamadas ao Asaas: {stats.get('api_calls', 0)} | Tempo total: {stats.get('timings', {}).get('total_seconds', 0)}s")
             else:
                 print(f"❌ [ASAAS SYNC] Falhou: {result.get('error', 'Erro desconhecido')}")
         finally:
@@ -267,6 +268,99 @@ scheduler.add_job(
     replace_existing=True
 )
 
+def run_category_cache_refresh_job():
+    """JOB 6: Revalidação (ETag/TTL) do cache local de categorias do ML - A cada 6 horas"""
+    try:
+        from app.services.ml_category_cache_service import run_category_cache_refresh
+        stats = run_category_cache_refresh()
+        print(f"🗂️ [CATEGORY CACHE] Revalidadas: {stats.get('checked', 0)}, atualizadas: {stats.get('updated', 0)}, erros: {stats.get('errors', 0)}")
+    except Exception as e:
+        print(f"❌ Erro no refresh do cache de categorias: {e}")
+
+# JOB 6: Refresh do cache de categorias do ML - A cada 6 horas
+scheduler.add_job(
+    func=run_category_cache_refresh_job,
+    trigger=IntervalTrigger(hours=6),
+    id='ml_category_cache_refresh',
+    name='Refresh do cache de categorias ML (6h)',
+    replace_existing=True
+)
+
+def run_ledger_reconciliation_job():
+    """JOB 7: Reconciliação do saldo das contas financeiras com o razão - Todos os dias às 4h da manhã"""
+    try:
+        from app.services.financial_ledger_service import run_ledger_reconciliation
+        result = run_ledger_reconciliation()
+        if result.get("success"):
+            print(f"📒 [LEDGER] Contas conferidas: {result.get('accounts_checked', 0)}, divergentes: {len(result.get('drifted', []))}, razões criados: {result.get('bootstrapped', 0)}")
+        else:
+            print(f"❌ [LEDGER] Falhou: {result.get('error', 'Erro desconhecido')}")
+    except Exception as e:
+        print(f"❌ Erro na reconciliação do razão: {e}")
+
+# JOB 7: Reconciliação do razão das contas financeiras - Todos os dias às 4h da manhã
+scheduler.add_job(
+    func=run_ledger_reconciliation_job,
+    trigger=CronTrigger(hour=4, minute=0),  # Todos os dias às 4h
+    id='financial_ledger_reconciliation',
+    name='Reconciliação do razão financeiro (4h)',
+    replace_existing=True
+)
+
+def run_response_cache_cleanup_job():
+    """JOB 8: Limpeza das respostas vencidas do cache dos agentes IA - Todos os dias às 5h da manhã"""
+    try:
+        from app.services.ai_response_cache_service import run_response_cache_cleanup
+        deleted = run_response_cache_cleanup()
+        print(f"♻️ [AI CACHE] Respostas vencidas removidas: {deleted}")
+    except Exception as e:
+        print(f"❌ Erro na limpeza do cache de respostas IA: {e}")
+
+# JOB 8: Limpeza do cache de respostas dos agentes IA - Todos os dias às 5h da manhã
+scheduler.add_job(
+    func=run_response_cache_cleanup_job,
+    trigger=CronTrigger(hour=5, minute=0),  # Todos os dias às 5h
+    id='ai_response_cache_cleanup',
+    name='Limpeza do cache de respostas IA (5h)',
+    replace_existing=True
+)
+
+def run_inbox_sync_job():
+    """JOB 9: Sincronização incremental de mensagens pós-venda e perguntas (cursores por conta) - A cada 15 minutos"""
+    try:
+        from app.services.ml_inbox_sync_service import run_inbox_sync
+        stats = run_inbox_sync()
+        print(f"📬 [INBOX SYNC] Empresas: {stats.get('companies', 0)}, conversas: {stats.get('threads', 0)}, perguntas: {stats.get('questions', 0)}, erros: {stats.get('errors', 0)}")
+    except Exception as e:
+        print(f"❌ Erro na sincronização da caixa de entrada ML: {e}")
+
+# JOB 9: Sincronização incremental de mensagens e perguntas - A cada 15 minutos
+scheduler.add_job(
+    func=run_inbox_sync_job,
+    trigger=IntervalTrigger(minutes=15),
+    id='ml_inbox_incremental_sync',
+    name='Sincronização incremental de mensagens e perguntas ML (15min)',
+    replace_existing=True
+)
+
+def run_ml_response_cache_cleanup_job():
+    """JOB 10: Limpeza das respostas vencidas do cache da API pública do ML - Todos os dias às 5h30"""
+    try:
+        from app.services.ml_response_cache_service import run_response_cache_cleanup as run_ml_cache_cleanup
+        deleted = run_ml_cache_cleanup()
+        print(f"♻️ [ML RESPONSE CACHE] Respostas vencidas removidas: {deleted}")
+    except Exception as e:
+        print(f"❌ Erro na limpeza do cache de respostas da API ML: {e}")
+
+# JOB 10: Limpeza do cache de respostas da API ML - Todos os dias às 5h30
+scheduler.add_job(
+    func=run_ml_response_cache_cleanup_job,
+    trigger=CronTrigger(hour=5, minute=30),  # Todos os dias às 5h30
+    id='ml_response_cache_cleanup',
+    name='Limpeza do cache de respostas da API ML (5h30)',
+    replace_existing=True
+)
+
 # Criar tabelas do banco de dados
 @app.on_event("startup")
 async def startup_event():
@@ -2917,6 +3011,9 @@ async def api_callback(code: str = None, error: str = None, state: str = None):
             action = "conectada"
         
         db.commit()
+        # Descartar o token em cache da conta (reconexão pode trocar o seller)
+        from app.services.token_manager import invalidate_account_token
+        invalidate_account_token(access_token.ml_account_id)
         db.close()
         
         # Redirecionar para página de contas com sucesso
@@ -3061,6 +3158,9 @@ async def callback(code: str = None, error: str = None, state: str = None):
             action = "conectada"
         
         db.commit()
+        # Descartar o token em cache da conta (reconexão pode trocar o seller)
+        from app.services.token_manager import invalidate_account_token
+        invalidate_account_token(access_token.ml_account_id)
         db.close()
         
         # Redirecionar para página de contas com sucesso
@@ -4,19 +4,55 @@ Cliente HTTP para fazer requisições aos endpoints da API interna
 import httpx
 import json
 import logging
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, Optional, Tuple
 from app.mcp.config import mcp_config
 
 logger = logging.getLogger(__name__)
 
 
 class APIClient:
-    """Cliente HTTP para fazer requisições aos endpoints da API"""
+    """
+    Cliente HTTP para fazer requisições aos endpoints da API
+    
+    Usa um único httpx.AsyncClient com pool de conexões keep-alive (criado na
+    primeira requisição e fechado em close()). Respostas de GET ficam em cache por
+    GET_CACHE_TTL segundos; qualquer requisição de escrita limpa o cache da sessão.
+    """
     
     def __init__(self, base_url: Optional[str] = None):
         self.base_url = base_url or mcp_config.API_BASE_URL
         self.timeout = mcp_config.HTTP_TIMEOUT
         self.max_retries = mcp_config.HTTP_MAX_RETRIES
+        self.cache_ttl = mcp_config.GET_CACHE_TTL
+        self._client: Optional[httpx.AsyncClient] = None
+        # (session_token, endpoint, params) -> (expira_em, resposta)
+        self._get_cache: Dict[Tuple, Tuple[float, Dict[str, Any]]] = {}
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=mcp_config.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=mcp_config.HTTP_MAX_CONNECTIONS
+                )
+            )
+        return self._client
+    
+    async def close(self):
+        """Fecha o pool de conexões"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+    
+    def _cache_key(self, session_token: str, endpoint: str, params: Optional[Dict[str, Any]]) -> Tuple:
+        return (session_token, endpoint, json.dumps(params or {}, sort_keys=True, default=str))
+    
+    def _invalidate_session(self, session_token: str):
+        for key in [key for key in self._get_cache if key[0] == session_token]:
+            del self._get_cache[key]
     
     async def request(
         self,
@@ -45,74 +81,88 @@ class APIClient:
             Exception: Se a requisição falhar
         """
         url = f"{self.base_url}{endpoint}"
+        method = method.upper()
+        
+        # GET idempotente: resposta recente em cache
+        cache_key = None
+        if method == "GET" and self.cache_ttl > 0 and not headers:
+            cache_key = self._cache_key(session_token, endpoint, params)
+            cached = self._get_cache.get(cache_key)
+            if cached and cached[0] > time.monotonic():
+                if mcp_config.ENABLE_VERBOSE_LOGGING:
+                    logger.debug(f"MCP API Cache hit: {method} {url}")
+                return cached[1]
+        elif session_token and method != "GET":
+            # Escrita: respostas em cache desta sessão podem ter ficado desatualizadas
+            self._invalidate_session(session_token)
         
         # Headers padrão
         request_headers = {
             "Content-Type": "application/json",
         }
         
-        # Adicionar session_token como Cookie para POST/PUT/PATCH (padrão da API)
-        if session_token and method.upper() in ["POST", "PUT", "PATCH"]:
+        # session_token como Cookie (rotas com Cookie) e como query param (rotas com Query)
+        if session_token:
             request_headers["Cookie"] = f"session_token={session_token}"
         
         if headers:
             request_headers.update(headers)
         
-        # Adicionar session_token como query param também (para compatibilidade)
-        # Alguns endpoints esperam como query param, outros como cookie
         if session_token:
-            if params is None:
-                params = {}
-            if "session_token" not in params:
-                params["session_token"] = session_token
+            params = dict(params or {})
+            params.setdefault("session_token", session_token)
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                # Fazer requisição com retry
-                last_error = None
-                for attempt in range(self.max_retries):
+            client = self._get_client()
+            # Fazer requisição com retry
+            last_error = None
+            for attempt in range(self.max_retries):
+                try:
+                    if mcp_config.ENABLE_VERBOSE_LOGGING:
+                        logger.debug(f"MCP API Request: {method} {url} (attempt {attempt + 1})")
+                    
+                    response = await client.request(
+                        method=method,
+                        url=url,
+                        params=params,
+                        json=json_data if json_data else None,
+                        headers=request_headers
+                    )
+                    
+                    # Tentar parsear JSON
                     try:
-                        if mcp_config.ENABLE_VERBOSE_LOGGING:
-                            logger.debug(f"MCP API Request: {method} {url} (attempt {attempt + 1})")
-                        
-                        response = await client.request(
-                            method=method,
-                            url=url,
-                            params=params,
-                            json=json_data if json_data else None,
-                            headers=request_headers,
-                            follow_redirects=True
-                        )
-                        
-                        # Tentar parsear JSON
-                        try:
-                            result = response.json()
-                        except json.JSONDecodeError:
-                            result = {"text": response.text, "status_code": response.status_code}
-                        
-                        # Verificar status code
-                        if response.status_code >= 400:
-                            error_msg = result.get("error", result.get("detail", f"HTTP {response.status_code}"))
-                            logger.error(f"MCP API Error: {method} {url} -> {response.status_code}: {error_msg}")
-                            raise Exception(f"API Error: {error_msg} (status: {response.status_code})")
-                        
-                        if mcp_config.ENABLE_VERBOSE_LOGGING:
-                            logger.debug(f"MCP API Response: {method} {url} -> {response.status_code}")
-                        
-                        return result
-                        
-                    except httpx.HTTPError as e:
-                        last_error = e
-                        if attempt < self.max_retries - 1:
-                            logger.warning(f"MCP API request failed (attempt {attempt + 1}/{self.max_retries}): {e}")
-                            continue
-                        else:
-                            raise
-                
-                # Se chegou aqui, todas as tentativas falharam
-                if last_error:
-                    raise last_error
+                        result = response.json()
+                    except json.JSONDecodeError:
+                        result = {"text": response.text, "status_code": response.status_code}
+                    
+                    # Verificar status code
+                    if response.status_code >= 400:
+                        error_msg = result.get("error", result.get("detail", f"HTTP {response.status_code}"))
+                        logger.error(f"MCP API Error: {method} {url} -> {response.status_code}: {error_msg}")
+                        raise Exception(f"API Error: {error_msg} (status: {response.status_code})")
+                    
+                    if mcp_config.ENABLE_VERBOSE_LOGGING:
+                        logger.debug(f"MCP API Response: {method} {url} -> {response.status_code}")
                     
+                    if cache_key is not None:
+                        now = time.monotonic()
+                        if len(self._get_cache) >= 1000:
+                            self._get_cache = {k: v for k, v in self._get_cache.items() if v[0] > now}
+                        self._get_cache[cache_key] = (now + self.cache_ttl, result)
+                    return result
+                    
+                except httpx.HTTPError as e:
+                    last_error = e
+                    if attempt < self.max_retries - 1:
+                        logger.warning(f"MCP API request failed (attempt {attempt + 1}/{self.max_retries}): {e}")
+                        continue
+                    else:
+                        raise
+            
+            # Se chegou aqui, todas as tentativas falharam
+            if last_error:
+                raise last_error
+                
         except Exception as e:
             logger.error(f"MCP API Client Error: {method} {url} -> {str(e)}")
             raise Exception(f"Failed to call API: {str(e)}")
@@ -23,6 +23,15 @@ class MCPConfig:
     # Número máximo de retries para requisições HTTP
     HTTP_MAX_RETRIES: int = int(os.getenv("MCP_HTTP_MAX_RETRIES", "3"))
     
+    # Requisições JSON-RPC processadas em paralelo (limite de requisições em andamento)
+    MAX_CONCURRENT_REQUESTS: int = int(os.getenv("MCP_MAX_CONCURRENT_REQUESTS", "8"))
+    
+    # Conexões HTTP mantidas no pool do cliente (keep-alive)
+    HTTP_MAX_CONNECTIONS: int = int(os.getenv("MCP_HTTP_MAX_CONNECTIONS", "20"))
+    
+    # Tempo (em segundos) que respostas de GET ficam em cache (0 desativa)
+    GET_CACHE_TTL: float = float(os.getenv("MCP_GET_CACHE_TTL", "10"))
+    
     # Habilitar logging detalhado
     ENABLE_VERBOSE_LOGGING: bool = os.getenv("MCP_VERBOSE_LOGGING", "false").lower() == "true"
 
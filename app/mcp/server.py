@@ -7,6 +7,7 @@ import os
 import json
 import asyncio
 import logging
+import time
 from typing import Dict, Any, Optional
 from app.mcp.config import mcp_config
 from app.mcp.tools import get_tool_definitions
@@ -27,6 +28,8 @@ class MCPServer:
     def __init__(self):
         self.api_client = APIClient()
         self.tools = get_tool_definitions()
+        # Latência por ferramenta: nome -> {calls, errors, total_ms, max_ms}
+        self.tool_stats: Dict[str, Dict[str, float]] = {}
         logger.info(f"MCP Server initialized with {len(self.tools)} tools")
     
     async def handle_request(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -115,12 +118,15 @@ class MCPServer:
                 }
             }
         
+        started_at = time.monotonic()
+        failed = True
         try:
             # Obter handler da ferramenta
             handler = get_tool_handler(tool_name)
             
             # Executar handler
             result = await handler(self.api_client, arguments)
+            failed = False
             
             return {
                 "jsonrpc": "2.0",
@@ -153,23 +159,87 @@ class MCPServer:
                     "message": f"Error executing tool: {str(e)}"
                 }
             }
+        finally:
+            self._record_latency(tool_name, (time.monotonic() - started_at) * 1000, failed)
+    
+    def _record_latency(self, tool_name: str, elapsed_ms: float, failed: bool):
+        """Acumula a latência da chamada nas estatísticas da ferramenta"""
+        stats = self.tool_stats.setdefault(tool_name, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["calls"] += 1
+        stats["errors"] += 1 if failed else 0
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        logger.info(f"Tool {tool_name} {'failed' if failed else 'completed'} in {elapsed_ms:.0f}ms")
+    
+    def _log_tool_stats(self):
+        for tool_name, stats in sorted(self.tool_stats.items()):
+            logger.info(
+                f"Tool stats {tool_name}: {stats['calls']} calls, {stats['errors']} errors, "
+                f"avg {stats['total_ms'] / stats['calls']:.0f}ms, max {stats['max_ms']:.0f}ms"
+            )
+    
+    async def _dispatch(self, line: str, semaphore: asyncio.Semaphore) -> Optional[Dict[str, Any]]:
+        """Processa uma linha do stdin e libera a vaga de concorrência ao terminar"""
+        try:
+            # Parsear requisição JSON
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.error(f"Invalid JSON: {line}")
+                return {
+                    "jsonrpc": "2.0",
+                    "id": None,
+                    "error": {
+                        "code": -32700,
+                        "message": f"Parse error: {str(e)}"
+                    }
+                }
+            
+            # Processar requisição
+            return await self.handle_request(request)
+        finally:
+            semaphore.release()
+    
+    async def _write_responses(self, pending: asyncio.Queue):
+        """Envia as respostas na ordem de chegada das requisições"""
+        while True:
+            task = await pending.get()
+            if task is None:
+                break
+            try:
+                response = await task
+            except Exception as e:
+                logger.error(f"Error handling request: {e}", exc_info=True)
+                continue
+            # Enviar resposta (notificações não têm resposta)
+            if response:
+                print(json.dumps(response), flush=True)
     
     async def run(self):
-        """Executa o servidor MCP lendo de stdin e escrevendo em stdout"""
-        logger.info("MCP Server starting (stdio mode)")
+        """
+        Executa o servidor MCP lendo de stdin e escrevendo em stdout
+        
+        As requisições são processadas em paralelo (até MAX_CONCURRENT_REQUESTS em
+        andamento; acima disso a leitura do stdin aguarda) e as respostas saem na
+        mesma ordem em que as requisições chegaram.
+        """
+        logger.info(f"MCP Server starting (stdio mode, max {mcp_config.MAX_CONCURRENT_REQUESTS} concurrent requests)")
+        
+        semaphore = asyncio.Semaphore(mcp_config.MAX_CONCURRENT_REQUESTS)
+        pending: asyncio.Queue = asyncio.Queue()
+        writer = asyncio.create_task(self._write_responses(pending))
         
         try:
-            # Ler linha por linha do stdin (bloqueante, mas OK para MCP)
             loop = asyncio.get_event_loop()
             
+            # Ler linha do stdin de forma assíncrona
+            def read_stdin():
+                try:
+                    return sys.stdin.readline()
+                except Exception:
+                    return None
+            
             while True:
-                # Ler linha do stdin de forma assíncrona
-                def read_stdin():
-                    try:
-                        return sys.stdin.readline()
-                    except Exception:
-                        return None
-                
                 line = await loop.run_in_executor(None, read_stdin)
                 
                 if not line:
@@ -180,33 +250,19 @@ class MCPServer:
                 if not line:
                     continue
                 
-                try:
-                    # Parsear requisição JSON
-                    request = json.loads(line)
-                    
-                    # Processar requisição
-                    response = await self.handle_request(request)
-                    
-                    # Enviar resposta
-                    if response:
-                        print(json.dumps(response), flush=True)
-                
-                except json.JSONDecodeError as e:
-                    logger.error(f"Invalid JSON: {line}")
-                    error_response = {
-                        "jsonrpc": "2.0",
-                        "id": None,
-                        "error": {
-                            "code": -32700,
-                            "message": f"Parse error: {str(e)}"
-                        }
-                    }
-                    print(json.dumps(error_response), flush=True)
+                await semaphore.acquire()
+                pending.put_nowait(asyncio.create_task(self._dispatch(line, semaphore)))
                 
         except KeyboardInterrupt:
             logger.info("MCP Server stopped by user")
         except Exception as e:
             logger.error(f"MCP Server error: {e}", exc_info=True)
+        finally:
+            # Aguardar as requisições em andamento e enviar as respostas restantes
+            pending.put_nowait(None)
+            await writer
+            await self.api_client.close()
+            self._log_tool_stats()
 
 
 async def main():
@@ -125,6 +125,7 @@ class ContentBriefing(Base):
     pesquisa_resultado = Column(Text)
     agentes_identificados = Column(JSONB)  # array de IDs/nomes de agentes a executar
     conteudo_gerado = Column(JSONB)  # objeto com todo conteúdo gerado
+    etapas_execucao = Column(JSONB)  # estado de cada agente da cadeia (permite retomar após falha)
     status = Column(String(20), default="draft")  # draft, researching, generating, completed, error
     
     # Timestamps
@@ -135,9 +136,13 @@ class ContentBriefing(Base):
     company = relationship("Company")
     user = relationship("User", foreign_keys=[user_id])
     
-    def to_dict(self):
-        """Converte o briefing para dicionário"""
-        return {
+    def to_dict(self, include_execution_state: bool = True):
+        """Converte o briefing para dicionário
+
+        include_execution_state=False omite etapas_execucao, status e updated_at (contexto dos
+        agentes: mudam a cada etapa e não devem entrar no prompt nem na chave do cache)
+        """
+        data = {
             "id": self.id,
             "company_id": self.company_id,
             "user_id": self.user_id,
@@ -152,8 +157,13 @@ class ContentBriefing(Base):
             "pesquisa_resultado": self.pesquisa_resultado,
             "agentes_identificados": json.loads(json.dumps(self.agentes_identificados)) if self.agentes_identificados else None,
             "conteudo_gerado": json.loads(json.dumps(self.conteudo_gerado)) if self.conteudo_gerado else None,
+            "etapas_execucao": json.loads(json.dumps(self.etapas_execucao)) if self.etapas_execucao else None,
             "status": self.status,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
+        if not include_execution_state:
+            for key in ("etapas_execucao", "status", "updated_at"):
+                data.pop(key)
+        return data
 
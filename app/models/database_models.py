@@ -1,7 +1,7 @@
 """
 Modelos do banco de dados usando SQLAlchemy
 """
-from sqlalchemy import Column, Integer, String, Text, Numeric, Boolean, DateTime, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, Text, Numeric, Boolean, DateTime, ForeignKey, Index, JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.config.database import Base
@@ -11,7 +11,13 @@ from app.config.database import Base
 # Product removido - já definido em saas_models.py
 
 class Category(Base):
-    """Modelo de categoria"""
+    """
+    Modelo de categoria
+
+    Também funciona como cache persistente da árvore de categorias do ML
+    (ver MLCategoryCacheService). A listagem raiz de um site é guardada em uma
+    linha cujo ml_category_id é o próprio site_id (ex.: "MLB").
+    """
     __tablename__ = "categories"
     
     id = Column(Integer, primary_key=True, index=True)
@@ -19,6 +25,16 @@ class Category(Base):
     name = Column(String(255), nullable=False)
     parent_id = Column(String(50), index=True)
     path_from_root = Column(Text)
+    site_id = Column(String(10), index=True)
+    
+    # Cache da API do ML (payload + revalidação por ETag/TTL)
+    data = Column(JSON)
+    etag = Column(String(255))
+    fetched_at = Column(DateTime, index=True)
+    attributes = Column(JSON)
+    attributes_etag = Column(String(255))
+    attributes_fetched_at = Column(DateTime)
+    
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
 
@@ -1,7 +1,7 @@
 """
 Modelos SQLAlchemy para o módulo financeiro
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Date, ForeignKey, Enum, Numeric, Index
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Date, ForeignKey, Enum, Numeric, Index, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.config.database import Base
@@ -426,3 +426,85 @@ class FinancialAlert(Base):
         Index('ix_financial_alerts_read', 'is_read'),
     )
 
+
+class FinancialMonthlySnapshot(Base):
+    """Agregados financeiros por empresa e mês (cache dos KPIs do dashboard, DRE e planejamento)"""
+    __tablename__ = "financial_monthly_snapshots"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False, index=True)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    
+    # Totais do mês (ver FinancialSnapshotService._compute_months)
+    data = Column(JSON, nullable=False)
+    
+    # Controle de atualização
+    is_dirty = Column(Boolean, default=False, nullable=False, index=True)
+    computed_at = Column(DateTime, nullable=False)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint('company_id', 'year', 'month', name='uq_financial_monthly_snapshots_company_month'),
+    )
+
+
+class FinancialLedgerEntry(Base):
+    """Razão (append-only) das contas: um lançamento por movimentação, com saldo acumulado"""
+    __tablename__ = "financial_ledger_entries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False, index=True)
+    account_id = Column(Integer, ForeignKey("financial_accounts.id"), nullable=False)
+    
+    # Transação de origem (sem FK: a transação pode ser removida, o lançamento não)
+    transaction_id = Column(Integer, index=True)
+    entry_type = Column(String(20), nullable=False)  # opening, transaction, reversal, adjustment
+    
+    # Dados exibidos no extrato (copiados da transação no momento do lançamento)
+    transaction_type = Column(String(50), nullable=False)  # credit, debit
+    amount = Column(Numeric(15, 2), nullable=False)
+    description = Column(Text)
+    reference_type = Column(String(50))
+    reference_id = Column(String(100))
+    entry_date = Column(Date, nullable=False)
+    
+    # Efeito no saldo da conta e saldo após o lançamento (ordem de lançamento)
+    signed_amount = Column(Numeric(15, 2), nullable=False)
+    running_balance = Column(Numeric(15, 2), nullable=False)
+    
+    created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('ix_financial_ledger_entries_account_id', 'account_id', 'id'),
+        Index('ix_financial_ledger_entries_account_date', 'account_id', 'entry_date'),
+    )
+
+
+class FinancialLedgerCheckpoint(Base):
+    """Fechamento mensal do razão por conta (pela data do lançamento)"""
+    __tablename__ = "financial_ledger_checkpoints"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False, index=True)
+    account_id = Column(Integer, ForeignKey("financial_accounts.id"), nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    
+    opening_balance = Column(Numeric(15, 2), nullable=False, default=0)
+    total_credits = Column(Numeric(15, 2), nullable=False, default=0)
+    total_debits = Column(Numeric(15, 2), nullable=False, default=0)
+    net_change = Column(Numeric(15, 2), nullable=False, default=0)
+    closing_balance = Column(Numeric(15, 2), nullable=False, default=0)
+    entries_count = Column(Integer, nullable=False, default=0)
+    
+    # Lançamento retroativo marca este mês e os seguintes para recálculo
+    is_dirty = Column(Boolean, default=False, nullable=False)
+    computed_at = Column(DateTime, nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint('account_id', 'year', 'month', name='uq_financial_ledger_checkpoints_account_month'),
+    )
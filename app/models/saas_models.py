@@ -2,9 +2,10 @@
 Modelos SaaS Multi-tenant para API Mercado Livre
 """
 from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, DateTime, Date, ForeignKey, Enum, JSON, Index, Numeric, UniqueConstraint, Float, TypeDecorator
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
 from app.config.database import Base, engine
+from app.utils.logistics import order_is_fulfillment, product_is_fulfillment, product_logistic_type
 import enum
 import logging
 
@@ -221,6 +222,10 @@ class MLAccount(Base):
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     last_sync = Column(DateTime)
     
+    # Cursores da sincronização incremental (UTC): data mais recente já importada
+    messages_synced_until = Column(DateTime)  # date_created do pedido/pack mais recente
+    questions_synced_until = Column(DateTime)  # date_created da pergunta mais recente
+    
     # Relacionamentos
     company = relationship("Company", back_populates="ml_accounts")
     user_ml_accounts = relationship("UserMLAccount", back_populates="ml_account", cascade="all, delete-orphan")
@@ -479,6 +484,8 @@ class MLProduct(Base):
     # Envio
     shipping = Column(JSON)    # Configurações de envio
     free_shipping = Column(Boolean, default=False)
+    logistic_type = Column(String(50))  # shipping.logistic_type (fulfillment, cross_docking, ...), mantido por _sync_logistic_fields
+    is_fulfillment = Column(Boolean, default=False, nullable=False, server_default="false")  # Anúncio Full (logistic_type ou tags)
     
     # Promoções e preços
     differential_pricing = Column(JSON)
@@ -500,8 +507,19 @@ class MLProduct(Base):
         Index('ix_ml_products_company_account', 'company_id', 'ml_account_id'),
         Index('ix_ml_products_account_status', 'ml_account_id', 'status'),
         Index('ix_ml_products_category_status', 'category_id', 'status'),
+        Index('ix_ml_products_company_fulfillment', 'company_id', 'is_fulfillment'),
+        Index('ix_ml_products_company_logistic_type', 'company_id', 'logistic_type'),
     )
 
+    @validates("shipping", "tags")
+    def _sync_logistic_fields(self, key, value):
+        """Mantém logistic_type / is_fulfillment em dia sempre que shipping ou tags mudam"""
+        shipping = value if key == "shipping" else self.shipping
+        tags = value if key == "tags" else self.tags
+        self.logistic_type = product_logistic_type(shipping)
+        self.is_fulfillment = product_is_fulfillment(self.logistic_type, tags)
+        return value
+
 class MLProductSync(Base):
     """Log de sincronização de produtos ML"""
     __tablename__ = "ml_product_sync"
@@ -568,6 +586,38 @@ class AIProductAnalysis(Base):
         Index('ix_ai_analysis_created', 'created_at'),
     )
 
+
+class ProductAnalysisSnapshot(Base):
+    """Insumos da análise IA de um produto (vendas, marketing, catálogo e pricing), atualizados de forma incremental"""
+    __tablename__ = "product_analysis_snapshots"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    ml_product_id = Column(Integer, ForeignKey("ml_products.id"), nullable=False, unique=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=False, index=True)
+    ml_item_id = Column(String(50), nullable=False)
+    
+    # Pedidos do anúncio na janela (ver ProductAnalysisSnapshotService._order_row)
+    window_days = Column(Integer, nullable=False, default=30)
+    orders = Column(JSON)
+    orders_watermark = Column(DateTime)  # maior ml_orders.updated_at já incorporado
+    orders_refreshed_at = Column(DateTime)
+    
+    # Métricas de Product Ads (API do ML)
+    marketing_metrics = Column(JSON)
+    marketing_fetched_at = Column(DateTime)
+    
+    # Concorrentes do catálogo
+    catalog_data = Column(JSON)
+    catalog_fetched_at = Column(DateTime)
+    
+    # Última análise de custos/preço enviada pela tela
+    pricing_analysis = Column(JSON)
+    pricing_updated_at = Column(DateTime)
+    
+    # Timestamps
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
 class MLProductAttribute(Base):
     """Atributos específicos de produtos ML"""
     __tablename__ = "ml_product_attributes"
@@ -766,7 +816,8 @@ class MLOrder(Base):
     invoice_pdf_url = Column(String(500))  # URL do PDF da NF (DANFE)
     
     # === FORMA DE ENVIO ===
-    shipping_type = Column(String(20), index=True)  # fulfillment, cross_docking, me2, etc.
+    shipping_type = Column(String(20), index=True)  # fulfillment, cross_docking, me2, etc. (logistic_type do envio)
+    is_fulfillment = Column(Boolean, default=False, nullable=False, server_default="false")  # Envio Full, mantido por _sync_is_fulfillment
     shipping_date = Column(DateTime, index=True)  # Data de envio (date_created do shipment)
     estimated_delivery_date = Column(DateTime, index=True)  # Data estimada de entrega
     
@@ -785,12 +836,23 @@ class MLOrder(Base):
         Index('ix_ml_orders_buyer_id', 'buyer_id'),
         Index('ix_ml_orders_seller_id', 'seller_id'),
         Index('ix_ml_orders_date_created', 'date_created'),
+        Index('ix_ml_orders_company_date_created', 'company_id', 'date_created'),
         Index('ix_ml_orders_status', 'status'),
         Index('ix_ml_orders_advertising', 'is_advertising_sale'),
         Index('ix_ml_orders_shipping_id', 'shipping_id'),
         Index('ix_ml_orders_cash_entry', 'cash_entry_created'),
+        Index('ix_ml_orders_company_fulfillment', 'company_id', 'is_fulfillment'),
+        Index('ix_ml_orders_company_shipping_type', 'company_id', 'shipping_type'),
     )
 
+    @validates("shipping_type", "shipping_details")
+    def _sync_is_fulfillment(self, key, value):
+        """Mantém is_fulfillment em dia sempre que shipping_type ou shipping_details mudam"""
+        shipping_type = value if key == "shipping_type" else self.shipping_type
+        shipping_details = value if key == "shipping_details" else self.shipping_details
+        self.is_fulfillment = order_is_fulfillment(shipping_details, shipping_type)
+        return value
+
 class MLOrderProcessingStatus(Base):
     """Status interno de processamento do pedido"""
     __tablename__ = "ml_order_processing_statuses"
@@ -1508,6 +1570,13 @@ class OpenAIAssistant(Base):
     provider = Column(String(50), default="openai", nullable=False, index=True)
     api_config = Column(JSON, nullable=True)  # Configurações específicas do provider
     
+    # Cache de respostas (modo report)
+    response_cache_enabled = Column(Boolean, default=True, nullable=False)
+    response_cache_ttl = Column(Integer, nullable=True)  # Segundos; NULL = padrão do AIResponseCacheService
+    
+    # Orçamento de tokens do histórico enviado no modo chat (NULL = padrão do ConversationContextManager)
+    context_token_budget = Column(Integer, nullable=True)
+    
     # Status
     is_active = Column(Boolean, default=True, nullable=False, index=True)
     
@@ -1554,6 +1623,10 @@ class OpenAIAssistantThread(Base):
     # Memória específica desta thread (informações aprendidas durante a conversa)
     memory_data = Column(JSON, nullable=True)
     
+    # Resumo acumulado dos turnos que saíram da janela de contexto
+    context_summary = Column(Text, nullable=True)
+    context_summary_until_id = Column(Integer, nullable=True)  # Última mensagem incluída no resumo
+    
     # Status
     is_active = Column(Boolean, default=True, nullable=False)
     
@@ -1632,6 +1705,12 @@ class OpenAIAssistantUsage(Base):
     request_data_size = Column(Integer, nullable=True)
     response_data_size = Column(Integer, nullable=True)
     
+    # Latência por chamada de ferramenta: [{"tool", "latency_ms", "status"}]
+    tool_metrics = Column(JSON, nullable=True)
+    
+    # Resposta servida do cache (sem chamada ao provider e sem débito de tokens)
+    cache_hit = Column(Boolean, default=False, nullable=True)
+    
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
@@ -1651,6 +1730,56 @@ class OpenAIAssistantUsage(Base):
     # )
 
 
+class AIResponseCache(Base):
+    """Respostas de agentes em modo report, reaproveitadas para prompts idênticos"""
+    __tablename__ = "ai_response_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # sha256(versão do agente + empresa + prompt normalizado + hash do contexto)
+    cache_key = Column(String(64), nullable=False, unique=True, index=True)
+    assistant_id = Column(Integer, ForeignKey("openai_assistants.id", ondelete="CASCADE"), nullable=False, index=True)
+    company_id = Column(Integer, ForeignKey("companies.id"), nullable=True, index=True)  # Nullable para superadmin
+    agent_version = Column(String(64), nullable=False)
+    use_case = Column(String(100), nullable=True)
+    
+    # Resposta
+    content = Column(Text, nullable=False)
+    raw_response = Column(JSON, nullable=True)
+    usage = Column(JSON, nullable=True)  # Uso de tokens da geração original
+    
+    # Métricas
+    hit_count = Column(Integer, default=0, nullable=False)
+    tokens_saved = Column(BigInteger, default=0, nullable=False)
+    last_hit_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class MLResponseCache(Base):
+    """Respostas GET da API do ML (highlights, produtos, itens, busca, visitas), com ETag"""
+    __tablename__ = "ml_response_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    # sha256(URL normalizada + parâmetros ordenados [+ seller dono do token nas classes não compartilhadas])
+    cache_key = Column(String(64), nullable=False, unique=True, index=True)
+    endpoint_class = Column(String(50), nullable=False, index=True)
+    url = Column(String(1000), nullable=False)
+    
+    # Resposta
+    status_code = Column(Integer, nullable=False)
+    etag = Column(String(255), nullable=True)
+    payload = Column(JSON, nullable=True)
+    
+    # Métricas
+    hit_count = Column(Integer, default=0, nullable=False)
+    
+    # Timestamps
+    fetched_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
 class WarehouseType(enum.Enum):
     """Tipo de depósito"""
     FULFILLMENT = "fulfillment"  # Estoque externo compartilhado do ML
@@ -2051,6 +2180,11 @@ class MLClaim(Base):
     # Dados completos (JSON)
     claim_data = Column(JSON)  # Dados completos da API
     
+    # Pedido consultado na API (quando não está em ml_orders)
+    order_total_amount = Column(Numeric(10, 2))
+    order_date_closed = Column(DateTime)
+    order_checked_at = Column(DateTime)  # Preenchido também quando o pedido não é encontrado
+    
     # Timestamps
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
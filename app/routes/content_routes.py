@@ -774,7 +774,7 @@ async def generate_content_api(
     request: Request,
     db: Session = Depends(get_db)
 ):
-    """API para gerar conteúdo completo (pesquisa + identificação + execução de agentes)"""
+    """API para gerar conteúdo completo (pesquisa + identificação + execução de agentes em paralelo por dependência)"""
     user_data = get_current_user(request, db)
     if not user_data:
         return JSONResponse(status_code=401, content={"success": False, "error": "Não autenticado"})
@@ -789,6 +789,15 @@ async def generate_content_api(
     
     service = BriefingService(db)
     
+    # Cadeia anterior falhou: retomar a partir dos agentes já concluídos ({"restart": true} refaz tudo)
+    try:
+        body = await request.json()
+    except Exception:
+        body = {}
+    restart = bool(body.get("restart")) if isinstance(body, dict) else False
+    if not restart and service.has_resumable_chain(briefing_id, company_id):
+        return JSONResponse(content=service.execute_agents_chain(briefing_id, company_id, user_data))
+    
     # 1. Executar pesquisa
     research_result = service.execute_research(briefing_id, company_id, user_data)
     if not research_result.get("success"):
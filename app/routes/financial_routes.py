@@ -17,7 +17,13 @@ from app.models.financial_models import (
     FinancialAccount, FinancialCategory, CostCenter, FinancialCustomer,
     AccountReceivable, FinancialSupplier, AccountPayable, FinancialTransaction
 )
-from app.models.saas_models import MLOrder, Fornecedor, OrdemCompra
+from app.models.saas_models import Fornecedor, OrdemCompra
+from app.services.cashflow_service import CashflowService
+from app.services.financial_ledger_service import FinancialLedgerService, signed_amount, transaction_type_for
+from app.services.financial_snapshot_service import (
+    FinancialSnapshotService, PAYABLE_PAID_STATUSES, PAYABLE_PENDING_STATUSES, sum_statuses
+)
+from app.utils.pagination import MAX_PAGE_SIZE
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -841,10 +847,19 @@ async def get_bank_accounts(
 @financial_router.get("/api/financial/account-transactions/{account_id}")
 async def get_account_transactions(
     account_id: int,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
     session_token: Optional[str] = Cookie(None),
     db: Session = Depends(get_db)
 ):
-    """API para obter transações de uma conta específica"""
+    """
+    API para obter o extrato de uma conta específica
+
+    Lê o razão da conta (saldo acumulado por lançamento), paginado por `cursor`.
+    Os totais vêm dos fechamentos mensais, sem varrer o histórico.
+    """
     if not session_token:
         raise HTTPException(status_code=401, detail="Token de sessão necessário")
     
@@ -856,7 +871,6 @@ async def get_account_transactions(
     company_id = user_data.get("company_id")
     
     # Verificar se a conta pertence à empresa
-    from app.models.financial_models import FinancialAccount, FinancialTransaction
     account = db.query(FinancialAccount).filter(
         and_(
             FinancialAccount.id == account_id,
@@ -867,47 +881,118 @@ async def get_account_transactions(
     if not account:
         raise HTTPException(status_code=404, detail="Conta não encontrada")
     
-    # Buscar transações da conta (filtradas por company_id)
-    transactions = db.query(FinancialTransaction).filter(
-        and_(
-            FinancialTransaction.account_id == account_id,
-            FinancialTransaction.company_id == company_id
-        )
-    ).order_by(FinancialTransaction.created_at.desc()).all()
+    ledger_service = FinancialLedgerService(db)
+    if ledger_service.get_balance(account.id) is None:
+        # Conta anterior ao razão: monta o histórico uma única vez
+        ledger_service.rebuild_account(account.id)
+        db.commit()
     
-    # Calcular estatísticas
-    total_credits = sum(float(t.amount) for t in transactions if t.transaction_type == "credit")
-    total_debits = sum(float(t.amount) for t in transactions if t.transaction_type == "debit")
-    net_balance = total_credits - total_debits
+    statement = ledger_service.get_statement(account, limit=limit, cursor=cursor, date_from=date_from, date_to=date_to)
     
     return {
         "account": {
             "id": account.id,
             "bank_name": account.bank_name,
             "account_name": account.account_name,
-            "current_balance": float(account.current_balance or 0)
+            "account_type": account.account_type,
+            "current_balance": float(account.current_balance or 0),
+            "ledger_balance": ledger_service.get_balance(account.id)
         },
-        "transactions": [
-            {
-                "id": t.id,
-                "transaction_type": t.transaction_type,
-                "amount": float(t.amount),
-                "description": t.description,
-                "reference_type": t.reference_type,
-                "reference_id": t.reference_id,
-                "transaction_date": t.transaction_date.isoformat() if t.transaction_date else None,
-                "created_at": t.created_at.isoformat() if t.created_at else None
-            }
-            for t in transactions
-        ],
-        "statistics": {
-            "total_credits": total_credits,
-            "total_debits": total_debits,
-            "net_balance": net_balance,
-            "total_transactions": len(transactions)
-        }
+        "transactions": statement["entries"],
+        "next_cursor": statement["next_cursor"],
+        "has_more": statement["has_more"],
+        "statistics": statement["statistics"]
+    }
+
+@financial_router.get("/api/financial/accounts/{account_id}/balance")
+async def get_account_balance_at(
+    account_id: int,
+    on_date: Optional[date] = Query(None, alias="date"),
+    session_token: Optional[str] = Cookie(None),
+    db: Session = Depends(get_db)
+):
+    """API para obter o saldo de uma conta ao final de uma data (padrão: hoje)"""
+    if not session_token:
+        raise HTTPException(status_code=401, detail="Token de sessão necessário")
+    
+    result = auth_controller.get_user_by_session(session_token, db)
+    if result.get("error"):
+        raise HTTPException(status_code=401, detail="Sessão inválida ou expirada")
+    
+    company_id = result["user"].get("company_id")
+    account = db.query(FinancialAccount).filter(
+        FinancialAccount.id == account_id,
+        FinancialAccount.company_id == company_id
+    ).first()
+    if not account:
+        raise HTTPException(status_code=404, detail="Conta não encontrada")
+    
+    on_date = on_date or date.today()
+    return {
+        "account_id": account.id,
+        "date": on_date.isoformat(),
+        "balance": FinancialLedgerService(db).get_balance_at(account, on_date)
     }
 
+@financial_router.get("/api/financial/accounts/{account_id}/ledger-summary")
+async def get_account_ledger_summary(
+    account_id: int,
+    session_token: Optional[str] = Cookie(None),
+    db: Session = Depends(get_db)
+):
+    """API para obter os fechamentos mensais (saldo inicial, créditos, débitos e saldo final) de uma conta"""
+    if not session_token:
+        raise HTTPException(status_code=401, detail="Token de sessão necessário")
+    
+    result = auth_controller.get_user_by_session(session_token, db)
+    if result.get("error"):
+        raise HTTPException(status_code=401, detail="Sessão inválida ou expirada")
+    
+    company_id = result["user"].get("company_id")
+    account = db.query(FinancialAccount).filter(
+        FinancialAccount.id == account_id,
+        FinancialAccount.company_id == company_id
+    ).first()
+    if not account:
+        raise HTTPException(status_code=404, detail="Conta não encontrada")
+    
+    return {"account_id": account.id, "months": FinancialLedgerService(db).get_monthly_summary(account)}
+
+@financial_router.get("/api/financial/ledger/reconciliation")
+async def get_ledger_reconciliation(
+    session_token: Optional[str] = Cookie(None),
+    db: Session = Depends(get_db)
+):
+    """API para conferir o saldo das contas da empresa contra o razão"""
+    if not session_token:
+        raise HTTPException(status_code=401, detail="Token de sessão necessário")
+    
+    result = auth_controller.get_user_by_session(session_token, db)
+    if result.get("error"):
+        raise HTTPException(status_code=401, detail="Sessão inválida ou expirada")
+    
+    company_id = result["user"].get("company_id")
+    return FinancialLedgerService(db).reconcile(company_id=company_id)
+
+@financial_router.post("/api/financial/ledger/reconciliation")
+async def fix_ledger_reconciliation(
+    session_token: Optional[str] = Cookie(None),
+    db: Session = Depends(get_db)
+):
+    """API para substituir o saldo divergente das contas da empresa pelo saldo do razão"""
+    if not session_token:
+        raise HTTPException(status_code=401, detail="Token de sessão necessário")
+    
+    result = auth_controller.get_user_by_session(session_token, db)
+    if result.get("error"):
+        raise HTTPException(status_code=401, detail="Sessão inválida ou expirada")
+    
+    company_id = result["user"].get("company_id")
+    reconciliation = FinancialLedgerService(db).reconcile(company_id=company_id, fix=True)
+    for item in reconciliation["drifted"]:
+        logger.info(f"🔧 Saldo da conta {item['account_name']} corrigido de R$ {item['current_balance']:.2f} para R$ {item['ledger_balance']:.2f}")
+    return reconciliation
+
 @financial_router.post("/api/financial/transfer")
 async def process_transfer(
     transfer_data: dict,
@@ -976,7 +1061,7 @@ async def process_transfer(
         debit_transaction = FinancialTransaction(
             company_id=company_id,
             account_id=from_account_id,
-            transaction_type="debit",
+            transaction_type=transaction_type_for(from_account.account_type, -amount),
             amount=amount,
             description=f"Débito - {description} - Enviado para {to_account.bank_name} - {to_account.account_name}",
             transaction_date=datetime.now().date(),
@@ -988,7 +1073,7 @@ async def process_transfer(
         credit_transaction = FinancialTransaction(
             company_id=company_id,
             account_id=to_account_id,
-            transaction_type="credit",
+            transaction_type=transaction_type_for(to_account.account_type, amount),
             amount=amount,
             description=f"Crédito - {description} - Recebido de {from_account.bank_name} - {from_account.account_name}",
             transaction_date=datetime.now().date(),
@@ -1063,14 +1148,9 @@ async def delete_transaction(
         if not account:
             raise HTTPException(status_code=404, detail="Conta não encontrada")
         
-        # Ajustar saldo da conta (reverter a transação)
+        # Ajustar saldo da conta (reverter a transação; o razão recebe o estorno)
         current_balance = float(account.current_balance or 0)
-        if transaction.transaction_type == "credit":
-            # Se era crédito, subtrair do saldo
-            new_balance = current_balance - float(transaction.amount)
-        else:
-            # Se era débito, somar ao saldo
-            new_balance = current_balance + float(transaction.amount)
+        new_balance = current_balance - float(signed_amount(transaction.transaction_type, transaction.amount, account.account_type))
         
         # Atualizar saldo da conta
         account.current_balance = new_balance
@@ -1155,23 +1235,9 @@ async def create_transaction(
         db.add(transaction)
         
         # Atualizar saldo da conta considerando tipo de conta
+        # (em cartões de crédito o crédito aumenta a dívida e o débito a diminui)
         current_balance = float(account.current_balance or 0)
-        is_credit_card = account.account_type == "credit"
-        
-        # Para cartões de crédito, a lógica é inversa:
-        # - Crédito aumenta dívida (diminui saldo disponível)
-        # - Débito diminui dívida (aumenta saldo disponível)
-        if is_credit_card:
-            if transaction_type == "credit":
-                new_balance = current_balance - amount  # Crédito aumenta dívida
-            else:
-                new_balance = current_balance + amount  # Débito diminui dívida
-        else:
-            # Para contas normais, lógica tradicional
-            if transaction_type == "credit":
-                new_balance = current_balance + amount
-            else:
-                new_balance = current_balance - amount
+        new_balance = current_balance + float(signed_amount(transaction_type, amount, account.account_type))
         
         account.current_balance = new_balance
         
@@ -1298,7 +1364,11 @@ async def update_bank_account(
     if account_data.get("initial_balance") is not None:
         account.initial_balance = float(account_data.get("initial_balance"))
     if account_data.get("current_balance") is not None:
-        account.current_balance = float(account_data.get("current_balance"))
+        new_current_balance = float(account_data.get("current_balance"))
+        if round(new_current_balance - float(account.current_balance or 0), 2) != 0:
+            # Saldo alterado manualmente entra no razão como ajuste
+            FinancialLedgerService(db).record_adjustment(account.id, new_current_balance)
+        account.current_balance = new_current_balance
     if account_data.get("is_active") is not None:
         account.is_active = account_data.get("is_active")
     # Sempre atualizar is_main_account (mesmo se for False)
@@ -2521,7 +2591,7 @@ async def update_payable_status(
                 if is_credit_card:
                     # Cartão de crédito: pagamento aumenta saldo (reduz dívida)
                     account.current_balance = float(account.current_balance or 0) + amount_value
-                    transaction_type = "credit"
+                    transaction_type = "debit"  # Débito diminui a dívida no cartão
                     description_prefix = "Pagamento de fatura"
                 else:
                     # Conta corrente/poupança: pagamento diminui saldo (saída de dinheiro)
@@ -2720,10 +2790,17 @@ async def get_cashflow_data(
     period: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     session_token: Optional[str] = Cookie(None),
     db: Session = Depends(get_db)
 ):
-    """API para obter dados do fluxo de caixa"""
+    """
+    API para obter dados do fluxo de caixa
+
+    Filtro de período e agregação diária são feitos no banco. Sem `limit`
+    retorna todos os lançamentos do período; com `limit` pagina por `cursor`.
+    """
     if not session_token:
         raise HTTPException(status_code=401, detail="Token de sessão necessário")
     
@@ -2734,205 +2811,14 @@ async def get_cashflow_data(
     user_data = result["user"]
     company_id = get_company_id_from_user(user_data)
     
-    # Buscar empresa para verificar se ML orders está ativado
-    from app.models.saas_models import Company, MLOrder, OrderStatus
-    from datetime import timedelta, datetime
-    
-    company = db.query(Company).filter(Company.id == company_id).first()
-    
-    # Lista para armazenar todos os itens do fluxo de caixa
-    cashflow_items = []
-    period_start = None
-    period_end = None
-
-    # Calcular período, se informado
-    try:
-        from datetime import datetime, timedelta
-        today = datetime.now()
-        if period:
-            if period == "today":
-                period_start = today.replace(hour=0, minute=0, second=0, microsecond=0)
-                period_end = today.replace(hour=23, minute=59, second=59, microsecond=999999)
-            elif period == "this_week":
-                days_since_monday = today.weekday()
-                period_start = (today - timedelta(days=days_since_monday)).replace(hour=0, minute=0, second=0, microsecond=0)
-                period_end = (period_start + timedelta(days=6)).replace(hour=23, minute=59, second=59, microsecond=999999)
-            elif period == "this_month":
-                period_start = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                period_end = (period_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-                period_end = period_end.replace(hour=23, minute=59, second=59, microsecond=999999)
-            elif period == "last_month":
-                period_start = (today.replace(day=1) - timedelta(days=1)).replace(day=1)
-                period_end = today.replace(day=1) - timedelta(days=1)
-                period_start = period_start.replace(hour=0, minute=0, second=0, microsecond=0)
-                period_end = period_end.replace(hour=23, minute=59, second=0, microsecond=0)
-            elif period == "next_month":
-                next_month = today.replace(day=1) + timedelta(days=32)
-                period_start = next_month.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                period_end = (period_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-                period_end = period_end.replace(hour=23, minute=59, second=59, microsecond=999999)
-            elif period == "next_30_days":
-                period_start = today.replace(hour=0, minute=0, second=0, microsecond=0)
-                period_end = (today + timedelta(days=30)).replace(hour=23, minute=59, second=59, microsecond=999999)
-            elif period == "next_60_days":
-                period_start = today.replace(hour=0, minute=0, second=0, microsecond=0)
-                period_end = (today + timedelta(days=60)).replace(hour=23, minute=59, second=59, microsecond=999999)
-            elif period == "next_90_days":
-                period_start = today.replace(hour=0, minute=0, second=0, microsecond=0)
-                period_end = (today + timedelta(days=90)).replace(hour=23, minute=59, second=59, microsecond=999999)
-            elif period == "this_year":
-                period_start = today.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-                period_end = today.replace(month=12, day=31, hour=23, minute=59, second=59, microsecond=999999)
-        if date_from and date_to:
-            # Sobrescreve se período personalizado foi informado
-            period_start = datetime.fromisoformat(date_from)
-            period_end = datetime.fromisoformat(date_to)
-    except Exception:
-        # Em caso de erro de parsing, ignora filtro de período
-        period_start = None
-        period_end = None
-    
-    # 1. Buscar contas a receber (todas, incluindo pagas)
-    receivables = db.query(AccountReceivable).filter(
-        AccountReceivable.company_id == company_id
-    ).all()
-    
-    for rec in receivables:
-        # Se já foi pago/recebido, usar a data de pagamento, senão data de vencimento
-        transaction_date = rec.paid_date.isoformat() if rec.paid_date else (rec.due_date.isoformat() if rec.due_date else None)
-        
-        cashflow_items.append({
-            "id": f"rec_{rec.id}",
-            "date": transaction_date,
-            "description": f"Conta a Receber - {rec.customer_name}",
-            "type": "receivable",
-            "flow_type": "inflow",
-            "amount": float(rec.paid_amount) if rec.paid_amount else float(rec.amount),
-            "status": rec.status,
-            "customer_name": rec.customer_name,
-            "invoice_number": rec.invoice_number,
-            "is_paid": rec.status in ['paid', 'received']
-        })
-    
-    # 2. Buscar contas a pagar (todas, incluindo pagas)
-    payables = db.query(AccountPayable).filter(
-        AccountPayable.company_id == company_id
-    ).all()
-    
-    for pay in payables:
-        # Se já foi pago, usar a data de pagamento, senão data de vencimento
-        transaction_date = pay.paid_date.isoformat() if pay.paid_date else (pay.due_date.isoformat() if pay.due_date else None)
-        
-        cashflow_items.append({
-            "id": f"pay_{pay.id}",
-            "date": transaction_date,
-            "description": f"Conta a Pagar - {pay.supplier_name}",
-            "type": "payable",
-            "flow_type": "outflow",
-            "amount": float(pay.paid_amount) if pay.paid_amount else float(pay.amount),
-            "status": pay.status,
-            "supplier_name": pay.supplier_name,
-            "invoice_number": pay.invoice_number,
-            "is_paid": pay.status in ['paid']
-        })
-    
-    # 3. Se ML orders está ativado, buscar pedidos ML (todos, incluindo recebidos)
-    if company and company.ml_orders_as_receivables:
-        ml_orders = db.query(MLOrder).filter(
-            MLOrder.company_id == company_id,
-            MLOrder.status.in_([OrderStatus.PAID, OrderStatus.DELIVERED]),
-            MLOrder.date_closed.isnot(None)
-        ).all()
-        
-        for order in ml_orders:
-            # Calcular data de recebimento baseada no método de pagamento
-            payment_date = calculate_ml_payment_date(order)
-            
-            # Calcular valor líquido (total - taxas)
-            net_amount = float(order.total_amount or 0) - float(order.total_fees or 0)
-            
-            # Definir status baseado no status do pedido ML e shipping
-            is_delivered = (
-                order.status == OrderStatus.DELIVERED or 
-                (order.shipping_status and order.shipping_status.lower() == "delivered")
-            )
-            
-            # Se foi entregue, verificar se já passou 7 dias
-            if is_delivered:
-                delivery_date = None
-                if order.shipping_details and isinstance(order.shipping_details, dict):
-                    status_history = order.shipping_details.get('status_history', {})
-                    if status_history and 'date_delivered' in status_history:
-                        try:
-                            delivery_date_str = status_history['date_delivered']
-                            delivery_date = datetime.fromisoformat(delivery_date_str.replace('Z', '+00:00'))
-                        except:
-                            pass
-                
-                if delivery_date:
-                    days_since_delivery = (datetime.now() - delivery_date.replace(tzinfo=None)).days
-                    if days_since_delivery < 7:
-                        is_delivered = False
-            
-            ml_status = "received" if is_delivered else "pending"
-            
-            # Se foi recebido, usar data de entrega + 7 dias, senão data de pagamento prevista
-            if is_delivered and delivery_date:
-                actual_payment_date = delivery_date + timedelta(days=7)
-                transaction_date = actual_payment_date.isoformat()
-            else:
-                transaction_date = payment_date.isoformat() if payment_date else None
-            
-            cashflow_items.append({
-                "id": f"ml_{order.ml_order_id}",
-                "date": transaction_date,
-                "description": f"Mercado Livre - Pedido #{order.ml_order_id}",
-                "type": "ml_order",
-                "flow_type": "inflow",
-                "amount": net_amount,
-                "status": ml_status,
-                "ml_order_id": order.ml_order_id,
-                "buyer_name": order.buyer_nickname or order.buyer_first_name or "Cliente ML",
-                "is_paid": ml_status == "received"
-            })
-    
-    # Aplicar filtro por período (servidor) se definido
-    if period_start or period_end:
-        def in_range(item_date_str: Optional[str]) -> bool:
-            if not item_date_str:
-                return False
-            try:
-                d = datetime.fromisoformat(item_date_str.replace('Z', '+00:00'))
-                # Normalizar para naive (sem timezone) para comparação consistente
-                if d.tzinfo is not None:
-                    d = d.astimezone(tz=None).replace(tzinfo=None)
-            except Exception:
-                return False
-            # Garantir que limites também sejam naive
-            ps = period_start.replace(tzinfo=None) if period_start else None
-            pe = period_end.replace(tzinfo=None) if period_end else None
-            if ps and d < ps:
-                return False
-            if pe and d > pe:
-                return False
-            return True
-        cashflow_items = [it for it in cashflow_items if in_range(it.get('date'))]
-
-    # Ordenar por data
-    cashflow_items.sort(key=lambda x: x['date'] or '9999-12-31')
-    
-    # Calcular saldo atual real das contas bancárias
-    bank_accounts = db.query(FinancialAccount).filter(
-        FinancialAccount.company_id == company_id,
-        FinancialAccount.is_active == True
-    ).all()
-    
-    total_current_balance = sum(float(acc.current_balance) for acc in bank_accounts)
-    
-    return {
-        "cashflow_items": cashflow_items,
-        "total_current_balance": total_current_balance
-    }
+    return CashflowService(db).get_cashflow(
+        company_id,
+        period=period,
+        date_from=date_from,
+        date_to=date_to,
+        limit=limit,
+        cursor=cursor
+    )
 
 @financial_router.get("/api/financial/dashboard")
 async def get_dashboard_data(
@@ -2979,132 +2865,32 @@ async def get_dashboard_data(
         month_start = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
         month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
     
-    # CONSULTA ÚNICA: Receitas (normais + Mercado Livre) com regra dos 7 dias
-    from app.models.financial_models import AccountReceivable, AccountPayable, FinancialAccount
-    from app.models.saas_models import Company, MLOrder, OrderStatus
-    from sqlalchemy import text
-    
-    # 1. Receitas normais pagas no período
-    receivables_paid = db.query(func.sum(AccountReceivable.paid_amount)).filter(
-        AccountReceivable.company_id == company_id,
-        AccountReceivable.status.in_(['paid', 'received']),
-        AccountReceivable.paid_date >= month_start,
-        AccountReceivable.paid_date <= month_end
-    ).scalar() or 0
-    
-    # 2. Receitas normais pendentes no período
-    receivables_pending = db.query(func.sum(AccountReceivable.amount)).filter(
-        AccountReceivable.company_id == company_id,
-        AccountReceivable.status == 'pending',
-        AccountReceivable.due_date >= month_start,
-        AccountReceivable.due_date <= month_end
-    ).scalar() or 0
-    
-    # 3. Pedidos ML com regra dos 7 dias
-    ml_received_revenue = 0
-    ml_pending_revenue = 0
-    
-    company = db.query(Company).filter(Company.id == company_id).first()
-    if company and company.ml_orders_as_receivables:
-        # Buscar pedidos ML do período (usando data de criação)
-        ml_orders = db.query(MLOrder).filter(
-            MLOrder.company_id == company_id,
-            MLOrder.status.in_([OrderStatus.PAID, OrderStatus.DELIVERED]),
-            MLOrder.date_created >= month_start,
-            MLOrder.date_created <= month_end
-        ).all()
-        
-        for order in ml_orders:
-            # Usar receita BRUTA (sem desconto das taxas)
-            gross_amount = float(order.total_amount or 0)
-            
-            # Aplicar regra dos 7 dias
-            is_delivered = (
-                order.status == OrderStatus.DELIVERED or 
-                (order.shipping_status and order.shipping_status.lower() == "delivered")
-            )
-            
-            if is_delivered:
-                delivery_date = None
-                if order.shipping_details and isinstance(order.shipping_details, dict):
-                    status_history = order.shipping_details.get('status_history', {})
-                    if status_history and 'date_delivered' in status_history:
-                        try:
-                            delivery_date_str = status_history['date_delivered']
-                            delivery_date = datetime.fromisoformat(delivery_date_str.replace('Z', '+00:00'))
-                        except:
-                            pass
-                
-                if delivery_date:
-                    days_since_delivery = (datetime.now() - delivery_date.replace(tzinfo=None)).days
-                    if days_since_delivery >= 7:
-                        ml_received_revenue += gross_amount
-                    else:
-                        ml_pending_revenue += gross_amount
-                else:
-                    ml_pending_revenue += gross_amount
-            else:
-                ml_pending_revenue += gross_amount
-    
-    # 4. Totais combinados (normais + ML) - convertendo para float
-    total_received_revenue = float(receivables_paid) + float(ml_received_revenue)
-    total_pending_revenue = float(receivables_pending) + float(ml_pending_revenue)
+    # KPIs a partir dos snapshots mensais (meses inteiros) ou agregação SQL do recorte
+    from app.models.financial_models import FinancialAccount
+    from app.models.saas_models import Company
     
-    # Despesas pagas no período - incluindo diferentes status
-    try:
-        payables_paid = db.query(func.sum(AccountPayable.amount)).filter(
-            AccountPayable.company_id == company_id,
-            AccountPayable.status.in_(['paid', 'received', 'completed'])
-        ).scalar() or 0
-    except Exception as e:
-        print(f"Erro ao consultar despesas pagas: {e}")
-        payables_paid = 0
+    totals = FinancialSnapshotService(db).get_period_totals(company_id, month_start.date(), month_end.date())
     
-    # Despesas pendentes no período - incluindo diferentes status
-    try:
-        payables_pending = db.query(func.sum(AccountPayable.amount)).filter(
-            AccountPayable.company_id == company_id,
-            AccountPayable.status.in_(['pending', 'overdue', 'unpaid']),
-            AccountPayable.due_date >= month_start,
-            AccountPayable.due_date <= month_end
-        ).scalar() or 0
-    except Exception as e:
-        print(f"Erro ao consultar despesas pendentes: {e}")
-        payables_pending = 0
+    # 1. Receitas normais pagas no período / pendentes com vencimento no período
+    receivables_paid = sum_statuses(totals["receivables_paid"], ["paid", "received"])
+    receivables_pending = sum_statuses(totals["receivables_due"], ["pending"])
     
-    # Debug: Log dos valores
-    print(f"DEBUG - Despesas pagas: {payables_paid}")
-    print(f"DEBUG - Despesas pendentes: {payables_pending}")
-    print(f"DEBUG - Company ID: {company_id}")
-    print(f"DEBUG - Período: {month_start} a {month_end}")
+    # 2. Pedidos ML (receita BRUTA) com regra dos 7 dias
+    ml_received_revenue = 0.0
+    ml_pending_revenue = 0.0
     
-    # Debug: Verificar todos os status das despesas
-    all_status = db.query(AccountPayable.status, func.count(AccountPayable.id)).filter(
-        AccountPayable.company_id == company_id
-    ).group_by(AccountPayable.status).all()
-    print(f"DEBUG - Status das despesas: {all_status}")
-    
-    # Debug: Verificar despesas com paid_date no período
-    paid_in_period = db.query(func.count(AccountPayable.id), func.sum(AccountPayable.paid_amount)).filter(
-        AccountPayable.company_id == company_id,
-        AccountPayable.paid_date >= month_start,
-        AccountPayable.paid_date <= month_end
-    ).first()
-    print(f"DEBUG - Despesas com paid_date no período: {paid_in_period}")
+    ml_orders_enabled = db.query(Company.ml_orders_as_receivables).filter(Company.id == company_id).scalar()
+    if ml_orders_enabled:
+        ml_received_revenue = float(totals["ml_received_gross"])
+        ml_pending_revenue = float(totals["ml_pending_gross"])
     
-    # Debug: Verificar despesas pagas - detalhes
-    paid_details = db.query(AccountPayable.id, AccountPayable.amount, AccountPayable.paid_amount, AccountPayable.status).filter(
-        AccountPayable.company_id == company_id,
-        AccountPayable.status.in_(['paid', 'received', 'completed'])
-    ).all()
-    print(f"DEBUG - Detalhes das despesas pagas: {paid_details}")
+    # 3. Totais combinados (normais + ML)
+    total_received_revenue = receivables_paid + ml_received_revenue
+    total_pending_revenue = receivables_pending + ml_pending_revenue
     
-    # Debug: Verificar se paid_amount está NULL
-    paid_amount_check = db.query(func.count(AccountPayable.id), func.sum(AccountPayable.amount)).filter(
-        AccountPayable.company_id == company_id,
-        AccountPayable.status.in_(['paid', 'received', 'completed'])
-    ).first()
-    print(f"DEBUG - Despesas pagas (usando amount): {paid_amount_check}")
+    # 4. Despesas pagas no período e pendentes com vencimento no período
+    payables_paid = sum_statuses(totals["payables_paid"], PAYABLE_PAID_STATUSES)
+    payables_pending = sum_statuses(totals["payables_due"], PAYABLE_PENDING_STATUSES)
     
     # Saldo das contas bancárias
     current_balance = db.query(func.sum(FinancialAccount.current_balance)).filter(
@@ -3260,129 +3046,32 @@ async def get_dre_report(
             'cost_center_categories': {}
         }
 
-        # OTIMIZAÇÃO: Buscar todos os dados de uma vez e processar em memória
-        print("DEBUG DRE - Buscando todos os dados de uma vez...")
-        
-        # Buscar todas as receitas de uma vez (sem filtro de status para incluir todas)
-        all_receivables = db.query(AccountReceivable).filter(
-            AccountReceivable.company_id == company_id
-        ).all()
-        print(f"DEBUG DRE - Total receitas encontradas: {len(all_receivables)}")
-        
-        # Buscar todos os pedidos ML de uma vez (sem filtro de status para incluir todos)
-        all_ml_orders = db.query(MLOrder).filter(
-            MLOrder.company_id == company_id
-        ).all()
-        print(f"DEBUG DRE - Total pedidos ML encontrados: {len(all_ml_orders)}")
-        
-        # OTIMIZAÇÃO: Consulta SQL consolidada para despesas
-        print("DEBUG DRE - Executando consulta SQL consolidada para despesas...")
-        
-        # Definir período de busca (últimos 12 meses + próximos 3 meses)
-        start_date = (today - timedelta(days=365)).strftime('%Y-%m-%d')
-        end_date = (today + timedelta(days=90)).strftime('%Y-%m-%d')
-        
-        # Consulta SQL consolidada para despesas (pagas + pendentes)
-        expenses_query = text("""
-            -- Despesas pagas
-            SELECT 
-                TO_CHAR(ap.paid_date, 'MM/YYYY') as month_key,
-                COALESCE(cc.name, 'Sem Centro de Custo') as cost_center_name,
-                'paid' as expense_type,
-                SUM(ap.amount) as total_amount,
-                COUNT(*) as record_count
-            FROM accounts_payable ap 
-            LEFT JOIN cost_centers cc ON cc.id = ap.cost_center_id
-            WHERE ap.company_id = :company_id
-                AND ap.status IN ('paid', 'received', 'completed')
-                AND ap.paid_date IS NOT NULL
-                AND ap.paid_date >= :start_date 
-                AND ap.paid_date <= :end_date
-            GROUP BY 
-                TO_CHAR(ap.paid_date, 'MM/YYYY'),
-                cc.name
-
-            UNION ALL
-
-            -- Despesas pendentes
-            SELECT 
-                TO_CHAR(ap.due_date, 'MM/YYYY') as month_key,
-                COALESCE(cc.name, 'Sem Centro de Custo') as cost_center_name,
-                'pending' as expense_type,
-                SUM(ap.amount) as total_amount,
-                COUNT(*) as record_count
-            FROM accounts_payable ap 
-            LEFT JOIN cost_centers cc ON cc.id = ap.cost_center_id
-            WHERE ap.company_id = :company_id
-                AND ap.status IN ('pending', 'unpaid', 'overdue')
-                AND ap.due_date >= :start_date 
-                AND ap.due_date <= :end_date
-            GROUP BY 
-                TO_CHAR(ap.due_date, 'MM/YYYY'),
-                cc.name
-            ORDER BY 
-                month_key DESC,
-                cost_center_name,
-                expense_type
-        """)
-        
-        # Executar consulta consolidada
-        expenses_results = db.execute(expenses_query, {
-            'company_id': company_id,
-            'start_date': start_date,
-            'end_date': end_date
-        }).fetchall()
-        
-        print(f"DEBUG DRE - Total registros de despesas encontrados: {len(expenses_results)}")
+        # Agregados mensais (snapshots): meses passados assentados não voltam às tabelas de origem
+        snapshots = FinancialSnapshotService(db).get_months(
+            company_id, [(m['year'], m['month']) for m in months_data]
+        )
         
-        # Processar dados em memória
         receivables_by_month = {}
         payables_by_month = {}
         ml_by_month = {}
+        ml_fees_by_month = {}
         cost_centers_by_month = {}
         
-        # Processar receitas - usar due_date para faturamento correto
-        for receivable in all_receivables:
-            if receivable.due_date:  # Mudança: usar due_date em vez de paid_date
-                month_key = receivable.due_date.strftime('%m/%Y')
-                if month_key not in receivables_by_month:
-                    receivables_by_month[month_key] = 0.0
-                receivables_by_month[month_key] += float(receivable.amount or 0)
-        
-        # Processar despesas (resultados da consulta consolidada)
-        for row in expenses_results:
-            month_key = row.month_key
-            cost_center_name = row.cost_center_name
-            expense_type = row.expense_type
-            total_amount = float(row.total_amount or 0)
-            
-            # Total por mês
-            if month_key not in payables_by_month:
-                payables_by_month[month_key] = 0.0
-            payables_by_month[month_key] += total_amount
+        for (year, month), month_totals in snapshots.items():
+            month_key = f"{month:02d}/{year}"
+            # Receitas por vencimento (faturamento) e pedidos ML por data de criação (bruto)
+            receivables_by_month[month_key] = sum_statuses(month_totals["receivables_due"])
+            ml_by_month[month_key] = sum_statuses(month_totals["ml_gross"])
+            # Taxas do ML como despesa separada
+            ml_fees_by_month[month_key] = sum_statuses(month_totals["ml_fees"])
             
-            # Por centro de custo
-            if month_key not in cost_centers_by_month:
-                cost_centers_by_month[month_key] = {}
-            if cost_center_name not in cost_centers_by_month[month_key]:
-                cost_centers_by_month[month_key][cost_center_name] = 0.0
-            cost_centers_by_month[month_key][cost_center_name] += total_amount
-        
-        # Processar pedidos ML - usar date_created para faturamento correto
-        ml_fees_by_month = {}  # Nova variável para taxas do ML
-        for order in all_ml_orders:
-            if order.date_created:  # Mudança: usar date_created e remover regra dos 7 dias
-                month_key = order.date_created.strftime('%m/%Y')
-                if month_key not in ml_by_month:
-                    ml_by_month[month_key] = 0.0
-                if month_key not in ml_fees_by_month:
-                    ml_fees_by_month[month_key] = 0.0
-                
-                # Faturamento BRUTO (valor total pago pelo cliente)
-                ml_by_month[month_key] += float(order.total_amount or 0)
-                
-                # Taxas do ML como despesa separada
-                ml_fees_by_month[month_key] += float(order.total_fees or 0)
+            # Despesas pagas (por pagamento) + pendentes (por vencimento), por centro de custo
+            by_cost_center = {}
+            for breakdown in (month_totals["payables_paid_by_cost_center"], month_totals["payables_pending_by_cost_center"]):
+                for cc_name, total in breakdown.items():
+                    by_cost_center[cc_name] = by_cost_center.get(cc_name, 0.0) + float(total or 0)
+            cost_centers_by_month[month_key] = by_cost_center
+            payables_by_month[month_key] = sum(by_cost_center.values())
         
         print(f"DEBUG DRE - Receitas por mês: {receivables_by_month}")
         print(f"DEBUG DRE - Despesas por mês: {payables_by_month}")
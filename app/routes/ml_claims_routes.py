@@ -92,6 +92,51 @@ async def get_claims(
         logger.error(f"Erro ao listar claims: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
+@ml_claims_router.get("/api/ml/claims/returns-metrics")
+async def get_returns_metrics(
+    date_from: Optional[str] = Query(None, description="Data inicial (YYYY-MM-DD), padrão: últimos 30 dias"),
+    date_to: Optional[str] = Query(None, description="Data final (YYYY-MM-DD), padrão: hoje"),
+    session_token: Optional[str] = Cookie(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Métricas de devoluções do período, calculadas a partir dos claims e pedidos locais
+    """
+    try:
+        if not session_token:
+            raise HTTPException(status_code=401, detail="Token de sessão necessário")
+        
+        auth_controller = AuthController()
+        result = auth_controller.get_user_by_session(session_token, db)
+        if result.get("error"):
+            raise HTTPException(status_code=401, detail="Sessão inválida ou expirada")
+        
+        company_id = get_company_id_from_user(result["user"])
+        if not company_id:
+            raise HTTPException(status_code=400, detail="Company ID não encontrado")
+        
+        from datetime import datetime, timedelta
+        try:
+            end = datetime.strptime(date_to, "%Y-%m-%d") if date_to else datetime.now()
+            start = datetime.strptime(date_from, "%Y-%m-%d") if date_from else end - timedelta(days=30)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Datas devem estar no formato YYYY-MM-DD")
+        end = end.replace(hour=23, minute=59, second=59)
+        
+        controller = MLClaimsController(db)
+        result = controller.get_returns_metrics(company_id, start, end)
+        
+        if not result.get("success"):
+            raise HTTPException(status_code=400, detail=result.get("error", "Erro ao calcular devoluções"))
+        
+        return JSONResponse(content=result)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao calcular métricas de devoluções: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
 @ml_claims_router.get("/api/ml/claims/{claim_id}")
 async def get_claim_details(
     claim_id: int,
@@ -110,10 +110,12 @@ async def get_orders_api(
     date_from: Optional[str] = Query(None),
     date_to: Optional[str] = Query(None),
     buffering_date: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None),
+    count: str = Query("exact", pattern="^(exact|estimated|none)$"),
     session_token: Optional[str] = Cookie(None),
     db: Session = Depends(get_db)
 ):
-    """API para buscar orders"""
+    """API para buscar orders (paginação por offset ou por cursor via next_cursor)"""
     try:
         if not session_token:
             return JSONResponse(content={"error": "Não autenticado"}, status_code=401)
@@ -137,7 +139,9 @@ async def get_orders_api(
             date_from=date_from,
             date_to=date_to,
             buffering_date=buffering_date,
-            search_query=search_query
+            search_query=search_query,
+            cursor=cursor,
+            count_mode=count
         )
         
         return JSONResponse(content=data)
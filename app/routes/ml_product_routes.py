@@ -6,17 +6,24 @@ import requests
 import httpx
 import json
 from fastapi import APIRouter, Depends, Request, Query, HTTPException, Cookie
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import Optional, Dict, Any, List
 from pathlib import Path
 from uuid import uuid4
 
-from app.config.database import get_db
+from app.config.database import get_db, SessionLocal
 from app.controllers.ml_product_controller import MLProductController
 from app.controllers.auth_controller import AuthController
+from app.services.ml_category_cache_service import MLCategoryCacheService
+from app.services.ml_response_cache_service import cached_get
 from app.models.saas_models import MLProduct, CatalogParticipant
 from app.config.settings import settings
+from app.utils.logistics import logistic_type_from_filter, logistic_type_label
+from app.utils.pagination import (
+    MAX_PAGE_SIZE, count_rows, encode_cursor, iter_query_chunks, keyset_paginate,
+    stream_csv, stream_ndjson
+)
 import os
 from openai import OpenAI
 
@@ -236,7 +243,8 @@ async def import_product(
                 user_id=user["id"],
                 import_type=import_type,
                 product_statuses=product_statuses,
-                limit=limit
+                limit=limit,
+                include_details=bool(body.get("include_details", False))
             )
         
         else:
@@ -390,12 +398,12 @@ async def get_filter_options(
             MLProduct.category_id.isnot(None)
         ).distinct().all()
         
-        # Buscar tipos de envio únicos
+        # Buscar tipos de envio únicos (coluna logistic_type, indexada por empresa)
         shipping_types = db.query(
-            MLProduct.shipping.op('->>')('shipping_type').label('shipping_type')
+            MLProduct.logistic_type
         ).filter(
             MLProduct.company_id == user["company"]["id"],
-            MLProduct.shipping.isnot(None)
+            MLProduct.logistic_type.isnot(None)
         ).distinct().all()
         
         return JSONResponse(content={
@@ -409,10 +417,10 @@ async def get_filter_options(
             ],
             "shipping_types": [
                 {
-                    "value": st.shipping_type,
-                    "label": st.shipping_type
+                    "value": st.logistic_type,
+                    "label": logistic_type_label(st.logistic_type)
                 }
-                for st in shipping_types if st.shipping_type
+                for st in shipping_types
             ]
         })
         
@@ -422,6 +430,100 @@ async def get_filter_options(
             content={"success": False, "error": f"Erro ao buscar opções: {str(e)}"}
         )
 
+PRODUCT_EXPORT_FIELDS = [
+    "id", "ml_item_id", "title", "price", "base_price", "original_price", "seller_sku",
+    "currency_id", "available_quantity", "sold_quantity", "status", "category_id",
+    "category_name", "condition", "thumbnail", "permalink", "shipping",
+    "catalog_product_id", "catalog_listing", "last_sync"
+]
+
+
+def _build_products_search_query(db: Session, company_id: int, q: Optional[str] = None,
+                                 ml_account_id: Optional[str] = None, status: Optional[str] = None,
+                                 category_id: Optional[str] = None, shipping_type: Optional[str] = None,
+                                 catalog_listing: Optional[str] = None, sku_filter: Optional[str] = None):
+    """Monta a query filtrada de anúncios (sem ordenação/paginação)"""
+    from sqlalchemy import or_
+
+    query = db.query(MLProduct).filter(MLProduct.company_id == company_id)
+    
+    if ml_account_id and ml_account_id.strip():
+        try:
+            account_id = int(ml_account_id)
+            query = query.filter(MLProduct.ml_account_id == account_id)
+        except ValueError:
+            pass  # Ignorar se não for um inteiro válido
+    
+    if status:
+        try:
+            from app.models.saas_models import MLProductStatus
+            status_enum = MLProductStatus(status)
+            query = query.filter(MLProduct.status == status_enum)
+        except ValueError:
+            # Se o status não for válido, ignorar o filtro
+            pass
+    
+    if category_id:
+        query = query.filter(MLProduct.category_id == category_id)
+    
+    if shipping_type:
+        # Filtrar por tipo de envio (logistic_type; aceita também o rótulo usado antes)
+        query = query.filter(MLProduct.logistic_type == logistic_type_from_filter(shipping_type))
+    
+    if catalog_listing:
+        # Filtrar por produtos de catálogo
+        if catalog_listing.lower() == 'true':
+            query = query.filter(MLProduct.catalog_listing == True)
+        elif catalog_listing.lower() == 'false':
+            query = query.filter(MLProduct.catalog_listing == False)
+    
+    # Filtro por SKU
+    if sku_filter and sku_filter.strip():
+        search_term = f'%{sku_filter.strip()}%'
+        query = query.filter(
+            or_(
+                MLProduct.seller_sku.ilike(search_term),
+                MLProduct.title.ilike(search_term)
+            )
+        )
+    
+    if q:
+        query = query.filter(
+            or_(
+                MLProduct.title.ilike(f"%{q}%"),
+                MLProduct.ml_item_id.ilike(f"%{q}%")
+            )
+        )
+    
+    return query
+
+
+def _serialize_search_product(p: MLProduct) -> Dict[str, Any]:
+    """Formato de um anúncio nas respostas de busca/exportação"""
+    return {
+        "id": p.id,
+        "ml_item_id": p.ml_item_id,
+        "title": p.title,
+        "price": p.price,
+        "base_price": p.base_price,
+        "original_price": p.original_price,
+        "seller_sku": p.seller_sku,
+        "currency_id": p.currency_id,
+        "available_quantity": p.available_quantity,
+        "sold_quantity": p.sold_quantity,
+        "status": p.status.value if p.status else None,
+        "category_id": p.category_id,
+        "category_name": p.category_name,
+        "condition": p.condition,
+        "thumbnail": p.thumbnail,
+        "permalink": p.permalink,
+        "shipping": p.shipping,
+        "catalog_product_id": p.catalog_product_id,
+        "catalog_listing": p.catalog_listing,
+        "last_sync": p.last_sync.isoformat() if p.last_sync else None
+    }
+
+
 @ml_product_router.get("/api/search")
 async def search_products(
     request: Request,
@@ -435,136 +537,86 @@ async def search_products(
     sort: Optional[str] = Query(None),
     order: Optional[str] = Query("asc"),
     page: int = Query(1, ge=1),
-    limit: int = Query(20, ge=1, le=999999),  # Sem limite máximo - permite buscar todos
-    get_all: Optional[bool] = Query(False),  # Novo parâmetro para buscar todos
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),  # Paginação por keyset (ignora page quando informado)
+    count: str = Query("exact", pattern="^(exact|estimated|none)$"),
+    get_all: Optional[bool] = Query(False),  # Mantido por compatibilidade: redireciona para /api/export
     db: Session = Depends(get_db),
     user = Depends(get_current_user)
 ):
-    """API para buscar produtos com filtros - retorna todos os produtos quando get_all=true"""
+    """
+    API para buscar produtos com filtros.
+
+    Use `cursor` (retornado em `next_cursor`) para paginar sem OFFSET e
+    `count=estimated|none` para evitar o COUNT(*) em listas grandes.
+    Para obter todos os anúncios use /api/export (streaming NDJSON/CSV).
+    """
     try:
-        from sqlalchemy import and_, or_
-        from app.models.saas_models import MLProduct
-        
-        query = db.query(MLProduct).filter(MLProduct.company_id == user["company"]["id"])
-        
-        if ml_account_id and ml_account_id.strip():
-            try:
-                account_id = int(ml_account_id)
-                query = query.filter(MLProduct.ml_account_id == account_id)
-            except ValueError:
-                pass  # Ignorar se não for um inteiro válido
-        
-        if status:
-            try:
-                from app.models.saas_models import MLProductStatus
-                status_enum = MLProductStatus(status)
-                query = query.filter(MLProduct.status == status_enum)
-            except ValueError:
-                # Se o status não for válido, ignorar o filtro
-                pass
-        
-        if category_id:
-            query = query.filter(MLProduct.category_id == category_id)
-        
-        if shipping_type:
-            # Filtrar por tipo de envio no campo JSON shipping
-            query = query.filter(MLProduct.shipping.op('->>')('shipping_type') == shipping_type)
-        
-        if catalog_listing:
-            # Filtrar por produtos de catálogo
-            if catalog_listing.lower() == 'true':
-                query = query.filter(MLProduct.catalog_listing == True)
-            elif catalog_listing.lower() == 'false':
-                query = query.filter(MLProduct.catalog_listing == False)
-        
-        # Filtro por SKU
-        if sku_filter and sku_filter.strip():
-            search_term = f'%{sku_filter.strip()}%'
-            query = query.filter(
-                or_(
-                    MLProduct.seller_sku.ilike(search_term),
-                    MLProduct.title.ilike(search_term)
-                )
-            )
-        
-        if q:
-            query = query.filter(
-                or_(
-                    MLProduct.title.ilike(f"%{q}%"),
-                    MLProduct.ml_item_id.ilike(f"%{q}%")
-                )
+        if get_all:
+            return RedirectResponse(
+                url=str(request.url_for("export_products")) + (f"?{request.url.query}" if request.url.query else ""),
+                status_code=307
             )
+
+        query = _build_products_search_query(
+            db, user["company"]["id"], q=q, ml_account_id=ml_account_id, status=status,
+            category_id=category_id, shipping_type=shipping_type,
+            catalog_listing=catalog_listing, sku_filter=sku_filter
+        )
         
-        # Aplicar ordenação
-        if sort and order:
-            # Mapear campos de ordenação
-            sort_mapping = {
-                'title': MLProduct.title,
-                'price': MLProduct.price,
-                'available_quantity': MLProduct.available_quantity,
-                'sold_quantity': MLProduct.sold_quantity,
-                'status': MLProduct.status
-            }
-            
-            if sort in sort_mapping:
-                sort_column = sort_mapping[sort]
-                if order.lower() == 'desc':
-                    query = query.order_by(sort_column.desc())
-                else:
-                    query = query.order_by(sort_column.asc())
-            else:
-                # Ordenação padrão por ID
-                query = query.order_by(MLProduct.id.desc())
-        else:
+        # Mapear campos de ordenação
+        sort_mapping = {
+            'title': MLProduct.title,
+            'price': MLProduct.price,
+            'available_quantity': MLProduct.available_quantity,
+            'sold_quantity': MLProduct.sold_quantity,
+            'status': MLProduct.status
+        }
+        sort_column = sort_mapping.get(sort) if sort and order else None
+        descending = sort_column is None or (order or "").lower() == 'desc'
+        if sort_column is None:
             # Ordenação padrão por ID
-            query = query.order_by(MLProduct.id.desc())
+            sort_column = MLProduct.id
         
-        total = query.count()
+        total = count_rows(query, count)
         
-        # Se get_all=true, retornar todos os produtos sem paginação
-        if get_all:
-            products = query.all()
-            offset = 0
-            limit = total
+        if cursor:
+            page_data = keyset_paginate(query, sort_column, MLProduct.id, limit, cursor=cursor, descending=descending)
+            products = page_data["items"]
+            has_next = page_data["has_next"]
+            next_cursor = page_data["next_cursor"]
         else:
             offset = (page - 1) * limit
-            products = query.offset(offset).limit(limit).all()
+            if sort_column is MLProduct.id:
+                ordering = [MLProduct.id.desc() if descending else MLProduct.id.asc()]
+            else:
+                ordering = [
+                    (sort_column.desc() if descending else sort_column.asc()).nullslast(),
+                    MLProduct.id.desc() if descending else MLProduct.id.asc()
+                ]
+            rows = query.order_by(*ordering).offset(offset).limit(limit + 1).all()
+            has_next = len(rows) > limit
+            products = rows[:limit]
+            next_cursor = None
+            if has_next and products:
+                last = products[-1]
+                next_cursor = encode_cursor(
+                    None if sort_column is MLProduct.id else getattr(last, sort_column.key),
+                    last.id
+                )
         
         # Não precisamos mais buscar nomes das categorias da API
         # pois agora estão salvos no banco de dados
         
         return JSONResponse(content={
             "success": True,
-            "products": [
-                {
-                    "id": p.id,
-                    "ml_item_id": p.ml_item_id,
-                    "title": p.title,
-                    "price": p.price,
-                    "base_price": p.base_price,
-                    "original_price": p.original_price,
-                    "seller_sku": p.seller_sku,
-                    "currency_id": p.currency_id,
-                    "available_quantity": p.available_quantity,
-                    "sold_quantity": p.sold_quantity,
-                    "status": p.status.value if p.status else None,
-                    "category_id": p.category_id,
-                    "category_name": p.category_name,
-                    "condition": p.condition,
-                    "thumbnail": p.thumbnail,
-                    "permalink": p.permalink,
-                    "shipping": p.shipping,
-                    "catalog_product_id": p.catalog_product_id,
-                    "catalog_listing": p.catalog_listing,
-                    "last_sync": p.last_sync.isoformat() if p.last_sync else None
-                }
-                for p in products
-            ],
+            "products": [_serialize_search_product(p) for p in products],
             "total": total,
             "page": page,
             "limit": limit,
-            "has_next": (offset + limit) < total,
-            "has_prev": page > 1
+            "has_next": has_next,
+            "has_prev": page > 1 or bool(cursor),
+            "next_cursor": next_cursor
         })
         
     except Exception as e:
@@ -573,6 +625,45 @@ async def search_products(
             content={"error": f"Erro na busca: {str(e)}"}
         )
 
+@ml_product_router.get("/api/export", name="export_products")
+async def export_products(
+    q: Optional[str] = Query(None),
+    ml_account_id: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    category_id: Optional[str] = Query(None),
+    shipping_type: Optional[str] = Query(None),
+    catalog_listing: Optional[str] = Query(None),
+    sku_filter: Optional[str] = Query(None),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    user = Depends(get_current_user)
+):
+    """Exporta todos os anúncios filtrados em streaming (NDJSON ou CSV), lendo o banco em lotes"""
+    company_id = user["company"]["id"]
+
+    def _rows():
+        # Sessão própria: a sessão da dependência é encerrada antes do streaming terminar
+        export_db = SessionLocal()
+        try:
+            query = _build_products_search_query(
+                export_db, company_id, q=q, ml_account_id=ml_account_id, status=status,
+                category_id=category_id, shipping_type=shipping_type,
+                catalog_listing=catalog_listing, sku_filter=sku_filter
+            )
+            yield from iter_query_chunks(query, MLProduct.id)
+        finally:
+            export_db.close()
+
+    if format == "csv":
+        return StreamingResponse(
+            stream_csv(_rows(), _serialize_search_product, PRODUCT_EXPORT_FIELDS),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": "attachment; filename=anuncios.csv"}
+        )
+    return StreamingResponse(
+        stream_ndjson(_rows(), _serialize_search_product),
+        media_type="application/x-ndjson"
+    )
+
 @ml_product_router.get("/details/{product_id}", response_class=HTMLResponse)
 async def product_details_page(
     request: Request,
@@ -782,7 +873,8 @@ async def get_product_catalog_info(
             "Content-Type": "application/json"
         }
         
-        response = requests.get(api_url, headers=headers, timeout=30)
+        # Cache por seller (dono do token): o catálogo consultado de novo pela conta é revalidado com ETag
+        response = cached_get(api_url, headers=headers, timeout=30)
         
         if response.status_code == 404:
             return JSONResponse(
@@ -1109,7 +1201,8 @@ async def sync_catalog_data(
             "Content-Type": "application/json"
         }
         
-        response = requests.get(api_url, headers=headers, timeout=30)
+        # Cache por seller (dono do token): o catálogo consultado de novo pela conta é revalidado com ETag
+        response = cached_get(api_url, headers=headers, timeout=30)
         
         if response.status_code == 404:
             return JSONResponse(
@@ -1748,33 +1841,7 @@ async def get_ai_analysis_data(
         user_data = result["user"]
         company_id = user_data["company"]["id"]
         
-        # Buscar dados do catálogo
-        catalog_data = None
-        try:
-            from app.services.ml_catalog_service import MLCatalogService
-            catalog_service = MLCatalogService(db)
-            catalog_result = catalog_service.get_product_catalog_competitors(product_id, company_id)
-            if catalog_result.get("success") and catalog_result.get("catalog_products"):
-                catalog_data = catalog_result["catalog_products"]
-        except Exception as e:
-            logger.warning(f"Erro ao buscar catálogo: {e}")
-        
-        # Buscar pricing analysis (precisa ser calculado)
-        pricing_analysis = None
-        try:
-            # Tentar buscar dados de pricing se disponíveis
-            # Por enquanto, retornar None - será calculado no frontend se necessário
-            pass
-        except Exception as e:
-            logger.warning(f"Erro ao buscar pricing: {e}")
-        
-        # Preparar dados completos usando o mesmo método da análise
-        from app.services.ai_analysis_service import AIAnalysisService
-        ai_service = AIAnalysisService(db)
-        
-        # Buscar produto e pedidos
-        from app.models.saas_models import MLProduct, MLOrder
-        from datetime import datetime, timedelta
+        from app.models.saas_models import MLProduct
         from sqlalchemy import and_
         
         product = db.query(MLProduct).filter(
@@ -1784,41 +1851,18 @@ async def get_ai_analysis_data(
         if not product:
             return JSONResponse(content={"error": "Produto não encontrado"}, status_code=404)
         
-        # Buscar pedidos dos últimos 30 dias
-        date_from = datetime.now() - timedelta(days=30)
-        orders = db.query(MLOrder).filter(
-            and_(
-                MLOrder.company_id == company_id,
-                MLOrder.date_created >= date_from
-            )
-        ).all()
-        
-        # Filtrar pedidos que contêm este produto
-        product_orders = []
-        for order in orders:
-            if order.order_items:
-                for item in order.order_items:
-                    if item.get('item', {}).get('id') == product.ml_item_id:
-                        product_orders.append(order)
-                        break
-        
-        # Buscar métricas de marketing
-        marketing_metrics = None
-        try:
-            from app.services.ml_product_ads_service import MLProductAdsService
-            ads_service = MLProductAdsService(db)
-            marketing_metrics = ads_service.get_product_advertising_metrics(
-                ml_item_id=product.ml_item_id,
-                ml_account_id=product.ml_account_id,
-                days=30
-            )
-        except Exception as e:
-            logger.warning(f"Erro ao buscar métricas de marketing: {e}")
-            marketing_metrics = {"has_advertising": False}
+        # Insumos do snapshot do produto (mesmos usados na análise)
+        from app.services.product_analysis_snapshot_service import ProductAnalysisSnapshotService
+        features = ProductAnalysisSnapshotService(db).get_features(product)
         
         # Preparar dados completos (mesmo método usado na análise)
+        from app.services.ai_analysis_service import AIAnalysisService
+        ai_service = AIAnalysisService(db)
+        marketing_metrics = ai_service._with_pricing_reference(
+            features["marketing_metrics"], product, features["pricing_analysis"]
+        )
         analysis_data = ai_service._prepare_analysis_data(
-            product, product_orders, catalog_data, pricing_analysis, marketing_metrics
+            product, features["orders"], features["catalog_data"], features["pricing_analysis"], marketing_metrics
         )
         
         return JSONResponse(content={
@@ -1885,7 +1929,6 @@ async def get_ml_categories(
     Busca categorias principais do Mercado Livre usando token do usuário
     """
     try:
-        import requests
         from app.models.saas_models import Token, MLAccount
         from datetime import datetime
         
@@ -1898,24 +1941,11 @@ async def get_ml_categories(
             Token.expires_at > datetime.utcnow()
         ).order_by(Token.expires_at.desc()).first()
         
-        url = f"https://api.mercadolibre.com/sites/{site_id}/categories"
-        
-        headers = {
-            "Accept": "application/json"
-        }
-        
-        # Se tiver token, adicionar ao header
-        if token:
-            headers["Authorization"] = f"Bearer {token.access_token}"
-            logger.info(f"🔍 Buscando categorias com token do ML")
-        else:
-            logger.info(f"🔍 Buscando categorias sem autenticação (público)")
-        
-        response = requests.get(url, headers=headers, timeout=10)
+        categories = MLCategoryCacheService(db).get_site_categories(
+            site_id, access_token=token.access_token if token else None
+        )
         
-        if response.status_code == 200:
-            categories = response.json()
-            
+        if categories is not None:
             logger.info(f"✅ {len(categories)} categorias principais encontradas")
             
             return JSONResponse(content={
@@ -1924,12 +1954,12 @@ async def get_ml_categories(
                 "total": len(categories)
             })
         else:
-            logger.error(f"❌ Erro da API ML: {response.status_code}")
+            logger.error(f"❌ Categorias do site {site_id} indisponíveis")
             return JSONResponse(
                 status_code=400,
                 content={
                     "success": False,
-                    "error": f"Erro ao buscar categorias: {response.status_code}"
+                    "error": "Erro ao buscar categorias"
                 }
             )
     except Exception as e:
@@ -1959,7 +1989,6 @@ async def predict_ml_category(
     """
     logger.info(f"🎯 INÍCIO predict_ml_category - q='{q}'")
     try:
-        import requests
         from datetime import datetime
         from app.models.saas_models import MLAccount
         from app.services.token_manager import TokenManager
@@ -1975,27 +2004,12 @@ async def predict_ml_category(
         if not token_record:
             logger.warning("⚠️ Nenhum token válido encontrado para predição de categorias")
         
-        url = f"https://api.mercadolibre.com/sites/{site_id}/domain_discovery/search"
-        params = {
-            "q": q,
-            "limit": limit
-        }
-        
-        headers = {"Accept": "application/json"}
-        if token_record and token_record.access_token:
-            headers["Authorization"] = f"Bearer {token_record.access_token}"
-            logger.info("🔍 Buscando categorias com token autenticado")
-        else:
-            logger.info("🔍 Buscando categorias sem token (modo público)")
-        
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        
-        logger.info(f"📥 Status da resposta: {response.status_code}")
-        logger.info(f"📥 Corpo da resposta: {response.text[:500]}")
+        predictions = MLCategoryCacheService(db).predict_categories(
+            site_id, q, limit,
+            access_token=token_record.access_token if token_record and token_record.access_token else None
+        )
         
-        if response.status_code == 200:
-            predictions = response.json()
-            
+        if predictions is not None:
             suggestions = []
             for pred in predictions:
                 suggestions.append({
@@ -2014,12 +2028,11 @@ async def predict_ml_category(
                 "total": len(suggestions)
             })
         else:
-            logger.error(f"❌ Erro da API ML: {response.status_code} - {response.text}")
             return JSONResponse(
                 status_code=400,
                 content={
                     "success": False,
-                    "error": f"Erro ao buscar categorias: {response.status_code}"
+                    "error": "Erro ao buscar categorias"
                 }
             )
     except Exception as e:
@@ -2043,7 +2056,6 @@ async def get_ml_category_children(
     Busca detalhes de uma categoria e suas subcategorias usando token do usuário
     """
     try:
-        import requests
         from app.models.saas_models import Token, MLAccount
         from datetime import datetime
         
@@ -2056,23 +2068,13 @@ async def get_ml_category_children(
             Token.expires_at > datetime.utcnow()
         ).order_by(Token.expires_at.desc()).first()
         
-        url = f"https://api.mercadolibre.com/categories/{category_id}"
-        
-        headers = {
-            "Accept": "application/json"
-        }
-        
-        # Se tiver token, adicionar ao header
-        if token:
-            headers["Authorization"] = f"Bearer {token.access_token}"
-        
         logger.info(f"🔍 Buscando detalhes da categoria {category_id}")
         
-        response = requests.get(url, headers=headers, timeout=10)
+        category_data = MLCategoryCacheService(db).get_category(
+            category_id, access_token=token.access_token if token else None
+        )
         
-        if response.status_code == 200:
-            category_data = response.json()
-            
+        if category_data is not None:
             logger.info(f"✅ Categoria encontrada: {category_data.get('name')}")
             
             return JSONResponse(content={
@@ -2080,12 +2082,11 @@ async def get_ml_category_children(
                 "category": category_data
             })
         else:
-            logger.error(f"❌ Erro da API ML: {response.status_code}")
             return JSONResponse(
                 status_code=400,
                 content={
                     "success": False,
-                    "error": f"Erro ao buscar categoria: {response.status_code}"
+                    "error": "Erro ao buscar categoria"
                 }
             )
     except Exception as e:
@@ -2109,7 +2110,6 @@ async def get_category_attributes(
     Busca os atributos obrigatórios e recomendados de uma categoria
     """
     try:
-        import requests
         from app.models.saas_models import Token, MLAccount
         from datetime import datetime
         
@@ -2122,23 +2122,13 @@ async def get_category_attributes(
             Token.expires_at > datetime.utcnow()
         ).order_by(Token.expires_at.desc()).first()
         
-        url = f"https://api.mercadolibre.com/categories/{category_id}/attributes"
-        
-        headers = {
-            "Accept": "application/json"
-        }
-        
-        # Se tiver token, adicionar ao header
-        if token:
-            headers["Authorization"] = f"Bearer {token.access_token}"
-        
         logger.info(f"🔍 Buscando atributos da categoria {category_id}")
         
-        response = requests.get(url, headers=headers, timeout=10)
+        attributes_data = MLCategoryCacheService(db).get_category_attributes(
+            category_id, access_token=token.access_token if token else None
+        )
         
-        if response.status_code == 200:
-            attributes_data = response.json()
-            
+        if attributes_data is not None:
             # Filtrar apenas atributos relevantes (não hidden) e destacar os obrigatórios
             main_attributes = []
             other_attributes = []
@@ -2183,12 +2173,11 @@ async def get_category_attributes(
                 "other_attributes": other_attributes
             })
         else:
-            logger.error(f"❌ Erro da API ML: {response.status_code}")
             return JSONResponse(
                 status_code=400,
                 content={
                     "success": False,
-                    "error": f"Erro ao buscar atributos: {response.status_code}"
+                    "error": "Erro ao buscar atributos"
                 }
             )
     except Exception as e:
@@ -2805,7 +2794,8 @@ NOTA: Alguns dados foram resumidos devido ao limite de tokens. Foque na análise
                 "product_data": product_data,
                 "category_id": product_data.get("category_id"),
                 "category_name": product_data.get("category_name")
-            }
+            },
+            use_cache=not data.get("force_refresh", False)
         )
         
         return JSONResponse(status_code=200, content=result)
@@ -2909,7 +2899,8 @@ async def generate_product_description(
                 "product_data": product_data,
                 "category_id": product_data.get("category_id"),
                 "category_name": product_data.get("category_name")
-            }
+            },
+            use_cache=not data.get("force_refresh", False)
         )
         
         return JSONResponse(status_code=200, content=result)
@@ -260,9 +260,10 @@ async def sync_questions_api(
     
     ml_account_id = body.get("ml_account_id")  # Opcional - se None, sincroniza todas as contas
     status = body.get("status")  # Opcional - se None, busca todas as perguntas
+    full = body.get("full", False)  # Opcional - ignora o cursor e reimporta todas as perguntas
     
     controller = MLQuestionsController(db)
-    result = controller.sync_questions(company_id, user_id, ml_account_id, status)
+    result = controller.sync_questions(company_id, user_id, ml_account_id, status, full=full)
     
     return JSONResponse(content=result)
 
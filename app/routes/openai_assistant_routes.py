@@ -1,15 +1,16 @@
 """
 Rotas para gerenciar assistentes OpenAI
 """
+import asyncio
 import logging
 import json
 from typing import Optional, List, Dict
 from fastapi import APIRouter, Depends, HTTPException, Request, Cookie, Query, Body, UploadFile, File
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from app.config.database import get_db
+from app.config.database import get_db, SessionLocal
 from app.controllers.openai_assistant_controller import OpenAIAssistantController
 from app.controllers.auth_controller import AuthController
 from app.services.file_processor_service import FileProcessorService
@@ -134,6 +135,9 @@ class CreateAssistantRequest(BaseModel):
     welcome_message: Optional[str] = None
     provider: Optional[str] = "openai"  # Provider de IA: openai, perplexity, anthropic, google
     api_config: Optional[Dict] = None  # Configurações específicas do provider
+    response_cache_enabled: Optional[bool] = None  # Reaproveita respostas idênticas em modo report
+    response_cache_ttl: Optional[int] = None  # Validade das respostas em cache (segundos)
+    context_token_budget: Optional[int] = None  # Orçamento de tokens do histórico no modo chat
 
 
 class UpdateAssistantRequest(BaseModel):
@@ -157,6 +161,9 @@ class UpdateAssistantRequest(BaseModel):
     welcome_message: Optional[str] = None
     provider: Optional[str] = None  # Provider de IA: openai, perplexity, anthropic, google
     api_config: Optional[Dict] = None  # Configurações específicas do provider
+    response_cache_enabled: Optional[bool] = None  # Reaproveita respostas idênticas em modo report
+    response_cache_ttl: Optional[int] = None  # Validade das respostas em cache (segundos)
+    context_token_budget: Optional[int] = None  # Orçamento de tokens do histórico no modo chat
 
 
 class UseAssistantReportRequest(BaseModel):
@@ -165,6 +172,7 @@ class UseAssistantReportRequest(BaseModel):
     context_data: Optional[Dict] = None
     use_case: Optional[str] = None
     files_data: Optional[List[Dict]] = None  # Dados processados dos arquivos
+    use_cache: bool = True  # False força nova geração (ignora o cache de respostas)
 
 
 class UseAssistantChatRequest(BaseModel):
@@ -269,7 +277,10 @@ async def create_assistant(
         initial_prompt=request_data.initial_prompt,
         welcome_enabled=request_data.welcome_enabled,
         welcome_use_model=request_data.welcome_use_model,
-        welcome_message=request_data.welcome_message
+        welcome_message=request_data.welcome_message,
+        response_cache_enabled=request_data.response_cache_enabled,
+        response_cache_ttl=request_data.response_cache_ttl,
+        context_token_budget=request_data.context_token_budget
     )
     
     if not result.get("success"):
@@ -492,7 +503,10 @@ async def update_assistant(
         welcome_use_model=request_data.welcome_use_model,
         welcome_message=request_data.welcome_message,
         provider=request_data.provider,
-        api_config=request_data.api_config
+        api_config=request_data.api_config,
+        response_cache_enabled=request_data.response_cache_enabled,
+        response_cache_ttl=request_data.response_cache_ttl,
+        context_token_budget=request_data.context_token_budget
     )
     
     if not result.get("success"):
@@ -539,7 +553,8 @@ async def use_assistant_report(
         user=user,
         message=request_data.prompt,
         context_data=context_data,
-        use_case=request_data.use_case
+        use_case=request_data.use_case,
+        use_cache=request_data.use_cache
     )
     
     if not result.get("success"):
@@ -605,6 +620,70 @@ async def use_assistant_chat(
         )
 
 
+@openai_assistant_router.post("/use/chat/stream")
+async def use_assistant_chat_stream(
+    request_data: UseAssistantChatRequest,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Usa um assistente em modo chat com resposta via Server-Sent Events.
+
+    Eventos (`data: {json}`):
+    - delta: trecho de texto da resposta
+    - tool_call / tool_result: ferramenta iniciada / concluída
+    - done: resultado final (mesmo formato de /use/chat)
+    - error: falha (mesmo formato do erro de /use/chat)
+    """
+    context_data = request_data.context_data or {}
+    if request_data.files_data:
+        files_context = FileProcessorService.format_for_context(request_data.files_data)
+        if files_context:
+            context_data.update(files_context)
+
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def emit(event: Optional[Dict]) -> None:
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    def run_agent() -> None:
+        # Sessão própria: a execução roda fora do ciclo da requisição
+        db_stream = SessionLocal()
+        try:
+            result = AgentExecutorService(db_stream).execute(
+                agent_id=request_data.assistant_id,
+                user=user,
+                message=request_data.message,
+                thread_id=request_data.thread_id,
+                context_data=context_data,
+                use_case=request_data.use_case,
+                stream_callback=emit
+            )
+            result.pop("raw_response", None)
+            emit({"type": "done" if result.get("success") else "error", **result})
+        except Exception as e:
+            logger.error(f"❌ Erro inesperado em use_assistant_chat_stream: {e}", exc_info=True)
+            emit({"type": "error", "success": False, "error": f"Erro interno: {str(e)}"})
+        finally:
+            db_stream.close()
+            emit(None)
+
+    async def event_stream():
+        worker = loop.run_in_executor(None, run_agent)
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield f"data: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+        await worker
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @openai_assistant_router.get("/tokens/balance")
 async def get_tokens_balance(
     request: Request,
@@ -782,6 +861,22 @@ async def get_usage_stats(
     return result
 
 
+@openai_assistant_router.get("/usage/response-cache")
+async def get_response_cache_stats(
+    assistant_id: Optional[int] = Query(None, description="ID do agente (opcional)"),
+    user: dict = Depends(get_superadmin_user),
+    db: Session = Depends(get_db)
+):
+    """Obtém métricas do cache de respostas dos agentes (apenas superadmin)"""
+    controller = OpenAIAssistantController(db)
+    result = controller.get_response_cache_stats(assistant_id=assistant_id)
+    
+    if not result.get("success"):
+        raise HTTPException(status_code=400, detail=result.get("error", "Erro ao obter métricas do cache"))
+    
+    return result
+
+
 @openai_assistant_router.get("/usage/by-assistant")
 async def get_usage_by_assistant(
     company_id: Optional[int] = Query(None, description="ID da empresa (opcional)"),
@@ -253,6 +253,53 @@ async def get_company_pricing_summary(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
+@router.post("/analysis/simulate")
+async def simulate_catalog_pricing(
+    price_change_pct: float = Body(0.0, description="Variação do preço de venda em % (ex.: -5 ou 10)"),
+    tax_rate: Optional[float] = Body(None, description="Nova alíquota de imposto (%) para todos os produtos"),
+    marketing_pct: Optional[float] = Body(None, description="Novo custo de anúncio em % do preço"),
+    shipping_cost: Optional[float] = Body(None, description="Frete fixo (R$) pago pelo vendedor por venda"),
+    limit: Optional[int] = Body(100, description="Linhas devolvidas (piores margens primeiro)"),
+    db: Session = Depends(get_db),
+    user = Depends(get_current_user)
+):
+    """
+    Simula preços e margens de todos os anúncios vinculados da empresa
+    
+    Args:
+        price_change_pct: Variação do preço (%)
+        tax_rate: Nova alíquota (%) (opcional)
+        marketing_pct: Novo percentual de marketing (opcional)
+        shipping_cost: Frete fixo por venda (opcional)
+        limit: Máximo de linhas no retorno
+        db: Sessão do banco de dados
+        user: Usuário logado (obtido da sessão)
+    
+    Returns:
+        Resumo do cenário atual x simulado e as linhas com pior margem simulada
+    """
+    try:
+        controller = PricingAnalysisController(db)
+        result = controller.simulate_catalog_pricing(
+            user["company"]["id"],
+            user_id=user["id"],
+            price_change_pct=price_change_pct,
+            tax_rate=tax_rate,
+            marketing_pct=marketing_pct,
+            shipping_cost=shipping_cost,
+            limit=limit
+        )
+        
+        if result.get("error"):
+            raise HTTPException(status_code=400, detail=result["error"])
+        
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
 @router.get("/analysis/health-check")
 async def pricing_health_check(
     db: Session = Depends(get_db),
@@ -18,6 +18,7 @@ from app.config.database import get_db
 from app.controllers.shipment_controller import ShipmentController
 from app.controllers.auth_controller import AuthController
 from app.services.token_manager import TokenManager
+from app.utils.logistics import order_logistic_type
 from app.views.template_renderer import render_template
 
 logger = logging.getLogger(__name__)
@@ -747,14 +748,12 @@ async def download_shipping_label(
             else:
                 shipping_details = order.shipping_details
         
-        logistic_type = shipping_details.get('logistic_type') if shipping_details else order.shipping_type
+        # Tipo logístico mantido na coluna shipping_type (ver app.utils.logistics)
+        logistic_type = order.shipping_type or order_logistic_type(shipping_details)
         
         # Tipos de logística que suportam etiquetas (segundo documentação ML)
         supported_logistic_types = ['drop_off', 'xd_drop_off', 'cross_docking', 'self_service']
-        is_supported = (
-            logistic_type in supported_logistic_types or
-            order.shipping_type in supported_logistic_types
-        )
+        is_supported = not order.is_fulfillment and logistic_type in supported_logistic_types
         
         # Não bloquear tentativa, mas logar aviso se não for tipo suportado
         if not is_supported:
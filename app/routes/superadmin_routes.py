@@ -1014,11 +1014,6 @@ async def view_manual(filename: str):
     from fastapi.responses import HTMLResponse
     import os
     
-    try:
-        import markdown
-    except ImportError:
-        raise HTTPException(status_code=500, detail="Biblioteca markdown não instalada. Execute: pip install markdown")
-    
     # Tentar múltiplos caminhos
     possible_paths = [
         Path("/app") / "manuais" / filename,  # Docker
@@ -1043,14 +1038,11 @@ async def view_manual(filename: str):
     if "manuais" not in path_str or ".." in filename:
         raise HTTPException(status_code=403, detail="Acesso negado")
     
-    content = manual_path.read_text(encoding="utf-8")
-    
-    # Converter Markdown para HTML
-    try:
-        html_content = markdown.markdown(content, extensions=['fenced_code', 'tables'])
-    except Exception as e:
-        # Se falhar, usar apenas o texto puro
-        html_content = f"<pre>{content}</pre>"
+    # Markdown convertido para HTML (em cache até o arquivo mudar)
+    from app.services.manual_index_service import get_manual_index
+    html_content = get_manual_index(str(manual_path.parent)).render_html(manual_path.name)
+    if html_content is None:
+        raise HTTPException(status_code=404, detail=f"Manual não encontrado: {filename}")
     
     # Criar página HTML completa
     html_page = f"""
@@ -1099,11 +1091,6 @@ async def view_agente_ia_manual(filename: str):
     from fastapi.responses import HTMLResponse
     import os
     
-    try:
-        import markdown
-    except ImportError:
-        raise HTTPException(status_code=500, detail="Biblioteca markdown não instalada. Execute: pip install markdown")
-    
     # Tentar múltiplos caminhos
     possible_paths = [
         Path("/app") / "manuais" / "agente_ia" / filename,  # Docker
@@ -1128,14 +1115,11 @@ async def view_agente_ia_manual(filename: str):
     if "agente_ia" not in path_str or ".." in filename:
         raise HTTPException(status_code=403, detail="Acesso negado")
     
-    content = manual_path.read_text(encoding="utf-8")
-    
-    # Converter Markdown para HTML
-    try:
-        html_content = markdown.markdown(content, extensions=['fenced_code', 'tables'])
-    except Exception as e:
-        # Se falhar, usar apenas o texto puro
-        html_content = f"<pre>{content}</pre>"
+    # Markdown convertido para HTML (em cache até o arquivo mudar)
+    from app.services.manual_index_service import get_manual_index
+    html_content = get_manual_index(str(manual_path.parent)).render_html(manual_path.name)
+    if html_content is None:
+        raise HTTPException(status_code=404, detail=f"Manual não encontrado: {filename}")
     
     # Criar página HTML completa
     html_page = f"""
@@ -1490,3 +1474,30 @@ async def superadmin_get_ticket_attachments_api(
             content=response
         )
 
+
+@superadmin_router.post("/api/superadmin/asaas/reconcile", response_class=JSONResponse)
+async def superadmin_asaas_reconcile_api(
+    request: Request,
+    dry_run: bool = Query(True, description="Apenas calcular as alterações, sem gravar"),
+    db: Session = Depends(get_db)
+):
+    """API para reconciliar as assinaturas com o Asaas (superadmin)"""
+    # Verificar se é superadmin
+    try:
+        get_superadmin_user(request, db)
+    except HTTPException as e:
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"success": False, "error": e.detail}
+        )
+    
+    from app.services.asaas_sync_service import AsaasSyncService
+    result = AsaasSyncService(db).sync_all_subscriptions(dry_run=dry_run)
+    
+    if result.get("success"):
+        return JSONResponse(content=result)
+    else:
+        return JSONResponse(
+            status_code=500,
+            content=result
+        )
@@ -4,12 +4,13 @@ Permite executar qualquer agente cadastrado no banco de dados em qualquer ponto
 Suporta múltiplos providers: OpenAI, Perplexity, Anthropic, Google
 """
 import logging
-from typing import Dict, Optional, Any, Tuple
+from typing import Callable, Dict, Optional, Any, Tuple
 from sqlalchemy.orm import Session
 
 from app.controllers.openai_assistant_controller import OpenAIAssistantController
 from app.models.saas_models import OpenAIAssistant, InteractionMode
 from app.services.ai_provider_factory import AIProviderFactory
+from app.services.ai_response_cache_service import AIResponseCacheService
 
 logger = logging.getLogger(__name__)
 
@@ -119,7 +120,9 @@ class AgentExecutorService:
         message: str,
         thread_id: Optional[str] = None,
         context_data: Optional[Dict[str, Any]] = None,
-        use_case: Optional[str] = None
+        use_case: Optional[str] = None,
+        stream_callback: Optional[Callable[[Dict], None]] = None,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         """
         Executa um agente detectando automaticamente se é CHAT ou REPORT
@@ -131,6 +134,10 @@ class AgentExecutorService:
             thread_id: ID da thread (apenas para modo chat, opcional)
             context_data: Dados adicionais de contexto (opcional)
             use_case: Caso de uso (opcional)
+            stream_callback: Recebe os eventos da resposta conforme são gerados
+                (apenas modo chat, opcional)
+            use_cache: Reaproveita resposta idêntica do cache (apenas modo report).
+                Use False para forçar uma nova geração
         
         Returns:
             Dict com:
@@ -141,6 +148,7 @@ class AgentExecutorService:
                 - usage: dict (informações de uso de tokens)
                 - requires_login: bool (se erro de autenticação)
                 - tokens_balance: dict (saldo de tokens, se erro de saldo)
+                - cached: bool (resposta servida do cache, apenas report)
         """
         try:
             # Validar message/prompt
@@ -201,7 +209,8 @@ class AgentExecutorService:
                     message=message,
                     thread_id=thread_id,
                     context_data=context_data,
-                    use_case=use_case
+                    use_case=use_case,
+                    stream_callback=stream_callback
                 )
             elif mode_value == "report":
                 return self._execute_report(
@@ -210,7 +219,8 @@ class AgentExecutorService:
                     user_id=user_id,
                     prompt=message,
                     context_data=context_data,
-                    use_case=use_case
+                    use_case=use_case,
+                    use_cache=use_cache
                 )
             else:
                 return {
@@ -245,7 +255,8 @@ class AgentExecutorService:
         message: str,
         thread_id: Optional[str],
         context_data: Dict[str, Any],
-        use_case: Optional[str]
+        use_case: Optional[str],
+        stream_callback: Optional[Callable[[Dict], None]] = None
     ) -> Dict[str, Any]:
         """Executa agente em modo chat"""
         try:
@@ -269,7 +280,8 @@ class AgentExecutorService:
                     message=message,
                     thread_id=thread_id,
                     context_data=context_data,
-                    use_case=use_case
+                    use_case=use_case,
+                    stream_callback=stream_callback
                 )
             else:
                 # Para outros providers, usar o serviço diretamente
@@ -321,6 +333,9 @@ class AgentExecutorService:
                 
                 # Formatar resultado no formato esperado
                 if result.get('success'):
+                    # Providers sem streaming: a resposta vai em um único trecho
+                    if stream_callback and result.get('content'):
+                        stream_callback({"type": "delta", "content": result.get('content')})
                     result = {
                         'success': True,
                         'response': result.get('content', ''),
@@ -399,9 +414,10 @@ class AgentExecutorService:
         user_id: int,
         prompt: str,
         context_data: Dict[str, Any],
-        use_case: Optional[str]
+        use_case: Optional[str],
+        use_cache: bool = True
     ) -> Dict[str, Any]:
-        """Executa agente em modo report"""
+        """Executa agente em modo report (com cache de respostas idênticas)"""
         try:
             # Buscar agente novamente para ter acesso ao provider
             agent = self._get_agent(agent_id)
@@ -411,6 +427,24 @@ class AgentExecutorService:
                     'error': f'Agente ID {agent_id} não encontrado ou inativo'
                 }
             
+            # Cache de respostas: hit não chama o provider nem debita tokens
+            response_cache = AIResponseCacheService(self.db)
+            cache_key = None
+            if use_cache and response_cache.is_enabled(agent):
+                cache_key = response_cache.build_key(agent, company_id, prompt, context_data)
+                cached_entry = response_cache.get(cache_key)
+                if cached_entry:
+                    response_cache.register_hit(cached_entry, agent, company_id, user_id, use_case)
+                    return {
+                        'success': True,
+                        'content': cached_entry.content,
+                        'raw_response': cached_entry.raw_response or {'content': cached_entry.content},
+                        'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+                        'cached': True
+                    }
+            else:
+                response_cache.record_bypass()
+            
             # Verificar provider
             provider = getattr(agent, 'provider', 'openai') or 'openai'
             
@@ -510,11 +544,15 @@ class AgentExecutorService:
                 # Registrar uso se disponível
                 usage = result.get('usage', {})
                 
+                if cache_key:
+                    response_cache.store(cache_key, agent, company_id, use_case, content, raw_response, usage)
+                
                 return {
                     'success': True,
                     'content': content,
                     'raw_response': raw_response,
-                    'usage': usage
+                    'usage': usage,
+                    'cached': False
                 }
             else:
                 return {
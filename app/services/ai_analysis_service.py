@@ -6,10 +6,8 @@ import logging
 import json
 from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
 from openai import OpenAI
-from app.models.saas_models import MLProduct, MLOrder
-from app.services.ml_product_ads_service import MLProductAdsService
+from app.models.saas_models import MLProduct
 
 logger = logging.getLogger(__name__)
 
@@ -142,58 +140,17 @@ class AIAnalysisService:
             if not product:
                 return {"success": False, "error": "Produto não encontrado"}
             
-            # 2. Buscar histórico de pedidos deste produto (ÚLTIMOS 30 DIAS)
-            # Como ml_item_id está dentro do JSON order_items, precisamos buscar todos
-            # os pedidos da empresa e filtrar no Python
-            from datetime import datetime, timedelta
-            
-            # Data limite: 30 dias atrás
-            thirty_days_ago = datetime.now() - timedelta(days=30)
-            
-            all_orders = self.db.query(MLOrder).filter(
-                MLOrder.company_id == company_id,
-                MLOrder.order_items.isnot(None),
-                MLOrder.date_created >= thirty_days_ago  # Filtrar últimos 30 dias
-            ).order_by(desc(MLOrder.date_created)).all()
-            
-            # Filtrar pedidos que contêm este produto
-            orders = []
-            for order in all_orders:
-                if order.order_items:
-                    # order_items é um JSON array
-                    for item in order.order_items:
-                        if item.get('item', {}).get('id') == product.ml_item_id:
-                            orders.append(order)
-                            break  # Já encontrou o produto neste pedido
+            # 2. Insumos da análise (vendas, marketing, catálogo e pricing) do snapshot do produto
+            from app.services.product_analysis_snapshot_service import ProductAnalysisSnapshotService
+            features = ProductAnalysisSnapshotService(self.db).get_features(product, catalog_data, pricing_analysis)
+            orders = features["orders"]
+            catalog_data = features["catalog_data"]
+            pricing_analysis = features["pricing_analysis"]
+            marketing_metrics = self._with_pricing_reference(features["marketing_metrics"], product, pricing_analysis)
             
             logger.info(f"Encontrados {len(orders)} pedidos nos últimos 30 dias para o produto {product.ml_item_id}")
             
-            # 3. Buscar métricas de marketing (Product Ads)
-            marketing_metrics = None
-            try:
-                ads_service = MLProductAdsService(self.db)
-                marketing_metrics = ads_service.get_product_advertising_metrics(
-                    ml_item_id=product.ml_item_id,
-                    ml_account_id=product.ml_account_id,
-                    days=30  # Últimos 30 dias
-                )
-                
-                # Adicionar dados de pricing às métricas de marketing
-                if marketing_metrics:
-                    # Preço do produto (prioritizar pricing_analysis se disponível)
-                    if pricing_analysis and pricing_analysis.get("preco_venda"):
-                        marketing_metrics["preco_venda"] = pricing_analysis.get("preco_venda")
-                        marketing_metrics["percentual_marketing_esperado"] = pricing_analysis.get("marketing_percentual", 5.0)
-                    else:
-                        marketing_metrics["preco_venda"] = float(product.price) if product.price else 0
-                        marketing_metrics["percentual_marketing_esperado"] = 5.0
-                
-                logger.info(f"Métricas de marketing obtidas para produto {product.ml_item_id}")
-            except Exception as e:
-                logger.warning(f"Não foi possível obter métricas de marketing: {e}")
-                marketing_metrics = {"has_advertising": False}
-            
-            # 4. Preparar dados estruturados
+            # 3. Preparar dados estruturados
             analysis_data = self._prepare_analysis_data(product, orders, catalog_data, pricing_analysis, marketing_metrics)
             
             # 4. Criar prompt para ChatGPT
@@ -250,7 +207,22 @@ class AIAnalysisService:
             logger.error(f"Erro na análise com IA: {e}", exc_info=True)
             return {"success": False, "error": f"Erro ao processar análise: {str(e)}"}
     
-    def _prepare_analysis_data(self, product: MLProduct, orders: List[MLOrder], 
+    def _with_pricing_reference(self, marketing_metrics: Dict, product: MLProduct,
+                                pricing_analysis: Optional[Dict] = None) -> Dict:
+        """Adiciona preço de venda e % de marketing esperado às métricas de Product Ads"""
+        if not marketing_metrics or not marketing_metrics.get("has_advertising"):
+            return marketing_metrics or {"has_advertising": False}
+        
+        # Preço do produto (prioritizar pricing_analysis se disponível)
+        if pricing_analysis and pricing_analysis.get("preco_venda"):
+            marketing_metrics["preco_venda"] = pricing_analysis.get("preco_venda")
+            marketing_metrics["percentual_marketing_esperado"] = pricing_analysis.get("marketing_percentual", 5.0)
+        else:
+            marketing_metrics["preco_venda"] = float(product.price) if product.price else 0
+            marketing_metrics["percentual_marketing_esperado"] = 5.0
+        return marketing_metrics
+    
+    def _prepare_analysis_data(self, product: MLProduct, orders: List[Dict], 
                                catalog_data: Optional[List] = None, pricing_analysis: Optional[Dict] = None,
                                marketing_metrics: Optional[Dict] = None) -> Dict:
         """Prepara dados estruturados para análise"""
@@ -353,53 +325,20 @@ class AIAnalysisService:
         total_discounts = 0
         total_quantity = 0
         
+        paid_orders = []
+        
+        # orders: linhas do snapshot (ProductAnalysisSnapshotService._order_row)
         for order in orders:
-            # Extrair quantidade e preço unitário do order_items
-            quantity = 1
-            unit_price = 0
-            
-            if order.order_items:
-                for item in order.order_items:
-                    if item.get('item', {}).get('id') == product.ml_item_id:
-                        quantity = item.get('quantity', 1)
-                        unit_price = item.get('unit_price', 0)
-                        break
-            
-            # Valores já estão em reais (não dividir por 100)
-            total_amount = float(order.total_amount) if order.total_amount else 0
-            sale_fees = float(order.sale_fees) if order.sale_fees else 0
-            shipping_cost = float(order.shipping_cost) if order.shipping_cost else 0
-            coupon_amount = float(order.coupon_amount) if order.coupon_amount else 0
-            unit_price_reais = float(unit_price) if unit_price else 0  # Já em reais
-            
-            order_data = {
-                "id_pedido": str(order.ml_order_id),
-                "data": order.date_created.isoformat() if order.date_created else None,
-                "quantidade": quantity,
-                "preco_unitario": unit_price_reais,  # Já em reais
-                "total_pago": total_amount,
-                "comissao_ml": sale_fees,
-                "frete": shipping_cost,
-                "desconto": coupon_amount,
-                "status": order.status.value if hasattr(order.status, 'value') else str(order.status)
-            }
-            orders_data.append(order_data)
+            orders_data.append(order)
             
             # Acumular métricas (apenas pedidos pagos/entregues)
-            status_str = order.status.value if hasattr(order.status, 'value') else str(order.status)
-            if status_str in ['paid', 'delivered']:
-                total_revenue += total_amount
-                total_ml_fees += sale_fees
-                total_shipping += shipping_cost
-                total_discounts += coupon_amount
-                total_quantity += quantity
-        
-        # Métricas agregadas de vendas
-        paid_orders = []
-        for o in orders:
-            status_str = o.status.value if hasattr(o.status, 'value') else str(o.status)
-            if status_str in ['paid', 'delivered']:
-                paid_orders.append(o)
+            if str(order.get("status") or "").upper() in ('PAID', 'DELIVERED'):
+                paid_orders.append(order)
+                total_revenue += order.get("total_pago", 0)
+                total_ml_fees += order.get("comissao_ml", 0)
+                total_shipping += order.get("frete", 0)
+                total_discounts += order.get("desconto", 0)
+                total_quantity += order.get("quantidade", 1)
         
         # Ticket médio por PEDIDO (valor médio de cada venda)
         ticket_medio_pedido = total_revenue / len(paid_orders) if paid_orders else 0
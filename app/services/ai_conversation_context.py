@@ -0,0 +1,321 @@
+"""
+Contexto das conversas (modo chat) enviado ao modelo
+
+- Carrega do banco apenas a janela recente da thread (mensagens após o resumo);
+  mensagens anteriores à janela (threads longas, rajadas) entram no resumo em lotes
+- Reconstrói pares assistant.tool_calls / tool em uma única passada
+- Reduz saídas de ferramentas de turnos anteriores
+- Respeita o orçamento de tokens do agente (context_token_budget): turnos mais
+  antigos que não cabem saem da janela e entram no resumo acumulado da thread
+"""
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.saas_models import OpenAIAssistant, OpenAIAssistantMessage, OpenAIAssistantThread
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken é opcional: sem ele, estimativa por caracteres
+    _encoding = None
+
+# Orçamento padrão do contexto de entrada (tokens)
+DEFAULT_CONTEXT_TOKEN_BUDGET = 16000
+# Mensagens carregadas do banco por turno
+MAX_WINDOW_MESSAGES = 80
+# Mensagens anteriores à janela incorporadas ao resumo: tamanho do lote e lotes por turno
+# (o restante é incorporado nos turnos seguintes, sempre das mais antigas para as mais novas)
+OVERFLOW_BATCH_MESSAGES = 200
+MAX_OVERFLOW_BATCHES = 3
+# Tamanho máximo (caracteres) de saídas de ferramentas no turno atual e nos anteriores
+TOOL_OUTPUT_CHARS = 16000
+OLD_TOOL_OUTPUT_CHARS = 1200
+# Resumo acumulado
+SUMMARY_MODEL = "gpt-4.1-nano"
+SUMMARY_MAX_TOKENS = 600
+SUMMARY_TRANSCRIPT_CHARS = 24000
+
+SUMMARY_INSTRUCTIONS = (
+    "Você mantém o resumo de uma conversa entre um usuário e um assistente de IA. "
+    "Atualize o resumo existente com os novos trechos, preservando fatos, números, "
+    "decisões, preferências do usuário e pendências. Responda apenas com o resumo, "
+    "em português, em tópicos curtos."
+)
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def _message_tokens(message: Dict) -> int:
+    tokens = 4 + estimate_tokens(message.get("content") or "")
+    for tool_call in message.get("tool_calls") or []:
+        tokens += estimate_tokens(tool_call["function"]["name"]) + estimate_tokens(tool_call["function"]["arguments"])
+    return tokens
+
+
+def _add_usage(total: Optional[Dict], usage: Optional[Dict]) -> Optional[Dict]:
+    if not usage:
+        return total
+    if not total:
+        return dict(usage)
+    return {key: total.get(key, 0) + usage.get(key, 0) for key in set(total) | set(usage)}
+
+
+def _truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit] + f"... [saída reduzida: {len(text) - limit} caracteres omitidos]"
+
+
+def _truncate_head(text: str, limit: int) -> str:
+    """Como _truncate, mas mantém o final do texto (trechos mais recentes)"""
+    if len(text) <= limit:
+        return text
+    return f"[{len(text) - limit} caracteres anteriores omitidos] ..." + text[-limit:]
+
+
+class ConversationContextManager:
+    """Monta o histórico da thread dentro do orçamento de tokens do agente"""
+
+    def __init__(self, db: Session, client=None):
+        self.db = db
+        self.client = client
+
+    def build(self, db_assistant: OpenAIAssistant, db_thread: OpenAIAssistantThread, instructions: str,
+              pending_message: Optional[str] = None) -> Dict:
+        """
+        Returns:
+            Dict com:
+                - messages: histórico no formato do Chat Completions (sem a mensagem atual)
+                - has_history: bool (a thread já tem mensagens ou resumo)
+                - summary_usage: tokens gastos atualizando o resumo (ou None)
+        """
+        budget = getattr(db_assistant, "context_token_budget", None) or DEFAULT_CONTEXT_TOKEN_BUDGET
+        summary = db_thread.context_summary
+        rows = self._load_window(db_thread)
+        summary, summary_usage = self._fold_overflow(db_thread, summary, rows)
+        turns = self._build_turns(rows)
+
+        fixed_tokens = estimate_tokens(instructions) + estimate_tokens(summary) + estimate_tokens(pending_message) + 12
+        turn_tokens = [sum(_message_tokens(m) for m in turn["messages"]) for turn in turns]
+
+        # Turnos mais antigos saem da janela até caber no orçamento (o último sempre fica)
+        dropped = 0
+        while dropped < len(turns) - 1 and fixed_tokens + sum(turn_tokens[dropped:]) > budget:
+            dropped += 1
+
+        if dropped:
+            summary, usage = self._update_summary(db_thread, summary, turns[:dropped])
+            summary_usage = _add_usage(summary_usage, usage)
+
+        messages = []
+        if instructions:
+            messages.append({"role": "system", "content": instructions})
+        if summary:
+            messages.append({"role": "system", "content": f"Resumo da conversa até aqui:\n{summary}"})
+        for turn in turns[dropped:]:
+            messages.extend(turn["messages"])
+
+        logger.info(
+            f"🧠 Contexto da thread {db_thread.id}: {len(rows)} mensagem(ns) carregada(s), "
+            f"{dropped} turno(s) resumido(s), ~{fixed_tokens + sum(turn_tokens[dropped:])}/{budget} tokens"
+        )
+        return {
+            "messages": messages,
+            "has_history": bool(rows) or bool(summary),
+            "summary_usage": summary_usage
+        }
+
+    def _load_window(self, db_thread: OpenAIAssistantThread) -> List[OpenAIAssistantMessage]:
+        """Mensagens posteriores ao resumo, limitadas às mais recentes"""
+        query = self.db.query(OpenAIAssistantMessage).filter(OpenAIAssistantMessage.thread_id == db_thread.id)
+        if db_thread.context_summary_until_id:
+            query = query.filter(OpenAIAssistantMessage.id > db_thread.context_summary_until_id)
+        rows = query.order_by(OpenAIAssistantMessage.id.desc()).limit(MAX_WINDOW_MESSAGES).all()
+        rows.reverse()
+        return rows
+
+    def _fold_overflow(self, db_thread: OpenAIAssistantThread, summary: Optional[str],
+                       window: List[OpenAIAssistantMessage]) -> Tuple[Optional[str], Optional[Dict]]:
+        """Incorpora ao resumo as mensagens entre o resumo e a janela (não cabem em MAX_WINDOW_MESSAGES)"""
+        usage = None
+        if len(window) < MAX_WINDOW_MESSAGES:
+            return summary, usage
+
+        for _ in range(MAX_OVERFLOW_BATCHES):
+            query = self.db.query(OpenAIAssistantMessage).filter(
+                OpenAIAssistantMessage.thread_id == db_thread.id,
+                OpenAIAssistantMessage.id < window[0].id
+            )
+            if db_thread.context_summary_until_id:
+                query = query.filter(OpenAIAssistantMessage.id > db_thread.context_summary_until_id)
+            batch = query.order_by(OpenAIAssistantMessage.id.asc()).limit(OVERFLOW_BATCH_MESSAGES).all()
+            if not batch:
+                break
+            turns = self._build_turns(batch)
+            if not turns:
+                db_thread.context_summary_until_id = batch[-1].id
+                self.db.flush()
+                continue
+            summary, batch_usage = self._update_summary(db_thread, summary, turns, until_id=batch[-1].id)
+            usage = _add_usage(usage, batch_usage)
+            logger.info(f"🧠 Thread {db_thread.id}: {len(batch)} mensagem(ns) anteriores à janela incorporada(s) ao resumo")
+        return summary, usage
+
+    def _build_turns(self, rows: List[OpenAIAssistantMessage]) -> List[Dict]:
+        """
+        Converte as mensagens em turnos (cada turno começa em uma mensagem do usuário).
+        tool_calls sem resposta e respostas de ferramenta sem tool_call são descartados.
+        """
+        turns: List[Dict] = []
+        pending_call: Optional[Tuple[Dict, Dict[str, Dict]]] = None  # (mensagem assistant, respostas por id)
+
+        def close_pending():
+            nonlocal pending_call
+            if pending_call is None:
+                return
+            assistant_message, responses = pending_call
+            pending_call = None
+            answered = [tc for tc in assistant_message["tool_calls"] if tc["id"] in responses]
+            if not answered:
+                return
+            assistant_message["tool_calls"] = answered
+            append(assistant_message, None)
+            for tool_call in answered:
+                append(responses[tool_call["id"]], None)
+
+        def append(message: Dict, last_id: Optional[int]):
+            if not turns or message["role"] == "user":
+                turns.append({"messages": [], "last_id": None})
+            turns[-1]["messages"].append(message)
+            if last_id:
+                turns[-1]["last_id"] = last_id
+
+        for row in rows:
+            role = (row.role or "").strip().lower()
+            if role not in ("system", "user", "assistant", "tool"):
+                logger.warning(f"⚠️ Role inválido na mensagem ID {row.id}: '{row.role}'. Pulando mensagem.")
+                continue
+            if role == "system":
+                continue  # Instruções vêm sempre do agente
+
+            payload = None
+            if role in ("assistant", "tool") and row.content and row.content[:1] == "{":
+                try:
+                    payload = json.loads(row.content)
+                except (json.JSONDecodeError, TypeError):
+                    payload = None
+
+            if role == "tool":
+                tool_call_id = payload.get("tool_call_id") if isinstance(payload, dict) else None
+                if pending_call is None or not tool_call_id:
+                    logger.warning(f"⚠️ Mensagem 'tool' isolada (ID {row.id}), pulando.")
+                    continue
+                result = payload.get("result")
+                content = json.dumps(result, ensure_ascii=False) if isinstance(result, (dict, list)) else str(result)
+                tool_message = {"role": "tool", "content": content, "tool_call_id": tool_call_id}
+                if payload.get("name"):
+                    tool_message["name"] = payload["name"]
+                pending_call[1][tool_call_id] = tool_message
+                if turns:
+                    turns[-1]["last_id"] = row.id
+                continue
+
+            close_pending()
+
+            if role == "assistant" and isinstance(payload, dict) and payload.get("tool_calls"):
+                pending_call = ({
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {
+                            "id": tc.get("id", ""),
+                            "type": "function",
+                            "function": {
+                                "name": tc.get("function", {}).get("name", ""),
+                                "arguments": tc.get("function", {}).get("arguments", "{}")
+                            }
+                        }
+                        for tc in payload["tool_calls"]
+                    ]
+                }, {})
+                if turns:
+                    turns[-1]["last_id"] = row.id
+                continue
+
+            append({"role": role, "content": row.content}, row.id)
+
+        close_pending()
+
+        # Saídas de ferramentas: teto geral e redução forte fora do último turno
+        for index, turn in enumerate(turns):
+            limit = TOOL_OUTPUT_CHARS if index == len(turns) - 1 else OLD_TOOL_OUTPUT_CHARS
+            for message in turn["messages"]:
+                if message["role"] == "tool":
+                    message["content"] = _truncate(message["content"] or "", limit)
+        return turns
+
+    def _update_summary(self, db_thread: OpenAIAssistantThread, summary: Optional[str], turns: List[Dict],
+                        until_id: Optional[int] = None) -> Tuple[Optional[str], Optional[Dict]]:
+        """Incorpora os turnos que saíram da janela ao resumo da thread (until_id: última mensagem coberta)"""
+        transcript = self._transcript(turns)
+        usage = None
+        new_summary = None
+
+        if self.client is not None:
+            try:
+                response = self.client.chat.completions.create(
+                    model=SUMMARY_MODEL,
+                    max_tokens=SUMMARY_MAX_TOKENS,
+                    messages=[
+                        {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+                        {"role": "user", "content": f"RESUMO ATUAL:\n{summary or '(vazio)'}\n\nNOVOS TRECHOS:\n{transcript}"}
+                    ]
+                )
+                new_summary = (response.choices[0].message.content or "").strip() or None
+                if response.usage:
+                    usage = {
+                        "prompt_tokens": response.usage.prompt_tokens,
+                        "completion_tokens": response.usage.completion_tokens,
+                        "total_tokens": response.usage.total_tokens
+                    }
+            except Exception as e:
+                logger.warning(f"⚠️ Não foi possível resumir a thread {db_thread.id} com o modelo: {e}")
+
+        if not new_summary:
+            # Sem modelo: resumo anterior + trecho novo, descartando o que for mais antigo
+            new_summary = _truncate_head(f"{summary}\n{transcript}" if summary else transcript, SUMMARY_MAX_TOKENS * 4)
+
+        last_ids = [turn["last_id"] for turn in turns if turn["last_id"]]
+        if until_id:
+            last_ids.append(until_id)
+        db_thread.context_summary = new_summary
+        if last_ids:
+            db_thread.context_summary_until_id = max(last_ids)
+        self.db.flush()
+        return new_summary, usage
+
+    @staticmethod
+    def _transcript(turns: List[Dict]) -> str:
+        labels = {"user": "Usuário", "assistant": "Assistente"}
+        lines = []
+        for turn in turns:
+            for message in turn["messages"]:
+                if message["role"] == "tool":
+                    lines.append(f"[{message.get('name', 'ferramenta')}]: {_truncate(message['content'] or '', 300)}")
+                elif message.get("tool_calls"):
+                    names = ", ".join(tc["function"]["name"] for tc in message["tool_calls"])
+                    lines.append(f"Assistente chamou: {names}")
+                elif message.get("content"):
+                    lines.append(f"{labels.get(message['role'], message['role'])}: {message['content']}")
+        return _truncate_head("\n".join(lines), SUMMARY_TRANSCRIPT_CHARS)
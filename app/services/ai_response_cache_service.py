@@ -0,0 +1,260 @@
+"""
+Cache persistente de respostas dos agentes em modo report
+
+A chave combina a versão do agente (modelo, instruções, prompt inicial e
+parâmetros de geração), a empresa, o prompt normalizado e o hash do
+context_data. Respostas servidas do cache não chamam o provider e não
+debitam tokens.
+
+Cada agente pode desligar o cache (response_cache_enabled) ou definir a
+validade das respostas (response_cache_ttl); cada chamada pode ignorá-lo
+com use_cache=False. Agentes com ferramentas não usam o cache, pois a
+resposta depende de dados consultados no momento.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from app.models.saas_models import AIResponseCache, OpenAIAssistant, OpenAIAssistantUsage
+
+logger = logging.getLogger(__name__)
+
+# Validade padrão das respostas (segundos)
+AGENT_RESPONSE_CACHE_TTL = 24 * 60 * 60
+# Respostas maiores que isso não são guardadas (caracteres)
+MAX_CACHED_RESPONSE_SIZE = 200_000
+
+# Contadores do processo desde o início (hit, miss, bypass)
+_counters = {"hits": 0, "misses": 0, "bypass": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Remove diferenças irrelevantes de espaçamento do prompt"""
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in (prompt or "").strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+def context_hash(context_data: Optional[Dict[str, Any]]) -> str:
+    payload = json.dumps(context_data or {}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def agent_version(agent: OpenAIAssistant) -> str:
+    """Hash da configuração do agente que influencia a resposta"""
+    payload = json.dumps({
+        "provider": getattr(agent, "provider", None) or "openai",
+        "model": agent.model,
+        "instructions": agent.instructions,
+        "initial_prompt": agent.initial_prompt,
+        "temperature": float(agent.temperature) if agent.temperature is not None else None,
+        "max_tokens": agent.max_tokens,
+        "tools_config": agent.tools_config,
+        "api_config": getattr(agent, "api_config", None),
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AIResponseCacheService:
+    """Consulta e grava respostas de agentes em modo report"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def is_enabled(self, agent: OpenAIAssistant) -> bool:
+        """Cache ligado no agente e respostas que não dependem de ferramentas (dados ao vivo)"""
+        if not getattr(agent, "response_cache_enabled", True):
+            return False
+        return not self._uses_tools(agent)
+
+    def _uses_tools(self, agent: OpenAIAssistant) -> bool:
+        tools_config = agent.tools_config
+        if isinstance(tools_config, dict) and tools_config.get("tools"):
+            return True
+        if isinstance(tools_config, list) and tools_config:
+            return True
+        try:
+            linked = self.db.execute(
+                text("SELECT 1 FROM openai_agent_tools WHERE agent_id = :agent_id LIMIT 1"),
+                {"agent_id": agent.id}
+            ).first()
+            return linked is not None
+        except Exception:
+            self.db.rollback()
+            return True
+
+    @staticmethod
+    def ttl_seconds(agent: OpenAIAssistant) -> int:
+        return getattr(agent, "response_cache_ttl", None) or AGENT_RESPONSE_CACHE_TTL
+
+    @staticmethod
+    def build_key(agent: OpenAIAssistant, company_id: Optional[int], prompt: str,
+                  context_data: Optional[Dict[str, Any]]) -> str:
+        raw = "|".join([
+            agent_version(agent),
+            str(company_id or 0),
+            hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest(),
+            context_hash(context_data),
+        ])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def record_bypass():
+        _count("bypass")
+
+    def get(self, cache_key: str) -> Optional[AIResponseCache]:
+        """Resposta válida para a chave, ou None (conta hit/miss)"""
+        try:
+            entry = self.db.query(AIResponseCache).filter(
+                AIResponseCache.cache_key == cache_key,
+                AIResponseCache.expires_at > datetime.now(timezone.utc)
+            ).first()
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao consultar cache de respostas: {e}")
+            self.db.rollback()
+            return None
+
+        _count("hits" if entry else "misses")
+        return entry
+
+    def register_hit(self, entry: AIResponseCache, agent: OpenAIAssistant, company_id: Optional[int],
+                     user_id: Optional[int], use_case: Optional[str]):
+        """Atualiza as métricas da entrada e registra o uso (sem tokens) no histórico do agente"""
+        from app.models.saas_models import UsageStatus
+
+        try:
+            now = datetime.now(timezone.utc)
+            saved = int((entry.usage or {}).get("total_tokens", 0) or 0)
+            entry.hit_count = (entry.hit_count or 0) + 1
+            entry.tokens_saved = (entry.tokens_saved or 0) + saved
+            entry.last_hit_at = now
+            self.db.add(OpenAIAssistantUsage(
+                assistant_id=agent.id,
+                company_id=company_id,
+                user_id=user_id,
+                thread_id=None,
+                interaction_mode="report",
+                use_case=use_case,
+                provider=getattr(agent, "provider", None) or "openai",
+                status=UsageStatus.COMPLETED,
+                prompt_tokens=0,
+                completion_tokens=0,
+                total_tokens=0,
+                cache_hit=True,
+                response_data_size=len(entry.content or ""),
+                created_at=now,
+                completed_at=now,
+                duration_seconds=0
+            ))
+            self.db.commit()
+            logger.info(f"♻️ Resposta do agente {agent.id} servida do cache ({saved} tokens economizados)")
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao registrar hit do cache de respostas: {e}")
+            self.db.rollback()
+
+    def store(self, cache_key: str, agent: OpenAIAssistant, company_id: Optional[int], use_case: Optional[str],
+              content: str, raw_response: Optional[Dict], usage: Optional[Dict]):
+        """Grava (ou substitui) a resposta da chave"""
+        if not content or len(content) > MAX_CACHED_RESPONSE_SIZE:
+            return
+
+        try:
+            now = datetime.now(timezone.utc)
+            entry = self.db.query(AIResponseCache).filter(AIResponseCache.cache_key == cache_key).first()
+            if not entry:
+                entry = AIResponseCache(cache_key=cache_key, assistant_id=agent.id, company_id=company_id)
+                self.db.add(entry)
+            entry.agent_version = agent_version(agent)
+            entry.use_case = use_case
+            entry.content = content
+            entry.raw_response = raw_response
+            entry.usage = usage or {}
+            entry.hit_count = 0
+            entry.tokens_saved = 0
+            entry.last_hit_at = None
+            entry.created_at = now
+            entry.expires_at = now + timedelta(seconds=self.ttl_seconds(agent))
+            self.db.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao gravar cache de respostas: {e}")
+            self.db.rollback()
+
+    def purge_expired(self) -> int:
+        """Remove respostas vencidas"""
+        deleted = self.db.query(AIResponseCache).filter(
+            AIResponseCache.expires_at <= datetime.now(timezone.utc)
+        ).delete(synchronize_session=False)
+        self.db.commit()
+        return deleted
+
+    def get_stats(self, assistant_id: Optional[int] = None) -> Dict:
+        """Métricas do cache: entradas válidas, hits, tokens economizados e contadores do processo"""
+        try:
+            now = datetime.now(timezone.utc)
+            query = self.db.query(
+                AIResponseCache.assistant_id,
+                func.count(AIResponseCache.id),
+                func.coalesce(func.sum(AIResponseCache.hit_count), 0),
+                func.coalesce(func.sum(AIResponseCache.tokens_saved), 0),
+            ).filter(AIResponseCache.expires_at > now)
+            if assistant_id:
+                query = query.filter(AIResponseCache.assistant_id == assistant_id)
+            rows = query.group_by(AIResponseCache.assistant_id).all()
+
+            # Execuções em modo report: as que vieram do cache e as que chamaram o provider
+            usage_query = self.db.query(
+                func.count(OpenAIAssistantUsage.id).filter(OpenAIAssistantUsage.cache_hit == True),
+                func.count(OpenAIAssistantUsage.id).filter(
+                    (OpenAIAssistantUsage.cache_hit == False) | (OpenAIAssistantUsage.cache_hit.is_(None))
+                ),
+            ).filter(OpenAIAssistantUsage.interaction_mode == "report")
+            if assistant_id:
+                usage_query = usage_query.filter(OpenAIAssistantUsage.assistant_id == assistant_id)
+            report_hits, report_calls = usage_query.one()
+            total_runs = int(report_hits or 0) + int(report_calls or 0)
+
+            with _counters_lock:
+                process_counters = dict(_counters)
+
+            return {
+                "success": True,
+                "stats": {
+                    "entries": sum(int(r[1]) for r in rows),
+                    "hits": int(report_hits or 0),
+                    "provider_calls": int(report_calls or 0),
+                    "hit_rate": round(int(report_hits or 0) / total_runs * 100, 2) if total_runs else 0.0,
+                    "tokens_saved": sum(int(r[3]) for r in rows),
+                    "by_assistant": [
+                        {"assistant_id": r[0], "entries": int(r[1]), "hits": int(r[2]), "tokens_saved": int(r[3])}
+                        for r in rows
+                    ],
+                    "process": process_counters,
+                }
+            }
+        except Exception as e:
+            logger.error(f"❌ Erro ao obter métricas do cache de respostas: {e}", exc_info=True)
+            self.db.rollback()
+            return {"success": False, "error": str(e)}
+
+
+def run_response_cache_cleanup() -> int:
+    """Remove respostas vencidas do cache (job agendado)"""
+    from app.config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return AIResponseCacheService(db).purge_expired()
+    finally:
+        db.close()
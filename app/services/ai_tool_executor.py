@@ -0,0 +1,164 @@
+"""
+Execução das ferramentas (function calling) chamadas pelos agentes de IA
+
+- Chamadas independentes de um mesmo turno rodam em paralelo em um pool limitado
+- Cada chamada de consulta usa sua própria sessão, em transação somente leitura
+  e com statement_timeout igual ao timeout da ferramenta
+- Consultas que chegam à API do ML (e podem renovar e gravar o token da conta)
+  também rodam em paralelo, mas em sessão própria gravável
+- Ferramentas que alteram dados rodam em série, na sessão da conversa
+- A latência de cada chamada é registrada (log + métricas do turno)
+"""
+import copy
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+
+from app.config.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Chamadas simultâneas (compartilhado entre conversas)
+MAX_PARALLEL_TOOLS = 6
+# Timeout padrão por ferramenta (segundos)
+DEFAULT_TOOL_TIMEOUT = 20
+TOOL_TIMEOUTS = {
+    "calculate": 5,
+    "get_product_core": 10,
+    "get_product_attributes": 10,
+    "get_orders": 30,
+    "get_product_sales": 30,
+    "get_sales_aggregates": 30,
+    "get_total_advertising_expenses": 30,
+    "get_catalog_monitoring_status": 30,
+}
+# Ferramentas que escrevem no banco ou na API do ML: sem paralelismo nem transação somente leitura
+WRITE_TOOLS = {"update_stock_quantity", "sync_stock_to_ml"}
+# Consultas que chamam a API do ML via TokenManager: um 401 renova o token e o grava
+# (o refresh_token antigo deixa de valer), então a sessão não pode ser somente leitura
+ML_API_TOOLS = {"get_ads_metrics_by_item", "get_catalog_competitors_db"}
+
+_pool = ThreadPoolExecutor(max_workers=MAX_PARALLEL_TOOLS, thread_name_prefix="ai-tool")
+
+
+def _error_result(error: Exception) -> Dict:
+    """Resultado de erro para o modelo; falhas de autenticação pedem novo login"""
+    error_str = str(error).lower()
+    if "authentication" in error_str or "unauthorized" in error_str or "session" in error_str or "login" in error_str:
+        return {
+            "success": False,
+            "error": "Sessão expirada. Por favor, faça login novamente.",
+            "requires_login": True
+        }
+    return {"error": f"Erro ao executar função: {str(error)[:500]}"}
+
+
+class ToolExecutionEngine:
+    """Executa as chamadas de ferramentas de um turno do agente"""
+
+    def __init__(self, service, db_thread):
+        """
+        Args:
+            service: OpenAIAssistantService da conversa (dono de _execute_tool_function)
+            db_thread: Thread da conversa (apenas id, company_id e user_id são repassados)
+        """
+        self.service = service
+        self.db_thread = db_thread
+        # Cópia desanexada da sessão da conversa, usada pelos workers
+        self.thread_context = SimpleNamespace(
+            id=db_thread.id, company_id=db_thread.company_id, user_id=db_thread.user_id
+        )
+        self.metrics: List[Dict] = []
+
+    def execute(self, calls: List[Tuple[str, Dict]]) -> List[Dict]:
+        """
+        Executa as chamadas (nome, argumentos) e devolve os resultados na mesma ordem.
+        Falhas e timeouts viram {"error": ...} para o modelo, como nas demais ferramentas.
+        """
+        started_at = time.monotonic()
+        results: List[Dict] = [None] * len(calls)
+        latencies: List[float] = [0.0] * len(calls)
+        statuses: List[str] = ["ok"] * len(calls)
+
+        futures = {
+            index: _pool.submit(self._run_in_own_session, name, args)
+            for index, (name, args) in enumerate(calls)
+            if name not in WRITE_TOOLS
+        }
+
+        for index, (name, args) in enumerate(calls):
+            if name in WRITE_TOOLS:
+                call_started = time.monotonic()
+                results[index] = self._run_in_conversation(name, args)
+                latencies[index] = time.monotonic() - call_started
+
+        for index, future in futures.items():
+            name = calls[index][0]
+            timeout = TOOL_TIMEOUTS.get(name, DEFAULT_TOOL_TIMEOUT)
+            remaining = max(0.0, timeout - (time.monotonic() - started_at))
+            try:
+                results[index], latencies[index] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                logger.warning(f"⏱️ Ferramenta {name} excedeu o timeout de {timeout}s")
+                results[index] = {"error": f"A consulta '{name}' excedeu o tempo limite de {timeout}s"}
+                latencies[index] = time.monotonic() - started_at
+                statuses[index] = "timeout"
+
+        for index, (name, _) in enumerate(calls):
+            if statuses[index] == "ok" and isinstance(results[index], dict) and results[index].get("error"):
+                statuses[index] = "error"
+            self.metrics.append({
+                "tool": name,
+                "latency_ms": int(latencies[index] * 1000),
+                "status": statuses[index]
+            })
+
+        elapsed = time.monotonic() - started_at
+        if len(calls) > 1:
+            logger.info(
+                f"⚙️ {len(calls)} ferramenta(s) em {elapsed:.2f}s "
+                f"(soma das latências {sum(latencies):.2f}s)"
+            )
+        return results
+
+    def _run_in_own_session(self, name: str, args: Dict) -> Tuple[Dict, float]:
+        """Executa uma ferramenta de consulta em sessão própria (somente leitura, exceto ML_API_TOOLS)"""
+        call_started = time.monotonic()
+        session = SessionLocal()
+        writable = name in ML_API_TOOLS
+        try:
+            if session.bind.dialect.name == "postgresql":
+                timeout_ms = TOOL_TIMEOUTS.get(name, DEFAULT_TOOL_TIMEOUT) * 1000
+                if not writable:
+                    session.execute(text("SET TRANSACTION READ ONLY"))
+                session.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+            worker = copy.copy(self.service)
+            worker.db = session
+            result = worker._execute_tool_function(name, args, self.thread_context)
+            if writable:
+                session.commit()
+        except Exception as e:
+            logger.error(f"❌ Erro ao executar ferramenta {name}: {e}", exc_info=True)
+            result = _error_result(e)
+        finally:
+            session.rollback()
+            session.close()
+        latency = time.monotonic() - call_started
+        logger.info(f"🔨 {name} concluída em {latency * 1000:.0f}ms")
+        return result, latency
+
+    def _run_in_conversation(self, name: str, args: Dict) -> Dict:
+        """Executa uma ferramenta de escrita na sessão da conversa"""
+        try:
+            return self.service._execute_tool_function(name, args, self.db_thread)
+        except Exception as e:
+            logger.error(f"❌ Erro ao executar ferramenta {name}: {e}", exc_info=True)
+            try:
+                self.service.db.rollback()
+            except Exception:
+                pass
+            return _error_result(e)
@@ -0,0 +1,233 @@
+"""
+Consultas das ferramentas de pedidos dos agentes de IA
+
+Tudo é resolvido no banco: filtro por item via containment JSONB em
+order_items (índice GIN ix_ml_orders_order_items_jsonb), agregações em SQL,
+projeção apenas das colunas usadas e teto de linhas aplicado no servidor.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import Integer, cast, column, func, or_, select, true
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session
+
+from app.models.saas_models import MLOrder, MLProduct, OrderStatus
+
+# Linhas devolvidas por padrão / no máximo para o modelo
+DEFAULT_TOOL_ROWS = 50
+MAX_TOOL_ROWS = 200
+PAID_STATUSES = [OrderStatus.PAID, OrderStatus.DELIVERED]
+
+# Projeção usada na listagem de pedidos
+ORDER_COLUMNS = [
+    MLOrder.ml_order_id, MLOrder.date_created, MLOrder.total_amount, MLOrder.status,
+    MLOrder.sale_fees, MLOrder.shipping_cost, MLOrder.coupon_amount, MLOrder.buyer_nickname
+]
+
+
+def clamp_rows(limit: Optional[int], default: int = DEFAULT_TOOL_ROWS) -> int:
+    """Limite de linhas pedido pelo modelo, dentro do teto"""
+    try:
+        limit = int(limit) if limit is not None else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, MAX_TOOL_ROWS))
+
+
+def order_items_jsonb():
+    # Mesma expressão do índice GIN (order_items::jsonb)
+    return cast(MLOrder.order_items, JSONB)
+
+
+def order_has_items(item_ids: Sequence[str]):
+    """Pedidos com algum dos anúncios (order_items @> '[{"item": {"id": ...}}]')"""
+    return or_(*[
+        order_items_jsonb().contains([{"item": {"id": str(item_id)}}])
+        for item_id in item_ids
+    ])
+
+
+def item_quantity(item_ids: Sequence[str]):
+    """Quantidade dos anúncios no pedido (subquery correlacionada sobre order_items)"""
+    element = func.jsonb_array_elements(order_items_jsonb()).table_valued(
+        column("value", JSONB)
+    ).alias("order_item")
+    quantity = func.coalesce(cast(element.c.value["quantity"].astext, Integer), 1)
+    return (
+        select(func.coalesce(func.sum(quantity), 0))
+        .where(element.c.value["item"]["id"].astext.in_([str(i) for i in item_ids]))
+        .scalar_subquery()
+    )
+
+
+def order_item_elements():
+    """order_items expandido (jsonb_array_elements) para junção lateral"""
+    return func.jsonb_array_elements(order_items_jsonb()).table_valued(
+        column("value", JSONB)
+    ).lateral("order_item")
+
+
+def advertised_item_ids(company_id: int, ml_account_id: Optional[int] = None):
+    """Subquery com os anúncios que tiveram venda por Product Ads"""
+    element = order_item_elements()
+    query = (select(element.c.value["item"]["id"].astext)
+             .select_from(MLOrder)
+             .join(element, true())
+             .where(MLOrder.company_id == company_id,
+                    MLOrder.is_advertising_sale == True))
+    if ml_account_id:
+        query = query.where(MLOrder.ml_account_id == ml_account_id)
+    return query.distinct()
+
+
+def order_has_item_in(item_query):
+    """Pedidos com algum anúncio da subquery (sem materializar a lista de ids)"""
+    element = func.jsonb_array_elements(order_items_jsonb()).table_valued(
+        column("value", JSONB)
+    ).alias("order_item")
+    return (
+        select(1)
+        .select_from(element)
+        .where(element.c.value["item"]["id"].astext.in_(item_query))
+        .exists()
+    )
+
+
+def product_item_ids_query(company_id: int, product_name: Optional[str] = None,
+                           seller_sku: Optional[str] = None, is_catalog: Optional[bool] = None):
+    """Subquery com os ml_item_ids dos anúncios que atendem aos filtros de produto"""
+    query = select(MLProduct.ml_item_id).where(
+        MLProduct.company_id == company_id,
+        MLProduct.ml_item_id.isnot(None)
+    )
+    if seller_sku:
+        query = query.where(MLProduct.seller_sku == seller_sku)
+    elif product_name:
+        query = query.where(MLProduct.title.ilike(f"%{product_name}%"))
+
+    if is_catalog is True:
+        query = query.where((MLProduct.catalog_listing == True) | (MLProduct.catalog_product_id.isnot(None)))
+    elif is_catalog is False:
+        query = query.where((MLProduct.catalog_listing == False) & (MLProduct.catalog_product_id.is_(None)))
+
+    return query
+
+
+def filter_orders(query, company_id: int, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  statuses: Optional[List[OrderStatus]] = None, item_ids: Optional[Sequence[str]] = None,
+                  item_query=None, buyer_nickname: Optional[str] = None):
+    """
+    Aplica os filtros comuns das ferramentas de pedidos
+
+    item_ids (lista) e item_query (subquery de product_item_ids_query) são
+    combinados com OU: o pedido precisa ter algum dos anúncios.
+    """
+    query = query.filter(MLOrder.company_id == company_id)
+    if since:
+        query = query.filter(MLOrder.date_created >= since)
+    if until:
+        query = query.filter(MLOrder.date_created < until)
+    if statuses:
+        query = query.filter(MLOrder.status.in_(statuses))
+    item_conditions = []
+    if item_ids:
+        item_conditions.append(order_has_items(item_ids))
+    if item_query is not None:
+        item_conditions.append(order_has_item_in(item_query))
+    if item_conditions:
+        query = query.filter(or_(*item_conditions))
+    if buyer_nickname:
+        query = query.filter(MLOrder.buyer_nickname.ilike(f"%{buyer_nickname}%"))
+    return query
+
+
+def list_orders(db: Session, company_id: int, limit: int, offset: int = 0, **filters) -> Dict:
+    """Página de pedidos (projeção) + total e somas de todo o filtro, em duas queries"""
+    totals = filter_orders(db.query(
+        func.count(MLOrder.id),
+        func.coalesce(func.sum(MLOrder.total_amount), 0),
+        func.coalesce(func.sum(MLOrder.sale_fees), 0),
+        func.coalesce(func.sum(MLOrder.shipping_cost), 0),
+        func.coalesce(func.sum(MLOrder.coupon_amount), 0),
+    ), company_id, **filters).one()
+
+    rows = (filter_orders(db.query(*ORDER_COLUMNS), company_id, **filters)
+            .order_by(MLOrder.date_created.desc(), MLOrder.id.desc())
+            .offset(offset)
+            .limit(limit)
+            .all())
+
+    total_count = int(totals[0] or 0)
+    return {
+        "pedidos": [serialize_order(row) for row in rows],
+        "total_pedidos": total_count,
+        "resumo": {
+            "valor_total": float(totals[1] or 0),
+            "comissoes": float(totals[2] or 0),
+            "frete": float(totals[3] or 0),
+            "desconto": float(totals[4] or 0),
+        },
+        "tem_mais": offset + len(rows) < total_count,
+    }
+
+
+def item_sales(db: Session, company_id: int, item_id: str, limit: int, offset: int = 0, **filters) -> List[Dict]:
+    """Pedidos que contêm o anúncio, com a quantidade do anúncio em cada um"""
+    quantity = item_quantity([item_id]).label("quantity")
+    rows = (filter_orders(db.query(MLOrder.ml_order_id, MLOrder.date_created, MLOrder.status,
+                                   MLOrder.total_amount, quantity),
+                          company_id, item_ids=[item_id], **filters)
+            .order_by(MLOrder.date_created.desc(), MLOrder.id.desc())
+            .offset(offset)
+            .limit(limit)
+            .all())
+    return [{
+        "id_pedido": str(row.ml_order_id),
+        "data": row.date_created.isoformat() if row.date_created else None,
+        "status": status_value(row.status),
+        "valor_total": float(row.total_amount) if row.total_amount else 0.0,
+        "quantidade": int(row.quantity or 0),
+    } for row in rows]
+
+
+def item_aggregates(db: Session, company_id: int, item_id: str, since: datetime) -> Dict:
+    """Receita, pedidos pagos, quantidade, comissões, frete e descontos do anúncio no período"""
+    quantity = item_quantity([item_id])
+    row = filter_orders(db.query(
+        func.count(MLOrder.id),
+        func.coalesce(func.sum(MLOrder.total_amount), 0),
+        func.count(MLOrder.id).filter(MLOrder.status.in_(PAID_STATUSES)),
+        func.coalesce(func.sum(quantity), 0),
+        func.coalesce(func.sum(MLOrder.sale_fees), 0),
+        func.coalesce(func.sum(MLOrder.shipping_cost), 0),
+        func.coalesce(func.sum(MLOrder.coupon_amount), 0),
+    ), company_id, since=since, item_ids=[item_id]).one()
+    return {
+        "orders": int(row[0] or 0),
+        "revenue": float(row[1] or 0),
+        "paid_orders": int(row[2] or 0),
+        "quantity": int(row[3] or 0),
+        "fees": float(row[4] or 0),
+        "shipping": float(row[5] or 0),
+        "discounts": float(row[6] or 0),
+    }
+
+
+def status_value(status) -> Optional[str]:
+    if status is None:
+        return None
+    return status.value if hasattr(status, "value") else str(status)
+
+
+def serialize_order(row) -> Dict:
+    return {
+        "id_pedido": str(row.ml_order_id),
+        "data": row.date_created.isoformat() if row.date_created else None,
+        "valor_total": float(row.total_amount) if row.total_amount else 0.0,
+        "status": status_value(row.status),
+        "comissoes": float(row.sale_fees) if row.sale_fees else 0.0,
+        "frete": float(row.shipping_cost) if row.shipping_cost else 0.0,
+        "desconto": float(row.coupon_amount) if row.coupon_amount else 0.0,
+        "comprador": row.buyer_nickname,
+    }
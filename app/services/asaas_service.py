@@ -428,6 +428,61 @@ class AsaasService:
             logger.error(f"❌ Erro ao buscar pagamentos da assinatura {subscription_id}: {e}")
             raise e
     
+    def _list_all(self, endpoint: str, page_size: int = 100, max_items: int = 50000) -> List[Dict[str, Any]]:
+        """
+        Percorre todas as páginas de uma listagem do Asaas ({"data": [...], "hasMore": bool})
+
+        Args:
+            endpoint: Endpoint com filtros (ex: /payments?status=PENDING)
+            page_size: Itens por página (máximo do Asaas: 100)
+            max_items: Limite de segurança
+        """
+        items = []
+        offset = 0
+        separator = "&" if "?" in endpoint else "?"
+        while True:
+            result = self._make_request("GET", f"{endpoint}{separator}limit={page_size}&offset={offset}")
+            page = result.get("data", []) if isinstance(result, dict) else (result if isinstance(result, list) else [])
+            items.extend(page)
+            if not page or not (isinstance(result, dict) and result.get("hasMore")):
+                break
+            offset += page_size
+            if offset >= max_items:
+                logger.warning(f"⚠️ Limite de paginação atingido em {endpoint}")
+                break
+        return items
+
+    def list_subscriptions(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Lista todas as assinaturas da conta (paginado)
+
+        Args:
+            status: ACTIVE, EXPIRED ou INACTIVE (opcional)
+        """
+        try:
+            endpoint = f"/subscriptions?status={status}" if status else "/subscriptions"
+            subscriptions = self._list_all(endpoint)
+            logger.info(f"📋 {len(subscriptions)} assinatura(s) listada(s) no Asaas" + (f" ({status})" if status else ""))
+            return subscriptions
+        except Exception as e:
+            logger.error(f"❌ Erro ao listar assinaturas: {e}")
+            raise e
+
+    def list_payments(self, status: str) -> List[Dict[str, Any]]:
+        """
+        Lista todos os pagamentos da conta com o status informado (paginado)
+
+        Args:
+            status: PENDING, OVERDUE, RECEIVED, CONFIRMED...
+        """
+        try:
+            payments = self._list_all(f"/payments?status={status}")
+            logger.info(f"📋 {len(payments)} pagamento(s) {status} listado(s) no Asaas")
+            return payments
+        except Exception as e:
+            logger.error(f"❌ Erro ao listar pagamentos {status}: {e}")
+            raise e
+
     def get_customer_payments(self, customer_id: str, limit: int = 100) -> List[Dict[str, Any]]:
         """
         Lista TODOS os pagamentos de um cliente (pendentes, pagos, vencidos, etc.)
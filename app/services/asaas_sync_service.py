@@ -2,36 +2,65 @@
 Serviço de sincronização diária com Asaas
 Sincroniza status e datas de vencimento das assinaturas
 Inativa empresas quando necessário
+
+Reconciliação em massa:
+- assinaturas e pagamentos pendentes/vencidos são listados do Asaas em páginas
+  (poucas chamadas para a conta inteira) e agrupados por assinatura em memória
+- o estado calculado é comparado com o local e só as assinaturas que mudaram
+  são gravadas
+- assinaturas ausentes da listagem (ex.: removidas) são consultadas uma a uma,
+  em paralelo limitado
+- dry_run calcula e devolve as alterações sem gravar
 """
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, Any, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import or_
 
 from app.models.saas_models import Subscription, Company, CompanyStatus
 from app.services.asaas_service import asaas_service
 
 logger = logging.getLogger(__name__)
 
+# Consultas individuais simultâneas ao Asaas (assinaturas fora da listagem)
+MAX_CONCURRENT_REQUESTS = 4
+# Status dos pagamentos que definem próxima parcela / parcelas vencidas
+OPEN_PAYMENT_STATUSES = ["PENDING", "OVERDUE"]
+
+# Mapear status do Asaas para nosso sistema
+STATUS_MAPPING = {
+    "ACTIVE": "active",
+    "INACTIVE": "inactive",
+    "EXPIRED": "inactive",
+    "CANCELLED": "inactive"
+}
+
 
 class AsaasSyncService:
     """Serviço para sincronização diária com Asaas"""
-    
+
     def __init__(self, db: Session):
         self.db = db
         self.asaas_service = asaas_service
-    
-    def sync_all_subscriptions(self) -> Dict[str, Any]:
+
+    def sync_all_subscriptions(self, dry_run: bool = False) -> Dict[str, Any]:
         """
         Sincroniza todas as assinaturas ativas/pendentes com o Asaas
-        
+
+        Args:
+            dry_run: Apenas calcula as alterações, sem gravar
+
         Returns:
-            Dict com estatísticas da sincronização
+            Dict com estatísticas da sincronização (inclui tempos de cada etapa)
         """
+        started_at = time.monotonic()
+        timings = {}
         try:
-            logger.info("🔄 Iniciando sincronização diária com Asaas...")
-            
+            logger.info(f"🔄 Iniciando sincronização diária com Asaas{' (dry-run)' if dry_run else ''}...")
+
             # Buscar todas as assinaturas que precisam ser sincronizadas
             subscriptions = self.db.query(Subscription).filter(
                 or_(
@@ -41,42 +70,111 @@ class AsaasSyncService:
                 ),
                 Subscription.asaas_subscription_id.isnot(None)
             ).all()
-            
+
             logger.info(f"📊 Encontradas {len(subscriptions)} assinaturas para sincronizar")
-            
+
             stats = {
                 "total": len(subscriptions),
+                "unchanged": 0,
                 "updated": 0,
                 "inactivated": 0,
                 "errors": 0,
+                "api_calls": 0,
+                "individual_lookups": 0,
+                "dry_run": dry_run,
                 "details": []
             }
-            
+            if not subscriptions:
+                return {"success": True, "stats": stats}
+
+            # 1. Estado remoto em massa
+            step_started = time.monotonic()
+            remote_subscriptions, payments_by_subscription, api_calls = self._fetch_remote_state()
+            stats["api_calls"] += api_calls
+
+            # 2. Assinaturas fora da listagem: consulta individual em paralelo limitado
+            missing = [s.asaas_subscription_id for s in subscriptions if s.asaas_subscription_id not in remote_subscriptions]
+            if missing:
+                lookups = self._fetch_individually(missing)
+                stats["individual_lookups"] = len(missing)
+                stats["api_calls"] += 2 * len(missing)
+                for asaas_id, (remote, payments, error) in lookups.items():
+                    if error:
+                        remote_subscriptions[asaas_id] = {"_error": error}
+                        continue
+                    if remote:
+                        remote_subscriptions[asaas_id] = remote
+                    payments_by_subscription[asaas_id] = [
+                        p for p in payments if (p.get("status") or "").upper() in OPEN_PAYMENT_STATUSES
+                    ]
+            timings["fetch_seconds"] = round(time.monotonic() - step_started, 2)
+
+            # 3. Diferenças com o estado local
+            step_started = time.monotonic()
+            companies = {
+                company.id: company
+                for company in self.db.query(Company).filter(
+                    Company.id.in_({s.company_id for s in subscriptions if s.company_id})
+                ).all()
+            }
+            now = datetime.now()
+            plans = []
             for subscription in subscriptions:
-                try:
-                    result = self._sync_single_subscription(subscription)
-                    stats["updated"] += result.get("updated", 0)
-                    stats["inactivated"] += result.get("inactivated", 0)
-                    stats["errors"] += result.get("errors", 0)
-                    stats["details"].append(result)
-                except Exception as e:
-                    logger.error(f"❌ Erro ao sincronizar assinatura {subscription.id}: {e}")
+                remote = remote_subscriptions.get(subscription.asaas_subscription_id)
+                if remote is None:
+                    logger.warning(f"⚠️ Assinatura {subscription.asaas_subscription_id} não encontrada no Asaas")
+                    stats["unchanged"] += 1
+                    continue
+                if remote.get("_error"):
                     stats["errors"] += 1
                     stats["details"].append({
                         "subscription_id": subscription.id,
                         "company_id": subscription.company_id,
-                        "error": str(e)
+                        "error": remote["_error"]
                     })
-            
-            self.db.commit()
-            
-            logger.info(f"✅ Sincronização concluída: {stats['updated']} atualizadas, {stats['inactivated']} inativadas, {stats['errors']} erros")
-            
+                    continue
+                plan = self._plan_subscription(
+                    subscription,
+                    remote,
+                    payments_by_subscription.get(subscription.asaas_subscription_id, []),
+                    companies.get(subscription.company_id),
+                    now
+                )
+                if plan["changes"] or plan["inactivate_company"]:
+                    plans.append(plan)
+                else:
+                    stats["unchanged"] += 1
+            timings["diff_seconds"] = round(time.monotonic() - step_started, 2)
+
+            # 4. Aplicar apenas o que mudou
+            step_started = time.monotonic()
+            for plan in plans:
+                stats["updated"] += 1
+                if plan["inactivate_company"]:
+                    stats["inactivated"] += 1
+                stats["details"].append(self._describe(plan))
+                if not dry_run:
+                    self._apply_plan(plan, now)
+
+            if dry_run:
+                self.db.rollback()
+            else:
+                self.db.commit()
+            timings["apply_seconds"] = round(time.monotonic() - step_started, 2)
+            timings["total_seconds"] = round(time.monotonic() - started_at, 2)
+            stats["timings"] = timings
+
+            logger.info(
+                f"✅ Sincronização concluída{' (dry-run)' if dry_run else ''} em {timings['total_seconds']}s: "
+                f"{stats['updated']} atualizadas, {stats['unchanged']} sem alteração, "
+                f"{stats['inactivated']} inativadas, {stats['errors']} erros, {stats['api_calls']} chamadas ao Asaas"
+            )
+
             return {
                 "success": True,
                 "stats": stats
             }
-            
+
         except Exception as e:
             self.db.rollback()
             logger.error(f"❌ Erro na sincronização diária com Asaas: {e}")
@@ -86,14 +184,153 @@ class AsaasSyncService:
                 "success": False,
                 "error": str(e)
             }
-    
+
+    def _fetch_remote_state(self) -> Tuple[Dict[str, Dict], Dict[str, List[Dict]], int]:
+        """
+        Lista assinaturas e pagamentos em aberto da conta no Asaas
+
+        Returns:
+            (assinaturas por id, pagamentos em aberto por id de assinatura, páginas consultadas)
+        """
+        remote_subscriptions = {s.get("id"): s for s in self.asaas_service.list_subscriptions() if s.get("id")}
+        pages = max(1, -(-len(remote_subscriptions) // 100))
+
+        payments_by_subscription: Dict[str, List[Dict]] = {}
+        for status in OPEN_PAYMENT_STATUSES:
+            payments = self.asaas_service.list_payments(status)
+            pages += max(1, -(-len(payments) // 100))
+            for payment in payments:
+                if payment.get("subscription"):
+                    payments_by_subscription.setdefault(payment["subscription"], []).append(payment)
+
+        return remote_subscriptions, payments_by_subscription, pages
+
+    def _fetch_individually(self, asaas_ids: List[str]) -> Dict[str, Tuple[Optional[Dict], List[Dict], Optional[str]]]:
+        """Busca assinatura + pagamentos de cada id em paralelo limitado (sem acesso ao banco)"""
+        def fetch(asaas_id: str):
+            try:
+                remote = self.asaas_service.get_subscription(asaas_id)
+                payments = self.asaas_service.get_subscription_payments(asaas_id) if remote else []
+                return asaas_id, (remote or None, payments, None)
+            except Exception as e:
+                return asaas_id, (None, [], str(e))
+
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+            return dict(executor.map(fetch, asaas_ids))
+
+    def _plan_subscription(self, subscription: Subscription, asaas_subscription: Dict, payments: List[Dict],
+                           company: Optional[Company], now: datetime) -> Dict[str, Any]:
+        """
+        Calcula o novo estado da assinatura (mesmas regras da sincronização individual)
+        e devolve apenas os campos que mudaram
+        """
+        asaas_status = (asaas_subscription.get("status") or "").upper()
+        if asaas_subscription.get("deleted"):
+            asaas_status = "CANCELLED"
+        new_status = STATUS_MAPPING.get(asaas_status, subscription.status)
+
+        # Encontrar próxima parcela pendente e parcelas vencidas
+        next_due_date = None
+        overdue_count = 0
+        for payment in payments:
+            payment_status = (payment.get("status") or "").upper()
+            due_date_str = payment.get("dueDate")
+            if payment_status not in OPEN_PAYMENT_STATUSES or not due_date_str:
+                continue
+            try:
+                due_date = datetime.strptime(due_date_str, "%Y-%m-%d")
+            except Exception as e:
+                logger.warning(f"⚠️ Erro ao processar data de vencimento {due_date_str}: {e}")
+                continue
+            if due_date >= now:
+                if not next_due_date or due_date < next_due_date:
+                    next_due_date = due_date
+            else:
+                overdue_count += 1
+
+        target = {"status": new_status}
+        if next_due_date:
+            target["next_charge_date"] = next_due_date
+            target["ends_at"] = next_due_date
+        else:
+            # Não há parcelas futuras, usar data de término da assinatura do Asaas
+            end_date_str = asaas_subscription.get("endDate")
+            if end_date_str:
+                try:
+                    target["ends_at"] = datetime.strptime(end_date_str, "%Y-%m-%d")
+                except ValueError:
+                    pass
+
+        # Inativar empresa: sem parcelas futuras, com parcelas vencidas ou assinatura encerrada no Asaas
+        reasons = []
+        if not next_due_date:
+            reasons.append("sem parcelas futuras pendentes")
+        if overdue_count:
+            reasons.append(f"{overdue_count} parcela(s) vencida(s)")
+        if asaas_status in ["INACTIVE", "EXPIRED", "CANCELLED"]:
+            reasons.append(f"{asaas_status} no Asaas")
+
+        inactivate_company = bool(reasons) and company is not None and company.status != CompanyStatus.INACTIVE
+        if inactivate_company:
+            target["status"] = "inactive"
+            target["is_trial"] = False
+
+        changes = {
+            field: (getattr(subscription, field), value)
+            for field, value in target.items()
+            if getattr(subscription, field) != value
+        }
+        return {
+            "subscription": subscription,
+            "company": company,
+            "changes": changes,
+            "inactivate_company": inactivate_company,
+            "reasons": reasons,
+            "next_due_date": next_due_date
+        }
+
+    def _apply_plan(self, plan: Dict[str, Any], now: datetime):
+        subscription = plan["subscription"]
+        for field, (_, value) in plan["changes"].items():
+            setattr(subscription, field, value)
+        subscription.updated_at = now
+
+        if plan["inactivate_company"]:
+            company = plan["company"]
+            company.status = CompanyStatus.INACTIVE
+            company.updated_at = now
+            logger.info(
+                f"🔴 Empresa {company.id} ({company.name}) inativada devido a assinatura vencida/cancelada "
+                f"({', '.join(plan['reasons'])})"
+            )
+
+        next_due_str = plan["next_due_date"].strftime('%d/%m/%Y') if plan["next_due_date"] else 'N/A'
+        logger.info(f"✅ Assinatura {subscription.id} sincronizada: status={subscription.status}, próxima_parcela={next_due_str}")
+
+    @staticmethod
+    def _describe(plan: Dict[str, Any]) -> Dict[str, Any]:
+        subscription = plan["subscription"]
+        return {
+            "subscription_id": subscription.id,
+            "company_id": subscription.company_id,
+            "changes": {
+                field: {
+                    "from": old.isoformat() if isinstance(old, datetime) else old,
+                    "to": new.isoformat() if isinstance(new, datetime) else new
+                }
+                for field, (old, new) in plan["changes"].items()
+            },
+            "inactivate_company": plan["inactivate_company"],
+            "reasons": plan["reasons"]
+        }
+
     def _sync_single_subscription(self, subscription: Subscription) -> Dict[str, Any]:
         """
         Sincroniza uma única assinatura com o Asaas
-        
+
         Args:
             subscription: Objeto Subscription
-            
+
         Returns:
             Dict com resultado da sincronização
         """
@@ -104,125 +341,35 @@ class AsaasSyncService:
             "inactivated": 0,
             "errors": 0
         }
-        
+
         try:
             asaas_subscription_id = subscription.asaas_subscription_id
-            
+
             if not asaas_subscription_id:
                 logger.warning(f"⚠️ Assinatura {subscription.id} não tem asaas_subscription_id")
                 return result
-            
+
             # Buscar dados da assinatura no Asaas
             asaas_subscription = self.asaas_service.get_subscription(asaas_subscription_id)
-            
+
             if not asaas_subscription:
                 logger.warning(f"⚠️ Assinatura {asaas_subscription_id} não encontrada no Asaas")
                 return result
-            
-            # Atualizar status da assinatura
-            asaas_status = asaas_subscription.get("status", "").upper()
-            
-            # Mapear status do Asaas para nosso sistema
-            status_mapping = {
-                "ACTIVE": "active",
-                "INACTIVE": "inactive",
-                "EXPIRED": "inactive",
-                "CANCELLED": "inactive"
-            }
-            
-            new_status = status_mapping.get(asaas_status, subscription.status)
-            
-            # Buscar pagamentos da assinatura para verificar parcelas
+
             subscription_payments = self.asaas_service.get_subscription_payments(asaas_subscription_id)
-            
-            # Encontrar próxima parcela pendente
+            company = self.db.query(Company).filter(Company.id == subscription.company_id).first()
+
             now = datetime.now()
-            next_pending_payment = None
-            overdue_payments = []
-            
-            for payment in subscription_payments:
-                payment_status = payment.get("status", "").upper()
-                due_date_str = payment.get("dueDate")
-                
-                if due_date_str:
-                    try:
-                        due_date = datetime.strptime(due_date_str, "%Y-%m-%d")
-                        
-                        if payment_status in ["PENDING", "OVERDUE"]:
-                            if due_date >= now:
-                                # Parcela futura pendente
-                                if not next_pending_payment or due_date < next_pending_payment["dueDate"]:
-                                    next_pending_payment = {
-                                        "dueDate": due_date,
-                                        "payment": payment
-                                    }
-                            elif due_date < now:
-                                # Parcela vencida
-                                overdue_payments.append({
-                                    "dueDate": due_date,
-                                    "payment": payment
-                                })
-                    except Exception as e:
-                        logger.warning(f"⚠️ Erro ao processar data de vencimento {due_date_str}: {e}")
-            
-            # Atualizar assinatura
-            subscription.status = new_status
-            subscription.updated_at = datetime.now()
-            
-            # Atualizar datas de vencimento
-            if next_pending_payment:
-                subscription.next_charge_date = next_pending_payment["dueDate"]
-                subscription.ends_at = next_pending_payment["dueDate"]
-            else:
-                # Não há parcelas futuras, usar data de término da assinatura do Asaas
-                end_date_str = asaas_subscription.get("endDate")
-                if end_date_str:
-                    try:
-                        subscription.ends_at = datetime.strptime(end_date_str, "%Y-%m-%d")
-                    except:
-                        pass
-            
-            # Verificar se deve inativar a empresa
-            should_inactivate = False
-            
-            # Condição 1: Não há parcelas futuras pendentes
-            if not next_pending_payment:
-                logger.info(f"⚠️ Assinatura {subscription.id} não tem parcelas futuras pendentes")
-                should_inactivate = True
-            
-            # Condição 2: Há parcelas vencidas
-            if overdue_payments:
-                logger.info(f"⚠️ Assinatura {subscription.id} tem {len(overdue_payments)} parcela(s) vencida(s)")
-                should_inactivate = True
-            
-            # Condição 3: Status da assinatura no Asaas é inativo/expirado/cancelado
-            if asaas_status in ["INACTIVE", "EXPIRED", "CANCELLED"]:
-                logger.info(f"⚠️ Assinatura {subscription.id} está {asaas_status} no Asaas")
-                should_inactivate = True
-            
-            # Inativar empresa se necessário
-            if should_inactivate:
-                company = self.db.query(Company).filter(Company.id == subscription.company_id).first()
-                if company and company.status != CompanyStatus.INACTIVE:
-                    company.status = CompanyStatus.INACTIVE
-                    company.updated_at = datetime.now()
-                    logger.info(f"🔴 Empresa {company.id} ({company.name}) inativada devido a assinatura vencida/cancelada")
-                    result["inactivated"] = 1
-                    
-                    # Atualizar assinatura também
-                    subscription.status = "inactive"
-                    subscription.is_trial = False
-            
-            result["updated"] = 1
-            
-            next_due_str = next_pending_payment['dueDate'].strftime('%d/%m/%Y') if next_pending_payment else 'N/A'
-            logger.info(f"✅ Assinatura {subscription.id} sincronizada: status={new_status}, próxima_parcela={next_due_str}")
-            
+            plan = self._plan_subscription(subscription, asaas_subscription, subscription_payments, company, now)
+            if plan["changes"] or plan["inactivate_company"]:
+                self._apply_plan(plan, now)
+                result["updated"] = 1
+                result["inactivated"] = 1 if plan["inactivate_company"] else 0
+
         except Exception as e:
             logger.error(f"❌ Erro ao sincronizar assinatura {subscription.id}: {e}")
             import traceback
             logger.error(traceback.format_exc())
             result["errors"] = 1
-        
-        return result
 
+        return result
@@ -3,16 +3,34 @@ Serviço para gerenciar Briefings de Marketing
 """
 import logging
 import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Dict, Any, Optional, List
 from datetime import datetime
+from types import SimpleNamespace
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
+from app.config.database import SessionLocal
 from app.models.content_models import ContentBriefing
 from app.services.agent_executor_service import AgentExecutorService
 from app.models.saas_models import OpenAIAssistant
 
 logger = logging.getLogger(__name__)
 
+# Agentes da cadeia executados ao mesmo tempo
+MAX_PARALLEL_AGENTS = 4
+
+# Mapeamento de nomes de agentes (para compatibilidade)
+AGENT_NAME_MAPPING = {
+    "Geração de Texto": "Criação de Texto",
+    "Geração de Imagens": "Geração de Imagem"
+}
+
+# Dependências padrão entre agentes (por chave de conteúdo). Todos recebem a pesquisa;
+# os demais só dependem da pesquisa e rodam em paralelo
+AGENT_DEPENDENCIES = {
+    "imagens": ["texto_completo"],
+}
+
 
 class BriefingService:
     """Serviço para gerenciar Briefings de Marketing"""
@@ -125,12 +143,13 @@ class BriefingService:
                 user=user,
                 message=prompt,
                 context_data={
-                    "briefing": briefing.to_dict()
+                    "briefing": briefing.to_dict(include_execution_state=False)
                 }
             )
             
             if result.get("success"):
                 briefing.pesquisa_resultado = result.get("content", "")
+                briefing.etapas_execucao = None  # Nova pesquisa invalida etapas já geradas
                 briefing.status = "draft"  # Voltar para draft após pesquisa
                 self.db.commit()
                 
@@ -183,7 +202,7 @@ class BriefingService:
                 user=user,
                 message=prompt,
                 context_data={
-                    "briefing": briefing.to_dict(),
+                    "briefing": briefing.to_dict(include_execution_state=False),
                     "pesquisa": briefing.pesquisa_resultado
                 }
             )
@@ -193,6 +212,7 @@ class BriefingService:
                 agents_list = self._parse_agents_list(result.get("content", ""))
                 
                 briefing.agentes_identificados = agents_list
+                briefing.etapas_execucao = None  # Nova cadeia: etapas anteriores não valem mais
                 self.db.commit()
                 
                 return {
@@ -214,7 +234,14 @@ class BriefingService:
             return {"success": False, "error": str(e)}
     
     def execute_agents_chain(self, briefing_id: int, company_id: Optional[int], user: dict) -> Dict[str, Any]:
-        """Executa agentes encadeadamente (company_id pode ser None para superadmin)"""
+        """
+        Executa os agentes identificados respeitando as dependências entre eles (company_id pode ser None para superadmin)
+        
+        Agentes sem dependência pendente rodam em paralelo, cada um com sua própria sessão.
+        O resultado de cada agente é salvo em etapas_execucao assim que termina: ao executar
+        de novo uma cadeia que falhou, os agentes já concluídos são reaproveitados.
+        """
+        briefing = None
         try:
             query = self.db.query(ContentBriefing).filter(ContentBriefing.id == briefing_id)
             if company_id is not None:
@@ -233,81 +260,200 @@ class BriefingService:
             
             # Lista de agentes a executar
             agents_list = briefing.agentes_identificados if isinstance(briefing.agentes_identificados, list) else []
-            
-            # Resultados acumulados
-            generated_content = {}
-            previous_results = {}
-            
-            # Mapeamento de nomes de agentes (para compatibilidade)
-            agent_name_mapping = {
-                "Geração de Texto": "Criação de Texto",
-                "Geração de Imagens": "Geração de Imagem"
+            steps = self._build_chain_steps(agents_list)
+            
+            # Estado salvo de uma execução anterior (apenas etapas concluídas são reaproveitadas)
+            saved_steps = briefing.etapas_execucao if isinstance(briefing.etapas_execucao, dict) else {}
+            step_states = {
+                name: saved_steps[name]
+                for name in steps
+                if isinstance(saved_steps.get(name), dict) and saved_steps[name].get("status") == "completed"
             }
+            if step_states:
+                logger.info(f"♻️ Briefing {briefing_id}: retomando cadeia, {len(step_states)} agente(s) já concluído(s)")
             
-            # Executar cada agente na ordem
-            for agent_name in agents_list:
-                try:
-                    # Aplicar mapeamento se necessário
-                    search_name = agent_name_mapping.get(agent_name, agent_name)
-                    
-                    # Buscar agente pelo nome
-                    agent = self.db.query(OpenAIAssistant).filter(
-                        OpenAIAssistant.name == search_name,
-                        OpenAIAssistant.is_active == True
-                    ).first()
-                    
-                    if not agent:
-                        logger.warning(f"Agente '{agent_name}' (procurado como '{search_name}') não encontrado, pulando...")
-                        continue
+            # Resolver agentes pelo nome (na sessão principal)
+            agent_ids = {}
+            for name in steps:
+                if name in step_states:
+                    continue
+                search_name = AGENT_NAME_MAPPING.get(name, name)
+                agent = self.db.query(OpenAIAssistant).filter(
+                    OpenAIAssistant.name == search_name,
+                    OpenAIAssistant.is_active == True
+                ).first()
+                if agent:
+                    agent_ids[name] = agent.id
+                else:
+                    logger.warning(f"Agente '{name}' (procurado como '{search_name}') não encontrado, pulando...")
+                    step_states[name] = {"status": "skipped", "error": f"Agente '{search_name}' não encontrado"}
+            
+            # Cópia desanexada do briefing para os workers (a sessão principal faz commit durante a cadeia)
+            briefing_data = briefing.to_dict(include_execution_state=False)
+            briefing_view = SimpleNamespace(**briefing_data)
+            self._save_chain_state(briefing, step_states)
+            
+            pending = {name for name in steps if name not in step_states}
+            running = {}
+            with ThreadPoolExecutor(max_workers=MAX_PARALLEL_AGENTS, thread_name_prefix="briefing-agent") as pool:
+                while pending or running:
+                    # Dependências com falha bloqueiam os dependentes
+                    for name in sorted(pending):
+                        failed = [dep for dep in steps[name] if step_states.get(dep, {}).get("status") in ("error", "blocked")]
+                        if failed:
+                            pending.discard(name)
+                            step_states[name] = {"status": "blocked", "error": f"Dependência com falha: {', '.join(failed)}"}
                     
-                    # Construir prompt com contexto
-                    prompt = self._build_agent_prompt(briefing, agent_name, previous_results)
+                    # Disparar todos os agentes com dependências concluídas (ou puladas)
+                    for name in [n for n in steps if n in pending]:
+                        if all(step_states.get(dep, {}).get("status") in ("completed", "skipped") for dep in steps[name]):
+                            pending.discard(name)
+                            previous_results = {
+                                dep: step_states[dep]["content"]
+                                for dep in steps[name]
+                                if step_states.get(dep, {}).get("status") == "completed"
+                            }
+                            logger.info(f"🚀 Briefing {briefing_id}: iniciando agente '{name}'")
+                            future = pool.submit(
+                                self._run_chain_agent, agent_ids[name], name, briefing_view, briefing_data,
+                                previous_results, user
+                            )
+                            running[future] = name
                     
-                    # Executar agente
-                    result = self.executor.execute(
-                        agent_id=agent.id,
-                        user=user,
-                        message=prompt,
-                        context_data={
-                            "briefing": briefing.to_dict(),
-                            "pesquisa": briefing.pesquisa_resultado,
-                            "previous_results": previous_results
-                        }
-                    )
+                    if not running:
+                        # Nada executável: dependência circular ou agente inexistente na cadeia
+                        for name in pending:
+                            step_states[name] = {"status": "blocked", "error": "Dependência circular ou não resolvida"}
+                        pending.clear()
+                        break
                     
-                    if result.get("success"):
-                        # Salvar resultado
-                        content_key = self._get_content_key_for_agent(agent_name)
-                        generated_content[content_key] = result.get("content", "")
-                        previous_results[agent_name] = result.get("content", "")
-                    else:
-                        logger.error(f"Erro ao executar agente {agent_name}: {result.get('error')}")
-                        generated_content[content_key] = f"Erro: {result.get('error')}"
-                        
-                except Exception as e:
-                    logger.error(f"Erro ao executar agente {agent_name}: {e}", exc_info=True)
-                    continue
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        step_states[name] = future.result()
+                        self._save_chain_state(briefing, step_states)
+                        logger.info(
+                            f"{'✅' if step_states[name]['status'] == 'completed' else '❌'} Briefing {briefing_id}: "
+                            f"agente '{name}' em {step_states[name].get('duration_seconds', 0):.1f}s"
+                        )
+            
+            # Conteúdo gerado na ordem definida pelo orquestrador
+            generated_content = {}
+            for name in steps:
+                state = step_states.get(name, {})
+                if state.get("status") == "completed":
+                    generated_content[self._get_content_key_for_agent(name)] = state.get("content", "")
+                elif state.get("status") in ("error", "blocked"):
+                    generated_content[self._get_content_key_for_agent(name)] = f"Erro: {state.get('error')}"
+            
+            failed_steps = [name for name in steps if step_states.get(name, {}).get("status") in ("error", "blocked")]
             
             # Salvar conteúdo gerado
             briefing.conteudo_gerado = generated_content
-            briefing.status = "completed"
-            self.db.commit()
+            briefing.status = "error" if failed_steps else "completed"
+            self._save_chain_state(briefing, step_states)
             
-            return {
+            result = {
                 "success": True,
                 "data": {
                     "briefing_id": briefing_id,
-                    "conteudo_gerado": generated_content
+                    "conteudo_gerado": generated_content,
+                    "etapas_execucao": step_states
                 }
             }
+            if failed_steps:
+                result["data"]["agentes_com_falha"] = failed_steps
+            return result
             
         except Exception as e:
             self.db.rollback()
             logger.error(f"Erro ao executar cadeia de agentes: {e}", exc_info=True)
-            briefing.status = "error"
-            self.db.commit()
+            if briefing is not None:
+                briefing.status = "error"
+                self.db.commit()
             return {"success": False, "error": str(e)}
     
+    def has_resumable_chain(self, briefing_id: int, company_id: Optional[int]) -> bool:
+        """Indica se a última cadeia de agentes falhou e pode ser retomada"""
+        query = self.db.query(ContentBriefing).filter(ContentBriefing.id == briefing_id)
+        if company_id is not None:
+            query = query.filter(ContentBriefing.company_id == company_id)
+        briefing = query.first()
+        return bool(
+            briefing
+            and briefing.status == "error"
+            and briefing.agentes_identificados
+            and isinstance(briefing.etapas_execucao, dict)
+            and any(step.get("status") == "completed" for step in briefing.etapas_execucao.values() if isinstance(step, dict))
+        )
+    
+    def _build_chain_steps(self, agents_list: List[Any]) -> Dict[str, List[str]]:
+        """
+        Monta {agente: [dependências]} a partir da lista do orquestrador.
+        
+        Itens podem ser o nome do agente (dependências de AGENT_DEPENDENCIES) ou
+        {"agente": nome, "depende_de": [nomes]}. Só valem dependências presentes na cadeia.
+        """
+        declared = {}
+        for item in agents_list:
+            if isinstance(item, dict):
+                name = item.get("agente") or item.get("nome")
+                if name:
+                    declared[name] = item.get("depende_de")
+            elif isinstance(item, str):
+                declared[item] = None
+        
+        keys = {name: self._get_content_key_for_agent(name) for name in declared}
+        steps = {}
+        for name, deps in declared.items():
+            if deps is None:
+                dep_keys = AGENT_DEPENDENCIES.get(keys[name], [])
+                deps = [other for other in declared if other != name and keys[other] in dep_keys]
+            steps[name] = [dep for dep in deps if dep in declared and dep != name]
+        return steps
+    
+    def _run_chain_agent(self, agent_id: int, agent_name: str, briefing: SimpleNamespace, briefing_data: Dict[str, Any],
+                         previous_results: Dict[str, str], user: dict) -> Dict[str, Any]:
+        """Executa um agente da cadeia em sessão própria (roda no pool)"""
+        started_at = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            prompt = self._build_agent_prompt(briefing, agent_name, previous_results)
+            result = AgentExecutorService(db).execute(
+                agent_id=agent_id,
+                user=user,
+                message=prompt,
+                context_data={
+                    "briefing": briefing_data,
+                    "pesquisa": briefing_data.get("pesquisa_resultado"),
+                    "previous_results": previous_results
+                }
+            )
+            if result.get("success"):
+                state = {"status": "completed", "content": result.get("content", "")}
+            else:
+                logger.error(f"Erro ao executar agente {agent_name}: {result.get('error')}")
+                state = {"status": "error", "error": result.get("error", "Erro desconhecido")}
+        except Exception as e:
+            logger.error(f"Erro ao executar agente {agent_name}: {e}", exc_info=True)
+            state = {"status": "error", "error": str(e)}
+        finally:
+            db.close()
+        
+        finished_at = datetime.utcnow()
+        state.update({
+            "depende_de": list(previous_results.keys()),
+            "started_at": started_at.isoformat(),
+            "finished_at": finished_at.isoformat(),
+            "duration_seconds": (finished_at - started_at).total_seconds()
+        })
+        return state
+    
+    def _save_chain_state(self, briefing: ContentBriefing, step_states: Dict[str, Dict[str, Any]]):
+        """Persiste o estado das etapas (novo dict para o JSONB ser detectado como alterado)"""
+        briefing.etapas_execucao = {name: dict(state) for name, state in step_states.items()}
+        self.db.commit()
+    
     def _build_research_prompt(self, briefing: ContentBriefing) -> str:
         """Constrói prompt para pesquisa Perplexity"""
         prompt_parts = []
@@ -362,8 +508,10 @@ AGENTES DISPONÍVEIS:
 - Email Marketing
 - Copy para Anúncios
 
-Retorne APENAS uma lista JSON com os nomes dos agentes que devem ser executados, na ordem correta.
-Exemplo: ["Geração de Texto", "Otimização SEO", "Copy para Redes Sociais"]
+Retorne APENAS uma lista JSON com os agentes que devem ser executados, na ordem correta.
+Para cada agente, informe em "depende_de" os agentes da lista cujo resultado ele precisa
+(lista vazia se nenhum); agentes sem dependência entre si são executados em paralelo.
+Exemplo: [{{"agente": "Geração de Texto", "depende_de": []}}, {{"agente": "Otimização SEO", "depende_de": ["Geração de Texto"]}}, {{"agente": "Copy para Redes Sociais", "depende_de": ["Geração de Texto"]}}]
 """
         return prompt
     
@@ -483,19 +631,19 @@ Exemplo: ["Geração de Texto", "Otimização SEO", "Copy para Redes Sociais"]
             logger.error(f"Erro ao gerar briefing: {e}", exc_info=True)
             return {"success": False, "error": str(e)}
     
-    def _parse_agents_list(self, content: str) -> List[str]:
-        """Parseia resposta do orquestrador para extrair lista de agentes"""
-        try:
-            # Tentar extrair JSON da resposta
-            import re
-            json_match = re.search(r'\[.*?\]', content, re.DOTALL)
-            if json_match:
-                agents_json = json_match.group(0)
-                agents = json.loads(agents_json)
-                if isinstance(agents, list):
+    def _parse_agents_list(self, content: str) -> List[Any]:
+        """Parseia resposta do orquestrador para extrair lista de agentes (nomes ou {"agente", "depende_de"})"""
+        # Decodificar a lista JSON a partir do primeiro "[" (listas aninhadas em depende_de incluídas)
+        decoder = json.JSONDecoder()
+        start = content.find("[")
+        while start != -1:
+            try:
+                agents, _ = decoder.raw_decode(content, start)
+                if isinstance(agents, list) and agents:
                     return agents
-        except:
-            pass
+            except ValueError:
+                pass
+            start = content.find("[", start + 1)
         
         # Fallback: tentar identificar agentes por nome
         available_agents = [
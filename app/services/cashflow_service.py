@@ -0,0 +1,375 @@
+"""
+Motor do fluxo de caixa
+
+Contas a receber, contas a pagar e (opcionalmente) pedidos do ML são unidos em
+uma única subquery SQL com a data efetiva de cada lançamento. O filtro de
+período, a paginação por cursor e a agregação diária rodam no banco; em Python
+ficam apenas os dias do período para montar o saldo acumulado/projetado a
+partir de FinancialAccount.current_balance.
+"""
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Date, String, and_, case, cast, func, literal, or_, tuple_, union_all
+from sqlalchemy.orm import Session
+
+from app.models.financial_models import AccountPayable, AccountReceivable, FinancialAccount
+from app.models.saas_models import Company, MLOrder, OrderStatus
+from app.utils.pagination import clamp_limit, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Dias após a entrega para o ML liberar o dinheiro
+ML_RELEASE_DAYS_AFTER_DELIVERY = 7
+
+SOURCE_RECEIVABLE = "rec"
+SOURCE_PAYABLE = "pay"
+SOURCE_ML_ORDER = "ml"
+
+
+def ml_delivery_expressions():
+    """
+    (data de entrega, entregue?) de um pedido ML como expressões SQL.
+
+    A data vem de shipping_details.status_history.date_delivered; valores fora
+    do formato ISO viram NULL em vez de quebrar a query.
+    """
+    delivered_text = MLOrder.shipping_details[("status_history", "date_delivered")].as_string()
+    delivered_date = case(
+        (delivered_text.op("~")(r"^\d{4}-\d{2}-\d{2}"), cast(func.substr(delivered_text, 1, 10), Date)),
+        else_=None
+    )
+    is_delivered = or_(
+        MLOrder.status == OrderStatus.DELIVERED,
+        func.lower(MLOrder.shipping_status) == "delivered"
+    )
+    return delivered_date, is_delivered
+
+
+def resolve_cashflow_period(period: Optional[str], date_from: Optional[str] = None,
+                            date_to: Optional[str] = None,
+                            today: Optional[date] = None) -> Tuple[Optional[date], Optional[date]]:
+    """Converte o filtro de período da tela em (início, fim) inclusivos; (None, None) = sem filtro"""
+    today = today or date.today()
+    start = end = None
+    try:
+        if period == "today":
+            start = end = today
+        elif period == "this_week":
+            start = today - timedelta(days=today.weekday())
+            end = start + timedelta(days=6)
+        elif period == "this_month":
+            start = today.replace(day=1)
+            end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        elif period == "last_month":
+            end = today.replace(day=1) - timedelta(days=1)
+            start = end.replace(day=1)
+        elif period == "next_month":
+            start = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+            end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        elif period in ("next_30_days", "next_60_days", "next_90_days"):
+            start = today
+            end = today + timedelta(days=int(period.split("_")[1]))
+        elif period == "this_year":
+            start = today.replace(month=1, day=1)
+            end = today.replace(month=12, day=31)
+        if date_from and date_to:
+            # Sobrescreve se período personalizado foi informado
+            start = datetime.fromisoformat(date_from).date()
+            end = datetime.fromisoformat(date_to).date()
+    except Exception:
+        # Em caso de erro de parsing, ignora filtro de período
+        return None, None
+    return start, end
+
+
+class CashflowService:
+    """Fluxo de caixa calculado no banco (período, agregação diária e paginação)"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # ------------------------------------------------------------------
+    # Subquery unificada
+    # ------------------------------------------------------------------
+    def _flows_subquery(self, company_id: int, include_ml_orders: bool, today: date,
+                        until: Optional[date] = None):
+        """
+        Uma linha por lançamento: (source, row_id, flow_date, flow_type, amount, is_paid, ...)
+
+        `until` é a maior data consultada; serve só para podar pedidos ML pelo
+        índice de date_closed, já que a data efetiva deles é calculada.
+        """
+        receivables = self.db.query(
+            literal(SOURCE_RECEIVABLE, String).label("source"),
+            AccountReceivable.id.label("row_id"),
+            func.coalesce(AccountReceivable.paid_date, AccountReceivable.due_date).label("flow_date"),
+            literal("receivable", String).label("type"),
+            literal("inflow", String).label("flow_type"),
+            func.coalesce(func.nullif(AccountReceivable.paid_amount, 0), AccountReceivable.amount).label("amount"),
+            AccountReceivable.status.label("status"),
+            AccountReceivable.status.in_(["paid", "received"]).label("is_paid"),
+            AccountReceivable.customer_name.label("party_name"),
+            AccountReceivable.invoice_number.label("invoice_number"),
+        ).filter(AccountReceivable.company_id == company_id)
+
+        payables = self.db.query(
+            literal(SOURCE_PAYABLE, String).label("source"),
+            AccountPayable.id.label("row_id"),
+            func.coalesce(AccountPayable.paid_date, AccountPayable.due_date).label("flow_date"),
+            literal("payable", String).label("type"),
+            literal("outflow", String).label("flow_type"),
+            func.coalesce(func.nullif(AccountPayable.paid_amount, 0), AccountPayable.amount).label("amount"),
+            AccountPayable.status.label("status"),
+            (AccountPayable.status == "paid").label("is_paid"),
+            AccountPayable.supplier_name.label("party_name"),
+            AccountPayable.invoice_number.label("invoice_number"),
+        ).filter(AccountPayable.company_id == company_id)
+
+        selects = [receivables, payables]
+        if include_ml_orders:
+            selects.append(self._ml_orders_query(company_id, today, until))
+
+        return union_all(*[query.statement for query in selects]).subquery("cashflow_items")
+
+    def _ml_orders_query(self, company_id: int, today: date, until: Optional[date] = None):
+        """
+        Pedidos ML como recebíveis, com a mesma regra de calculate_ml_payment_date
+        e dos 7 dias após a entrega, expressa em SQL.
+        """
+        delivered_date, is_delivered = ml_delivery_expressions()
+        release_cutoff = today - timedelta(days=ML_RELEASE_DAYS_AFTER_DELIVERY)
+        is_received = and_(is_delivered, or_(delivered_date.is_(None), delivered_date <= release_cutoff))
+
+        expected_days = case(
+            (func.lower(func.coalesce(MLOrder.shipping_method, "")).contains("mercadoenvios"), 7),
+            (func.lower(func.coalesce(MLOrder.payment_method_id, "")).contains("mercadopago"), 2),
+            else_=14
+        )
+        flow_date = case(
+            (and_(is_received, delivered_date.isnot(None)),
+             delivered_date + ML_RELEASE_DAYS_AFTER_DELIVERY),
+            else_=cast(MLOrder.date_closed, Date) + expected_days
+        )
+
+        query = self.db.query(
+            literal(SOURCE_ML_ORDER, String).label("source"),
+            MLOrder.id.label("row_id"),
+            flow_date.label("flow_date"),
+            literal("ml_order", String).label("type"),
+            literal("inflow", String).label("flow_type"),
+            (func.coalesce(MLOrder.total_amount, 0) - func.coalesce(MLOrder.total_fees, 0)).label("amount"),
+            case((is_received, "received"), else_="pending").label("status"),
+            is_received.label("is_paid"),
+            func.coalesce(MLOrder.buyer_nickname, MLOrder.buyer_first_name, "Cliente ML").label("party_name"),
+            cast(MLOrder.ml_order_id, String).label("invoice_number"),
+        ).filter(
+            MLOrder.company_id == company_id,
+            MLOrder.status.in_([OrderStatus.PAID, OrderStatus.DELIVERED]),
+            MLOrder.date_closed.isnot(None)
+        )
+        if until:
+            # A data efetiva nunca é anterior a date_closed + 2 dias
+            query = query.filter(MLOrder.date_closed < until - timedelta(days=1))
+        return query
+
+    @staticmethod
+    def _in_period(flows, start: Optional[date], end: Optional[date]) -> List:
+        criteria = []
+        if start:
+            criteria.append(flows.c.flow_date >= start)
+        if end:
+            criteria.append(flows.c.flow_date <= end)
+        return criteria
+
+    @staticmethod
+    def _signed_amount(flows):
+        return case((flows.c.flow_type == "inflow", flows.c.amount), else_=-flows.c.amount)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def get_items(self, flows, start: Optional[date], end: Optional[date],
+                  limit: Optional[int] = None, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Lançamentos do período ordenados por (data, origem, id); paginados se `limit` for informado"""
+        query = self.db.query(flows).filter(*self._in_period(flows, start, end))
+
+        decoded = decode_cursor(cursor)
+        if decoded is not None and isinstance(decoded.get("s"), list) and len(decoded["s"]) == 2:
+            last_date_raw, last_source = decoded["s"]
+            last_key = tuple_(flows.c.source, flows.c.row_id) > tuple_(literal(last_source), literal(decoded["id"]))
+            if last_date_raw is None:
+                # Já no bloco de lançamentos sem data (sempre no final)
+                query = query.filter(flows.c.flow_date.is_(None), last_key)
+            else:
+                last_date = date.fromisoformat(last_date_raw)
+                query = query.filter(or_(
+                    flows.c.flow_date > last_date,
+                    and_(flows.c.flow_date == last_date, last_key),
+                    flows.c.flow_date.is_(None)
+                ))
+
+        query = query.order_by(flows.c.flow_date.asc().nullslast(), flows.c.source, flows.c.row_id)
+
+        if limit is None:
+            return {"items": [self._serialize(row) for row in query.all()], "next_cursor": None, "has_next": False}
+
+        limit = clamp_limit(limit)
+        rows = query.limit(limit + 1).all()
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_next and rows:
+            last = rows[-1]
+            next_cursor = encode_cursor(
+                [last.flow_date.isoformat() if last.flow_date else None, last.source], last.row_id
+            )
+        return {"items": [self._serialize(row) for row in rows], "next_cursor": next_cursor, "has_next": has_next}
+
+    def get_daily_totals(self, flows, start: Optional[date], end: Optional[date]) -> Dict[date, Dict[str, float]]:
+        """Entradas/saídas (realizadas e pendentes) por dia, agregadas no banco"""
+        rows = self.db.query(
+            flows.c.flow_date,
+            flows.c.flow_type,
+            flows.c.is_paid,
+            func.sum(flows.c.amount)
+        ).filter(
+            flows.c.flow_date.isnot(None), *self._in_period(flows, start, end)
+        ).group_by(flows.c.flow_date, flows.c.flow_type, flows.c.is_paid).all()
+
+        days: Dict[date, Dict[str, float]] = {}
+        for flow_date, flow_type, is_paid, total in rows:
+            day = days.setdefault(flow_date, {
+                "inflow_paid": 0.0, "inflow_pending": 0.0, "outflow_paid": 0.0, "outflow_pending": 0.0
+            })
+            day[f"{flow_type}_{'paid' if is_paid else 'pending'}"] += float(total or 0)
+        return days
+
+    def _net_between(self, flows, after: date, until: date, paid: bool) -> float:
+        """Saldo líquido (entradas - saídas) com data em (after, until]"""
+        if until <= after:
+            return 0.0
+        total = self.db.query(func.sum(self._signed_amount(flows))).filter(
+            flows.c.is_paid.is_(paid),
+            flows.c.flow_date > after,
+            flows.c.flow_date <= until
+        ).scalar()
+        return float(total or 0)
+
+    def get_current_balance(self, company_id: int) -> float:
+        total = self.db.query(func.sum(FinancialAccount.current_balance)).filter(
+            FinancialAccount.company_id == company_id,
+            FinancialAccount.is_active == True
+        ).scalar()
+        return float(total or 0)
+
+    def build_daily_balances(self, flows, daily: Dict[date, Dict[str, float]], current_balance: float,
+                             start: date, end: date, today: date) -> List[Dict[str, Any]]:
+        """
+        Saldo por dia do período.
+
+        Até hoje: saldo realizado, reconstruído de trás para frente a partir do
+        saldo atual descontando o que foi realizado depois de cada dia.
+        Depois de hoje: saldo projetado = saldo atual + pendências até o dia.
+        """
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        empty = {"inflow_paid": 0.0, "inflow_pending": 0.0, "outflow_paid": 0.0, "outflow_pending": 0.0}
+
+        # Realizado entre o fim do trecho passado do período e hoje (fora da agregação diária)
+        past_end = min(end, today)
+        realized_after = self._net_between(flows, past_end, today, paid=True) if start <= today else 0.0
+        # Pendências entre hoje e o início do trecho futuro do período
+        future_start = max(start, today + timedelta(days=1))
+        projected = current_balance + self._net_between(flows, today, future_start - timedelta(days=1), paid=False)
+
+        balances: Dict[date, float] = {}
+        for day in reversed([d for d in days if d <= today]):
+            balances[day] = current_balance - realized_after
+            totals = daily.get(day, empty)
+            realized_after += totals["inflow_paid"] - totals["outflow_paid"]
+        for day in [d for d in days if d > today]:
+            totals = daily.get(day, empty)
+            projected += totals["inflow_pending"] - totals["outflow_pending"]
+            balances[day] = projected
+
+        result = []
+        for day in days:
+            totals = daily.get(day, empty)
+            inflow = totals["inflow_paid"] + totals["inflow_pending"]
+            outflow = totals["outflow_paid"] + totals["outflow_pending"]
+            result.append({
+                "date": day.isoformat(),
+                "inflow": round(inflow, 2),
+                "outflow": round(outflow, 2),
+                "net": round(inflow - outflow, 2),
+                **{key: round(value, 2) for key, value in totals.items()},
+                "balance": round(balances[day], 2),
+                "is_projection": day > today
+            })
+        return result
+
+    # ------------------------------------------------------------------
+    # Entrada principal
+    # ------------------------------------------------------------------
+    def get_cashflow(self, company_id: int, period: Optional[str] = None, date_from: Optional[str] = None,
+                     date_to: Optional[str] = None, limit: Optional[int] = None,
+                     cursor: Optional[str] = None) -> Dict[str, Any]:
+        today = date.today()
+        start, end = resolve_cashflow_period(period, date_from, date_to, today)
+
+        include_ml_orders = bool(self.db.query(Company.ml_orders_as_receivables).filter(
+            Company.id == company_id
+        ).scalar())
+        flows = self._flows_subquery(company_id, include_ml_orders, today, max(end, today) if end else None)
+
+        page = self.get_items(flows, start, end, limit, cursor)
+        current_balance = self.get_current_balance(company_id)
+
+        daily: List[Dict[str, Any]] = []
+        summary = {"inflow_paid": 0.0, "inflow_pending": 0.0, "outflow_paid": 0.0, "outflow_pending": 0.0}
+        if start and end:
+            daily_totals = self.get_daily_totals(flows, start, end)
+            for totals in daily_totals.values():
+                for key, value in totals.items():
+                    summary[key] += value
+            daily = self.build_daily_balances(flows, daily_totals, current_balance, start, end, today)
+
+        return {
+            "cashflow_items": page["items"],
+            "next_cursor": page["next_cursor"],
+            "has_more": page["has_next"],
+            "total_current_balance": current_balance,
+            "period": {
+                "start": start.isoformat() if start else None,
+                "end": end.isoformat() if end else None
+            },
+            "summary": {key: round(value, 2) for key, value in summary.items()},
+            "daily": daily,
+            "projected_balance": daily[-1]["balance"] if daily else current_balance
+        }
+
+    @staticmethod
+    def _serialize(row) -> Dict[str, Any]:
+        item = {
+            "id": f"{row.source}_{row.invoice_number if row.source == SOURCE_ML_ORDER else row.row_id}",
+            "date": row.flow_date.isoformat() if row.flow_date else None,
+            "type": row.type,
+            "flow_type": row.flow_type,
+            "amount": float(row.amount or 0),
+            "status": row.status,
+            "invoice_number": row.invoice_number,
+            "is_paid": bool(row.is_paid)
+        }
+        if row.source == SOURCE_RECEIVABLE:
+            item["description"] = f"Conta a Receber - {row.party_name}"
+            item["customer_name"] = row.party_name
+        elif row.source == SOURCE_PAYABLE:
+            item["description"] = f"Conta a Pagar - {row.party_name}"
+            item["supplier_name"] = row.party_name
+        else:
+            item["description"] = f"Mercado Livre - Pedido #{row.invoice_number}"
+            item["ml_order_id"] = int(row.invoice_number)
+            item["buyer_name"] = row.party_name
+            item["invoice_number"] = None
+        return item
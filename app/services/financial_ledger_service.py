@@ -0,0 +1,641 @@
+"""
+Razão (ledger) das contas financeiras
+
+- Cada FinancialTransaction gravada via ORM gera um lançamento em
+  financial_ledger_entries com o efeito no saldo e o saldo acumulado após ele
+- Lançamentos nunca são alterados: remoção/alteração de transação gera estorno
+- Fechamentos mensais (financial_ledger_checkpoints) respondem saldo em uma data
+  e totais do extrato sem varrer todo o histórico da conta
+- A reconciliação compara FinancialAccount.current_balance com o razão
+"""
+import logging
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, delete, event, extract, func, insert, inspect, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models.financial_models import (
+    FinancialAccount, FinancialLedgerCheckpoint, FinancialLedgerEntry, FinancialTransaction
+)
+from app.services.financial_snapshot_service import Month, month_bounds, months_between
+from app.utils.pagination import keyset_paginate
+
+logger = logging.getLogger(__name__)
+
+ENTRY_OPENING = "opening"
+ENTRY_TRANSACTION = "transaction"
+ENTRY_REVERSAL = "reversal"
+ENTRY_ADJUSTMENT = "adjustment"
+
+CREDIT_CARD_ACCOUNT_TYPE = "credit"
+CREDIT_TRANSACTION_TYPES = ("credit", "income")
+
+# Colunas da transação que, alteradas, exigem estorno + novo lançamento
+LEDGER_FIELDS = ("account_id", "amount", "transaction_type", "transaction_date")
+
+# Diferença aceita entre current_balance e o razão (arredondamento)
+RECONCILIATION_TOLERANCE = Decimal("0.01")
+REBUILD_CHUNK_SIZE = 1000
+
+CENT = Decimal("0.01")
+
+
+def _money(value: Any) -> Decimal:
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def signed_amount(transaction_type: Optional[str], amount: Any, account_type: Optional[str]) -> Decimal:
+    """Efeito da transação no saldo; em cartão de crédito o crédito aumenta a dívida (reduz o saldo)"""
+    value = _money(amount)
+    increases = transaction_type in CREDIT_TRANSACTION_TYPES
+    if account_type == CREDIT_CARD_ACCOUNT_TYPE:
+        increases = not increases
+    return value if increases else -value
+
+
+def transaction_type_for(account_type: Optional[str], delta: Any) -> str:
+    """Tipo de transação (credit/debit) que produz o efeito `delta` no saldo da conta"""
+    increases = _money(delta) >= 0
+    if account_type == CREDIT_CARD_ACCOUNT_TYPE:
+        increases = not increases
+    return "credit" if increases else "debit"
+
+
+def _previous_month(month: Month) -> Month:
+    year, number = month
+    return (year - 1, 12) if number == 1 else (year, number - 1)
+
+
+# ----------------------------------------------------------------------
+# Escrita (sempre na conexão da transação de quem gravou)
+# ----------------------------------------------------------------------
+def _lock_account(connection, account_id: int):
+    """Trava a conta até o commit: lançamentos da mesma conta são serializados"""
+    return connection.execute(
+        select(
+            FinancialAccount.id, FinancialAccount.company_id, FinancialAccount.account_type,
+            FinancialAccount.initial_balance, FinancialAccount.created_at
+        ).where(FinancialAccount.id == account_id).with_for_update()
+    ).first()
+
+
+def _last_running_balance(connection, account_id: int) -> Optional[Decimal]:
+    return connection.execute(
+        select(FinancialLedgerEntry.running_balance)
+        .where(FinancialLedgerEntry.account_id == account_id)
+        .order_by(FinancialLedgerEntry.id.desc())
+        .limit(1)
+    ).scalar()
+
+
+def _opening_balance(connection, account_id: int) -> Decimal:
+    """Saldo inicial da conta (primeiro lançamento do razão)"""
+    value = connection.execute(
+        select(FinancialLedgerEntry.signed_amount)
+        .where(FinancialLedgerEntry.account_id == account_id, FinancialLedgerEntry.entry_type == ENTRY_OPENING)
+        .order_by(FinancialLedgerEntry.id)
+        .limit(1)
+    ).scalar()
+    return value if value is not None else Decimal("0")
+
+
+def _mark_checkpoints_dirty(connection, account_id: int, since: date) -> None:
+    connection.execute(
+        update(FinancialLedgerCheckpoint)
+        .where(
+            FinancialLedgerCheckpoint.account_id == account_id,
+            or_(
+                FinancialLedgerCheckpoint.year > since.year,
+                and_(FinancialLedgerCheckpoint.year == since.year, FinancialLedgerCheckpoint.month >= since.month)
+            )
+        )
+        .values(is_dirty=True)
+    )
+
+
+def _append_entries(connection, account, entries: List[Dict[str, Any]]) -> None:
+    """Acrescenta lançamentos calculando o saldo acumulado a partir do último"""
+    if not entries:
+        return
+    balance = _last_running_balance(connection, account.id) or Decimal("0")
+    rows = []
+    for entry in entries:
+        balance += entry["signed_amount"]
+        rows.append({**entry, "company_id": account.company_id, "account_id": account.id, "running_balance": balance})
+    connection.execute(insert(FinancialLedgerEntry), rows)
+    _mark_checkpoints_dirty(connection, account.id, min(entry["entry_date"] for entry in entries))
+
+
+def _transaction_entry(transaction: Any, account_type: Optional[str]) -> Dict[str, Any]:
+    return {
+        "transaction_id": transaction.id,
+        "entry_type": ENTRY_TRANSACTION,
+        "transaction_type": transaction.transaction_type,
+        "amount": _money(transaction.amount),
+        "description": transaction.description,
+        "reference_type": transaction.reference_type,
+        "reference_id": transaction.reference_id,
+        "entry_date": transaction.transaction_date or date.today(),
+        "signed_amount": signed_amount(transaction.transaction_type, transaction.amount, account_type),
+    }
+
+
+def _reversal_entry(source: Any, net: Decimal, account_type: Optional[str]) -> Dict[str, Any]:
+    return {
+        "transaction_id": source.transaction_id,
+        "entry_type": ENTRY_REVERSAL,
+        "transaction_type": transaction_type_for(account_type, -net),
+        "amount": abs(net),
+        "description": f"Estorno - {source.description or ''}".strip(),
+        "reference_type": source.reference_type,
+        "reference_id": source.reference_id,
+        "entry_date": date.today(),
+        "signed_amount": -net,
+    }
+
+
+def _rebuild_account(connection, account) -> int:
+    """Refaz o razão de uma conta a partir do saldo inicial e das transações atuais"""
+    connection.execute(delete(FinancialLedgerEntry).where(FinancialLedgerEntry.account_id == account.id))
+    connection.execute(delete(FinancialLedgerCheckpoint).where(FinancialLedgerCheckpoint.account_id == account.id))
+
+    first_date = connection.execute(
+        select(func.min(FinancialTransaction.transaction_date))
+        .where(FinancialTransaction.account_id == account.id)
+    ).scalar()
+    opening_dates = [value for value in (first_date, account.created_at.date() if account.created_at else None) if value]
+    initial_balance = _money(account.initial_balance)
+
+    balance = initial_balance
+    rows = [{
+        "company_id": account.company_id,
+        "account_id": account.id,
+        "transaction_id": None,
+        "entry_type": ENTRY_OPENING,
+        "transaction_type": transaction_type_for(account.account_type, initial_balance),
+        "amount": abs(initial_balance),
+        "description": "Saldo inicial",
+        "reference_type": None,
+        "reference_id": None,
+        "entry_date": min(opening_dates) if opening_dates else date.today(),
+        "signed_amount": initial_balance,
+        "running_balance": balance,
+    }]
+    count = 1
+
+    transactions = connection.execute(
+        select(
+            FinancialTransaction.id, FinancialTransaction.transaction_type, FinancialTransaction.amount,
+            FinancialTransaction.description, FinancialTransaction.reference_type,
+            FinancialTransaction.reference_id, FinancialTransaction.transaction_date
+        )
+        .where(FinancialTransaction.account_id == account.id)
+        .order_by(FinancialTransaction.transaction_date, FinancialTransaction.created_at, FinancialTransaction.id)
+    )
+    for transaction in transactions:
+        entry = _transaction_entry(transaction, account.account_type)
+        balance += entry["signed_amount"]
+        rows.append({**entry, "company_id": account.company_id, "account_id": account.id, "running_balance": balance})
+        count += 1
+        if len(rows) >= REBUILD_CHUNK_SIZE:
+            connection.execute(insert(FinancialLedgerEntry), rows)
+            rows = []
+    if rows:
+        connection.execute(insert(FinancialLedgerEntry), rows)
+    return count
+
+
+def _write_ledger(connection, postings: Dict[int, List[Any]], reversed_ids: Set[int], new_accounts: Set[int]) -> None:
+    # Saldo líquido já lançado por (transação, conta): é o que o estorno desfaz
+    reversals: Dict[int, List[Tuple[Any, Decimal]]] = {}
+    if reversed_ids:
+        lines = connection.execute(
+            select(
+                FinancialLedgerEntry.transaction_id, FinancialLedgerEntry.account_id,
+                FinancialLedgerEntry.entry_type, FinancialLedgerEntry.signed_amount,
+                FinancialLedgerEntry.description, FinancialLedgerEntry.reference_type,
+                FinancialLedgerEntry.reference_id
+            )
+            .where(FinancialLedgerEntry.transaction_id.in_(sorted(reversed_ids)))
+            .order_by(FinancialLedgerEntry.id)
+        ).all()
+        net: Dict[Tuple[int, int], Decimal] = {}
+        sources: Dict[Tuple[int, int], Any] = {}
+        for line in lines:
+            key = (line.transaction_id, line.account_id)
+            net[key] = net.get(key, Decimal("0")) + line.signed_amount
+            if line.entry_type == ENTRY_TRANSACTION:
+                sources[key] = line
+        for key, amount in net.items():
+            if amount != 0 and key in sources:
+                reversals.setdefault(key[1], []).append((sources[key], amount))
+
+    # Ordem fixa de travamento evita deadlock entre gravações concorrentes
+    for account_id in sorted(set(postings) | set(reversals) | new_accounts):
+        account = _lock_account(connection, account_id)
+        if account is None:
+            continue
+        if _last_running_balance(connection, account_id) is None:
+            # Conta ainda sem razão: o rebuild já reflete o estado gravado neste flush
+            _rebuild_account(connection, account)
+            continue
+        entries = [_reversal_entry(source, amount, account.account_type) for source, amount in reversals.get(account_id, [])]
+        entries += [_transaction_entry(transaction, account.account_type) for transaction in postings.get(account_id, [])]
+        _append_entries(connection, account, entries)
+
+
+def _has_ledger_changes(instance: FinancialTransaction) -> bool:
+    state = inspect(instance)
+    return any(state.attrs[field].history.has_changes() for field in LEDGER_FIELDS)
+
+
+@event.listens_for(Session, "after_flush")
+def _append_ledger_after_flush(session: Session, flush_context) -> None:
+    postings: Dict[int, List[Any]] = {}
+    reversed_ids: Set[int] = set()
+    new_accounts: Set[int] = set()
+
+    for instance in session.new:
+        if isinstance(instance, FinancialTransaction) and instance.account_id:
+            postings.setdefault(instance.account_id, []).append(instance)
+        elif isinstance(instance, FinancialAccount):
+            new_accounts.add(instance.id)
+    for instance in session.dirty:
+        if isinstance(instance, FinancialTransaction) and _has_ledger_changes(instance):
+            reversed_ids.add(instance.id)
+            if instance.account_id:
+                postings.setdefault(instance.account_id, []).append(instance)
+    for instance in session.deleted:
+        if isinstance(instance, FinancialTransaction):
+            reversed_ids.add(instance.id)
+
+    if not (postings or reversed_ids or new_accounts):
+        return
+
+    try:
+        _write_ledger(session.connection(), postings, reversed_ids, new_accounts)
+    except Exception as e:
+        # Sem o lançamento a transação não pode ser gravada: o erro sobe para quem fez o commit
+        logger.error(f"❌ Erro ao registrar lançamentos no razão: {e}")
+        raise
+
+
+# ----------------------------------------------------------------------
+# Leitura e manutenção
+# ----------------------------------------------------------------------
+class FinancialLedgerService:
+    """Extrato, saldo em data, ajustes e reconciliação das contas financeiras"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_balance(self, account_id: int) -> Optional[float]:
+        """Saldo atual segundo o razão (último saldo acumulado)"""
+        balance = _last_running_balance(self.db.connection(), account_id)
+        return float(balance) if balance is not None else None
+
+    def get_balance_at(self, account: FinancialAccount, on_date: date) -> float:
+        """Saldo ao final do dia `on_date` (fechamento do mês anterior + lançamentos do mês até a data)"""
+        first_date, last_date = self._movement_dates(account.id)
+        if first_date is None or on_date >= last_date:
+            return self.get_balance(account.id) or 0.0
+        if on_date < first_date:
+            return float(_opening_balance(self.db.connection(), account.id))
+
+        month_start = date(on_date.year, on_date.month, 1)
+        previous = _previous_month((on_date.year, on_date.month))
+        if previous >= (first_date.year, first_date.month):
+            opening = self._ensure_checkpoints(account, previous)[previous]["closing_balance"]
+        else:
+            opening = _opening_balance(self.db.connection(), account.id)
+
+        in_month = self.db.query(func.coalesce(func.sum(FinancialLedgerEntry.signed_amount), 0)).filter(
+            FinancialLedgerEntry.account_id == account.id,
+            FinancialLedgerEntry.entry_type != ENTRY_OPENING,
+            FinancialLedgerEntry.entry_date >= month_start,
+            FinancialLedgerEntry.entry_date <= on_date
+        ).scalar()
+        return float(_money(opening) + _money(in_month))
+
+    def get_statement(self, account: FinancialAccount, limit: int = 50, cursor: Optional[str] = None,
+                      date_from: Optional[date] = None, date_to: Optional[date] = None) -> Dict[str, Any]:
+        """Extrato paginado (mais recentes primeiro) com totais do período"""
+        query = self.db.query(FinancialLedgerEntry).filter(FinancialLedgerEntry.account_id == account.id)
+        if date_from:
+            query = query.filter(FinancialLedgerEntry.entry_date >= date_from)
+        if date_to:
+            query = query.filter(FinancialLedgerEntry.entry_date <= date_to)
+
+        page = keyset_paginate(query, FinancialLedgerEntry.id, FinancialLedgerEntry.id, limit, cursor)
+        entries = page["items"]
+
+        # Só transações ainda existentes podem ser removidas pela interface
+        transaction_ids = {entry.transaction_id for entry in entries if entry.transaction_id}
+        live_ids = set()
+        if transaction_ids:
+            live_ids = {row.id for row in self.db.query(FinancialTransaction.id).filter(
+                FinancialTransaction.id.in_(transaction_ids)
+            )}
+
+        return {
+            "entries": [self._serialize(entry, entry.transaction_id in live_ids) for entry in entries],
+            "next_cursor": page["next_cursor"],
+            "has_more": page["has_next"],
+            "limit": page["limit"],
+            "statistics": self._statement_totals(account, date_from, date_to)
+        }
+
+    def get_monthly_summary(self, account: FinancialAccount) -> List[Dict[str, Any]]:
+        """Fechamentos mensais desde a primeira movimentação"""
+        last_date = self._movement_dates(account.id)[1]
+        if last_date is None:
+            return []
+        checkpoints = self._ensure_checkpoints(account, (last_date.year, last_date.month))
+        return [
+            {"year": year, "month": month, **{key: float(value) if isinstance(value, Decimal) else value
+                                              for key, value in data.items()}}
+            for (year, month), data in sorted(checkpoints.items())
+        ]
+
+    def record_adjustment(self, account_id: int, target_balance: float,
+                          description: str = "Ajuste manual de saldo") -> Optional[float]:
+        """Lança a diferença entre o saldo informado e o razão; retorna o valor ajustado"""
+        connection = self.db.connection()
+        account = _lock_account(connection, account_id)
+        if account is None:
+            return None
+        if _last_running_balance(connection, account_id) is None:
+            _rebuild_account(connection, account)
+
+        delta = _money(target_balance) - _last_running_balance(connection, account_id)
+        if delta == 0:
+            return 0.0
+        _append_entries(connection, account, [{
+            "transaction_id": None,
+            "entry_type": ENTRY_ADJUSTMENT,
+            "transaction_type": transaction_type_for(account.account_type, delta),
+            "amount": abs(delta),
+            "description": description,
+            "reference_type": "adjustment",
+            "reference_id": None,
+            "entry_date": date.today(),
+            "signed_amount": delta,
+        }])
+        logger.info(f"📒 Ajuste de R$ {float(delta):.2f} lançado no razão da conta {account_id}")
+        return float(delta)
+
+    def rebuild_account(self, account_id: int) -> int:
+        """Refaz o razão da conta (backfill/manutenção); retorna o número de lançamentos"""
+        connection = self.db.connection()
+        account = _lock_account(connection, account_id)
+        if account is None:
+            return 0
+        return _rebuild_account(connection, account)
+
+    def reconcile(self, company_id: Optional[int] = None, fix: bool = False) -> Dict[str, Any]:
+        """
+        Compara current_balance com o saldo do razão de cada conta.
+
+        Contas sem razão são reconstruídas antes da comparação. Com `fix=True`
+        o current_balance divergente é substituído pelo saldo do razão.
+        """
+        accounts_query = self.db.query(FinancialAccount)
+        last_ids = select(
+            FinancialLedgerEntry.account_id, func.max(FinancialLedgerEntry.id).label("last_id")
+        ).group_by(FinancialLedgerEntry.account_id)
+        if company_id is not None:
+            accounts_query = accounts_query.filter(FinancialAccount.company_id == company_id)
+            last_ids = last_ids.where(FinancialLedgerEntry.company_id == company_id)
+        last_ids = last_ids.subquery()
+
+        ledger_balances = dict(
+            self.db.query(FinancialLedgerEntry.account_id, FinancialLedgerEntry.running_balance)
+            .join(last_ids, FinancialLedgerEntry.id == last_ids.c.last_id)
+            .all()
+        )
+
+        bootstrapped = 0
+        drifted = []
+        accounts = accounts_query.order_by(FinancialAccount.id).all()
+        for account in accounts:
+            ledger_balance = ledger_balances.get(account.id)
+            if ledger_balance is None:
+                self.rebuild_account(account.id)
+                ledger_balance = _last_running_balance(self.db.connection(), account.id)
+                bootstrapped += 1
+
+            current_balance = _money(account.current_balance)
+            difference = current_balance - _money(ledger_balance)
+            if abs(difference) < RECONCILIATION_TOLERANCE:
+                continue
+
+            drifted.append({
+                "account_id": account.id,
+                "company_id": account.company_id,
+                "account_name": account.account_name,
+                "current_balance": float(current_balance),
+                "ledger_balance": float(ledger_balance),
+                "difference": float(difference)
+            })
+            if fix:
+                account.current_balance = ledger_balance
+
+        self.db.commit()
+        return {
+            "success": True,
+            "accounts_checked": len(accounts),
+            "bootstrapped": bootstrapped,
+            "drifted": drifted,
+            "fixed": fix and bool(drifted)
+        }
+
+    # ------------------------------------------------------------------
+    # Fechamentos mensais
+    # ------------------------------------------------------------------
+    def _ensure_checkpoints(self, account: FinancialAccount, until: Month) -> Dict[Month, Dict[str, Any]]:
+        """
+        Fechamentos do primeiro mês com lançamentos até `until`.
+
+        O saldo inicial não tem data: é a abertura do primeiro mês. Só os meses a
+        partir do primeiro sujo/ausente são recalculados, com uma query agregada
+        restrita a esse intervalo de datas.
+        """
+        first_date = self._movement_dates(account.id)[0]
+        if first_date is None or until < (first_date.year, first_date.month):
+            return {}
+
+        months = months_between(first_date, month_bounds(*until)[0])
+        rows = {
+            (row.year, row.month): row
+            for row in self.db.query(FinancialLedgerCheckpoint).filter(
+                FinancialLedgerCheckpoint.account_id == account.id,
+                or_(
+                    FinancialLedgerCheckpoint.year < until[0],
+                    and_(FinancialLedgerCheckpoint.year == until[0], FinancialLedgerCheckpoint.month <= until[1])
+                )
+            )
+        }
+        result = {month: self._checkpoint_data(rows[month]) for month in months if month in rows}
+
+        stale_index = next((index for index, month in enumerate(months)
+                            if month not in rows or rows[month].is_dirty), None)
+        if stale_index is None:
+            return result
+
+        start = month_bounds(*months[stale_index])[0]
+        end = month_bounds(*until)[1]
+        year = extract("year", FinancialLedgerEntry.entry_date)
+        month = extract("month", FinancialLedgerEntry.entry_date)
+        is_credit = FinancialLedgerEntry.transaction_type.in_(CREDIT_TRANSACTION_TYPES)
+        sums = {
+            (int(y), int(m)): (credits, debits, net, count)
+            for y, m, credits, debits, net, count in self.db.query(
+                year, month,
+                func.sum(case((is_credit, FinancialLedgerEntry.amount), else_=0)),
+                func.sum(case((is_credit, 0), else_=FinancialLedgerEntry.amount)),
+                func.sum(FinancialLedgerEntry.signed_amount),
+                func.count(FinancialLedgerEntry.id)
+            ).filter(
+                FinancialLedgerEntry.account_id == account.id,
+                FinancialLedgerEntry.entry_type != ENTRY_OPENING,
+                FinancialLedgerEntry.entry_date >= start,
+                FinancialLedgerEntry.entry_date < end
+            ).group_by(year, month)
+        }
+
+        if stale_index > 0:
+            balance = result[months[stale_index - 1]]["closing_balance"]
+        else:
+            balance = _opening_balance(self.db.connection(), account.id)
+        now = datetime.utcnow()
+        for current in months[stale_index:]:
+            credits, debits, net, count = sums.get(current, (0, 0, 0, 0))
+            data = {
+                "opening_balance": _money(balance),
+                "total_credits": _money(credits),
+                "total_debits": _money(debits),
+                "net_change": _money(net),
+                "closing_balance": _money(balance) + _money(net),
+                "entries_count": int(count or 0)
+            }
+            balance = data["closing_balance"]
+            result[current] = data
+
+            row = rows.get(current)
+            if row is None:
+                row = FinancialLedgerCheckpoint(
+                    company_id=account.company_id, account_id=account.id, year=current[0], month=current[1]
+                )
+                self.db.add(row)
+            for key, value in data.items():
+                setattr(row, key, value)
+            row.is_dirty = False
+            row.computed_at = now
+
+        try:
+            self.db.commit()
+        except Exception as e:
+            # Outra requisição gravou o mesmo fechamento: os valores calculados continuam válidos
+            self.db.rollback()
+            logger.warning(f"⚠️ Não foi possível gravar fechamentos do razão da conta {account.id}: {e}")
+        return result
+
+    def _movement_dates(self, account_id: int) -> Tuple[Optional[date], Optional[date]]:
+        """Primeira e última data de movimentação (o saldo inicial não conta)"""
+        return self.db.query(
+            func.min(FinancialLedgerEntry.entry_date), func.max(FinancialLedgerEntry.entry_date)
+        ).filter(
+            FinancialLedgerEntry.account_id == account_id,
+            FinancialLedgerEntry.entry_type != ENTRY_OPENING
+        ).one()
+
+    @staticmethod
+    def _checkpoint_data(row: FinancialLedgerCheckpoint) -> Dict[str, Any]:
+        return {
+            "opening_balance": _money(row.opening_balance),
+            "total_credits": _money(row.total_credits),
+            "total_debits": _money(row.total_debits),
+            "net_change": _money(row.net_change),
+            "closing_balance": _money(row.closing_balance),
+            "entries_count": row.entries_count or 0
+        }
+
+    def _statement_totals(self, account: FinancialAccount, date_from: Optional[date],
+                          date_to: Optional[date]) -> Dict[str, Any]:
+        """Totais do extrato: fechamentos mensais sem período, soma do intervalo com período"""
+        if date_from is None and date_to is None:
+            data = self.get_monthly_summary(account)
+            total_credits = sum(item["total_credits"] for item in data)
+            total_debits = sum(item["total_debits"] for item in data)
+            total_entries = sum(item["entries_count"] for item in data)
+            opening_balance = float(_opening_balance(self.db.connection(), account.id))
+            closing_balance = self.get_balance(account.id) or 0.0
+        else:
+            is_credit = FinancialLedgerEntry.transaction_type.in_(CREDIT_TRANSACTION_TYPES)
+            query = self.db.query(
+                func.coalesce(func.sum(case((is_credit, FinancialLedgerEntry.amount), else_=0)), 0),
+                func.coalesce(func.sum(case((is_credit, 0), else_=FinancialLedgerEntry.amount)), 0),
+                func.count(FinancialLedgerEntry.id)
+            ).filter(
+                FinancialLedgerEntry.account_id == account.id,
+                FinancialLedgerEntry.entry_type != ENTRY_OPENING
+            )
+            if date_from:
+                query = query.filter(FinancialLedgerEntry.entry_date >= date_from)
+            if date_to:
+                query = query.filter(FinancialLedgerEntry.entry_date <= date_to)
+            credits, debits, total_entries = query.one()
+            total_credits, total_debits = float(credits), float(debits)
+            opening_balance = self.get_balance_at(account, date_from - timedelta(days=1)) if date_from else 0.0
+            closing_balance = (self.get_balance_at(account, date_to) if date_to
+                               else self.get_balance(account.id) or 0.0)
+
+        return {
+            "total_credits": total_credits,
+            "total_debits": total_debits,
+            "net_balance": total_credits - total_debits,
+            "total_transactions": total_entries,
+            "opening_balance": opening_balance,
+            "closing_balance": closing_balance
+        }
+
+    @staticmethod
+    def _serialize(entry: FinancialLedgerEntry, can_delete: bool) -> Dict[str, Any]:
+        return {
+            "id": entry.transaction_id,
+            "entry_id": entry.id,
+            "entry_type": entry.entry_type,
+            "transaction_type": entry.transaction_type,
+            "amount": float(entry.amount),
+            "signed_amount": float(entry.signed_amount),
+            "running_balance": float(entry.running_balance),
+            "description": entry.description,
+            "reference_type": entry.reference_type,
+            "reference_id": entry.reference_id,
+            "transaction_date": entry.entry_date.isoformat() if entry.entry_date else None,
+            "created_at": entry.created_at.isoformat() if entry.created_at else None,
+            "can_delete": can_delete
+        }
+
+
+def run_ledger_reconciliation() -> Dict[str, Any]:
+    """Entrada do job agendado: confere current_balance de todas as contas contra o razão"""
+    from app.config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        result = FinancialLedgerService(db).reconcile()
+        for item in result["drifted"]:
+            logger.warning(
+                f"⚠️ Saldo divergente na conta {item['account_id']} ({item['account_name']}): "
+                f"current_balance R$ {item['current_balance']:.2f} x razão R$ {item['ledger_balance']:.2f}"
+            )
+        return result
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Erro na reconciliação do razão: {e}")
+        return {"success": False, "error": str(e)}
+    finally:
+        db.close()
@@ -0,0 +1,373 @@
+"""
+Snapshots financeiros mensais por empresa
+
+Os KPIs do dashboard, o DRE e o planejado x realizado leem agregados por mês da
+tabela financial_monthly_snapshots em vez de varrer contas a receber/pagar,
+transações e pedidos ML a cada acesso.
+
+- Meses passados já assentados são leituras O(1)
+- O mês corrente (e meses ainda em liquidação no ML) é recalculado após um TTL curto
+- Alterações via ORM nas tabelas de origem marcam os meses afetados como sujos
+  (listener after_flush); UPDATEs em SQL puro usam mark_months_dirty/mark_ml_order_dirty
+"""
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, event, extract, func, inspect, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.financial_models import (
+    AccountPayable, AccountReceivable, CostCenter, FinancialMonthlySnapshot, FinancialTransaction
+)
+from app.models.saas_models import MLOrder, OrderStatus
+from app.services.cashflow_service import ML_RELEASE_DAYS_AFTER_DELIVERY, ml_delivery_expressions
+
+logger = logging.getLogger(__name__)
+
+# Mês corrente (ou ainda em liquidação) é recalculado após este intervalo
+CURRENT_MONTH_TTL = timedelta(minutes=10)
+# Dias após o fim do mês em que o recebido/pendente do ML ainda pode mudar sozinho
+SETTLEMENT_DAYS = 45
+
+PAYABLE_PAID_STATUSES = ["paid", "received", "completed"]
+PAYABLE_PENDING_STATUSES = ["pending", "unpaid", "overdue"]
+NO_COST_CENTER = "Sem Centro de Custo"
+
+# Colunas que, alteradas, mudam os agregados do mês
+TRACKED_FIELDS = {
+    AccountReceivable: ("due_date", "paid_date", "amount", "paid_amount", "status"),
+    AccountPayable: ("due_date", "paid_date", "amount", "paid_amount", "status", "cost_center_id"),
+    FinancialTransaction: ("transaction_date", "amount", "transaction_type"),
+    MLOrder: ("date_created", "status", "total_amount", "total_fees", "shipping_status", "shipping_details"),
+}
+DATE_FIELDS = {
+    AccountReceivable: ("due_date", "paid_date"),
+    AccountPayable: ("due_date", "paid_date"),
+    FinancialTransaction: ("transaction_date",),
+    MLOrder: ("date_created",),
+}
+
+Month = Tuple[int, int]
+
+
+def month_bounds(year: int, month: int) -> Tuple[date, date]:
+    """(primeiro dia do mês, primeiro dia do mês seguinte)"""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def months_between(start: date, end: date) -> List[Month]:
+    """Meses (ano, mês) que tocam o intervalo [start, end]"""
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def empty_month_data() -> Dict[str, Any]:
+    return {
+        "receivables_due": {},           # status -> soma de amount (por due_date)
+        "receivables_paid": {},          # status -> soma de paid_amount (por paid_date)
+        "payables_due": {},              # status -> soma de amount (por due_date)
+        "payables_paid": {},             # status -> soma de amount (por paid_date)
+        "payables_paid_by_cost_center": {},     # centro de custo -> pagas no mês
+        "payables_pending_by_cost_center": {},  # centro de custo -> pendentes com vencimento no mês
+        "ml_gross": {},                  # status -> soma de total_amount (por date_created)
+        "ml_fees": {},                   # status -> soma de total_fees (por date_created)
+        "ml_received_gross": 0.0,        # PAID/DELIVERED já liberados (entrega + 7 dias)
+        "ml_pending_gross": 0.0,         # PAID/DELIVERED ainda não liberados
+        "expense_transactions": 0.0,     # transações do tipo expense
+    }
+
+
+def sum_statuses(values: Dict[str, float], statuses: Optional[Iterable[str]] = None) -> float:
+    """Soma um mapa status -> valor (todos os status se `statuses` for None)"""
+    if statuses is None:
+        return float(sum(values.values()))
+    return float(sum(values.get(status, 0.0) for status in statuses))
+
+
+def merge_month_data(items: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Soma os agregados de vários meses"""
+    merged = empty_month_data()
+    for data in items:
+        for key, value in data.items():
+            if isinstance(value, dict):
+                target = merged.setdefault(key, {})
+                for sub_key, amount in value.items():
+                    target[sub_key] = target.get(sub_key, 0.0) + amount
+            else:
+                merged[key] = merged.get(key, 0.0) + value
+    return merged
+
+
+class FinancialSnapshotService:
+    """Leitura e atualização dos snapshots financeiros mensais"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+    def get_months(self, company_id: int, months: Iterable[Month]) -> Dict[Month, Dict[str, Any]]:
+        """Agregados dos meses pedidos; só os ausentes/sujos/vencidos são recalculados"""
+        months = sorted(set(months))
+        if not months:
+            return {}
+
+        now = datetime.utcnow()
+        rows = {
+            (row.year, row.month): row
+            for row in self.db.query(FinancialMonthlySnapshot).filter(
+                FinancialMonthlySnapshot.company_id == company_id,
+                tuple_(FinancialMonthlySnapshot.year, FinancialMonthlySnapshot.month).in_(months)
+            ).all()
+        }
+
+        result = {month: row.data for month, row in rows.items() if self._is_fresh(row, now)}
+        stale = [month for month in months if month not in result]
+        if stale:
+            computed = self._compute_months(company_id, stale)
+            self._store(company_id, computed, now)
+            result.update(computed)
+        return result
+
+    def get_period_totals(self, company_id: int, start: date, end: date) -> Dict[str, Any]:
+        """
+        Agregados de um período [start, end].
+
+        Períodos de meses inteiros usam os snapshots; recortes menores (hoje,
+        semana, datas livres) são agregados direto no banco, sem armazenar.
+        """
+        if start.day == 1 and (end + timedelta(days=1)).day == 1:
+            return merge_month_data(self.get_months(company_id, months_between(start, end)).values())
+        return merge_month_data(self._aggregate(company_id, start, end + timedelta(days=1)).values())
+
+    @staticmethod
+    def _is_fresh(row: FinancialMonthlySnapshot, now: datetime) -> bool:
+        if row.is_dirty or row.data is None:
+            return False
+        _, next_month = month_bounds(row.year, row.month)
+        settled = next_month + timedelta(days=SETTLEMENT_DAYS) <= row.computed_at.date()
+        return settled or row.computed_at >= now - CURRENT_MONTH_TTL
+
+    # ------------------------------------------------------------------
+    # Cálculo
+    # ------------------------------------------------------------------
+    def _compute_months(self, company_id: int, months: List[Month]) -> Dict[Month, Dict[str, Any]]:
+        start, _ = month_bounds(*months[0])
+        _, end = month_bounds(*months[-1])
+        aggregated = self._aggregate(company_id, start, end)
+        return {month: aggregated.get(month, empty_month_data()) for month in months}
+
+    def _aggregate(self, company_id: int, start: date, end: date) -> Dict[Month, Dict[str, Any]]:
+        """Agregados por mês de [start, end) com uma query GROUP BY por origem"""
+        data: Dict[Month, Dict[str, Any]] = {}
+
+        def bucket(year, month) -> Dict[str, Any]:
+            return data.setdefault((int(year), int(month)), empty_month_data())
+
+        def by_month(column):
+            return extract("year", column).label("year"), extract("month", column).label("month")
+
+        def in_range(column):
+            return and_(column >= start, column < end)
+
+        # Contas a receber: vencimento (faturamento) e pagamento (recebido)
+        year, month = by_month(AccountReceivable.due_date)
+        for y, m, status, total in self.db.query(year, month, AccountReceivable.status, func.sum(AccountReceivable.amount)).filter(
+            AccountReceivable.company_id == company_id, in_range(AccountReceivable.due_date)
+        ).group_by(year, month, AccountReceivable.status):
+            bucket(y, m)["receivables_due"][status or ""] = float(total or 0)
+
+        year, month = by_month(AccountReceivable.paid_date)
+        for y, m, status, total in self.db.query(year, month, AccountReceivable.status, func.sum(AccountReceivable.paid_amount)).filter(
+            AccountReceivable.company_id == company_id, in_range(AccountReceivable.paid_date)
+        ).group_by(year, month, AccountReceivable.status):
+            bucket(y, m)["receivables_paid"][status or ""] = float(total or 0)
+
+        # Contas a pagar: por status e por centro de custo
+        cost_center = func.coalesce(CostCenter.name, NO_COST_CENTER)
+        year, month = by_month(AccountPayable.due_date)
+        for y, m, status, cc_name, total in self.db.query(
+            year, month, AccountPayable.status, cost_center, func.sum(AccountPayable.amount)
+        ).outerjoin(CostCenter, CostCenter.id == AccountPayable.cost_center_id).filter(
+            AccountPayable.company_id == company_id, in_range(AccountPayable.due_date)
+        ).group_by(year, month, AccountPayable.status, cost_center):
+            month_data = bucket(y, m)
+            month_data["payables_due"][status or ""] = month_data["payables_due"].get(status or "", 0.0) + float(total or 0)
+            if status in PAYABLE_PENDING_STATUSES:
+                by_cc = month_data["payables_pending_by_cost_center"]
+                by_cc[cc_name] = by_cc.get(cc_name, 0.0) + float(total or 0)
+
+        year, month = by_month(AccountPayable.paid_date)
+        for y, m, status, cc_name, total in self.db.query(
+            year, month, AccountPayable.status, cost_center, func.sum(AccountPayable.amount)
+        ).outerjoin(CostCenter, CostCenter.id == AccountPayable.cost_center_id).filter(
+            AccountPayable.company_id == company_id, in_range(AccountPayable.paid_date)
+        ).group_by(year, month, AccountPayable.status, cost_center):
+            month_data = bucket(y, m)
+            month_data["payables_paid"][status or ""] = month_data["payables_paid"].get(status or "", 0.0) + float(total or 0)
+            if status in PAYABLE_PAID_STATUSES:
+                by_cc = month_data["payables_paid_by_cost_center"]
+                by_cc[cc_name] = by_cc.get(cc_name, 0.0) + float(total or 0)
+
+        # Pedidos ML por data de criação; recebido = entregue há 7+ dias
+        delivered_date, is_delivered = ml_delivery_expressions()
+        release_cutoff = date.today() - timedelta(days=ML_RELEASE_DAYS_AFTER_DELIVERY)
+        is_released = and_(
+            MLOrder.status.in_([OrderStatus.PAID, OrderStatus.DELIVERED]),
+            is_delivered, delivered_date.isnot(None), delivered_date <= release_cutoff
+        )
+        is_settling = MLOrder.status.in_([OrderStatus.PAID, OrderStatus.DELIVERED])
+        year, month = by_month(MLOrder.date_created)
+        for y, m, status, gross, fees, released, pending in self.db.query(
+            year, month, MLOrder.status,
+            func.sum(MLOrder.total_amount),
+            func.sum(MLOrder.total_fees),
+            func.sum(func.coalesce(MLOrder.total_amount, 0)).filter(is_released),
+            func.sum(func.coalesce(MLOrder.total_amount, 0)).filter(and_(is_settling, ~is_released)),
+        ).filter(
+            MLOrder.company_id == company_id, in_range(MLOrder.date_created)
+        ).group_by(year, month, MLOrder.status):
+            month_data = bucket(y, m)
+            status_key = status.value if isinstance(status, OrderStatus) else str(status)
+            month_data["ml_gross"][status_key] = float(gross or 0)
+            month_data["ml_fees"][status_key] = float(fees or 0)
+            month_data["ml_received_gross"] += float(released or 0)
+            month_data["ml_pending_gross"] += float(pending or 0)
+
+        # Transações de despesa
+        year, month = by_month(FinancialTransaction.transaction_date)
+        for y, m, total in self.db.query(year, month, func.sum(FinancialTransaction.amount)).filter(
+            FinancialTransaction.company_id == company_id,
+            FinancialTransaction.transaction_type == "expense",
+            in_range(FinancialTransaction.transaction_date)
+        ).group_by(year, month):
+            bucket(y, m)["expense_transactions"] = float(total or 0)
+
+        return data
+
+    def _store(self, company_id: int, computed: Dict[Month, Dict[str, Any]], computed_at: datetime) -> None:
+        if not computed:
+            return
+        table = FinancialMonthlySnapshot.__table__
+        statement = pg_insert(table).values([
+            {"company_id": company_id, "year": year, "month": month, "data": data,
+             "is_dirty": False, "computed_at": computed_at}
+            for (year, month), data in computed.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.company_id, table.c.year, table.c.month],
+            set_={
+                "data": statement.excluded.data,
+                "is_dirty": False,
+                "computed_at": statement.excluded.computed_at,
+                "updated_at": func.now(),
+            }
+        )
+        try:
+            self.db.execute(statement)
+            self.db.commit()
+        except Exception as e:
+            # Falha ao gravar o cache não deve derrubar a leitura
+            self.db.rollback()
+            logger.warning(f"⚠️ Não foi possível gravar snapshots financeiros da empresa {company_id}: {e}")
+
+
+# ----------------------------------------------------------------------
+# Invalidação
+# ----------------------------------------------------------------------
+def _mark_dirty(connection, months_by_company: Dict[int, Set[Month]]) -> None:
+    for company_id, months in months_by_company.items():
+        if not months:
+            continue
+        connection.execute(
+            update(FinancialMonthlySnapshot)
+            .where(
+                FinancialMonthlySnapshot.company_id == company_id,
+                tuple_(FinancialMonthlySnapshot.year, FinancialMonthlySnapshot.month).in_(sorted(months))
+            )
+            .values(is_dirty=True)
+        )
+
+
+def mark_months_dirty(db: Session, company_id: int, dates: Iterable[Optional[date]]) -> None:
+    """Marca como sujos os meses das datas informadas (para escritas fora do ORM)"""
+    months = {(value.year, value.month) for value in dates if value}
+    _mark_dirty(db.connection(), {company_id: months})
+
+
+def mark_ml_order_dirty(db: Session, company_id: int, ml_order_id: Any) -> None:
+    """Marca como sujo o mês de criação de um pedido ML atualizado por SQL puro"""
+    db.execute(text("""
+        UPDATE financial_monthly_snapshots s
+        SET is_dirty = true
+        FROM ml_orders o
+        WHERE o.ml_order_id = :ml_order_id
+          AND o.company_id = :company_id
+          AND s.company_id = o.company_id
+          AND s.year = EXTRACT(YEAR FROM o.date_created)
+          AND s.month = EXTRACT(MONTH FROM o.date_created)
+    """), {"ml_order_id": ml_order_id, "company_id": company_id})
+
+
+def _affected_months(instance, is_new_or_deleted: bool) -> Set[Month]:
+    """Meses (atuais e anteriores) das datas de um registro alterado"""
+    state = inspect(instance)
+    cls = type(instance)
+    if not is_new_or_deleted and not any(
+        state.attrs[field].history.has_changes() for field in TRACKED_FIELDS[cls]
+    ):
+        return set()
+
+    # Meses anteriores das datas alteradas (registrados pelo listener de "set")
+    months = set(state.info.pop("snapshot_previous_months", ()))
+    for field in DATE_FIELDS[cls]:
+        history = state.attrs[field].history
+        for value in list(history.added) + list(history.deleted) + list(history.unchanged):
+            if value:
+                months.add((value.year, value.month))
+    return months
+
+
+def _remember_previous_month(target, value, oldvalue, initiator) -> None:
+    """Guarda o mês da data antiga; sem isso mover um lançamento de mês deixaria o mês de origem desatualizado"""
+    if isinstance(oldvalue, date):
+        inspect(target).info.setdefault("snapshot_previous_months", set()).add((oldvalue.year, oldvalue.month))
+
+
+for _model, _fields in DATE_FIELDS.items():
+    for _field in _fields:
+        # active_history carrega o valor antigo mesmo com o atributo expirado
+        event.listen(getattr(_model, _field), "set", _remember_previous_month, active_history=True)
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_snapshots_after_flush(session: Session, flush_context) -> None:
+    months_by_company: Dict[int, Set[Month]] = {}
+    for collection, is_new_or_deleted in ((session.new, True), (session.dirty, False), (session.deleted, True)):
+        for instance in collection:
+            if type(instance) not in TRACKED_FIELDS:
+                continue
+            company_id = getattr(instance, "company_id", None)
+            if company_id is None:
+                continue
+            months = _affected_months(instance, is_new_or_deleted)
+            if months:
+                months_by_company.setdefault(company_id, set()).update(months)
+
+    if months_by_company:
+        try:
+            connection = session.connection()
+            # Savepoint: uma falha aqui não pode abortar a transação de quem gravou
+            with connection.begin_nested():
+                _mark_dirty(connection, months_by_company)
+        except Exception as e:
+            logger.warning(f"⚠️ Não foi possível invalidar snapshots financeiros: {e}")
@@ -1,11 +1,17 @@
 """
 Service para buscar produtos mais vendidos usando a API /highlights do Mercado Livre
+
+As chamadas à API passam pelo cache de respostas (ml_response_cache_service): highlights,
+produtos e buscas são compartilhados entre empresas; itens e itens do produto ficam no
+escopo do seller dono do token. Cada resposta é baixada uma vez e depois só revalidada
+com ETag.
 """
 import logging
-import requests
 from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
 
+from app.services.ml_response_cache_service import cached_get
+
 logger = logging.getLogger(__name__)
 
 class HighlightsService:
@@ -33,8 +39,22 @@ class HighlightsService:
     def _get_access_token(self, user_id: int) -> Optional[str]:
         """Busca um token válido do usuário para usar na API"""
         try:
+            from app.models.saas_models import MLAccount, MLAccountStatus, User
             from app.services.token_manager import TokenManager
             token_manager = TokenManager(self.db)
+
+            # Preferir o token em cache da conta ML ativa da empresa
+            account = self.db.query(MLAccount.id, MLAccount.company_id).join(
+                User, User.company_id == MLAccount.company_id
+            ).filter(
+                User.id == user_id,
+                MLAccount.status == MLAccountStatus.ACTIVE
+            ).first()
+            if account:
+                token = token_manager.get_access_token_for_account(account.id, account.company_id)
+                if token:
+                    return token
+
             return token_manager.get_valid_token(user_id)
         except Exception as e:
             logger.error(f"Erro ao buscar token: {e}")
@@ -91,7 +111,7 @@ class HighlightsService:
                 "Authorization": f"Bearer {access_token}"
             }
             
-            response = requests.get(url, params=params, headers=headers, timeout=15)
+            response = cached_get(url, params=params, headers=headers, timeout=15)
             
             if response.status_code == 404:
                 return {
@@ -297,7 +317,7 @@ class HighlightsService:
                 # Tentar primeiro como item normal
                 url = f"{self.base_url}/items/{item_id}"
                 logger.debug(f"Buscando detalhes de USER_PRODUCT {item_id} via {url}")
-                response = requests.get(url, headers=headers, timeout=15)
+                response = cached_get(url, headers=headers, timeout=15)
                 
                 if response.status_code == 200:
                     return self._parse_item_response(response.json())
@@ -311,7 +331,7 @@ class HighlightsService:
                 # Para produtos catalogados, buscar o primeiro item ativo
                 url = f"{self.base_url}/products/{item_id}/items"
                 logger.debug(f"Buscando itens do produto catalogado {item_id} via {url}")
-                response = requests.get(url, headers=headers, timeout=15)
+                response = cached_get(url, headers=headers, timeout=15)
                 
                 if response.status_code == 200:
                     items_data = response.json()
@@ -331,7 +351,7 @@ class HighlightsService:
                 # Se não encontrou itens, tentar buscar informações do produto diretamente
                 url = f"{self.base_url}/products/{item_id}"
                 logger.debug(f"Tentando buscar informações do produto {item_id} via {url}")
-                response = requests.get(url, headers=headers, timeout=15)
+                response = cached_get(url, headers=headers, timeout=15)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -360,7 +380,7 @@ class HighlightsService:
             # Para ITEM ou fallback, buscar como item
             url = f"{self.base_url}/items/{item_id}"
             logger.debug(f"Buscando detalhes de {item_type} {item_id} via {url}")
-            response = requests.get(url, headers=headers, timeout=15)
+            response = cached_get(url, headers=headers, timeout=15)
             
             if response.status_code == 200:
                 return self._parse_item_response(response.json())
@@ -448,14 +468,14 @@ class HighlightsService:
                     "Authorization": f"Bearer {access_token}"
                 }
                 
-                prod_response = requests.get(prod_url, headers=headers, timeout=15)
+                prod_response = cached_get(prod_url, headers=headers, timeout=15)
                 
                 if prod_response.status_code == 200:
                     prod_data = prod_response.json()
                     
                     # Buscar itens para obter preço e outros dados
                     items_url = f"{self.base_url}/products/{product_id}/items"
-                    items_response = requests.get(items_url, headers=headers, timeout=15)
+                    items_response = cached_get(items_url, headers=headers, timeout=15)
                     
                     price = 0
                     sold_quantity = 0
@@ -483,7 +503,7 @@ class HighlightsService:
                                 try:
                                     search_url = f"{self.base_url}/sites/MLB/search"
                                     search_params = {"ids": item_id}
-                                    search_response = requests.get(search_url, params=search_params, timeout=10)
+                                    search_response = cached_get(search_url, params=search_params, timeout=10)
                                     if search_response.status_code == 200:
                                         search_data = search_response.json()
                                         search_results = search_data.get("results", [])
@@ -579,7 +599,7 @@ class HighlightsService:
                 }
                 
                 logger.debug(f"Buscando lote de {len(batch)} itens via search: {ids_param[:100]}")
-                search_response = requests.get(search_url, params=search_params, headers=headers_public, timeout=20)
+                search_response = cached_get(search_url, params=search_params, headers=headers_public, timeout=20)
                 
                 if search_response.status_code == 200:
                     search_data = search_response.json()
@@ -633,7 +653,7 @@ class HighlightsService:
                             "Authorization": f"Bearer {access_token}"
                         }
                         
-                        response = requests.get(url, params=params, headers=headers, timeout=20)
+                        response = cached_get(url, params=params, headers=headers, timeout=20)
                         
                         if response.status_code == 200:
                             items = response.json()
@@ -662,7 +682,7 @@ class HighlightsService:
                 **self.headers
             }
             
-            response = requests.get(search_url, params=search_params, headers=headers_public, timeout=15)
+            response = cached_get(search_url, params=search_params, headers=headers_public, timeout=15)
             
             if response.status_code == 200:
                 search_data = response.json()
@@ -708,7 +728,7 @@ class HighlightsService:
                 "Authorization": f"Bearer {access_token}"
             }
             
-            response = requests.get(url, params=params, headers=headers, timeout=10)
+            response = cached_get(url, params=params, headers=headers, timeout=10)
             if response.status_code == 200:
                 data = response.json()
                 if data.get("results") and len(data["results"]) > 0:
@@ -781,7 +801,7 @@ class HighlightsService:
                 "Authorization": f"Bearer {access_token}"
             }
             
-            response = requests.get(url, headers=headers, timeout=15)
+            response = cached_get(url, headers=headers, timeout=15)
             
             if response.status_code == 404:
                 return {
@@ -847,7 +867,7 @@ class HighlightsService:
                 "Authorization": f"Bearer {access_token}"
             }
             
-            response = requests.get(url, headers=headers, timeout=15)
+            response = cached_get(url, headers=headers, timeout=15)
             
             if response.status_code == 404:
                 return {
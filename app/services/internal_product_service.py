@@ -6,6 +6,9 @@ from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 from app.models.saas_models import InternalProduct, Product, Company
+from app.utils.batch_loader import BatchLoader, query_budget
+from app.utils.logistics import logistic_type_label
+from app.services.pricing_simulation_service import company_default_tax_rate, compute_margins
 
 logger = logging.getLogger(__name__)
 
@@ -133,23 +136,20 @@ class InternalProductService:
                     )
                 )
             
-            # Contar total
-            total = query.count()
-            
-            # Aplicar paginação
-            products = query.offset(offset).limit(limit).all()
-            
-            # Buscar contagem de anúncios associados para cada produto
-            from app.models.saas_models import SKUManagement
-            product_announcements = {}
-            for product in products:
-                announcements_count = self.db.query(SKUManagement).filter(
-                    and_(
-                        SKUManagement.internal_product_id == product.id,
-                        SKUManagement.status == "active"
-                    )
-                ).count()
-                product_announcements[product.id] = announcements_count
+            with query_budget(self.db, 3, "internal_products.list"):
+                # Contar total
+                total = query.count()
+                
+                # Aplicar paginação
+                products = query.offset(offset).limit(limit).all()
+                
+                # Contagem de anúncios associados em um único COUNT agrupado
+                from app.models.saas_models import SKUManagement
+                product_announcements = BatchLoader(self.db).count_many(
+                    SKUManagement.internal_product_id,
+                    [product.id for product in products],
+                    SKUManagement.status == "active"
+                )
             
             return {
                 "success": True,
@@ -711,72 +711,46 @@ class InternalProductService:
             if not products:
                 return {"error": "Nenhum produto encontrado com os SKUs fornecidos"}
             
-            # Buscar empresa uma vez para usar valores padrão se necessário
+            # Buscar empresa uma vez e resolver os valores padrão (imposto e marketing) uma única vez
             company = self.db.query(Company).filter(Company.id == company_id).first()
+            default_tax_rate = company_default_tax_rate(company)
+            company_marketing_pct = float(company.percentual_marketing) if company and company.percentual_marketing else 0.0
+            
+            # Colunas de entrada; impostos, custos e margens são calculados em lote
+            cost_prices = [float(p.cost_price) if p.cost_price else 0.0 for p in products]
+            other_costs = [float(p.other_costs) if p.other_costs else 0.0 for p in products]
+            selling_prices = [float(p.selling_price) if p.selling_price else 0.0 for p in products]
+            # Taxa de imposto: usar do produto, se não tiver, usar da empresa
+            tax_rates = [float(p.tax_rate) if p.tax_rate else default_tax_rate for p in products]
+            # Custo de marketing: usar do produto, se não tiver, percentual da empresa sobre o preço de venda
+            marketing_costs = [
+                float(p.marketing_cost) if p.marketing_cost else price * company_marketing_pct / 100
+                for p, price in zip(products, selling_prices)
+            ]
+            margins = compute_margins(
+                selling_prices,
+                [c + o for c, o in zip(cost_prices, other_costs)],
+                tax_rates,
+                marketing_costs
+            )
             
             pricing_data = []
             found_skus = []
             
-            for product in products:
-                cost_price = float(product.cost_price) if product.cost_price else 0.0
-                other_costs = float(product.other_costs) if product.other_costs else 0.0
-                selling_price = float(product.selling_price) if product.selling_price else 0.0
-                
-                # Taxa de imposto: usar do produto, se não tiver, usar da empresa
-                tax_rate = float(product.tax_rate) if product.tax_rate else 0.0
-                if tax_rate == 0.0 and company:
-                    # Tentar usar aliquota_simples primeiro, depois média das alíquotas
-                    if company.aliquota_simples:
-                        tax_rate = float(company.aliquota_simples)
-                    else:
-                        # Calcular média das alíquotas disponíveis
-                        aliquotas = []
-                        if company.aliquota_ir:
-                            aliquotas.append(float(company.aliquota_ir))
-                        if company.aliquota_csll:
-                            aliquotas.append(float(company.aliquota_csll))
-                        if company.aliquota_pis:
-                            aliquotas.append(float(company.aliquota_pis))
-                        if company.aliquota_cofins:
-                            aliquotas.append(float(company.aliquota_cofins))
-                        if company.aliquota_icms:
-                            aliquotas.append(float(company.aliquota_icms))
-                        if company.aliquota_iss:
-                            aliquotas.append(float(company.aliquota_iss))
-                        
-                        if aliquotas:
-                            tax_rate = sum(aliquotas) / len(aliquotas)
-                
-                # Custo de marketing: usar do produto, se não tiver, calcular da empresa
-                marketing_cost = float(product.marketing_cost) if product.marketing_cost else 0.0
-                if marketing_cost == 0.0 and company and company.percentual_marketing and selling_price > 0:
-                    # Calcular marketing cost baseado no percentual da empresa sobre o preço de venda
-                    percentual_marketing = float(company.percentual_marketing)
-                    marketing_cost = (selling_price * percentual_marketing / 100)
-                
-                # Calcular totais
-                total_costs = cost_price + marketing_cost + other_costs
-                tax_amount = (selling_price * tax_rate / 100) if selling_price and tax_rate else 0.0
-                total_costs_with_tax = total_costs + tax_amount
-                
-                # Calcular margem
-                profit_margin = 0.0
-                if selling_price > 0:
-                    profit_margin = ((selling_price - total_costs_with_tax) / selling_price) * 100
-                
+            for i, product in enumerate(products):
                 pricing_data.append({
                     "product_id": product.id,
                     "name": product.name,
                     "internal_sku": product.internal_sku,
-                    "cost_price": cost_price,
-                    "selling_price": selling_price,
-                    "tax_rate": tax_rate,
-                    "tax_amount": tax_amount,
-                    "marketing_cost": marketing_cost,
-                    "other_costs": other_costs,
-                    "total_costs": total_costs,
-                    "total_costs_with_tax": total_costs_with_tax,
-                    "profit_margin": profit_margin,
+                    "cost_price": cost_prices[i],
+                    "selling_price": selling_prices[i],
+                    "tax_rate": tax_rates[i],
+                    "tax_amount": margins["tax_amount"][i],
+                    "marketing_cost": marketing_costs[i],
+                    "other_costs": other_costs[i],
+                    "total_costs": margins["total_costs"][i],
+                    "total_costs_with_tax": margins["total_costs_with_tax"][i],
+                    "profit_margin": margins["profit_margin"][i],
                     "expected_profit_margin": float(product.expected_profit_margin) if product.expected_profit_margin else 0.0,
                     "category": product.category,
                     "brand": product.brand,
@@ -886,41 +860,13 @@ class InternalProductService:
                         MLAccount.id == ml_product.ml_account_id
                     ).first()
                     
-                    # Verificar se é fulfillment
-                    is_fulfillment = False
-                    logistic_type = None
-                    shipping_type_label = "Não informado"
-                    
-                    if ml_product.shipping:
-                        import json
-                        if isinstance(ml_product.shipping, str):
-                            try:
-                                shipping_data = json.loads(ml_product.shipping)
-                            except:
-                                shipping_data = {}
-                        else:
-                            shipping_data = ml_product.shipping
-                        
-                        # Verificar logistic_type no shipping
-                        logistic_type = shipping_data.get("logistic_type")
-                        if logistic_type == "fulfillment":
-                            is_fulfillment = True
-                            shipping_type_label = "Full (Fulfillment)"
-                        elif logistic_type == "cross_docking":
-                            shipping_type_label = "Mercado Envios"
-                        elif logistic_type == "xd_drop_off":
-                            shipping_type_label = "Agência"
-                        elif logistic_type == "drop_off":
-                            shipping_type_label = "Correios"
-                        elif logistic_type:
-                            shipping_type_label = logistic_type.replace("_", " ").title()
-                    
-                    # Verificar também nas tags
-                    if not is_fulfillment and ml_product.tags:
-                        tags_list = ml_product.tags if isinstance(ml_product.tags, list) else []
-                        if any(tag in ["fulfillment", "meli_fulfillment", "FULL"] for tag in tags_list):
-                            is_fulfillment = True
-                            shipping_type_label = "Full (Fulfillment)"
+                    # Tipo logístico mantido nas colunas logistic_type / is_fulfillment
+                    is_fulfillment = bool(ml_product.is_fulfillment)
+                    logistic_type = ml_product.logistic_type
+                    if is_fulfillment:
+                        shipping_type_label = "Full (Fulfillment)"
+                    else:
+                        shipping_type_label = logistic_type_label(logistic_type) or "Não informado"
                     
                     announcements.append({
                         "id": ml_product.id,
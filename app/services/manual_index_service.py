@@ -0,0 +1,295 @@
+"""
+Índice invertido em memória dos manuais (.md)
+
+- tokenização sem acentos e sem stopwords do português; termos da busca casam
+  por prefixo ("estoq" encontra "estoque")
+- ranking BM25 com peso extra para termos do título
+- trechos (linha anterior/posterior) das linhas com mais termos encontrados
+- atualização incremental: a cada consulta o diretório é listado (apenas stat)
+  e só os arquivos com mtime/tamanho alterados são relidos e reindexados
+- HTML renderizado dos manuais fica em cache por (caminho, mtime)
+
+Um índice por diretório, compartilhado entre requisições (get_manual_index),
+para servir tanto a tela de suporte quanto agentes que respondem a partir dos manuais.
+"""
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Trechos devolvidos por manual na busca
+MAX_SNIPPETS_PER_MANUAL = 3
+# Peso de uma ocorrência no título em relação ao corpo
+TITLE_WEIGHT = 3.0
+# Parâmetros do BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Intervalo mínimo (s) entre verificações de mtime do diretório
+REFRESH_INTERVAL_SECONDS = 2.0
+
+STOPWORDS = {
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "do", "da", "dos", "das",
+    "em", "no", "na", "nos", "nas", "por", "para", "pelo", "pela", "com", "sem", "e",
+    "ou", "que", "se", "ao", "aos", "the", "como", "mais", "ser", "sao", "esta", "este",
+    "isso", "essa", "esse", "seu", "sua", "ja", "nao", "me", "eu", "voce"
+}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """Minúsculas e sem acentos"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(normalize(text)) if len(t) > 1 and t not in STOPWORDS]
+
+
+def _title_from(filename: str, content: str) -> str:
+    title = filename.replace('.md', '').replace('_', ' ').title()
+    for line in content.split('\n')[:5]:
+        if line.strip().startswith('#'):
+            return line.replace('#', '').strip()
+    return title
+
+
+class ManualIndex:
+    """Índice invertido dos manuais .md de um diretório"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._last_refresh = 0.0
+        # filename -> {"signature", "title", "lines", "term_freq", "length"}
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        # termo -> {filename: [linhas (0-based)]}; linha -1 = título
+        self._postings: Dict[str, Dict[str, List[int]]] = {}
+        self._vocabulary: List[str] = []
+        self._html_cache: Dict[str, Tuple[float, str]] = {}
+
+    # ------------------------------------------------------------------ índice
+
+    def refresh(self, force: bool = False):
+        """Reindexa apenas os arquivos novos, alterados ou removidos"""
+        now = time.monotonic()
+        if not force and now - self._last_refresh < REFRESH_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            self._last_refresh = now
+            if not os.path.isdir(self.directory):
+                if self._docs:
+                    self._docs.clear()
+                    self._postings.clear()
+                    self._vocabulary = []
+                return
+
+            current: Dict[str, Tuple[float, int]] = {}
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.md') and not entry.name.startswith('.') and entry.is_file():
+                        stat = entry.stat()
+                        current[entry.name] = (stat.st_mtime, stat.st_size)
+
+            removed = [name for name in self._docs if name not in current]
+            changed = [name for name, sig in current.items()
+                       if name not in self._docs or self._docs[name]["signature"] != sig]
+            if not removed and not changed:
+                return
+
+            for name in removed + changed:
+                self._unindex(name)
+            for name in changed:
+                self._index(name, current[name])
+            self._vocabulary = sorted(self._postings)
+            logger.info(
+                f"📚 Índice de manuais atualizado: {len(changed)} (re)indexado(s), "
+                f"{len(removed)} removido(s), {len(self._docs)} no total"
+            )
+
+    def _index(self, filename: str, signature: Tuple[float, int]):
+        try:
+            with open(os.path.join(self.directory, filename), 'r', encoding='utf-8') as f:
+                content = f.read()
+        except Exception as e:
+            logger.warning(f"Erro ao indexar manual {filename}: {e}")
+            return
+
+        title = _title_from(filename, content)
+        lines = content.split('\n')
+        term_freq: Dict[str, float] = {}
+        for token in tokenize(title):
+            term_freq[token] = term_freq.get(token, 0.0) + TITLE_WEIGHT
+            self._postings.setdefault(token, {}).setdefault(filename, []).append(-1)
+        for number, line in enumerate(lines):
+            for token in tokenize(line):
+                term_freq[token] = term_freq.get(token, 0.0) + 1.0
+                line_numbers = self._postings.setdefault(token, {}).setdefault(filename, [])
+                if not line_numbers or line_numbers[-1] != number:
+                    line_numbers.append(number)
+
+        self._docs[filename] = {
+            "signature": signature,
+            "title": title,
+            "lines": lines,
+            "term_freq": term_freq,
+            "length": sum(term_freq.values()) or 1.0
+        }
+
+    def _unindex(self, filename: str):
+        doc = self._docs.pop(filename, None)
+        if not doc:
+            return
+        for token in doc["term_freq"]:
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(filename, None)
+                if not postings:
+                    del self._postings[token]
+        self._html_cache.pop(filename, None)
+
+    def _expand(self, token: str) -> List[str]:
+        """Termos do vocabulário que começam com o termo buscado"""
+        terms = []
+        for i in range(bisect_left(self._vocabulary, token), len(self._vocabulary)):
+            if not self._vocabulary[i].startswith(token):
+                break
+            terms.append(self._vocabulary[i])
+        return terms
+
+    # ------------------------------------------------------------------ consultas
+
+    def list_manuals(self, exclude: Tuple[str, ...] = ()) -> List[Dict[str, Any]]:
+        self.refresh()
+        with self._lock:
+            return [
+                {"filename": name, "title": doc["title"], "path": os.path.join(self.directory, name)}
+                for name, doc in sorted(self._docs.items())
+                if name not in exclude
+            ]
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        with self._lock:
+            doc = self._docs.get(filename)
+            if not doc:
+                return None
+            return {"filename": filename, "title": doc["title"], "content": '\n'.join(doc["lines"])}
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Busca ranqueada nos manuais. Todos os termos precisam aparecer no manual
+        (por prefixo); se nenhum manual tiver todos, vale qualquer termo.
+
+        Returns:
+            Lista de {filename, title, score, matches: [{line, context}], match_count}
+        """
+        self.refresh()
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        with self._lock:
+            total_docs = len(self._docs) or 1
+            average_length = sum(doc["length"] for doc in self._docs.values()) / total_docs
+            # termo buscado -> {filename: (peso, linhas)}
+            per_token: List[Dict[str, Tuple[float, List[int]]]] = []
+            for token in tokens:
+                hits: Dict[str, Tuple[float, List[int]]] = {}
+                for term in self._expand(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for filename, line_numbers in postings.items():
+                        doc = self._docs[filename]
+                        tf = doc["term_freq"][term]
+                        weight = idf * tf * (BM25_K1 + 1) / (
+                            tf + BM25_K1 * (1 - BM25_B + BM25_B * doc["length"] / average_length)
+                        )
+                        previous_weight, previous_lines = hits.get(filename, (0.0, []))
+                        hits[filename] = (previous_weight + weight, previous_lines + line_numbers)
+                per_token.append(hits)
+
+            candidates = set.intersection(*(set(hits) for hits in per_token))
+            if not candidates:
+                candidates = set().union(*(set(hits) for hits in per_token))
+
+            results = []
+            for filename in candidates:
+                doc = self._docs[filename]
+                score = 0.0
+                line_hits: Dict[int, int] = {}
+                for hits in per_token:
+                    if filename not in hits:
+                        continue
+                    weight, line_numbers = hits[filename]
+                    score += weight
+                    for number in set(line_numbers):
+                        if number >= 0:
+                            line_hits[number] = line_hits.get(number, 0) + 1
+
+                results.append({
+                    "filename": filename,
+                    "title": doc["title"],
+                    "score": round(score, 3),
+                    "matches": self._snippets(doc["lines"], line_hits),
+                    "match_count": len(line_hits)
+                })
+
+        results.sort(key=lambda r: (-r["score"], r["filename"]))
+        return results[:limit] if limit else results
+
+    @staticmethod
+    def _snippets(lines: List[str], line_hits: Dict[int, int]) -> List[Dict[str, Any]]:
+        """Linhas com mais termos (empate: a primeira), com a linha anterior e a posterior"""
+        best = sorted(line_hits, key=lambda n: (-line_hits[n], n))[:MAX_SNIPPETS_PER_MANUAL]
+        return [
+            {"line": n + 1, "context": '\n'.join(lines[max(0, n - 1):min(len(lines), n + 2)])}
+            for n in sorted(best)
+        ]
+
+    # ------------------------------------------------------------------ HTML
+
+    def render_html(self, filename: str) -> Optional[str]:
+        """Markdown do manual convertido em HTML, em cache até o arquivo mudar"""
+        filepath = os.path.join(self.directory, filename)
+        try:
+            mtime = os.path.getmtime(filepath)
+        except OSError:
+            return None
+        cached = self._html_cache.get(filename)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
+        try:
+            import markdown
+            html_content = markdown.markdown(content, extensions=['fenced_code', 'tables'])
+        except Exception:
+            # Se falhar, usar apenas o texto puro
+            html_content = f"<pre>{content}</pre>"
+        self._html_cache[filename] = (mtime, html_content)
+        return html_content
+
+
+_indexes: Dict[str, ManualIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_manual_index(directory: str) -> ManualIndex:
+    """Índice compartilhado (por processo) do diretório de manuais"""
+    directory = os.path.realpath(directory)
+    with _indexes_lock:
+        index = _indexes.get(directory)
+        if index is None:
+            index = ManualIndex(directory)
+            _indexes[directory] = index
+        return index
@@ -0,0 +1,349 @@
+"""
+Cache local da árvore de categorias e atributos do Mercado Livre
+
+Três camadas:
+- memória (entradas quentes, TTL curto, por processo)
+- tabela `categories` (payload + ETag, TTL longo)
+- API do ML (apenas no primeiro acesso ou na revalidação em background)
+
+Dados vencidos continuam sendo servidos enquanto o job de refresh
+revalida com If-None-Match, então páginas não esperam pela API.
+"""
+import copy
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.database_models import Category
+
+logger = logging.getLogger(__name__)
+
+ML_API_BASE_URL = "https://api.mercadolibre.com"
+
+# Validade do cache persistido antes da revalidação
+CATEGORY_TTL = timedelta(days=7)
+SITE_CATEGORIES_TTL = timedelta(days=1)
+
+# Validade das entradas quentes em memória (segundos)
+HOT_CACHE_TTL = 600
+PREDICT_CACHE_TTL = 3600
+HOT_CACHE_MAX_ENTRIES = 5000
+
+REQUEST_TIMEOUT = 10
+
+_hot_cache: Dict[str, Tuple[float, Any]] = {}
+_hot_lock = threading.Lock()
+
+
+def _hot_get(key: str) -> Optional[Any]:
+    with _hot_lock:
+        entry = _hot_cache.get(key)
+        if not entry:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            _hot_cache.pop(key, None)
+            return None
+    # Cópia: chamadores costumam anotar os dicts retornados
+    return copy.deepcopy(value)
+
+
+def _hot_set(key: str, value: Any, ttl: int = HOT_CACHE_TTL) -> None:
+    with _hot_lock:
+        if len(_hot_cache) >= HOT_CACHE_MAX_ENTRIES:
+            # Descarta primeiro as entradas mais próximas de expirar
+            for old_key, _ in sorted(_hot_cache.items(), key=lambda item: item[1][0])[:HOT_CACHE_MAX_ENTRIES // 10]:
+                _hot_cache.pop(old_key, None)
+        _hot_cache[key] = (time.monotonic() + ttl, copy.deepcopy(value))
+
+
+def invalidate_hot_cache() -> None:
+    """Limpa as entradas em memória (os dados persistidos são mantidos)"""
+    with _hot_lock:
+        _hot_cache.clear()
+
+
+class MLCategoryCacheService:
+    """Serviço de leitura de categorias/atributos do ML com cache persistente"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+    def get_site_categories(self, site_id: str = "MLB", access_token: Optional[str] = None) -> Optional[List[Dict]]:
+        """Categorias raiz de um site"""
+        hot_key = f"site:{site_id}"
+        cached = _hot_get(hot_key)
+        if cached is not None:
+            return cached
+
+        data = self._stored_value(site_id, "data")
+        if data is None:
+            data = self._fetch_and_store(
+                site_id, f"{ML_API_BASE_URL}/sites/{site_id}/categories", "data",
+                access_token=access_token, site_id=site_id, name=f"{site_id} (raiz)"
+            )
+        if data is None:
+            return None
+
+        _hot_set(hot_key, data)
+        return copy.deepcopy(data)
+
+    def get_category(self, category_id: str, access_token: Optional[str] = None) -> Optional[Dict]:
+        """Detalhes da categoria (inclui children_categories e path_from_root)"""
+        if not category_id:
+            return None
+
+        hot_key = f"category:{category_id}"
+        cached = _hot_get(hot_key)
+        if cached is not None:
+            return cached
+
+        data = self._stored_value(category_id, "data")
+        if data is None:
+            data = self._fetch_and_store(
+                category_id, f"{ML_API_BASE_URL}/categories/{category_id}", "data",
+                access_token=access_token
+            )
+        if data is None:
+            return None
+
+        _hot_set(hot_key, data)
+        return copy.deepcopy(data)
+
+    def get_category_attributes(self, category_id: str, access_token: Optional[str] = None) -> Optional[List[Dict]]:
+        """Lista bruta de atributos da categoria"""
+        if not category_id:
+            return None
+
+        hot_key = f"attributes:{category_id}"
+        cached = _hot_get(hot_key)
+        if cached is not None:
+            return cached
+
+        attributes = self._stored_value(category_id, "attributes")
+        if attributes is None:
+            attributes = self._fetch_and_store(
+                category_id, f"{ML_API_BASE_URL}/categories/{category_id}/attributes", "attributes",
+                access_token=access_token
+            )
+        if attributes is None:
+            return None
+
+        _hot_set(hot_key, attributes)
+        return copy.deepcopy(attributes)
+
+    def get_category_info(self, category_id: str) -> Dict:
+        """Resumo usado na importação de produtos (nome, caminho, domínio...)"""
+        category_data = self.get_category(category_id)
+        if not category_data:
+            return {}
+
+        path = category_data.get("path_from_root") or []
+        return {
+            "category_name": category_data.get("name"),
+            "category_path": [{"id": node.get("id"), "name": node.get("name")} for node in path],
+            "domain_id": category_data.get("domain_id"),
+            "attributes_count": len(category_data.get("attributes", [])),
+            "children_categories": len(category_data.get("children_categories", [])),
+            "settings": category_data.get("settings", {})
+        }
+
+    def predict_categories(self, site_id: str, q: str, limit: int = 5,
+                           access_token: Optional[str] = None) -> Optional[List[Dict]]:
+        """Predição de categoria pelo título (cache apenas em memória, por título normalizado)"""
+        normalized = " ".join((q or "").lower().split())
+        hot_key = f"predict:{site_id}:{limit}:{normalized}"
+        cached = _hot_get(hot_key)
+        if cached is not None:
+            return cached
+
+        headers = {"Accept": "application/json"}
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+
+        response = requests.get(
+            f"{ML_API_BASE_URL}/sites/{site_id}/domain_discovery/search",
+            params={"q": q, "limit": limit},
+            headers=headers,
+            timeout=REQUEST_TIMEOUT
+        )
+        if response.status_code != 200:
+            logger.warning(f"⚠️ Predição de categoria falhou: {response.status_code}")
+            return None
+
+        predictions = response.json()
+        _hot_set(hot_key, predictions, ttl=PREDICT_CACHE_TTL)
+        return predictions
+
+    # ------------------------------------------------------------------
+    # Refresh em background
+    # ------------------------------------------------------------------
+    def refresh_stale(self, limit: int = 200) -> Dict[str, int]:
+        """Revalida (ETag) as categorias com cache vencido; usado pelo job agendado"""
+        now = datetime.utcnow()
+        stats = {"checked": 0, "not_modified": 0, "updated": 0, "errors": 0}
+
+        rows = self.db.query(Category).filter(
+            or_(
+                Category.fetched_at.is_(None),
+                Category.fetched_at < now - SITE_CATEGORIES_TTL,
+                Category.attributes_fetched_at < now - CATEGORY_TTL
+            )
+        ).order_by(Category.fetched_at.asc().nullsfirst()).limit(limit).all()
+
+        for row in rows:
+            is_site_root = row.site_id is not None and row.ml_category_id == row.site_id
+            data_ttl = SITE_CATEGORIES_TTL if is_site_root else CATEGORY_TTL
+            targets = []
+            if row.fetched_at is None or row.fetched_at < now - data_ttl:
+                url = (f"{ML_API_BASE_URL}/sites/{row.ml_category_id}/categories" if is_site_root
+                       else f"{ML_API_BASE_URL}/categories/{row.ml_category_id}")
+                targets.append((url, "data"))
+            if row.attributes_fetched_at is not None and row.attributes_fetched_at < now - CATEGORY_TTL:
+                targets.append((f"{ML_API_BASE_URL}/categories/{row.ml_category_id}/attributes", "attributes"))
+
+            for url, field in targets:
+                stats["checked"] += 1
+                result = self._revalidate(row, url, field)
+                stats[result] += 1
+
+        if rows:
+            invalidate_hot_cache()
+        logger.info(f"🗂️ Refresh de categorias: {stats}")
+        return stats
+
+    # ------------------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------------------
+    def _fetch_and_store(self, ml_category_id: str, url: str, field: str,
+                         access_token: Optional[str] = None, site_id: Optional[str] = None,
+                         name: Optional[str] = None) -> Optional[Any]:
+        """Primeira busca de um recurso ainda não cacheado; retorna o valor do campo"""
+        headers = {"Accept": "application/json"}
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+
+        try:
+            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            logger.error(f"❌ Erro ao buscar {url}: {e}")
+            return self._stored_value(ml_category_id, field)
+
+        if response.status_code != 200:
+            logger.warning(f"⚠️ API ML retornou {response.status_code} para {url}")
+            return self._stored_value(ml_category_id, field)
+
+        payload = response.json()
+        self._store(ml_category_id, field, payload, response.headers.get("ETag"), site_id=site_id, name=name)
+        return payload
+
+    def _revalidate(self, row: Category, url: str, field: str) -> str:
+        """Revalida um recurso com If-None-Match; retorna a chave de estatística"""
+        etag = row.etag if field == "data" else row.attributes_etag
+        headers = {"Accept": "application/json"}
+        if etag:
+            headers["If-None-Match"] = etag
+
+        try:
+            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            logger.error(f"❌ Erro ao revalidar {url}: {e}")
+            return "errors"
+
+        if response.status_code == 304:
+            return "not_modified" if self._store(row.ml_category_id, field, not_modified=True) else "errors"
+        if response.status_code != 200:
+            logger.warning(f"⚠️ Revalidação de {url} retornou {response.status_code}")
+            return "errors"
+
+        stored = self._store(row.ml_category_id, field, response.json(), response.headers.get("ETag"))
+        return "updated" if stored else "errors"
+
+    def _stored_value(self, ml_category_id: str, field: str) -> Optional[Any]:
+        return self.db.query(getattr(Category, field)).filter(Category.ml_category_id == ml_category_id).scalar()
+
+    @staticmethod
+    def _store(ml_category_id: str, field: str, payload: Any = None, etag: Optional[str] = None,
+               site_id: Optional[str] = None, name: Optional[str] = None, not_modified: bool = False) -> bool:
+        """
+        Grava o recurso em uma sessão própria
+
+        A leitura pode acontecer no meio de uma transação do chamador (ex.: lote da
+        importação de produtos); o commit/rollback do cache não pode afetá-la.
+        """
+        from app.config.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            row = db.query(Category).filter(Category.ml_category_id == ml_category_id).first()
+            if not_modified:
+                if row is None:
+                    return False
+                if field == "data":
+                    row.fetched_at = datetime.utcnow()
+                else:
+                    row.attributes_fetched_at = datetime.utcnow()
+                db.commit()
+                return True
+
+            if row is None:
+                row = Category(ml_category_id=ml_category_id, name=name or ml_category_id, site_id=site_id)
+                try:
+                    with db.begin_nested():
+                        db.add(row)
+                except IntegrityError:
+                    # Outra requisição criou a linha ao mesmo tempo
+                    row = db.query(Category).filter(Category.ml_category_id == ml_category_id).first()
+                    if row is None:
+                        return False
+
+            MLCategoryCacheService._apply_payload(row, field, payload, etag)
+            db.commit()
+            return True
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ Erro ao salvar cache da categoria {ml_category_id}: {e}")
+            return False
+        finally:
+            db.close()
+
+    @staticmethod
+    def _apply_payload(row: Category, field: str, payload: Any, etag: Optional[str]) -> None:
+        now = datetime.utcnow()
+        if field == "attributes":
+            row.attributes = payload
+            row.attributes_etag = etag
+            row.attributes_fetched_at = now
+            return
+
+        row.data = payload
+        row.etag = etag
+        row.fetched_at = now
+        if isinstance(payload, dict):
+            row.name = payload.get("name") or row.name
+            path = payload.get("path_from_root") or []
+            row.path_from_root = " > ".join(node.get("name", "") for node in path) or row.path_from_root
+            if len(path) > 1:
+                row.parent_id = path[-2].get("id")
+            row.site_id = row.site_id or (row.ml_category_id[:3] if row.ml_category_id else None)
+
+
+def run_category_cache_refresh() -> Dict[str, int]:
+    """Entrada do job agendado: revalida o cache de categorias vencido"""
+    from app.config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        return MLCategoryCacheService(db).refresh_stale()
+    finally:
+        db.close()
@@ -3,157 +3,277 @@ Serviço para gerenciar Claims/Returns do Mercado Livre
 """
 import logging
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.models.saas_models import MLClaim, MLClaimStatus, MLClaimType, MLOrder
 
 logger = logging.getLogger(__name__)
 
+# Resolution reasons que indicam DEVOLUÇÃO CONFIRMADA (baseado na documentação)
+RETURN_RESOLUTIONS = [
+    "item_returned",       # Produto devolvido
+    "return_canceled",     # Devolução cancelada
+    "return_expired",      # Devolução expirada
+    "warehouse_decision",  # Decisão do warehouse (produto analisado)
+    "warehouse_timeout",   # Timeout do warehouse
+    "low_cost",           # Custo de envio > valor produto
+    "coverage_decision",   # Cobertura aplicada (devolução)
+    "no_bpp",             # Sem cobertura (devolução)
+]
+
+# Pedidos buscados em paralelo na API (apenas os que não estão em ml_orders)
+ORDER_FETCH_WORKERS = 8
+
+# Prazo após o fechamento da venda em que um claim ainda pode ser aberto; limita quais
+# claims sem pedido local são consultados na API para um período
+CLAIM_AFTER_SALE_WINDOW = timedelta(days=90)
+
+
+def _parse_ml_datetime(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value.split(".")[0], "%Y-%m-%dT%H:%M:%S")
+    except ValueError:
+        return None
+
+
 class MLClaimsService:
     """Serviço para buscar reclamações e devoluções"""
     
-    def __init__(self):
+    def __init__(self, db: Optional[Session] = None):
         self.base_url = "https://api.mercadolibre.com"
+        self.db = db
     
-    def get_returns_metrics(self, access_token: str, date_from: datetime, date_to: datetime, seller_id: int = None) -> Dict:
+    def get_returns_metrics(self, account_tokens: Dict[int, str], date_from: datetime, date_to: datetime,
+                            company_id: int = None) -> Dict:
         """
         Busca métricas de devoluções do período - LÓGICA CORRETA BASEADA NA DOCUMENTAÇÃO DO ML
         
         ML conta: "vendas do período selecionado em que compradores solicitaram devolução"
         = Vendas FECHADAS no período (date_closed) que TÊM claims/returns
         
-        LÓGICA:
-        1. Buscar TODOS os claims (type=mediations E type=returns)
-        2. Filtrar apenas os que têm resolution.reason indicando devolução CONFIRMADA
-        3. Para cada claim, buscar a order e verificar se date_closed está no período
+        LÓGICA (local primeiro):
+        1. Buscar as páginas recentes de claims (type=mediations E type=returns) de cada conta e
+           gravar em ml_claims apenas os que ainda não existem (os demais são mantidos pelo webhook)
+        2. Filtrar apenas os que têm resolution.reason indicando devolução CONFIRMADA e
+           cruzar com ml_orders (date_closed no período, total_amount) em SQL
+        3. Claims cujo pedido não está em ml_orders e ainda não foi consultado (criados no período):
+           buscar os pedidos na API, em paralelo, com o token da conta do claim, e gravar o
+           resultado no claim para não consultar de novo
         
         Args:
-            access_token: Token de acesso  
+            account_tokens: ml_account_id -> access token da conta
             date_from: Data inicial do período
             date_to: Data final do período
+            company_id: Empresa dos claims locais
             
         Returns:
             Dict com total de devoluções e valor
         """
         try:
-            logger.info(f"🔄 Buscando devoluções com lógica CORRETA do ML...")
-            
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            }
-            
-            # Resolution reasons que indicam DEVOLUÇÃO CONFIRMADA (baseado na documentação)
-            RETURN_RESOLUTIONS = [
-                "item_returned",       # Produto devolvido
-                "return_canceled",     # Devolução cancelada
-                "return_expired",      # Devolução expirada
-                "warehouse_decision",  # Decisão do warehouse (produto analisado)
-                "warehouse_timeout",   # Timeout do warehouse
-                "low_cost",           # Custo de envio > valor produto
-                "coverage_decision",   # Cobertura aplicada (devolução)
-                "no_bpp",             # Sem cobertura (devolução)
-            ]
-            
-            claims_url = f"{self.base_url}/post-purchase/v1/claims/search"
+            if self.db is None or not company_id:
+                raise ValueError("get_returns_metrics requer sessão de banco e company_id")
+            
+            logger.info(f"🔄 Buscando devoluções (claims locais + pedidos locais)...")
+            
+            # 1. Claims novos (ainda não vistos) das páginas mais recentes
+            new_claims = 0
+            for ml_account_id, access_token in account_tokens.items():
+                for claim_type in ["mediations", "returns"]:
+                    claims = self.get_claims(access_token, claim_type=claim_type, limit=100).get("data", [])
+                    new_claims += self._store_new_claims(claims, claim_type, company_id, ml_account_id)
+            
+            # 2. Devoluções confirmadas x pedidos locais (um join em SQL)
+            rows = self.db.query(
+                MLClaim.id,
+                MLClaim.ml_account_id,
+                MLClaim.ml_claim_id,
+                MLClaim.claim_type,
+                MLClaim.ml_order_id,
+                MLClaim.resolution_reason,
+                MLClaim.order_total_amount,
+                MLClaim.order_date_closed,
+                MLClaim.order_checked_at,
+                MLOrder.id.label("local_order_id"),
+                MLOrder.total_amount,
+                MLOrder.date_closed
+            ).outerjoin(
+                MLOrder,
+                and_(MLOrder.order_id == MLClaim.ml_order_id, MLOrder.company_id == company_id)
+            ).filter(
+                MLClaim.company_id == company_id,
+                MLClaim.ml_order_id.isnot(None),
+                MLClaim.ml_order_id != "",
+                or_(
+                    # Para type=returns: TODOS são devoluções (se tiverem resolution)
+                    and_(MLClaim.claim_type == MLClaimType.RETURNS, MLClaim.resolution_reason.isnot(None)),
+                    # Para type=mediations: Apenas os com resolution indicando devolução
+                    and_(MLClaim.claim_type == MLClaimType.MEDIATIONS, MLClaim.resolution_reason.in_(RETURN_RESOLUTIONS))
+                ),
+                or_(
+                    MLOrder.date_closed.between(date_from, date_to),
+                    and_(
+                        MLOrder.id.is_(None),
+                        or_(
+                            # Pedido já consultado na API
+                            MLClaim.order_date_closed.between(date_from, date_to),
+                            # Ainda não consultado: só claims abertos depois da venda do período
+                            and_(
+                                MLClaim.order_checked_at.is_(None),
+                                MLClaim.ml_account_id.in_(list(account_tokens)),
+                                MLClaim.date_created.between(date_from, date_to + CLAIM_AFTER_SALE_WINDOW)
+                            )
+                        )
+                    )
+                )
+            ).all()
             
             all_returns = []
-            
-            # BUSCAR CLAIMS TYPE=MEDIATIONS E TYPE=RETURNS
-            for claim_type in ["mediations", "returns"]:
-                logger.info(f"📦 Buscando claims type={claim_type}...")
-                
-                # Buscar com sort por date_created DESC e limit 100 (cobre período de 30 dias)
-                claims_params = {
-                    "type": claim_type,
-                    "limit": 100,
-                    "offset": 0,
-                    "sort": "date_created:desc"
-                }
-                
-                response = requests.get(claims_url, headers=headers, params=claims_params, timeout=30)
-                
-                if response.status_code != 200:
-                    logger.error(f"Erro ao buscar claims {claim_type}: {response.status_code}")
+            missing = []
+            for row in rows:
+                if row.local_order_id is not None:
+                    total_amount, date_closed = row.total_amount, row.date_closed
+                elif row.order_checked_at is not None:
+                    total_amount, date_closed = row.order_total_amount, row.order_date_closed
+                else:
+                    missing.append(row)
                     continue
-                
-                data = response.json()
-                claims = data.get("data", [])
-                total = data.get("paging", {}).get("total", 0)
-                
-                logger.info(f"  Total de claims {claim_type}: {total}, recebidos: {len(claims)}")
-                
-                # Processar cada claim
-                for claim in claims:
-                    claim_id = claim.get("id")
-                    resource_id = claim.get("resource_id")
-                    resolution = claim.get("resolution", {})
-                    resolution_reason = resolution.get("reason") if resolution else None
-                    
-                    # Para type=returns: TODOS são devoluções (se tiverem resolution)
-                    # Para type=mediations: Apenas os com resolution indicando devolução
-                    is_return = False
-                    
-                    if claim_type == "returns":
-                        # Returns sempre são devoluções (se tiverem resolution)
-                        if resolution_reason:
-                            is_return = True
-                    elif claim_type == "mediations":
-                        # Mediations: verificar resolution.reason
-                        if resolution_reason in RETURN_RESOLUTIONS:
-                            is_return = True
-                    
-                    if is_return and resource_id:
-                        try:
-                            # Buscar detalhes do pedido
-                            order_url = f"{self.base_url}/orders/{resource_id}"
-                            order_response = requests.get(order_url, headers=headers, timeout=10)
-                            
-                            if order_response.status_code == 200:
-                                order_data = order_response.json()
-                                date_closed_str = order_data.get("date_closed")
-                                
-                                if date_closed_str:
-                                    # Parse date_closed
-                                    try:
-                                        order_date = datetime.strptime(date_closed_str.split(".")[0], "%Y-%m-%dT%H:%M:%S")
-                                        
-                                        # Verificar se a VENDA foi fechada no período
-                                        if date_from <= order_date <= date_to:
-                                            total_amount = float(order_data.get("total_amount", 0))
-                                            
-                                            all_returns.append({
-                                                "claim_id": claim_id,
-                                                "claim_type": claim_type,
-                                                "order_id": resource_id,
-                                                "total_amount": total_amount,
-                                                "date_closed": date_closed_str,
-                                                "resolution_reason": resolution_reason
-                                            })
-                                            
-                                            logger.info(f"  ✅ Devolução: Claim {claim_id} ({claim_type}) | Order {resource_id} | R$ {total_amount:.2f} | {resolution_reason}")
-                                    except Exception as e:
-                                        logger.debug(f"Erro ao parsear date_closed: {e}")
-                        except Exception as e:
-                            logger.debug(f"Erro ao buscar order {resource_id}: {e}")
+                all_returns.append(self._return_entry(row, total_amount, date_closed))
+            
+            # 3. Pedidos fora do banco: API, em paralelo (token da conta de cada claim)
+            fetched = 0
+            if missing:
+                now = datetime.now()
+                for ml_account_id, access_token in account_tokens.items():
+                    account_rows = [row for row in missing if row.ml_account_id == ml_account_id]
+                    if not account_rows:
+                        continue
+                    headers = {
+                        "Authorization": f"Bearer {access_token}",
+                        "Content-Type": "application/json"
+                    }
+                    orders = self._fetch_orders([row.ml_order_id for row in account_rows], headers)
+                    for row in account_rows:
+                        if row.ml_order_id not in orders:
+                            continue  # falha temporária: tenta de novo na próxima consulta
+                        order_data = orders[row.ml_order_id]
+                        date_closed = _parse_ml_datetime(order_data.get("date_closed"))
+                        total_amount = order_data.get("total_amount")
+                        self.db.query(MLClaim).filter(MLClaim.id == row.id).update({
+                            MLClaim.order_total_amount: total_amount,
+                            MLClaim.order_date_closed: date_closed,
+                            MLClaim.order_checked_at: now
+                        }, synchronize_session=False)
+                        fetched += 1
+                        # Verificar se a VENDA foi fechada no período
+                        if date_closed and date_from <= date_closed <= date_to:
+                            all_returns.append(self._return_entry(row, total_amount, date_closed))
+                if fetched:
+                    self.db.commit()
             
             # Calcular totais
             returns_count = len(all_returns)
             returns_value = sum(r['total_amount'] for r in all_returns)
             
-            logger.info(f"✅ Total de devoluções no período: {returns_count}, R$ {returns_value:.2f}")
+            logger.info(
+                f"✅ Total de devoluções no período: {returns_count}, R$ {returns_value:.2f} "
+                f"({new_claims} claim(s) novo(s), {fetched} pedido(s) buscado(s) na API)"
+            )
             
             return {
                 "returns_count": returns_count,
                 "returns_value": returns_value,
+                "new_claims": new_claims,
+                "orders_fetched": fetched,
                 "details": all_returns  # Para debug
             }
             
         except Exception as e:
+            self.db.rollback()
             logger.error(f"Erro ao buscar devoluções: {e}")
             import traceback
             traceback.print_exc()
             return {"returns_count": 0, "returns_value": 0}
     
+    @staticmethod
+    def _return_entry(row, total_amount, date_closed: Optional[datetime]) -> Dict:
+        return {
+            "claim_id": row.ml_claim_id,
+            "claim_type": row.claim_type.value,
+            "order_id": row.ml_order_id,
+            "total_amount": float(total_amount or 0),
+            "date_closed": date_closed.isoformat() if date_closed else None,
+            "resolution_reason": row.resolution_reason
+        }
+    
+    def _store_new_claims(self, claims: List[Dict], claim_type: str, company_id: int, ml_account_id: int) -> int:
+        """Grava os claims da busca que ainda não existem em ml_claims (campos principais)"""
+        ids = [str(c.get("id")) for c in claims if c.get("id")]
+        if not ids:
+            return 0
+        existing = {
+            row.ml_claim_id for row in self.db.query(MLClaim.ml_claim_id).filter(MLClaim.ml_claim_id.in_(ids)).all()
+        }
+        now = datetime.now()
+        created = 0
+        for claim in claims:
+            ml_claim_id = str(claim.get("id"))
+            if not claim.get("id") or ml_claim_id in existing:
+                continue
+            resolution = claim.get("resolution") if isinstance(claim.get("resolution"), dict) else {}
+            status_str = (claim.get("status") or "opened").upper()
+            self.db.add(MLClaim(
+                company_id=company_id,
+                ml_account_id=ml_account_id,
+                ml_claim_id=ml_claim_id,
+                ml_order_id=str(claim.get("resource_id") or ""),
+                ml_buyer_id=str((claim.get("buyer") or {}).get("id", "") if isinstance(claim.get("buyer"), dict) else ""),
+                ml_seller_id=str((claim.get("seller") or {}).get("id", "") if isinstance(claim.get("seller"), dict) else ""),
+                claim_type=MLClaimType.MEDIATIONS if (claim.get("type") or claim_type) == "mediations" else MLClaimType.RETURNS,
+                status=MLClaimStatus[status_str] if status_str in MLClaimStatus.__members__ else MLClaimStatus.OPENED,
+                resolution_reason=resolution.get("reason"),
+                resolution_status=resolution.get("status"),
+                resolution_date=_parse_ml_datetime(resolution.get("date")),
+                date_created=_parse_ml_datetime(claim.get("date_created")) or now,
+                date_updated=_parse_ml_datetime(claim.get("last_updated") or claim.get("date_updated")),
+                date_closed=_parse_ml_datetime(claim.get("date_closed")),
+                claim_data=claim,
+                last_sync=now
+            ))
+            existing.add(ml_claim_id)
+            created += 1
+        if created:
+            self.db.commit()
+            logger.info(f"  📥 {created} claim(s) {claim_type} novo(s) gravado(s)")
+        return created
+    
+    def _fetch_orders(self, order_ids: List[str], headers: Dict) -> Dict[str, Dict]:
+        """
+        Busca pedidos na API em paralelo; devolve order_id -> dados
+        
+        Pedidos inexistentes ou de outro seller (403/404) voltam como {} para serem marcados
+        como consultados; falhas temporárias ficam de fora.
+        """
+        def fetch(order_id: str):
+            try:
+                response = requests.get(f"{self.base_url}/orders/{order_id}", headers=headers, timeout=10)
+                if response.status_code == 200:
+                    return order_id, response.json()
+                if response.status_code in (403, 404):
+                    return order_id, {}
+            except Exception as e:
+                logger.debug(f"Erro ao buscar order {order_id}: {e}")
+            return order_id, None
+        
+        unique_ids = list(dict.fromkeys(order_ids))
+        with ThreadPoolExecutor(max_workers=min(ORDER_FETCH_WORKERS, len(unique_ids))) as executor:
+            return {order_id: data for order_id, data in executor.map(fetch, unique_ids) if data is not None}
+    
     def get_claims(self, access_token: str, claim_type: Optional[str] = None, status: Optional[str] = None, 
                    limit: int = 100, offset: int = 0, order_id: Optional[str] = None) -> Dict:
         """
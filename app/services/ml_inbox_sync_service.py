@@ -0,0 +1,96 @@
+"""
+Sincronização em background da caixa de entrada do Mercado Livre (mensagens pós-venda e perguntas)
+
+As telas de mensagens/perguntas leem apenas as tabelas locais; a atualização vem
+dos webhooks, do job agendado (run_inbox_sync) e, quando a conta ainda não tem
+cursor, de uma sincronização disparada em thread (request_inbox_sync).
+"""
+import logging
+import threading
+from typing import Dict, Optional
+
+from app.models.saas_models import MLAccount, MLAccountStatus
+from app.services.ml_messages_service import MLMessagesService
+from app.services.ml_questions_service import MLQuestionsService
+
+logger = logging.getLogger(__name__)
+
+# Empresas com sincronização em andamento (evita threads duplicadas por requisições seguidas)
+_running: set = set()
+_running_lock = threading.Lock()
+
+
+def _sync_company(db, company_id: int, ml_account_id: Optional[int] = None) -> Dict:
+    messages = MLMessagesService(db).sync_messages(company_id, None, ml_account_id, fetch_all=False)
+    questions = MLQuestionsService(db).sync_questions(company_id, None, ml_account_id)
+    return {"messages": messages, "questions": questions}
+
+
+def run_inbox_sync() -> Dict[str, int]:
+    """Entrada do job agendado: sincronização incremental de todas as empresas com conta ML ativa"""
+    from app.config.database import SessionLocal
+
+    db = SessionLocal()
+    stats = {"companies": 0, "threads": 0, "questions": 0, "errors": 0}
+    try:
+        company_ids = [
+            row[0] for row in db.query(MLAccount.company_id)
+            .filter(MLAccount.status == MLAccountStatus.ACTIVE)
+            .distinct()
+            .all()
+        ]
+        for company_id in company_ids:
+            with _running_lock:
+                if company_id in _running:
+                    continue
+                _running.add(company_id)
+            try:
+                result = _sync_company(db, company_id)
+                stats["companies"] += 1
+                stats["threads"] += result["messages"].get("synced", 0)
+                stats["questions"] += result["questions"].get("saved", 0)
+                if not result["messages"].get("success") or not result["questions"].get("success"):
+                    stats["errors"] += 1
+            except Exception as e:
+                db.rollback()
+                stats["errors"] += 1
+                logger.error(f"❌ Erro na sincronização da caixa de entrada da empresa {company_id}: {e}", exc_info=True)
+            finally:
+                with _running_lock:
+                    _running.discard(company_id)
+        return stats
+    finally:
+        db.close()
+
+
+def request_inbox_sync(company_id: int, ml_account_id: Optional[int] = None) -> bool:
+    """
+    Dispara a sincronização incremental da empresa em uma thread, sem bloquear a requisição
+
+    Returns:
+        True se a sincronização foi iniciada, False se já havia uma em andamento
+    """
+    with _running_lock:
+        if company_id in _running:
+            return False
+        _running.add(company_id)
+
+    def worker():
+        from app.config.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            result = _sync_company(db, company_id, ml_account_id)
+            logger.info(
+                f"📬 Sincronização em background da empresa {company_id}: "
+                f"{result['messages'].get('synced', 0)} conversa(s), {result['questions'].get('saved', 0)} pergunta(s)"
+            )
+        except Exception as e:
+            logger.error(f"❌ Erro na sincronização em background da empresa {company_id}: {e}", exc_info=True)
+        finally:
+            db.close()
+            with _running_lock:
+                _running.discard(company_id)
+
+    threading.Thread(target=worker, daemon=True).start()
+    return True
@@ -3,16 +3,54 @@ Service para gerenciar mensagens pós-venda do Mercado Livre
 """
 import logging
 import requests
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func, null
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import json
 
 from app.models.saas_models import MLMessageThread, MLMessage, MLMessageThreadStatus, MLMessageType, MLAccount, MLAccountStatus
-from app.services.token_manager import TokenManager
+from app.services.token_manager import TokenManager, resolve_token_owner
 
 logger = logging.getLogger(__name__)
 
+# Margem aplicada ao cursor de pedidos na sincronização incremental
+MESSAGES_CURSOR_OVERLAP = timedelta(hours=2)
+# Conversas buscadas na API e gravadas por transação
+THREAD_SYNC_BATCH_SIZE = 100
+# Buscas simultâneas de /messages/packs
+THREAD_FETCH_WORKERS = 6
+# Linhas por INSERT ... ON CONFLICT
+UPSERT_BATCH_SIZE = 500
+
+# Colunas atualizadas quando a conversa/mensagem já existe (espelham os antigos save_*_to_db)
+THREAD_UPDATE_COLUMNS = ["ml_package_id", "status", "thread_data", "last_sync", "updated_at"]
+# Colunas da conversa que só são sobrescritas quando a API trouxe valor
+THREAD_COALESCE_COLUMNS = ["buyer_nickname", "last_message_date", "last_message_text", "order_ids"]
+MESSAGE_UPDATE_COLUMNS = ["message_text", "from_nickname", "to_nickname", "read", "message_data", "updated_at"]
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    """Data ISO da API do ML (aceita sufixo Z)"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (ValueError, AttributeError):
+        return None
+
+
+def _utc(value: Optional[str]) -> Optional[datetime]:
+    """Data ISO da API convertida para UTC (para comparar com os cursores)"""
+    parsed = _parse_date(value)
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
 class MLMessagesService:
     """Service para gerenciar mensagens pós-venda do Mercado Livre"""
     
@@ -31,41 +69,22 @@ class MLMessagesService:
         ml_account_id: Optional[int] = None,
         company_id: Optional[int] = None,
     ) -> Optional[str]:
-        """Obtém token válido usando TokenManager"""
+        """Obtém token válido usando TokenManager (cache por conta ML)"""
         try:
             token_manager = TokenManager(self.db)
 
             if ml_account_id:
-                token_record = token_manager.get_token_record_for_account(
-                    ml_account_id, company_id
+                access_token = token_manager.get_access_token_for_account(ml_account_id, company_id)
+                if access_token:
+                    return access_token
+                logger.error(
+                    "Falha ao obter token para ml_account_id=%s",
+                    ml_account_id,
                 )
-                if token_record and token_record.access_token:
-                    access_token = token_record.access_token
-                    if token_manager.test_token(access_token):
-                        return access_token
-
-                    logger.info(
-                        "Token expirado para ml_account_id=%s, tentando refresh",
-                        ml_account_id,
-                    )
-                    refreshed = token_manager._refresh_token_for_record(token_record)
-                    if refreshed and refreshed.access_token:
-                        access_token = refreshed.access_token
-                        if token_manager.test_token(access_token):
-                            return access_token
-                        logger.error(
-                            "Token renovado continua inválido para ml_account_id=%s",
-                            ml_account_id,
-                        )
-                    else:
-                        logger.error(
-                            "Falha ao renovar token para ml_account_id=%s",
-                            ml_account_id,
-                        )
 
             if user_id:
                 access_token = token_manager.get_valid_token(user_id)
-                if access_token and token_manager.test_token(access_token):
+                if access_token:
                     return access_token
 
             logger.error(
@@ -105,19 +124,8 @@ class MLMessagesService:
         Conforme documentação: POST /messages/packs/$PACK_ID/sellers/$USER_ID?tag=post_sale
         """
         if not seller_id:
-            # Tentar obter seller_id do token
-            try:
-                user_info_url = f"{self.base_url}/users/me"
-                response = requests.get(user_info_url, headers={
-                    **self.headers,
-                    "Authorization": f"Bearer {access_token}"
-                }, timeout=10)
-                if response.status_code == 200:
-                    user_data = response.json()
-                    seller_id = str(user_data.get("id", ""))
-            except Exception as e:
-                logger.error(f"Erro ao obter seller_id: {e}")
-                return {"error": "seller_id não encontrado"}
+            # Dono do token vem do cache do TokenManager (sem /users/me para tokens conhecidos)
+            seller_id = resolve_token_owner(access_token)
         
         if not seller_id:
             return {"error": "seller_id obrigatório"}
@@ -165,20 +173,10 @@ class MLMessagesService:
         """
         if not seller_id:
             logger.warning("⚠️ seller_id não fornecido, tentando obter do token...")
-            # Tentar obter seller_id do token (informação do usuário logado)
-            try:
-                user_info_url = f"{self.base_url}/users/me"
-                response = requests.get(user_info_url, headers={
-                    **self.headers,
-                    "Authorization": f"Bearer {access_token}"
-                }, timeout=10)
-                if response.status_code == 200:
-                    user_data = response.json()
-                    seller_id = str(user_data.get("id", ""))
-                    logger.info(f"✅ Seller ID obtido: {seller_id}")
-            except Exception as e:
-                logger.error(f"❌ Erro ao obter seller_id do token: {e}")
-                return None
+            # Dono do token vem do cache do TokenManager (sem /users/me para tokens conhecidos)
+            seller_id = resolve_token_owner(access_token)
+            if seller_id:
+                logger.info(f"✅ Seller ID obtido: {seller_id}")
         
         if not seller_id:
             logger.error("❌ seller_id obrigatório para buscar mensagens")
@@ -240,19 +238,8 @@ class MLMessagesService:
         Conforme documentação: POST /messages/packs/$PACK_ID/sellers/$USER_ID?tag=post_sale
         """
         if not seller_id:
-            # Tentar obter seller_id do token
-            try:
-                user_info_url = f"{self.base_url}/users/me"
-                response = requests.get(user_info_url, headers={
-                    **self.headers,
-                    "Authorization": f"Bearer {access_token}"
-                }, timeout=10)
-                if response.status_code == 200:
-                    user_data = response.json()
-                    seller_id = str(user_data.get("id", ""))
-            except Exception as e:
-                logger.error(f"Erro ao obter seller_id: {e}")
-                return {"error": "seller_id não encontrado"}
+            # Dono do token vem do cache do TokenManager (sem /users/me para tokens conhecidos)
+            seller_id = resolve_token_owner(access_token)
         
         if not seller_id:
             return {"error": "seller_id obrigatório"}
@@ -430,191 +417,241 @@ class MLMessagesService:
             logger.error(f"❌ ========== FIM DO ERRO ==========")
             return []
     
-    def save_thread_to_db(self, thread_data: Dict, company_id: int, ml_account_id: int, ml_user_id: str) -> Optional[MLMessageThread]:
-        """Salva ou atualiza uma thread/conversa no banco"""
-        logger.info(f"💾 ========== SALVANDO THREAD NO BANCO ==========")
-        logger.info(f"💾 Company ID: {company_id}")
-        logger.info(f"💾 ML Account ID: {ml_account_id}")
-        logger.info(f"💾 ML User ID: {ml_user_id}")
-        
+    def get_unread_packs(self, access_token: str) -> List[str]:
+        """
+        Packs com mensagens não lidas pelo vendedor
+
+        Conforme documentação: GET /messages/unread?role=seller&tag=post_sale
+        Cobre conversas novas em pedidos antigos, que a busca por data de pedido não alcança.
+        """
         try:
-            package_id = thread_data.get("package_id") or thread_data.get("id")
-            logger.info(f"💾 Package ID extraído: {package_id}")
+            url = f"{self.base_url}/messages/unread"
+            headers = {
+                **self.headers,
+                "Authorization": f"Bearer {access_token}"
+            }
+            response = requests.get(url, headers=headers, params={"role": "seller", "tag": "post_sale"}, timeout=15)
+            if response.status_code != 200:
+                logger.warning(f"⚠️ Erro ao buscar packs não lidos: {response.status_code} - {response.text[:200]}")
+                return []
             
-            if not package_id:
-                logger.warning("❌ Thread sem package_id, ignorando...")
-                logger.warning(f"❌ Dados recebidos: {list(thread_data.keys())}")
+            pack_ids = []
+            for result in response.json().get("results", []):
+                # resource: /packs/$PACK_ID/sellers/$USER_ID
+                parts = (result.get("resource") or "").strip("/").split("/")
+                if len(parts) >= 2 and parts[0] == "packs":
+                    pack_ids.append(parts[1])
+            logger.info(f"📬 {len(pack_ids)} pack(s) com mensagens não lidas")
+            return pack_ids
+        except Exception as e:
+            logger.error(f"Erro ao buscar packs não lidos: {e}", exc_info=True)
+            return []
+    
+    def _thread_row(self, thread_data: Dict, company_id: int, ml_account_id: int, ml_user_id: str) -> Optional[Dict]:
+        """Converte o pacote/conversa da API na linha de ml_message_threads usada no upsert"""
+        package_id = thread_data.get("package_id") or thread_data.get("id")
+        if not package_id:
+            logger.warning(f"❌ Thread sem package_id, ignorando... Dados recebidos: {list(thread_data.keys())}")
+            return None
+        
+        messages_data = thread_data.get("messages") or []
+        last_message = messages_data[-1] if messages_data else {}
+        
+        buyer_data = thread_data.get("buyer") or {}
+        buyer_id = str(buyer_data["id"]) if buyer_data.get("id") else None
+        if not buyer_id:
+            # Packs vindos de /messages/unread não trazem o pedido: o comprador é o outro participante
+            for message in messages_data:
+                for side in ("from", "to"):
+                    user_id = str((message.get(side) or {}).get("user_id", ""))
+                    if user_id and user_id != str(ml_user_id):
+                        buyer_id = user_id
+                        break
+                if buyer_id:
+                    break
+        
+        order_ids = thread_data.get("order_ids") or [
+            o.get("id") for o in thread_data.get("orders") or [] if o.get("id")
+        ]
+        if not order_ids and thread_data.get("order_id"):
+            order_ids = [thread_data["order_id"]]
+        
+        now = datetime.now()
+        return {
+            "company_id": company_id,
+            "ml_account_id": ml_account_id,
+            "ml_thread_id": str(package_id),
+            "ml_package_id": str(package_id),
+            "ml_buyer_id": buyer_id or "UNKNOWN",
+            "buyer_nickname": buyer_data.get("nickname"),
+            "reason": thread_data.get("reason"),
+            "subject": thread_data.get("subject"),
+            "status": MLMessageThreadStatus.CLOSED if thread_data.get("status") == "closed" else MLMessageThreadStatus.OPEN,
+            "last_message_date": _parse_date(last_message.get("date")),
+            "last_message_text": last_message.get("text"),
+            "order_ids": order_ids or null(),  # SQL NULL (não JSON null) para o COALESCE
+            "thread_data": thread_data,
+            "created_at": now,
+            "updated_at": now,
+            "last_sync": now
+        }
+    
+    def _message_row(self, message_data: Dict, thread_id: int, company_id: int, ml_user_id: str) -> Optional[Dict]:
+        """Converte a mensagem da API na linha de ml_messages usada no upsert"""
+        ml_message_id = str(message_data.get("id", ""))
+        if not ml_message_id:
+            logger.warning("Mensagem sem ID, ignorando...")
+            return None
+        
+        from_data = message_data.get("from") or {}
+        to_data = message_data.get("to") or {}
+        from_user_id = str(from_data.get("user_id", from_data.get("id", ""))) if from_data else "UNKNOWN"
+        to_user_id = str(to_data.get("user_id", to_data.get("id", ""))) if to_data else "UNKNOWN"
+        
+        now = datetime.now()
+        return {
+            "thread_id": thread_id,
+            "company_id": company_id,
+            "ml_message_id": ml_message_id,
+            "from_user_id": from_user_id,
+            "from_nickname": from_data.get("nickname"),
+            "to_user_id": to_user_id,
+            "to_nickname": to_data.get("nickname"),
+            "message_text": message_data.get("text", "") or "",
+            "message_type": MLMessageType.TEXT,  # Por enquanto apenas texto
+            "is_seller": from_user_id == str(ml_user_id),
+            "message_date": _parse_date(message_data.get("date")) or now,
+            "read": message_data.get("read", False),
+            "message_data": message_data,
+            "created_at": now,
+            "updated_at": now
+        }
+    
+    def upsert_threads(self, threads_data: List[Dict], company_id: int, ml_account_id: int,
+                       ml_user_id: str) -> Dict[str, int]:
+        """
+        Grava conversas e suas mensagens em lote com INSERT ... ON CONFLICT
+        (ml_thread_id / ml_message_id), sem tocar registros de outra empresa. Não faz commit.
+
+        Returns:
+            Mapa ml_thread_id -> id local das conversas gravadas
+        """
+        rows: Dict[str, Dict] = {}
+        messages_by_thread: Dict[str, List[Dict]] = {}
+        for thread_data in threads_data:
+            row = self._thread_row(thread_data, company_id, ml_account_id, ml_user_id)
+            if row:
+                rows[row["ml_thread_id"]] = row
+                messages_by_thread[row["ml_thread_id"]] = thread_data.get("messages") or []
+        if not rows:
+            return {}
+        
+        table = MLMessageThread.__table__
+        thread_ids: Dict[str, int] = {}
+        values = list(rows.values())
+        for start in range(0, len(values), UPSERT_BATCH_SIZE):
+            statement = pg_insert(table).values(values[start:start + UPSERT_BATCH_SIZE])
+            excluded = statement.excluded
+            set_values = {column: excluded[column] for column in THREAD_UPDATE_COLUMNS}
+            for column in THREAD_COALESCE_COLUMNS:
+                set_values[column] = func.coalesce(excluded[column], table.c[column])
+            set_values["ml_buyer_id"] = func.coalesce(func.nullif(excluded.ml_buyer_id, "UNKNOWN"), table.c.ml_buyer_id)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.ml_thread_id],
+                set_=set_values,
+                where=table.c.company_id == excluded.company_id
+            ).returning(table.c.id, table.c.ml_thread_id)
+            for row in self.db.execute(statement):
+                thread_ids[row.ml_thread_id] = row.id
+        
+        message_rows = [
+            (message_data, thread_ids[ml_thread_id])
+            for ml_thread_id, messages in messages_by_thread.items() if ml_thread_id in thread_ids
+            for message_data in messages
+        ]
+        self.upsert_messages(message_rows, company_id, ml_user_id)
+        return thread_ids
+    
+    def upsert_messages(self, messages: List[Tuple[Dict, int]], company_id: int, ml_user_id: str) -> int:
+        """
+        Grava mensagens (dados da API, id local da conversa) em lote com
+        INSERT ... ON CONFLICT (ml_message_id). Não faz commit.
+        """
+        rows: Dict[str, Dict] = {}
+        for message_data, thread_id in messages:
+            row = self._message_row(message_data, thread_id, company_id, ml_user_id)
+            if row:
+                rows[row["ml_message_id"]] = row
+        if not rows:
+            return 0
+        
+        table = MLMessage.__table__
+        values = list(rows.values())
+        saved = 0
+        for start in range(0, len(values), UPSERT_BATCH_SIZE):
+            statement = pg_insert(table).values(values[start:start + UPSERT_BATCH_SIZE])
+            excluded = statement.excluded
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.ml_message_id],
+                set_={column: excluded[column] for column in MESSAGE_UPDATE_COLUMNS},
+                where=table.c.company_id == excluded.company_id
+            )
+            saved += self.db.execute(statement).rowcount
+        return saved
+    
+    def save_thread_to_db(self, thread_data: Dict, company_id: int, ml_account_id: int, ml_user_id: str) -> Optional[MLMessageThread]:
+        """Salva ou atualiza uma thread/conversa (e suas mensagens) no banco"""
+        package_id = thread_data.get("package_id") or thread_data.get("id")
+        try:
+            thread_ids = self.upsert_threads([thread_data], company_id, ml_account_id, ml_user_id)
+            if not thread_ids:
                 return None
-            
-            # Buscar thread existente
-            logger.info(f"🔍 Verificando se thread já existe no banco: package_id={package_id}, company_id={company_id}")
-            thread = self.db.query(MLMessageThread).filter(
-                MLMessageThread.ml_thread_id == str(package_id),
-                MLMessageThread.company_id == company_id
-            ).first()
-            
-            if thread:
-                logger.info(f"📝 Thread existente encontrada! ID: {thread.id}, atualizando...")
-            else:
-                logger.info(f"✨ Nova thread, criando...")
-            
-            buyer_data = thread_data.get("buyer", {})
-            buyer_id = str(buyer_data.get("id", "")) if buyer_data else "UNKNOWN"
-            buyer_nickname = buyer_data.get("nickname") if buyer_data else None
-            
-            messages_data = thread_data.get("messages", [])
-            last_message = messages_data[-1] if messages_data else {}
-            
-            order_ids = []
-            if thread_data.get("order_ids"):
-                order_ids = thread_data["order_ids"]
-            elif thread_data.get("orders"):
-                order_ids = [o.get("id") for o in thread_data["orders"] if o.get("id")]
-            
-            if thread:
-                # Atualizar thread existente
-                thread.ml_package_id = str(package_id)
-                thread.ml_buyer_id = buyer_id
-                thread.buyer_nickname = buyer_nickname
-                thread.status = MLMessageThreadStatus.OPEN if thread_data.get("status") != "closed" else MLMessageThreadStatus.CLOSED
-                thread.last_message_date = datetime.fromisoformat(last_message.get("date").replace("Z", "+00:00")) if last_message.get("date") else None
-                thread.last_message_text = last_message.get("text") if last_message else None
-                thread.order_ids = order_ids
-                thread.thread_data = thread_data
-                thread.last_sync = datetime.now()
-                thread.updated_at = datetime.now()
-            else:
-                # Criar nova thread
-                thread = MLMessageThread(
-                    company_id=company_id,
-                    ml_account_id=ml_account_id,
-                    ml_thread_id=str(package_id),
-                    ml_package_id=str(package_id),
-                    ml_buyer_id=buyer_id,
-                    buyer_nickname=buyer_nickname,
-                    reason=thread_data.get("reason"),
-                    subject=thread_data.get("subject"),
-                    status=MLMessageThreadStatus.OPEN if thread_data.get("status") != "closed" else MLMessageThreadStatus.CLOSED,
-                    last_message_date=datetime.fromisoformat(last_message.get("date").replace("Z", "+00:00")) if last_message.get("date") else None,
-                    last_message_text=last_message.get("text") if last_message else None,
-                    order_ids=order_ids,
-                    thread_data=thread_data,
-                    last_sync=datetime.now()
-                )
-                self.db.add(thread)
-            
-            logger.info(f"💾 Fazendo commit do thread no banco...")
             self.db.commit()
-            self.db.refresh(thread)
-            
-            logger.info(f"✅ Thread commitado! ID no banco: {thread.id}")
-            
-            # Salvar mensagens individuais
-            logger.info(f"📨 Processando {len(messages_data)} mensagens...")
-            if messages_data:
-                saved_messages = 0
-                for idx, msg_data in enumerate(messages_data):
-                    logger.info(f"📨 Salvando mensagem {idx + 1}/{len(messages_data)}: message_id={msg_data.get('id')}")
-                    saved_msg = self.save_message_to_db(msg_data, thread.id, company_id, ml_user_id)
-                    if saved_msg:
-                        saved_messages += 1
-                
-                logger.info(f"✅ {saved_messages}/{len(messages_data)} mensagens salvas com sucesso")
-            else:
-                logger.info(f"ℹ️ Nenhuma mensagem para salvar")
             
-            logger.info(f"💾 ========== THREAD SALVO COM SUCESSO ==========")
+            thread = self.db.get(MLMessageThread, thread_ids[str(package_id)])
             logger.info(f"✅ Thread {package_id} salva/atualizada no banco com ID: {thread.id}")
             return thread
             
         except Exception as e:
-            logger.error(f"❌ ========== ERRO AO SALVAR THREAD ==========")
-            logger.error(f"❌ Package ID: {package_id}")
-            logger.error(f"❌ Company ID: {company_id}")
-            logger.error(f"❌ Erro: {str(e)}")
-            logger.error(f"❌ Tipo: {type(e).__name__}")
-            logger.error(f"❌ Traceback:", exc_info=True)
+            logger.error(f"❌ Erro ao salvar thread {package_id} (company_id={company_id}): {e}", exc_info=True)
             self.db.rollback()
-            logger.error(f"❌ Rollback executado")
-            logger.error(f"❌ ========== FIM DO ERRO ==========")
             return None
     
     def save_message_to_db(self, message_data: Dict, thread_id: int, company_id: int, ml_user_id: str) -> Optional[MLMessage]:
         """Salva ou atualiza uma mensagem individual no banco"""
         try:
-            ml_message_id = str(message_data.get("id", ""))
-            if not ml_message_id:
-                logger.warning("Mensagem sem ID, ignorando...")
+            if not self.upsert_messages([(message_data, thread_id)], company_id, ml_user_id):
                 return None
-            
-            # Buscar mensagem existente
-            message = self.db.query(MLMessage).filter(
-                MLMessage.ml_message_id == ml_message_id,
-                MLMessage.thread_id == thread_id
-            ).first()
-            
-            from_data = message_data.get("from", {})
-            to_data = message_data.get("to", {})
-            
-            from_user_id = str(from_data.get("user_id", from_data.get("id", ""))) if from_data else "UNKNOWN"
-            from_nickname = from_data.get("nickname") if from_data else None
-            
-            to_user_id = str(to_data.get("user_id", to_data.get("id", ""))) if to_data else "UNKNOWN"
-            to_nickname = to_data.get("nickname") if to_data else None
-            
-            is_seller = from_user_id == str(ml_user_id)
-            
-            message_date = None
-            if message_data.get("date"):
-                try:
-                    message_date = datetime.fromisoformat(message_data.get("date").replace("Z", "+00:00"))
-                except:
-                    message_date = datetime.now()
-            else:
-                message_date = datetime.now()
-            
-            if message:
-                # Atualizar mensagem existente
-                message.message_text = message_data.get("text", "")
-                message.from_nickname = from_nickname
-                message.to_nickname = to_nickname
-                message.read = message_data.get("read", False)
-                message.message_data = message_data
-                message.updated_at = datetime.now()
-            else:
-                # Criar nova mensagem
-                message = MLMessage(
-                    thread_id=thread_id,
-                    company_id=company_id,
-                    ml_message_id=ml_message_id,
-                    from_user_id=from_user_id,
-                    from_nickname=from_nickname,
-                    to_user_id=to_user_id,
-                    to_nickname=to_nickname,
-                    message_text=message_data.get("text", ""),
-                    message_type=MLMessageType.TEXT,  # Por enquanto apenas texto
-                    is_seller=is_seller,
-                    message_date=message_date,
-                    read=message_data.get("read", False),
-                    message_data=message_data
-                )
-                self.db.add(message)
-            
             self.db.commit()
-            self.db.refresh(message)
             
-            return message
+            return self.db.query(MLMessage).filter(
+                MLMessage.ml_message_id == str(message_data.get("id"))
+            ).first()
             
         except Exception as e:
             logger.error(f"Erro ao salvar mensagem no banco: {e}", exc_info=True)
             self.db.rollback()
             return None
     
+    def _fetch_thread_details(self, packages: List[Dict], access_token: str, seller_id: str) -> List[Dict]:
+        """Busca as mensagens dos pacotes em paralelo (apenas HTTP; a gravação fica na thread principal)"""
+        def fetch(package_data: Dict) -> Dict:
+            details = self.get_thread_messages(package_data.get("id"), access_token, seller_id=seller_id)
+            return {**package_data, **details} if details else package_data
+        
+        with ThreadPoolExecutor(max_workers=THREAD_FETCH_WORKERS) as executor:
+            return list(executor.map(fetch, packages))
+    
     def sync_messages(self, company_id: int, user_id: int, ml_account_id: int = None, 
                      date_from: Optional[str] = None, date_to: Optional[str] = None,
                      fetch_all: bool = True) -> Dict:
         """
         Sincroniza mensagens pós-venda de todas as contas ML ativas da empresa
+
+        Com fetch_all=False e sem período explícito a sincronização é incremental:
+        pedidos criados desde o cursor da conta (messages_synced_until, com margem de
+        MESSAGES_CURSOR_OVERLAP) mais os packs com mensagens não lidas. Sem cursor,
+        a primeira execução busca apenas a página mais recente de pedidos.
         
         Args:
             company_id: ID da empresa
@@ -630,7 +667,6 @@ class MLMessagesService:
         try:
             logger.info(f"🔄 ========== INICIANDO SINCRONIZAÇÃO DE MENSAGENS ==========")
             logger.info(f"🔄 Company ID: {company_id}")
-            logger.info(f"🔄 User ID: {user_id}")
             if ml_account_id:
                 logger.info(f"🔄 ML Account ID específico: {ml_account_id}")
             if date_from:
@@ -655,8 +691,6 @@ class MLMessagesService:
                     "synced": 0
                 }
             
-            logger.info(f"🔄 Contas ML encontradas: {len(accounts)}")
-            
             total_synced = 0
             total_processed = 0
             errors = []
@@ -664,56 +698,53 @@ class MLMessagesService:
             for account in accounts:
                 try:
                     ml_user_id = str(account.ml_user_id)
-                    logger.info(f"🔄 Processando conta ML: {account.nickname} (ID: {account.id}, ML User: {ml_user_id})")
                     access_token = self._get_access_token(user_id, account.id, company_id)
                     if not access_token:
                         raise Exception("Token de acesso não encontrado ou expirado para esta conta")
                     
-                    # Buscar pacotes/conversas com paginação completa
+                    incremental = not fetch_all and not date_from and not date_to
+                    since = None
+                    if incremental and account.messages_synced_until:
+                        since = account.messages_synced_until - MESSAGES_CURSOR_OVERLAP
+                    logger.info(
+                        f"🔄 Conta {account.nickname} (ID: {account.id}): "
+                        f"{'incremental desde ' + since.isoformat() if since else 'busca por período/completa'}"
+                    )
+                    
+                    # Pedidos (pack_ids) do período; no modo incremental, todas as páginas desde o cursor
                     packages = self.get_packages(
                         ml_user_id, 
                         access_token, 
                         limit=50,
-                        fetch_all=fetch_all,
-                        date_from=date_from,
+                        fetch_all=fetch_all or since is not None,
+                        date_from=since.strftime("%Y-%m-%dT%H:%M:%S.000-00:00") if since else date_from,
                         date_to=date_to
                     )
+                    if incremental:
+                        known = {str(p.get("id")) for p in packages}
+                        packages += [{"id": pack_id} for pack_id in self.get_unread_packs(access_token) if pack_id not in known]
                     
-                    logger.info(f"🔄 {len(packages)} pacotes encontrados para a conta {account.nickname}")
+                    logger.info(f"🔄 {len(packages)} pacotes a sincronizar para a conta {account.nickname}")
                     
-                    if len(packages) == 0:
-                        logger.warning(f"⚠️ Nenhum pacote encontrado para a conta {account.nickname}")
-                        logger.warning(f"⚠️ O Mercado Livre pode não fornecer um endpoint público para buscar histórico de mensagens.")
-                        logger.warning(f"⚠️ As mensagens são recebidas apenas através de notificações webhook quando há novas mensagens.")
-                        continue
+                    for start in range(0, len(packages), THREAD_SYNC_BATCH_SIZE):
+                        batch = self._fetch_thread_details(packages[start:start + THREAD_SYNC_BATCH_SIZE], access_token, ml_user_id)
+                        thread_ids = self.upsert_threads(batch, company_id, account.id, ml_user_id)
+                        self.db.commit()
+                        total_processed += len(batch)
+                        total_synced += len(thread_ids)
                     
-                    for package_data in packages:
-                        try:
-                            total_processed += 1
-                            package_id = package_data.get("id")
-                            
-                            logger.info(f"🔄 Processando pacote {total_processed}/{len(packages)}: {package_id}")
-                            
-                            # Buscar detalhes completos do pacote (mensagens)
-                            seller_id = ml_user_id
-                            thread_details = self.get_thread_messages(package_id, access_token, seller_id=seller_id)
-                            if thread_details:
-                                package_data.update(thread_details)
-                            
-                            # Salvar no banco
-                            saved = self.save_thread_to_db(package_data, company_id, account.id, ml_user_id)
-                            if saved:
-                                total_synced += 1
-                                logger.info(f"✅ Pacote {package_id} salvo com sucesso")
-                            else:
-                                logger.warning(f"⚠️ Falha ao salvar pacote {package_id}")
-                                
-                        except Exception as e:
-                            error_msg = f"Erro ao processar pacote {package_data.get('id')}: {str(e)}"
-                            logger.error(error_msg, exc_info=True)
-                            errors.append(error_msg)
+                    # O cursor acompanha o pedido mais recente visto (não recua com buscas por período)
+                    if not date_to:
+                        newest = max((_utc(p.get("order_date")) for p in packages if p.get("order_date")), default=None)
+                        if newest:
+                            newest = newest.replace(tzinfo=None)
+                            if not account.messages_synced_until or newest > account.messages_synced_until:
+                                account.messages_synced_until = newest
+                        account.last_sync = datetime.now()
+                        self.db.commit()
                 
                 except Exception as e:
+                    self.db.rollback()
                     error_msg = f"Erro ao sincronizar conta {account.nickname}: {str(e)}"
                     logger.error(error_msg, exc_info=True)
                     errors.append(error_msg)
@@ -739,4 +770,3 @@ class MLMessagesService:
                 "error": str(e),
                 "synced": 0
             }
-
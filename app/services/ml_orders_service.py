@@ -7,8 +7,9 @@ from datetime import datetime, timedelta
 import pytz
 
 from app.models.saas_models import MLOrder, MLAccount, MLAccountStatus, OrderStatus
-from app.services.token_manager import TokenManager
+from app.services.token_manager import TokenManager, invalidate_access_token, resolve_token_owner
 from app.utils.notification_logger import global_logger
+from app.utils.pagination import clamp_limit, count_rows, encode_cursor, keyset_paginate
 
 logger = logging.getLogger(__name__)
 
@@ -26,8 +27,10 @@ class MLOrdersService:
                              shipping_status_filter: Optional[str] = None,
                              logistic_filter: Optional[str] = None,
                              date_from: Optional[str] = None,
-                             date_to: Optional[str] = None) -> Dict:
-        """Busca orders de uma conta ML específica"""
+                             date_to: Optional[str] = None,
+                             cursor: Optional[str] = None,
+                             count_mode: str = "exact") -> Dict:
+        """Busca orders de uma conta ML específica (offset ou cursor em date_created/id)"""
         try:
             logger.info(f"Buscando orders para ml_account_id: {ml_account_id}")
             
@@ -95,12 +98,23 @@ class MLOrdersService:
                 except ValueError:
                     logger.warning(f"Data inválida: {date_to}")
             
-            # Ordenar por data de criação (mais recentes primeiro)
-            query = query.order_by(MLOrder.date_created.desc())
-            
-            # Paginação
-            total = query.count()
-            orders = query.offset(offset).limit(limit).all()
+            # Paginação (mais recentes primeiro)
+            limit = clamp_limit(limit)
+            total = count_rows(query, count_mode)
+            if cursor:
+                page_data = keyset_paginate(query, MLOrder.date_created, MLOrder.id, limit, cursor=cursor)
+                orders = page_data["items"]
+                has_more = page_data["has_next"]
+                next_cursor = page_data["next_cursor"]
+            else:
+                rows = query.order_by(
+                    MLOrder.date_created.desc().nullslast(), MLOrder.id.desc()
+                ).offset(offset).limit(limit + 1).all()
+                has_more = len(rows) > limit
+                orders = rows[:limit]
+                next_cursor = None
+                if has_more and orders:
+                    next_cursor = encode_cursor(orders[-1].date_created, orders[-1].id)
             
             # Converter para formato de resposta
             orders_data = []
@@ -169,7 +183,8 @@ class MLOrdersService:
                 "total": total,
                 "limit": limit,
                 "offset": offset,
-                "has_more": (offset + limit) < total
+                "has_more": has_more,
+                "next_cursor": next_cursor
             }
             
         except Exception as e:
@@ -223,6 +238,7 @@ class MLOrdersService:
             # Processar orders - salvar apenas os novos
             new_orders_count = 0
             existing_orders_count = 0
+            created_orders = []  # Baixa de estoque em lote após o commit
             
             for order_data in orders_data:
                 try:
@@ -243,6 +259,8 @@ class MLOrdersService:
                     result = self._save_order_to_database(order_data, ml_account_id, company_id)
                     if result:
                         new_orders_count += 1
+                        if result.get("needs_stock_sync") and result.get("order") is not None:
+                            created_orders.append(result["order"])
                         logger.info(f"✅ Novo pedido {ml_order_id} salvo com sucesso")
                     
                 except Exception as e:
@@ -267,6 +285,9 @@ class MLOrdersService:
             
             self.db.commit()
             
+            # Pedidos que o webhook não trouxe: baixa de estoque em uma passada
+            stock_result = self._sync_orders_to_stock(created_orders, company_id) if created_orders else None
+            
             # Sincronizar custos de publicidade do período atual
             advertising_result = None
             try:
@@ -287,7 +308,8 @@ class MLOrdersService:
                 "new_orders": new_orders_count,
                 "existing_orders": existing_orders_count,
                 "total_processed": new_orders_count,
-                "advertising_sync": advertising_result
+                "advertising_sync": advertising_result,
+                "stock_sync": stock_result
             }
             
         except Exception as e:
@@ -381,6 +403,10 @@ class MLOrdersService:
             # Salvar orders no banco
             saved_count = 0
             updated_count = 0
+            # Baixa de estoque em lote após o commit (só em sincronizações incrementais;
+            # importações históricas não devem consumir o estoque atual)
+            sync_stock = not is_full_import and not (date_from and date_to)
+            created_orders = []
             
             # Adicionar delay entre processamentos para evitar sobrecarga
             # import time  # ⚡ OTIMIZAÇÃO: Removido sleep para acelerar sincronização
@@ -394,6 +420,8 @@ class MLOrdersService:
                     result = self._save_order_to_database(order_data, ml_account_id, company_id)
                     if result["action"] == "created":
                         saved_count += 1
+                        if sync_stock and result.get("needs_stock_sync") and result.get("order") is not None:
+                            created_orders.append(result["order"])
                     elif result["action"] == "updated":
                         updated_count += 1
                     
@@ -429,6 +457,8 @@ class MLOrdersService:
             
             self.db.commit()
             
+            stock_result = self._sync_orders_to_stock(created_orders, company_id) if created_orders else None
+            
             # Sincronizar custos de publicidade após salvar os pedidos
             # Na sincronização normal: apenas 1 período
             # Na importação completa: últimos 3 períodos
@@ -452,7 +482,8 @@ class MLOrdersService:
                 "saved_count": saved_count,
                 "updated_count": updated_count,
                 "total_processed": len(orders_data),
-                "advertising_sync": advertising_result
+                "advertising_sync": advertising_result,
+                "stock_sync": stock_result
             }
             
         except Exception as e:
@@ -573,6 +604,7 @@ class MLOrdersService:
                 elif response_first.status_code == 401:
                     logger.error(f"❌ ERRO 401: Token inválido ou expirado para seller_id={seller_id}")
                     logger.error(f"❌ Necessário reconectar a conta ML")
+                    invalidate_access_token(access_token)
                 
                 return []
             
@@ -1591,49 +1623,25 @@ class MLOrdersService:
             raise e
     
     def _test_token_validity(self, access_token: str, seller_id: str) -> Dict[str, Any]:
-        """Testa se o token é válido fazendo uma chamada simples à API"""
+        """Confere se o token é válido e pertence ao seller (identidade em cache no TokenManager)"""
         try:
-            import requests
-            headers = {"Authorization": f"Bearer {access_token}"}
+            returned_user_id = resolve_token_owner(access_token)
             
-            # Testar com endpoint simples de usuário
-            response = requests.get(
-                f"{self.base_url}/users/me",
-                headers=headers,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                user_data = response.json()
-                returned_user_id = str(user_data.get("id", ""))
-                
-                # Verificar se o user_id do token corresponde ao seller_id esperado
-                if returned_user_id != str(seller_id):
-                    logger.warning(f"⚠️ Token pertence a user_id {returned_user_id}, mas esperado {seller_id}")
-                    return {
-                        "valid": False,
-                        "error": f"Token pertence a outro usuário (ID: {returned_user_id})"
-                    }
-                
-                return {"valid": True}
-            
-            elif response.status_code == 401:
+            if not returned_user_id:
                 return {
                     "valid": False,
-                    "error": "Token expirado ou inválido (401 Unauthorized)"
+                    "error": "Token expirado ou inválido"
                 }
             
-            elif response.status_code == 403:
+            # Verificar se o user_id do token corresponde ao seller_id esperado
+            if returned_user_id != str(seller_id):
+                logger.warning(f"⚠️ Token pertence a user_id {returned_user_id}, mas esperado {seller_id}")
                 return {
                     "valid": False,
-                    "error": "Acesso negado (403 Forbidden)"
+                    "error": f"Token pertence a outro usuário (ID: {returned_user_id})"
                 }
             
-            else:
-                return {
-                    "valid": False,
-                    "error": f"Erro ao validar token: HTTP {response.status_code}"
-                }
+            return {"valid": True}
                 
         except Exception as e:
             logger.error(f"Erro ao testar token: {e}")
@@ -1643,47 +1651,16 @@ class MLOrdersService:
             }
     
     def _get_active_token(self, ml_account_id: int, company_id: Optional[int] = None) -> Optional[str]:
-        """Obtém token ativo usando TokenManager, tentando renovação automática se necessário"""
+        """Obtém token ativo usando TokenManager (cache por conta, com renovação automática se necessário)"""
         try:
-            token_manager = TokenManager(self.db)
-
-            account = (
-                self.db.query(MLAccount)
-                .filter(MLAccount.id == ml_account_id)
-                .first()
-            )
-
-            if not account:
-                logger.error(
-                    "❌ Conta ML %s não encontrada ao buscar token",
-                    ml_account_id,
-                )
-                return None
-
-            resolved_company_id = company_id or account.company_id
-
-            if resolved_company_id is None:
-                logger.error(
-                    "❌ Não foi possível determinar company_id para ml_account_id=%s ao buscar token",
-                    ml_account_id,
-                )
-                return None
-
-            expected_seller_id = str(account.ml_user_id) if account.ml_user_id else None
-
-            token_record = token_manager.get_token_record_for_account(
-                ml_account_id,
-                resolved_company_id,
-                expected_ml_user_id=expected_seller_id,
-            )
-
-            if token_record and token_record.access_token:
-                return token_record.access_token
+            access_token = TokenManager(self.db).get_access_token_for_account(ml_account_id, company_id)
+            if access_token:
+                return access_token
 
             logger.warning(
                 "⚠️ Nenhum token ativo encontrado para ml_account_id=%s (company_id=%s)",
                 ml_account_id,
-                resolved_company_id,
+                company_id,
             )
             return None
 
@@ -1691,85 +1668,6 @@ class MLOrdersService:
             logger.error(f"Erro ao obter token ativo: {e}")
             return None
     
-    def _refresh_token(self, refresh_token: str, ml_account_id: int) -> Optional[str]:
-        """Tenta renovar token usando refresh token"""
-        try:
-            import requests
-            from app.config.settings import Settings
-            
-            settings = Settings()
-            
-            # Dados para renovar token (usa credenciais do ambiente)
-            data = {
-                "grant_type": "refresh_token",
-                "client_id": settings.ml_app_id,
-                "client_secret": settings.ml_client_secret,
-                "refresh_token": refresh_token
-            }
-            
-            headers = {
-                "accept": "application/json",
-                "content-type": "application/x-www-form-urlencoded"
-            }
-            
-            response = requests.post("https://api.mercadolibre.com/oauth/token", data=data, headers=headers)
-            
-            if response.status_code == 200:
-                token_data = response.json()
-                
-                # Salvar novo token no banco
-                from app.models.saas_models import Token
-                from datetime import datetime, timedelta
-                
-                # Desativar tokens antigos
-                self.db.query(Token).filter(
-                    Token.ml_account_id == ml_account_id,
-                    Token.is_active == True
-                ).update({"is_active": False})
-                
-                # Buscar user_id da empresa da conta ML (para compatibilidade)
-                from app.models.saas_models import MLAccount, User
-                account = self.db.query(MLAccount).filter(MLAccount.id == ml_account_id).first()
-                user_id = None
-                if account:
-                    # Buscar qualquer usuário da empresa (pode ser inativo, não importa)
-                    user = self.db.query(User).filter(User.company_id == account.company_id).first()
-                    user_id = user.id if user else None
-                    
-                # Se não encontrar usuário, usar o user_id do token anterior
-                if not user_id:
-                    old_token = self.db.query(Token).filter(
-                        Token.ml_account_id == ml_account_id,
-                        Token.is_active == False
-                    ).order_by(Token.created_at.desc()).first()
-                    user_id = old_token.user_id if old_token else None
-                
-                # Criar novo token
-                new_token = Token(
-                    user_id=user_id,
-                    ml_account_id=ml_account_id,
-                    access_token=token_data["access_token"],
-                    refresh_token=token_data.get("refresh_token"),
-                    token_type=token_data.get("token_type", "Bearer"),
-                    expires_in=token_data.get("expires_in", 21600),
-                    scope=token_data.get("scope", ""),
-                    expires_at=datetime.utcnow() + timedelta(seconds=token_data.get("expires_in", 21600)),
-                    is_active=True
-                )
-                
-                self.db.add(new_token)
-                self.db.commit()
-                
-                logger.info(f"Token renovado com sucesso para ml_account_id: {ml_account_id}")
-                return token_data["access_token"]
-            else:
-                logger.error(f"Erro ao renovar token: {response.status_code} - {response.text}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Erro ao renovar token: {e}")
-            return None
-    
     def delete_orders(self, order_ids: List[int], company_id: int) -> Dict:
         """Remove pedidos selecionados do banco de dados"""
         try:
@@ -2048,6 +1946,75 @@ class MLOrdersService:
         except Exception as e:
             logger.error(f"❌ Erro ao verificar NF do pedido {order_id}: {e}", exc_info=True)
     
+    @staticmethod
+    def _order_stock_items(order) -> List[tuple]:
+        """Itens do pedido para baixa de estoque: [(ml_item_id, quantidade)]"""
+        items = []
+        for item_entry in order.order_items or []:
+            item_data = item_entry
+            if isinstance(item_entry, dict):
+                item_data = item_entry.get("item") or item_entry
+            if not item_data:
+                continue
+            
+            if isinstance(item_data, dict):
+                ml_item_id = str(item_data.get("id") or item_data.get("item_id") or item_data.get("ml_item_id") or "")
+            else:
+                ml_item_id = str(item_data)
+            
+            try:
+                quantity = int(item_entry.get("quantity", item_entry.get("qty", 1))) if isinstance(item_entry, dict) else 1
+            except (TypeError, ValueError):
+                quantity = 0
+            
+            if not ml_item_id or ml_item_id == "None" or quantity <= 0:
+                logger.warning(f"⚠️ [ESTOQUE] Item inválido no pedido {order.ml_order_id}: ml_item_id='{ml_item_id}', quantity={quantity}")
+                continue
+            items.append((ml_item_id, quantity))
+        return items
+    
+    def _sync_orders_to_stock(self, orders: List[MLOrder], company_id: int, sync_ml_skus: bool = True) -> Dict[str, Any]:
+        """Dá baixa no estoque de vários pedidos em uma passada (StockMovementService.sync_sales_to_stock_bulk)
+        
+        Args:
+            orders: Pedidos já commitados no banco
+            company_id: ID da empresa
+            sync_ml_skus: Se True, após o commit envia ao ML o novo estoque dos anúncios não-full
+                que compartilham o estoque dos produtos internos afetados (evita vender além do estoque)
+        """
+        from app.services.stock_movement_service import StockMovementService
+        
+        sales = []
+        seen_orders = set()
+        for order in orders:
+            if order is None or order.id in seen_orders:
+                continue
+            seen_orders.add(order.id)
+            sales.extend((order.id, ml_item_id, quantity) for ml_item_id, quantity in self._order_stock_items(order))
+        
+        if not sales:
+            return {"success": True, "orders_processed": 0, "movements_created": 0, "errors": [], "ml_sync_targets": []}
+        
+        result = StockMovementService(self.db).sync_sales_to_stock_bulk(company_id, sales)
+        
+        if sync_ml_skus and result.get("success") and result.get("ml_sync_targets"):
+            from decimal import Decimal
+            from app.services.stock_service import StockService
+            
+            stock_service = StockService(self.db)
+            for target in result["ml_sync_targets"]:
+                try:
+                    stock_service.sync_stock_to_ml_announcements(
+                        company_id=company_id,
+                        internal_product_id=target["internal_product_id"],
+                        new_quantity=Decimal(str(target["available_quantity"])),
+                        warehouse_id=target["warehouse_id"]
+                    )
+                except Exception as e:
+                    logger.warning(f"⚠️ Erro ao sincronizar anúncios do produto {target['internal_product_id']} com ML: {e}")
+        
+        return result
+    
     def _sync_order_to_stock(self, order, company_id: int, sync_ml_skus: bool = True):
         """Sincroniza pedido criado com estoque - processa cada item do pedido
         
@@ -2057,223 +2024,12 @@ class MLOrdersService:
             sync_ml_skus: Se True, sincroniza SKUs não-full com ML após registrar movimentações
         """
         try:
-            from app.services.stock_movement_service import StockMovementService
-            from app.models.saas_models import StockMovement, StockMovementType
-            from datetime import datetime
-            
-            # Log global: início do processamento do pedido
-            global_logger.log_event(
-                event_type="stock_sync/order_start",
-                data={
-                    "action": "processing_order",
-                    "ml_order_id": str(order.ml_order_id),
-                    "order_id": order.id,
-                    "company_id": company_id,
-                    "order_items_count": len(order.order_items or [])
-                },
-                company_id=company_id,
-                success=True
-            )
-            
-            # Verificar se já foi sincronizado (evitar duplicação)
-            movement_service = StockMovementService(self.db)
-            
-            # Verificar se já existe movimentação para este pedido
-            # IMPORTANTE: Usar cast para evitar problemas com EnumValueType no SQLAlchemy
-            from sqlalchemy import cast, String
-            sale_movement_type_value = "sale"  # StockMovementType.SALE.value
-            existing_movement = self.db.query(StockMovement).filter(
-                StockMovement.ml_order_id == order.id,
-                cast(StockMovement.movement_type, String) == sale_movement_type_value
-            ).first()
-            
-            if existing_movement:
-                logger.info(f"ℹ️ Pedido {order.ml_order_id} já foi sincronizado com estoque (movimento ID: {existing_movement.id})")
-                global_logger.log_event(
-                    event_type="stock_sync/order_start",
-                    data={
-                        "action": "order_already_synced",
-                        "ml_order_id": str(order.ml_order_id),
-                        "movement_id": existing_movement.id
-                    },
-                    company_id=company_id,
-                    success=True
-                )
-                return
-            
-            # Processar itens do pedido (pedido pode ter múltiplos itens)
-            order_items = order.order_items or []
-            
-            logger.info(f"🔍 [ESTOQUE] Pedido {order.ml_order_id} - Verificando order_items:")
-            logger.info(f"🔍 [ESTOQUE] Tipo de order_items: {type(order_items)}")
-            logger.info(f"🔍 [ESTOQUE] order_items é None? {order_items is None}")
-            logger.info(f"🔍 [ESTOQUE] order_items é lista vazia? {order_items == []}")
-            logger.info(f"🔍 [ESTOQUE] Quantidade de itens: {len(order_items) if order_items else 0}")
-            
-            if not order_items:
-                logger.warning(f"⚠️ [ESTOQUE] Pedido {order.ml_order_id} não tem itens para sincronizar (order_items está vazio ou None)")
-                global_logger.log_event(
-                    event_type="stock_sync/error",
-                    data={
-                        "action": "no_items_in_order",
-                        "ml_order_id": str(order.ml_order_id),
-                        "order_id": order.id,
-                        "order_items": str(order_items)
-                    },
-                    company_id=company_id,
-                    success=False,
-                    error_message="Pedido não tem itens"
-                )
-                return
-            
-            logger.info(f"🔄 [ESTOQUE] Processando {len(order_items)} item(ns) do pedido {order.ml_order_id} para sincronização com estoque")
-            
-            # Log global: processando itens
-            global_logger.log_event(
-                event_type="stock_sync/order_start",
-                data={
-                    "action": "processing_items",
-                    "ml_order_id": str(order.ml_order_id),
-                    "items_count": len(order_items)
-                },
-                company_id=company_id,
-                success=True
-            )
-            
-            # Formatar data do pedido para observação
-            order_date = order.date_created.strftime("%d/%m/%Y %H:%M") if order.date_created else datetime.utcnow().strftime("%d/%m/%Y %H:%M")
-            
-            items_processed = 0
-            items_success = 0
-            items_errors = 0
-            
-            for idx, item_entry in enumerate(order_items):
-                logger.info(f"🔍 [ESTOQUE] Processando item {idx + 1}/{len(order_items)} do pedido {order.ml_order_id}")
-                logger.info(f"🔍 [ESTOQUE] Tipo do item_entry: {type(item_entry)}")
-                logger.info(f"🔍 [ESTOQUE] Conteúdo do item_entry: {str(item_entry)[:200]}")
-                
-                # Extrair dados do item
-                if isinstance(item_entry, dict):
-                    item_data = item_entry.get("item")
-                    logger.info(f"🔍 [ESTOQUE] item_entry é dict, buscando campo 'item': {item_data is not None}")
-                    if not item_data:
-                        # Tentar usar o próprio item_entry como item_data
-                        item_data = item_entry
-                        logger.info(f"🔍 [ESTOQUE] Usando item_entry diretamente como item_data")
-                else:
-                    item_data = item_entry
-                    logger.info(f"🔍 [ESTOQUE] item_entry não é dict, usando diretamente")
-                
-                if not item_data:
-                    logger.warning(f"⚠️ [ESTOQUE] Item {idx + 1} do pedido {order.ml_order_id} não tem dados (item_data é None)")
-                    continue
-                
-                logger.info(f"🔍 [ESTOQUE] item_data tipo: {type(item_data)}")
-                logger.info(f"🔍 [ESTOQUE] item_data keys: {list(item_data.keys()) if isinstance(item_data, dict) else 'não é dict'}")
-                
-                # Extrair ml_item_id de múltiplas formas possíveis
-                ml_item_id = None
-                if isinstance(item_data, dict):
-                    ml_item_id = str(item_data.get("id") or item_data.get("item_id") or item_data.get("ml_item_id") or "")
-                elif isinstance(item_data, str):
-                    ml_item_id = item_data
-                else:
-                    ml_item_id = str(item_data) if item_data else ""
-                
-                # Extrair quantidade
-                if isinstance(item_entry, dict):
-                    item_quantity = int(item_entry.get("quantity", item_entry.get("qty", 1)))
-                else:
-                    item_quantity = 1
-                
-                logger.info(f"🔍 [ESTOQUE] ml_item_id extraído: '{ml_item_id}'")
-                logger.info(f"🔍 [ESTOQUE] item_quantity extraído: {item_quantity}")
-                
-                if not ml_item_id or ml_item_id == "None" or item_quantity <= 0:
-                    logger.warning(f"⚠️ [ESTOQUE] Item inválido no pedido {order.ml_order_id}: ml_item_id='{ml_item_id}', quantity={item_quantity}")
-                    items_errors += 1
-                    continue
-                
-                logger.info(f"🔄 [ESTOQUE] Processando item {ml_item_id} - quantidade: {item_quantity} unidades")
-                
-                # Sincronizar com estoque (baixa apenas - sincronização ML será feita depois)
-                result = movement_service.sync_sale_to_stock(
-                    company_id=company_id,
-                    ml_order_id=order.id,
-                    ml_item_id=ml_item_id,
-                    quantity=item_quantity,
-                    order_number=str(order.ml_order_id),
-                    order_date=order_date,
-                    sales_channel="Mercado Livre",
-                    sync_ml_skus=False  # Sincronização ML será feita depois em lote
-                )
-                
-                items_processed += 1
-                
-                if result.get("success"):
-                    items_success += 1
-                    logger.info(f"✅ Estoque sincronizado: {item_quantity} unidade(s) do item {ml_item_id} (Pedido: {order.ml_order_id})")
-                else:
-                    items_errors += 1
-                    logger.warning(f"⚠️ Erro ao sincronizar estoque do item {ml_item_id}: {result.get('error')}")
-            
-            # Log global: processamento do pedido concluído
-            global_logger.log_event(
-                event_type="stock_sync/order_completed",
-                data={
-                    "action": "order_processing_completed",
-                    "ml_order_id": str(order.ml_order_id),
-                    "items_processed": items_processed,
-                    "items_success": items_success,
-                    "items_errors": items_errors
-                },
-                company_id=company_id,
-                success=items_errors == 0,
-                error_message=f"{items_errors} item(s) com erro" if items_errors > 0 else None
-            )
-            
-            # ETAPA 1: Commit das movimentações de estoque (pedido já foi commitado antes)
-            # IMPORTANTE: Commit separado das movimentações após o pedido estar salvo
-            try:
-                logger.info(f"💾 [ESTOQUE] Preparando commit das movimentações de estoque para pedido {order.ml_order_id}")
-                logger.info(f"💾 [ESTOQUE] Itens processados: {items_processed}, sucesso: {items_success}, erros: {items_errors}")
-                
-                # Fazer flush primeiro para garantir que todas as movimentações estejam na sessão
-                self.db.flush()
-                logger.info(f"💾 [ESTOQUE] Flush realizado - movimentações adicionadas à sessão")
-                
-                # Commit das movimentações (pedido já foi commitado antes)
-                self.db.commit()
-                logger.info(f"✅ [ESTOQUE] Commit das movimentações realizado com sucesso para pedido {order.ml_order_id}")
-                
-                # Verificar após commit
-                from app.models.saas_models import StockMovement
-                from sqlalchemy import cast, String
-                
-                committed_movements = self.db.query(StockMovement).filter(
-                    StockMovement.ml_order_id == order.id,
-                    cast(StockMovement.movement_type, String) == "sale"
-                ).count()
-                
-                logger.info(f"✅ [ESTOQUE] Movimentações confirmadas no banco: {committed_movements}")
-                
-                if committed_movements == 0 and items_success > 0:
-                    logger.error(f"❌ [ESTOQUE] CRÍTICO: Nenhuma movimentação foi salva após commit para pedido {order.ml_order_id}!")
-                    logger.error(f"❌ [ESTOQUE] Itens processados com sucesso: {items_success}, mas nenhuma movimentação no banco!")
-                elif committed_movements > 0:
-                    logger.info(f"✅ [ESTOQUE] Sucesso: {committed_movements} movimentação(ões) salva(s) no banco")
-                    
-            except Exception as commit_error:
-                logger.error(f"❌ [ESTOQUE] Erro ao commitar movimentações de estoque: {commit_error}", exc_info=True)
-                self.db.rollback()
-                logger.error(f"❌ [ESTOQUE] Rollback realizado - movimentações não foram salvas")
-                # Não fazer raise - o pedido já foi salvo, apenas logar o erro
-                # As movimentações podem ser reprocessadas depois se necessário
-                    
+            result = self._sync_orders_to_stock([order], company_id, sync_ml_skus=sync_ml_skus)
+            if not result.get("success"):
+                logger.error(f"❌ [ESTOQUE] Erro ao sincronizar pedido {order.ml_order_id} com estoque: {result.get('error')}")
+            return result
         except Exception as e:
             logger.error(f"❌ Erro ao sincronizar pedido com estoque: {e}", exc_info=True)
-            
-            # Log global: erro no processamento do pedido
             global_logger.log_event(
                 event_type="stock_sync/error",
                 data={
@@ -2285,5 +2041,4 @@ class MLOrdersService:
                 success=False,
                 error_message=str(e)
             )
-            
             # Não falhar o salvamento do pedido por causa do estoque
@@ -3,11 +3,30 @@ Serviço para buscar taxas reais do Mercado Livre via API listing_prices
 """
 import requests
 import logging
-from typing import Dict, Any, Optional
+import threading
+import time
+from bisect import bisect_right
+from typing import Dict, Any, Optional, Tuple
 from app.services.token_manager import TokenManager
 
 logger = logging.getLogger(__name__)
 
+# Faixas de preço em que a tarifa fixa do ML muda (limites inferiores, em R$).
+# Dentro de uma faixa o percentual e a tarifa fixa são os mesmos, então a
+# tabela de taxas é consultada uma vez por (site, categoria, tipo, faixa)
+FEE_PRICE_BANDS = [0.0, 12.50, 29.0, 50.0, 79.0]
+# Validade (s) das tabelas de taxas em cache
+FEE_SCHEDULE_TTL = 6 * 60 * 60
+
+# (site, categoria, tipo de anúncio, faixa) -> (expira_em, tabela)
+_fee_schedule_cache: Dict[Tuple, Tuple[float, Dict[str, Any]]] = {}
+_fee_schedule_lock = threading.Lock()
+
+
+def price_band(price: float) -> int:
+    """Índice da faixa de preço (FEE_PRICE_BANDS) em que o preço cai"""
+    return max(0, bisect_right(FEE_PRICE_BANDS, price or 0.0) - 1)
+
 class MLPricingService:
     """Serviço para buscar taxas reais do Mercado Livre"""
     
@@ -67,6 +86,51 @@ class MLPricingService:
             logger.error(f"Erro ao buscar listing prices: {e}")
             return None
     
+    def get_fee_schedule(self, user_id: Optional[int], price: float, category_id: str = None,
+                         listing_type_id: str = "gold_special", site_id: str = "MLB") -> Dict[str, Any]:
+        """
+        Tabela de taxas (percentual, tarifa fixa, tarifa de publicação) para a faixa
+        de preço, em cache por (site, categoria, tipo de anúncio, faixa)
+        
+        Sem user_id ou se a API falhar, usa as taxas padrão (não ficam em cache).
+        
+        Returns:
+            Dict com percentage_fee, fixed_fee, listing_fee, listing_type, currency e source
+        """
+        key = (site_id, category_id, listing_type_id, price_band(price))
+        now = time.monotonic()
+        with _fee_schedule_lock:
+            cached = _fee_schedule_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+        
+        listing_prices = self.get_listing_prices(user_id, price, category_id, listing_type_id) if user_id else None
+        if isinstance(listing_prices, list):
+            listing_prices = listing_prices[0] if listing_prices else None
+        if not listing_prices:
+            default = self._get_default_fees(price)
+            return {
+                "percentage_fee": default["percentage_fee"],
+                "fixed_fee": default["fixed_fee"],
+                "listing_fee": 0,
+                "listing_type": default["listing_type"],
+                "currency": default["currency"],
+                "source": "fallback"
+            }
+        
+        sale_fee_details = listing_prices.get("sale_fee_details", {}) or {}
+        schedule = {
+            "percentage_fee": sale_fee_details.get("percentage_fee", 0) or 0,
+            "fixed_fee": sale_fee_details.get("fixed_fee", 0) or 0,
+            "listing_fee": listing_prices.get("listing_fee_amount", 0) or 0,
+            "listing_type": listing_prices.get("listing_type_name", "Clássico"),
+            "currency": listing_prices.get("currency_id", "BRL"),
+            "source": "api"
+        }
+        with _fee_schedule_lock:
+            _fee_schedule_cache[key] = (now + FEE_SCHEDULE_TTL, schedule)
+        return schedule
+    
     def calculate_ml_fees(self, user_id: int, price: float, category_id: str = None, item_id: str = None) -> Dict[str, Any]:
         """
         Calcula as taxas do Mercado Livre baseado nas taxas reais da API
@@ -80,32 +144,16 @@ class MLPricingService:
             Dict com as taxas calculadas
         """
         try:
-            # Buscar taxas reais
-            listing_prices = self.get_listing_prices(user_id, price, category_id)
+            # Taxas reais (tabela da faixa de preço, em cache)
+            schedule = self.get_fee_schedule(user_id, price, category_id)
             
-            if not listing_prices:
+            if schedule["source"] != "api":
                 logger.warning("Não foi possível obter taxas reais, usando valores padrão")
                 return self._get_default_fees(price)
             
-            # Processar dados da API
-            if isinstance(listing_prices, list) and len(listing_prices) > 0:
-                # Pegar o primeiro resultado (gold_special - Clássico)
-                pricing_data = listing_prices[0]
-            else:
-                pricing_data = listing_prices
-            
-            # Extrair taxas
-            sale_fee_details = pricing_data.get("sale_fee_details", {})
-            listing_fee_details = pricing_data.get("listing_fee_details", {})
-            
-            # Taxa fixa de venda (só existe em alguns sites como MLA)
-            fixed_fee = sale_fee_details.get("fixed_fee", 0)
-            
-            # Taxa percentual
-            percentage_fee = sale_fee_details.get("percentage_fee", 0)
-            
-            # Taxa de publicação
-            listing_fee = pricing_data.get("listing_fee_amount", 0)
+            fixed_fee = schedule["fixed_fee"]
+            percentage_fee = schedule["percentage_fee"]
+            listing_fee = schedule["listing_fee"]
             
             # Calcular valores monetários
             percentage_amount = (price * percentage_fee / 100) if percentage_fee > 0 else 0
@@ -121,14 +169,14 @@ class MLPricingService:
             total_fees = fixed_fee + percentage_amount + listing_fee + shipping_cost
             
             return {
-                "listing_type": pricing_data.get("listing_type_name", "Clássico"),
+                "listing_type": schedule["listing_type"],
                 "fixed_fee": fixed_fee,
                 "percentage_fee": percentage_fee,
                 "percentage_amount": percentage_amount,
                 "listing_fee": listing_fee,
                 "shipping_cost": shipping_cost,
                 "total_fees": total_fees,
-                "currency": pricing_data.get("currency_id", "BRL"),
+                "currency": schedule["currency"],
                 "source": "api"
             }
             
@@ -171,6 +171,8 @@ class MLProductAdsService:
             elif response.status_code == 401 and user_id and token_manager:
                 # Token expirado, tentar renovar usando TokenManager
                 logger.warning(f"Token expirado (401), tentando renovar para usuário {user_id}")
+                from app.services.token_manager import invalidate_access_token
+                invalidate_access_token(access_token)
                 new_token = token_manager._refresh_token(user_id)
                 
                 if new_token:
@@ -0,0 +1,259 @@
+"""
+Motor de importação em massa de anúncios do Mercado Livre
+
+- Lista os IDs da conta com search_type=scan (sem o limite de offset de 1000)
+- Busca detalhes via multiget (/items?ids=, 20 por chamada) em paralelo
+- Pré-carrega os anúncios existentes em uma query por lote e grava com
+  INSERT ... ON CONFLICT (upsert em massa), sem tocar anúncios de outra empresa
+- Enriquecimentos (descrição, preços promocionais) são opcionais; questions e
+  reviews não são buscadas na importação e ficam para as telas que as usam
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.models.saas_models import MLAccount, MLProduct
+from app.services.ml_category_cache_service import MLCategoryCacheService
+from app.services.ml_product_service import MLProductService
+
+logger = logging.getLogger(__name__)
+
+# Limite do multiget da API do ML
+MULTIGET_CHUNK_SIZE = 20
+# Chamadas de multiget simultâneas
+MAX_CONCURRENT_CHUNKS = 8
+# IDs processados (buscados + gravados) por transação
+IMPORT_BATCH_SIZE = 500
+# Tamanho da página no modo scan
+SCAN_PAGE_SIZE = 100
+MAX_RETRIES = 3
+REQUEST_TIMEOUT = 30
+
+# Colunas atualizadas quando o anúncio já existe (espelha _update_product_from_api)
+UPDATE_COLUMNS = [
+    "title", "subtitle", "price", "available_quantity", "sold_quantity", "status",
+    "sale_terms", "warranty", "video_id", "health", "domain_id", "category_id",
+    "sub_status", "pictures", "attributes", "variations", "tags", "shipping",
+    "free_shipping", "logistic_type", "is_fulfillment", "last_sync", "last_ml_update"
+]
+# Colunas que só são sobrescritas quando a API trouxe valor
+COALESCE_COLUMNS = ["description", "category_name", "base_price", "original_price"]
+
+
+class MLProductImportService:
+    """Importação concorrente de anúncios com multiget e upsert em massa"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.base_url = "https://api.mercadolibre.com"
+        self.product_service = MLProductService(db)
+        self.category_cache = MLCategoryCacheService(db)
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=MAX_CONCURRENT_CHUNKS, pool_maxsize=MAX_CONCURRENT_CHUNKS * 2)
+        self.http.mount("https://", adapter)
+
+    def import_account_products(self, ml_account_id: int, company_id: int,
+                                statuses: Optional[List[str]] = None,
+                                max_items: Optional[int] = None,
+                                enrich: bool = False) -> Dict:
+        """
+        Importa (cria ou atualiza) os anúncios de uma conta ML.
+
+        `enrich=True` busca também descrição e preços promocionais de cada item,
+        o que volta a exigir chamadas individuais; por padrão fica desligado.
+        """
+        started_at = time.monotonic()
+        stats = {"items_processed": 0, "items_created": 0, "items_updated": 0,
+                 "items_errors": 0, "items_skipped": 0, "total_found": 0}
+
+        ml_account = self.db.query(MLAccount).filter(
+            MLAccount.id == ml_account_id,
+            MLAccount.company_id == company_id
+        ).first()
+        if not ml_account:
+            return {"success": False, "error": "Conta ML não encontrada"}
+
+        token = self.product_service.get_active_token(ml_account_id, company_id)
+        if not token:
+            return {"success": False, "error": "Token não encontrado ou expirado"}
+
+        headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+
+        item_ids = list(self._iter_item_ids(ml_account.ml_user_id, headers, statuses or ["active"], max_items))
+        stats["total_found"] = len(item_ids)
+        if not item_ids:
+            return {"success": False, "error": "Nenhum produto encontrado com os status selecionados"}
+
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CHUNKS) as executor:
+            for start in range(0, len(item_ids), IMPORT_BATCH_SIZE):
+                batch_ids = item_ids[start:start + IMPORT_BATCH_SIZE]
+                try:
+                    items = self._fetch_items(executor, batch_ids, headers)
+                    stats["items_errors"] += len(batch_ids) - len(items)
+                    if enrich and items:
+                        self._enrich_items(executor, items, headers)
+                    self._upsert_batch(items, ml_account_id, company_id, stats)
+                except Exception as e:
+                    self.db.rollback()
+                    stats["items_errors"] += len(batch_ids)
+                    logger.error(f"❌ Erro ao importar lote de {len(batch_ids)} anúncios: {e}")
+
+                logger.info(
+                    f"📦 Importação conta {ml_account_id}: {min(start + IMPORT_BATCH_SIZE, len(item_ids))}/{len(item_ids)}"
+                )
+
+        elapsed = round(time.monotonic() - started_at, 1)
+        return {
+            "success": True,
+            "message": (
+                f"Importação concluída! {stats['items_processed']} produtos processados: "
+                f"{stats['items_created']} criados, {stats['items_updated']} atualizados, "
+                f"{stats['items_errors']} erros"
+            ),
+            **stats,
+            "elapsed_seconds": elapsed
+        }
+
+    # ------------------------------------------------------------------
+    # API do ML
+    # ------------------------------------------------------------------
+    def _get(self, url: str, headers: Dict, params: Optional[Dict] = None) -> Optional[requests.Response]:
+        """GET com retry exponencial para 429/5xx"""
+        for attempt in range(MAX_RETRIES):
+            try:
+                response = self.http.get(url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as e:
+                logger.warning(f"⚠️ Erro de rede em {url}: {e}")
+                response = None
+            if response is not None and response.status_code < 500 and response.status_code != 429:
+                return response
+            time.sleep(2 ** attempt)
+        return None
+
+    def _iter_item_ids(self, ml_user_id: str, headers: Dict, statuses: List[str],
+                       max_items: Optional[int]) -> Iterator[str]:
+        """Percorre os IDs da conta com o modo scan (scroll_id)"""
+        url = f"{self.base_url}/users/{ml_user_id}/items/search"
+        yielded = 0
+        for status in statuses:
+            params = {"search_type": "scan", "limit": SCAN_PAGE_SIZE, "status": status}
+            while True:
+                response = self._get(url, headers, params)
+                if response is None or response.status_code != 200:
+                    logger.warning(f"⚠️ Falha ao listar anúncios ({status}): "
+                                   f"{response.status_code if response is not None else 'sem resposta'}")
+                    break
+                data = response.json()
+                results = data.get("results", [])
+                for item_id in results:
+                    yield item_id
+                    yielded += 1
+                    if max_items and yielded >= max_items:
+                        return
+                scroll_id = data.get("scroll_id")
+                if not results or not scroll_id:
+                    break
+                params = {"search_type": "scan", "limit": SCAN_PAGE_SIZE, "status": status, "scroll_id": scroll_id}
+
+    def _fetch_chunk(self, chunk: List[str], headers: Dict) -> List[Dict]:
+        response = self._get(f"{self.base_url}/items", headers, {"ids": ",".join(chunk)})
+        if response is None or response.status_code != 200:
+            logger.warning(f"⚠️ Multiget falhou para {len(chunk)} itens")
+            return []
+        return [entry.get("body") for entry in response.json()
+                if entry.get("code") == 200 and entry.get("body")]
+
+    def _fetch_items(self, executor: ThreadPoolExecutor, item_ids: List[str], headers: Dict) -> List[Dict]:
+        """Busca os itens em blocos de 20, com vários blocos em paralelo"""
+        chunks = [item_ids[i:i + MULTIGET_CHUNK_SIZE] for i in range(0, len(item_ids), MULTIGET_CHUNK_SIZE)]
+        items: List[Dict] = []
+        for chunk_items in executor.map(lambda chunk: self._fetch_chunk(chunk, headers), chunks):
+            items.extend(chunk_items)
+        return items
+
+    def _enrich_items(self, executor: ThreadPoolExecutor, items: List[Dict], headers: Dict) -> None:
+        """Descrição e preços promocionais (chamadas por item, em paralelo)"""
+        def _enrich(item: Dict) -> None:
+            item_id = item.get("id")
+            descriptions = self.product_service._get_product_descriptions(item_id, headers)
+            if descriptions:
+                item["descriptions"] = descriptions
+            price_info = self.product_service._get_promotional_prices(item_id, headers)
+            if price_info:
+                item.update(price_info)
+
+        list(executor.map(_enrich, items))
+
+    # ------------------------------------------------------------------
+    # Banco
+    # ------------------------------------------------------------------
+    def _upsert_batch(self, items: List[Dict], ml_account_id: int, company_id: int, stats: Dict) -> None:
+        if not items:
+            return
+
+        # Um mesmo item não pode aparecer duas vezes no mesmo INSERT ... ON CONFLICT
+        items = list({item.get("id"): item for item in items if item.get("id")}.values())
+        item_ids = [item.get("id") for item in items]
+        existing = {
+            row.ml_item_id: row
+            for row in self.db.query(
+                MLProduct.ml_item_id, MLProduct.company_id, MLProduct.category_id
+            ).filter(MLProduct.ml_item_id.in_(item_ids)).all()
+        }
+
+        # Nomes de categoria apenas para categorias novas/alteradas (cache local)
+        category_names: Dict[str, Optional[str]] = {}
+        for item in items:
+            category_id = item.get("category_id")
+            current = existing.get(item.get("id"))
+            if category_id and category_id not in category_names and (not current or current.category_id != category_id):
+                category_names[category_id] = self.category_cache.get_category_info(category_id).get("category_name")
+
+        rows = []
+        for item in items:
+            current = existing.get(item.get("id"))
+            if current and current.company_id != company_id:
+                # ml_item_id é único globalmente: nunca sobrescrever anúncio de outra empresa
+                stats["items_skipped"] += 1
+                continue
+            try:
+                values = self.product_service._build_product_values(
+                    item, ml_account_id, company_id, category_names.get(item.get("category_id"))
+                )
+                if "base_price" not in item:
+                    values["base_price"] = None
+                rows.append(values)
+            except Exception as e:
+                stats["items_errors"] += 1
+                logger.error(f"❌ Erro ao mapear anúncio {item.get('id')}: {e}")
+
+        if not rows:
+            return
+
+        table = MLProduct.__table__
+        statement = pg_insert(table).values(rows)
+        excluded = statement.excluded
+        set_values = {column: excluded[column] for column in UPDATE_COLUMNS}
+        for column in COALESCE_COLUMNS:
+            set_values[column] = func.coalesce(excluded[column], table.c[column])
+        set_values["updated_at"] = func.now()
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.ml_item_id],
+            set_=set_values,
+            where=table.c.company_id == excluded.company_id
+        )
+
+        self.db.execute(statement)
+        self.db.commit()
+
+        created = sum(1 for row in rows if row["ml_item_id"] not in existing)
+        stats["items_created"] += created
+        stats["items_updated"] += len(rows) - created
+        stats["items_processed"] += len(rows)
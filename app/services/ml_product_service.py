@@ -12,6 +12,8 @@ from sqlalchemy import and_, or_
 from app.models.saas_models import MLAccount, MLProduct, MLProductSync, Token, MLProductStatus
 from app.config.settings import settings
 from app.services.token_manager import TokenManager
+from app.services.ml_category_cache_service import MLCategoryCacheService
+from app.utils.logistics import product_is_fulfillment, product_logistic_type
 
 logger = logging.getLogger(__name__)
 
@@ -24,26 +26,11 @@ class MLProductService:
         self.token_manager = TokenManager(db)
     
     def get_active_token(self, ml_account_id: int, company_id: Optional[int] = None) -> Optional[str]:
-        """Obtém access token usando o TokenManager, renovando automaticamente se necessário"""
+        """Obtém access token usando o TokenManager (cache por conta, renovando automaticamente se necessário)"""
         try:
-            if company_id is None:
-                account = (
-                    self.db.query(MLAccount.company_id)
-                    .filter(MLAccount.id == ml_account_id)
-                    .first()
-                )
-                if not account:
-                    logger.warning(
-                        "Conta ML %s não encontrada ao buscar token", ml_account_id
-                    )
-                    return None
-                company_id = account[0]
-
-            token_record = self.token_manager.get_token_record_for_account(
-                ml_account_id, company_id
-            )
-            if token_record and token_record.access_token:
-                return token_record.access_token
+            token = self.token_manager.get_access_token_for_account(ml_account_id, company_id)
+            if token:
+                return token
 
             logger.warning(
                 "TokenManager não retornou token válido para ml_account_id=%s", ml_account_id
@@ -54,73 +41,6 @@ class MLProductService:
             logger.error(f"Erro ao obter token ativo via TokenManager: {e}")
             return None
     
-    def _refresh_token(self, refresh_token: str, ml_account_id: int) -> Optional[str]:
-        """Tenta renovar token usando refresh token"""
-        try:
-            import requests
-            from datetime import datetime, timedelta
-            from app.config.settings import Settings
-            
-            settings = Settings()
-            
-            # Dados para renovar token (usa credenciais do ambiente)
-            data = {
-                "grant_type": "refresh_token",
-                "client_id": settings.ml_app_id,
-                "client_secret": settings.ml_client_secret,
-                "refresh_token": refresh_token
-            }
-            
-            headers = {
-                "accept": "application/json",
-                "content-type": "application/x-www-form-urlencoded"
-            }
-            
-            response = requests.post("https://api.mercadolibre.com/oauth/token", data=data, headers=headers)
-            
-            if response.status_code == 200:
-                token_data = response.json()
-                logger.info(f"Token renovado com sucesso para ml_account_id: {ml_account_id}")
-                
-                # Desativar tokens antigos
-                from sqlalchemy import text
-                self.db.execute(text("""
-                    UPDATE tokens 
-                    SET is_active = false 
-                    WHERE ml_account_id = :ml_account_id
-                """), {"ml_account_id": ml_account_id})
-                
-                # Buscar user_id válido da tabela users
-                user_query = text("SELECT id FROM users WHERE company_id = (SELECT company_id FROM ml_accounts WHERE id = :ml_account_id) LIMIT 1")
-                user_result = self.db.execute(user_query, {"ml_account_id": ml_account_id}).fetchone()
-                user_id = user_result[0] if user_result else 1
-                
-                # Criar novo token
-                from app.models.saas_models import Token
-                new_token = Token(
-                    user_id=user_id,
-                    ml_account_id=ml_account_id,
-                    access_token=token_data["access_token"],
-                    refresh_token=token_data.get("refresh_token"),
-                    token_type=token_data.get("token_type", "Bearer"),
-                    expires_in=token_data.get("expires_in", 21600),
-                    scope=token_data.get("scope", ""),
-                    expires_at=datetime.utcnow() + timedelta(seconds=token_data.get("expires_in", 21600)),
-                    is_active=True
-                )
-                
-                self.db.add(new_token)
-                self.db.commit()
-                
-                return token_data["access_token"]
-            else:
-                logger.error(f"Erro ao renovar token: {response.status_code} - {response.text}")
-                return None
-                
-        except Exception as e:
-            logger.error(f"Erro ao renovar token: {e}")
-            return None
-    
     def fetch_user_products(
         self,
         ml_account_id: int,
@@ -201,99 +121,29 @@ class MLProductService:
             raise Exception(f"Erro ao buscar produto: {e}")
     
     def import_bulk_products(self, ml_account_id: int, company_id: int, 
-                            product_statuses: list, limit: int = 100) -> Dict:
-        """Importa múltiplos produtos do Mercado Livre com filtro de status"""
+                            product_statuses: list, limit: int = 100,
+                            include_details: bool = False) -> Dict:
+        """
+        Importa múltiplos produtos do Mercado Livre com filtro de status
+
+        Usa o motor de importação em massa (multiget concorrente + upsert em lote).
+        `include_details` busca também descrição e preços promocionais por item.
+        """
         try:
-            print(f"🔍 SERVICE DEBUG - ml_account_id: {ml_account_id}")
-            print(f"🔍 SERVICE DEBUG - company_id: {company_id}")
-            print(f"🔍 SERVICE DEBUG - product_statuses: {product_statuses}")
-            print(f"🔍 SERVICE DEBUG - limit: {limit}")
-            
-            # Obter token ativo
-            token = self.get_active_token(ml_account_id, company_id)
-            if not token:
-                print(f"❌ SERVICE ERROR - Token não encontrado para ml_account_id: {ml_account_id}")
-                return {
-                    "success": False,
-                    "error": "Token não encontrado ou expirado"
-                }
-            
-            print(f"✅ SERVICE DEBUG - Token encontrado: {token[:20]}...")
-            
-            # Buscar produtos do usuário com filtro de status
-            print(f"🔍 SERVICE DEBUG - Chamando fetch_user_products...")
-            products_data = self.fetch_user_products(ml_account_id, company_id, limit=limit)
-            print(f"🔍 SERVICE DEBUG - Resultado fetch_user_products: {products_data}")
-            
-            if not products_data.get('success'):
-                print(f"❌ SERVICE ERROR - fetch_user_products falhou: {products_data}")
-                return {
-                    "success": False,
-                    "error": "Erro ao buscar produtos do usuário"
-                }
-            
-            products = products_data.get('products', [])
-            
-            # Como a API já retorna apenas produtos ativos, não precisamos filtrar
-            # Vamos usar todos os produtos retornados
-            filtered_products = products
-            
-            if not filtered_products:
-                return {
-                    "success": False,
-                    "error": f"Nenhum produto encontrado com os status selecionados: {', '.join(product_statuses)}"
-                }
-            
-            # Processar produtos
-            items_processed = 0
-            items_created = 0
-            items_updated = 0
-            items_errors = 0
-            
-            for product_id in filtered_products:
-                try:
-                    # product_id já é o ID do produto (string)
-                    
-                    # Buscar detalhes completos do produto
-                    product_details = self.fetch_product_details(product_id, token)
-                    if not product_details:
-                        items_errors += 1
-                        continue
-                    
-                    # Verificar se produto já existe
-                    existing_product = self.db.query(MLProduct).filter(
-                        MLProduct.ml_item_id == product_id
-                    ).first()
-                    
-                    if existing_product:
-                        # Atualizar produto existente
-                        self._update_product_from_api(existing_product, product_details)
-                        items_updated += 1
-                    else:
-                        # Criar novo produto
-                        self._create_product_from_api(
-                            product_details, ml_account_id, company_id
-                        )
-                        items_created += 1
-                    
-                    items_processed += 1
-                    
-                except Exception as e:
-                    logger.error(f"Erro ao processar produto {product_details.get('id', 'unknown')}: {e}")
-                    items_errors += 1
-                    continue
+            from app.services.ml_product_import_service import MLProductImportService
+            
+            result = MLProductImportService(self.db).import_account_products(
+                ml_account_id,
+                company_id,
+                statuses=product_statuses or ["active"],
+                max_items=limit,
+                enrich=include_details
+            )
             
-            self.db.commit()
+            if not result.get("success") and result.get("error", "").startswith("Nenhum produto"):
+                result["error"] = f"Nenhum produto encontrado com os status selecionados: {', '.join(product_statuses)}"
             
-            return {
-                "success": True,
-                "message": f"Importação concluída! {items_processed} produtos processados: {items_created} criados, {items_updated} atualizados, {items_errors} erros",
-                "items_processed": items_processed,
-                "items_created": items_created,
-                "items_updated": items_updated,
-                "items_errors": items_errors,
-                "total_found": len(filtered_products)
-            }
+            return result
             
         except Exception as e:
             self.db.rollback()
@@ -453,71 +303,9 @@ class MLProductService:
             # Buscar informações adicionais da categoria
             category_info = self._get_category_info(api_data.get("category_id"))
             
-            # Processar informações de envio
-            shipping_info = self._process_shipping_info(api_data.get("shipping", {}))
-            
-            # Processar atributos completos
-            processed_attributes = self._process_attributes(api_data.get("attributes", []))
-            
-            # Extrair descrição (pode vir em descriptions array)
-            description_text = None
-            descriptions = api_data.get("descriptions", [])
-            if descriptions and len(descriptions) > 0:
-                # Pegar a primeira descrição (geralmente é a principal)
-                description_text = descriptions[0].get("plain_text") or descriptions[0].get("text")
-            
-            # Mapear dados da API para o modelo
-            product = MLProduct(
-                company_id=company_id,
-                ml_account_id=ml_account_id,
-                ml_item_id=api_data.get("id"),
-                user_product_id=api_data.get("user_product_id"),
-                family_id=api_data.get("family_id"),
-                family_name=api_data.get("family_name"),
-                title=api_data.get("title"),
-                subtitle=api_data.get("subtitle"),
-                description=description_text,
-                price=str(api_data.get("price", 0)),
-                base_price=str(api_data.get("base_price", 0)),
-                original_price=str(api_data.get("original_price", 0)) if api_data.get("original_price") else None,
-                currency_id=api_data.get("currency_id"),
-                sale_terms=api_data.get("sale_terms"),
-                warranty=api_data.get("warranty"),
-                video_id=api_data.get("video_id"),
-                health=api_data.get("health"),
-                domain_id=api_data.get("domain_id"),
-                available_quantity=api_data.get("available_quantity", 0),
-                sold_quantity=api_data.get("sold_quantity", 0),
-                initial_quantity=api_data.get("initial_quantity", 0),
-                category_id=api_data.get("category_id"),
-                category_name=category_info.get("category_name"),
-                condition=api_data.get("condition"),
-                listing_type_id=api_data.get("listing_type_id"),
-                buying_mode=api_data.get("buying_mode"),
-                permalink=api_data.get("permalink"),
-                thumbnail=api_data.get("thumbnail"),
-                secure_thumbnail=api_data.get("secure_thumbnail"),
-                pictures=self._extract_pictures(api_data.get("pictures", [])),
-                status=self._map_status(api_data.get("status")),
-                sub_status=api_data.get("sub_status", []),
-                start_time=self._parse_datetime(api_data.get("start_time")),
-                stop_time=self._parse_datetime(api_data.get("stop_time")),
-                end_time=self._parse_datetime(api_data.get("end_time")),
-                seller_id=str(api_data.get("seller_id", "")),
-                seller_custom_field=api_data.get("seller_custom_field"),
-                seller_sku=self._extract_seller_sku(api_data.get("attributes", [])),
-                catalog_product_id=api_data.get("catalog_product_id"),
-                catalog_listing=api_data.get("catalog_listing", False),
-                attributes=processed_attributes,
-                variations=api_data.get("variations", []),
-                tags=api_data.get("tags", []),
-                shipping=shipping_info,
-                free_shipping=api_data.get("shipping", {}).get("free_shipping", False),
-                differential_pricing=api_data.get("differential_pricing"),
-                deal_ids=api_data.get("deal_ids", []),
-                last_sync=datetime.utcnow(),
-                last_ml_update=self._parse_datetime(api_data.get("last_updated"))
-            )
+            product = MLProduct(**self._build_product_values(
+                api_data, ml_account_id, company_id, category_info.get("category_name")
+            ))
             
             self.db.add(product)
             self.db.commit()
@@ -528,6 +316,77 @@ class MLProductService:
             logger.error(f"Erro ao criar produto: {e}")
             raise
     
+    def _build_product_values(self, api_data: Dict, ml_account_id: int, company_id: int,
+                              category_name: Optional[str] = None) -> Dict:
+        """Mapeia os dados da API para as colunas de MLProduct (usado também no upsert em massa)"""
+        # Processar informações de envio
+        shipping_info = self._process_shipping_info(api_data.get("shipping", {}))
+        
+        # Processar atributos completos
+        processed_attributes = self._process_attributes(api_data.get("attributes", []))
+        
+        # Extrair descrição (pode vir em descriptions array)
+        description_text = None
+        descriptions = api_data.get("descriptions", [])
+        if descriptions and len(descriptions) > 0:
+            # Pegar a primeira descrição (geralmente é a principal)
+            description_text = descriptions[0].get("plain_text") or descriptions[0].get("text")
+        
+        # Mapear dados da API para o modelo
+        return dict(
+            company_id=company_id,
+            ml_account_id=ml_account_id,
+            ml_item_id=api_data.get("id"),
+            user_product_id=api_data.get("user_product_id"),
+            family_id=api_data.get("family_id"),
+            family_name=api_data.get("family_name"),
+            title=api_data.get("title"),
+            subtitle=api_data.get("subtitle"),
+            description=description_text,
+            price=str(api_data.get("price", 0)),
+            base_price=str(api_data.get("base_price", 0)),
+            original_price=str(api_data.get("original_price", 0)) if api_data.get("original_price") else None,
+            currency_id=api_data.get("currency_id"),
+            sale_terms=api_data.get("sale_terms"),
+            warranty=api_data.get("warranty"),
+            video_id=api_data.get("video_id"),
+            health=api_data.get("health"),
+            domain_id=api_data.get("domain_id"),
+            available_quantity=api_data.get("available_quantity", 0),
+            sold_quantity=api_data.get("sold_quantity", 0),
+            initial_quantity=api_data.get("initial_quantity", 0),
+            category_id=api_data.get("category_id"),
+            category_name=category_name,
+            condition=api_data.get("condition"),
+            listing_type_id=api_data.get("listing_type_id"),
+            buying_mode=api_data.get("buying_mode"),
+            permalink=api_data.get("permalink"),
+            thumbnail=api_data.get("thumbnail"),
+            secure_thumbnail=api_data.get("secure_thumbnail"),
+            pictures=self._extract_pictures(api_data.get("pictures", [])),
+            status=self._map_status(api_data.get("status")),
+            sub_status=api_data.get("sub_status", []),
+            start_time=self._parse_datetime(api_data.get("start_time")),
+            stop_time=self._parse_datetime(api_data.get("stop_time")),
+            end_time=self._parse_datetime(api_data.get("end_time")),
+            seller_id=str(api_data.get("seller_id", "")),
+            seller_custom_field=api_data.get("seller_custom_field"),
+            seller_sku=self._extract_seller_sku(api_data.get("attributes", [])),
+            catalog_product_id=api_data.get("catalog_product_id"),
+            catalog_listing=api_data.get("catalog_listing", False),
+            attributes=processed_attributes,
+            variations=api_data.get("variations", []),
+            tags=api_data.get("tags", []),
+            shipping=shipping_info,
+            free_shipping=api_data.get("shipping", {}).get("free_shipping", False),
+            logistic_type=product_logistic_type(shipping_info),
+            is_fulfillment=product_is_fulfillment(product_logistic_type(shipping_info), api_data.get("tags", [])),
+            differential_pricing=api_data.get("differential_pricing"),
+            deal_ids=api_data.get("deal_ids", []),
+            last_sync=datetime.utcnow(),
+            last_ml_update=self._parse_datetime(api_data.get("last_updated"))
+        )
+    
     def _update_product_from_api(self, product: MLProduct, api_data: Dict):
         """Atualiza produto existente com dados da API"""
         try:
@@ -610,30 +469,12 @@ class MLProductService:
         return None
     
     def _get_category_info(self, category_id: str) -> Dict:
-        """Busca informações completas da categoria"""
+        """Busca informações completas da categoria (cache local de categorias)"""
         try:
             if not category_id:
                 return {}
-                
-            # Buscar informações da categoria via API
-            response = requests.get(
-                f"https://api.mercadolibre.com/categories/{category_id}",
-                timeout=30
-            )
             
-            if response.status_code == 200:
-                category_data = response.json()
-                return {
-                    "category_name": category_data.get("name"),
-                    "category_path": self._extract_category_path(category_data),
-                    "domain_id": category_data.get("domain_id"),
-                    "attributes_count": len(category_data.get("attributes", [])),
-                    "children_categories": len(category_data.get("children_categories", [])),
-                    "settings": category_data.get("settings", {})
-                }
-            else:
-                logger.warning(f"Não foi possível buscar categoria {category_id}: {response.status_code}")
-                return {}
+            return MLCategoryCacheService(self.db).get_category_info(category_id)
                 
         except Exception as e:
             logger.error(f"Erro ao buscar categoria {category_id}: {e}")
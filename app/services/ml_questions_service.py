@@ -4,14 +4,53 @@ Service para gerenciar perguntas do Mercado Livre
 import logging
 import requests
 from typing import Dict, List, Optional
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 from app.models.saas_models import MLQuestion, MLQuestionStatus, MLAccount, MLAccountStatus, User
 from app.services.token_manager import TokenManager
 
 logger = logging.getLogger(__name__)
 
+# Margem aplicada ao cursor para não perder perguntas com atraso de indexação na API
+QUESTIONS_CURSOR_OVERLAP = timedelta(hours=1)
+# Linhas por INSERT ... ON CONFLICT
+UPSERT_BATCH_SIZE = 500
+# Limite do multiget de /items
+ITEMS_MULTIGET_SIZE = 20
+
+# Colunas atualizadas quando a pergunta já existe (espelha o antigo save_question_to_db)
+QUESTION_UPDATE_COLUMNS = [
+    "question_text", "status", "answer_text", "answer_status", "answered_at", "answer_date",
+    "buyer_nickname", "buyer_answered_questions", "question_data", "updated_at", "last_sync",
+    "deleted_from_list", "hold"
+]
+# Colunas que só são sobrescritas quando a API trouxe valor
+QUESTION_COALESCE_COLUMNS = ["item_title", "item_thumbnail", "ml_buyer_id"]
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    """Data ISO da API do ML (aceita sufixo Z)"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (ValueError, AttributeError):
+        logger.warning(f"Erro ao parsear data da API: {value}")
+        return None
+
+
+def _utc(value: Optional[str]) -> Optional[datetime]:
+    """Data ISO da API convertida para UTC (para comparar com os cursores)"""
+    parsed = _parse_date(value)
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
 class MLQuestionsService:
     """Service para gerenciar perguntas do Mercado Livre"""
     
@@ -77,8 +116,14 @@ class MLQuestionsService:
             logger.error(f"Erro ao buscar perguntas do item {item_id}: {e}", exc_info=True)
             return []
     
-    def get_all_questions(self, ml_user_id: str, access_token: str, status: str = None, limit: int = 50) -> List[Dict]:
-        """Busca todas as perguntas do vendedor"""
+    def get_all_questions(self, ml_user_id: str, access_token: str, status: str = None, limit: int = 50,
+                          since: Optional[datetime] = None) -> List[Dict]:
+        """
+        Busca todas as perguntas do vendedor
+
+        Com since (UTC), as páginas vêm da mais recente para a mais antiga e a
+        busca para na primeira página que já alcança perguntas anteriores ao cursor.
+        """
         try:
             url = f"{self.base_url}/questions/search"
             headers = {
@@ -92,6 +137,9 @@ class MLQuestionsService:
             }
             if status:
                 params["status"] = status
+            if since:
+                params["sort_fields"] = "date_created"
+                params["sort_types"] = "DESC"
             
             all_questions = []
             offset = 0
@@ -107,7 +155,13 @@ class MLQuestionsService:
                     if not questions:
                         break
                     
-                    all_questions.extend(questions)
+                    if since:
+                        recent = [q for q in questions if (_utc(q.get("date_created")) or since) >= since]
+                        all_questions.extend(recent)
+                        if len(recent) < len(questions):
+                            break
+                    else:
+                        all_questions.extend(questions)
                     total = data.get("total", 0)
                     
                     offset += len(questions)
@@ -216,143 +270,160 @@ class MLQuestionsService:
             logger.error(f"Erro ao buscar detalhes do item {item_id}: {e}", exc_info=True)
             return None
 
+    def _question_row(self, question_data: Dict, company_id: int, ml_account_id: int,
+                      seller_id: str) -> Optional[Dict]:
+        """Converte a pergunta da API na linha de ml_questions usada no upsert"""
+        ml_question_id = question_data.get("id")
+        if not ml_question_id:
+            logger.warning("Dados da pergunta não contêm ID")
+            return None
+        
+        # Status da pergunta
+        try:
+            status = MLQuestionStatus[question_data.get("status", "UNANSWERED")]
+        except KeyError:
+            status = MLQuestionStatus.UNANSWERED
+        
+        # Dados da resposta, do comprador e do item
+        answer_data = question_data.get("answer") or {}
+        answer_date = _parse_date(answer_data.get("date_created"))
+        from_data = question_data.get("from") or {}
+        item_data = question_data.get("item") if isinstance(question_data.get("item"), dict) else {}
+        
+        item_id = item_data.get("id") or question_data.get("item_id")
+        if not item_id:
+            logger.warning(f"Item ID não encontrado na pergunta {ml_question_id}")
+        
+        now = datetime.now()
+        return {
+            "company_id": company_id,
+            "ml_account_id": ml_account_id,
+            "ml_question_id": int(ml_question_id),
+            "ml_item_id": str(item_id) if item_id else "UNKNOWN",
+            "ml_seller_id": str(question_data.get("seller_id") or seller_id or "UNKNOWN"),
+            "ml_buyer_id": str(from_data["id"]) if from_data.get("id") else None,
+            "question_text": question_data.get("text", ""),
+            "status": status,
+            "answer_text": answer_data.get("text"),
+            "answer_status": answer_data.get("status"),
+            "answered_at": answer_date,
+            "answer_date": answer_date,
+            "item_title": item_data.get("title"),
+            "item_thumbnail": item_data.get("thumbnail"),
+            "buyer_nickname": from_data.get("nickname"),
+            "buyer_answered_questions": from_data.get("answered_questions"),
+            "deleted_from_list": question_data.get("deleted_from_list", False),
+            "hold": question_data.get("hold", False),
+            "question_date": _parse_date(question_data.get("date_created")) or now,
+            "question_data": question_data,
+            "created_at": now,
+            "updated_at": now,
+            "last_sync": now
+        }
+    
+    def upsert_questions(self, questions: List[Dict], company_id: int, ml_account: MLAccount) -> int:
+        """
+        Grava as perguntas em lote com INSERT ... ON CONFLICT (ml_question_id),
+        sem tocar perguntas de outra empresa. Não faz commit.
+
+        Returns:
+            Quantidade de perguntas gravadas
+        """
+        rows: Dict[int, Dict] = {}
+        for question_data in questions:
+            row = self._question_row(question_data, company_id, ml_account.id, str(ml_account.ml_user_id))
+            if row:
+                rows[row["ml_question_id"]] = row
+        if not rows:
+            return 0
+        
+        table = MLQuestion.__table__
+        values = list(rows.values())
+        saved = 0
+        for start in range(0, len(values), UPSERT_BATCH_SIZE):
+            statement = pg_insert(table).values(values[start:start + UPSERT_BATCH_SIZE])
+            excluded = statement.excluded
+            set_values = {column: excluded[column] for column in QUESTION_UPDATE_COLUMNS}
+            for column in QUESTION_COALESCE_COLUMNS:
+                set_values[column] = func.coalesce(excluded[column], table.c[column])
+            # Item/vendedor só são trocados quando o registro local ficou sem o valor
+            for column in ("ml_item_id", "ml_seller_id"):
+                set_values[column] = func.coalesce(func.nullif(table.c[column], "UNKNOWN"), excluded[column])
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.ml_question_id],
+                set_=set_values,
+                where=table.c.company_id == excluded.company_id
+            )
+            saved += self.db.execute(statement).rowcount
+        return saved
+    
+    def enrich_item_details(self, company_id: int, ml_account_id: int, access_token: str) -> int:
+        """
+        Preenche título/miniatura do anúncio das perguntas que ainda não os têm,
+        com multiget de /items (20 por chamada) para os itens distintos. Não faz commit.
+        """
+        item_ids = [
+            row[0] for row in self.db.query(MLQuestion.ml_item_id).filter(
+                MLQuestion.company_id == company_id,
+                MLQuestion.ml_account_id == ml_account_id,
+                MLQuestion.ml_item_id != "UNKNOWN",
+                or_(MLQuestion.item_title.is_(None), MLQuestion.item_title == "",
+                    MLQuestion.item_thumbnail.is_(None), MLQuestion.item_thumbnail == "")
+            ).distinct().all()
+        ]
+        if not item_ids:
+            return 0
+        
+        headers = {**self.headers, "Authorization": f"Bearer {access_token}"}
+        updated = 0
+        for start in range(0, len(item_ids), ITEMS_MULTIGET_SIZE):
+            chunk = item_ids[start:start + ITEMS_MULTIGET_SIZE]
+            try:
+                response = requests.get(
+                    f"{self.base_url}/items",
+                    headers=headers,
+                    params={"ids": ",".join(chunk), "attributes": "id,title,thumbnail,secure_thumbnail,pictures"},
+                    timeout=15
+                )
+                if response.status_code != 200:
+                    logger.warning(f"⚠️ Multiget de itens retornou {response.status_code}: {response.text[:200]}")
+                    continue
+                entries = response.json()
+            except Exception as e:
+                logger.warning(f"⚠️ Erro no multiget de itens das perguntas: {e}")
+                continue
+            
+            for entry in entries:
+                item = entry.get("body") or {}
+                if entry.get("code") != 200 or not item.get("id"):
+                    continue
+                thumbnail = item.get("secure_thumbnail") or item.get("thumbnail")
+                if not thumbnail and item.get("pictures"):
+                    first_picture = item["pictures"][0]
+                    thumbnail = first_picture.get("secure_url") or first_picture.get("url")
+                updated += self.db.query(MLQuestion).filter(
+                    MLQuestion.company_id == company_id,
+                    MLQuestion.ml_item_id == str(item["id"])
+                ).update({
+                    MLQuestion.item_title: func.coalesce(func.nullif(MLQuestion.item_title, ""), item.get("title")),
+                    MLQuestion.item_thumbnail: func.coalesce(func.nullif(MLQuestion.item_thumbnail, ""), thumbnail),
+                    MLQuestion.updated_at: datetime.now()
+                }, synchronize_session=False)
+        return updated
+    
     def save_question_to_db(self, question_data: Dict, company_id: int, ml_account_id: int) -> Optional[MLQuestion]:
         """Salva ou atualiza pergunta no banco"""
         try:
-            ml_question_id = question_data.get("id")
-            if not ml_question_id:
-                logger.warning("Dados da pergunta não contêm ID")
+            ml_account = self.db.query(MLAccount).filter(MLAccount.id == ml_account_id).first()
+            if not ml_account or not self.upsert_questions([question_data], company_id, ml_account):
                 return None
+            self.db.commit()
             
-            # Buscar se já existe
             question = self.db.query(MLQuestion).filter(
-                MLQuestion.ml_question_id == ml_question_id,
+                MLQuestion.ml_question_id == int(question_data["id"]),
                 MLQuestion.company_id == company_id
             ).first()
-            
-            # Status da pergunta
-            status_str = question_data.get("status", "UNANSWERED")
-            try:
-                status = MLQuestionStatus[status_str]
-            except KeyError:
-                status = MLQuestionStatus.UNANSWERED
-            
-            # Dados da resposta
-            answer_data = question_data.get("answer", {})
-            answer_text = answer_data.get("text") if answer_data else None
-            answer_status = answer_data.get("status") if answer_data else None
-            
-            answer_date = None
-            if answer_data and answer_data.get("date_created"):
-                try:
-                    date_str = answer_data["date_created"]
-                    if date_str.endswith("Z"):
-                        date_str = date_str.replace("Z", "+00:00")
-                    answer_date = datetime.fromisoformat(date_str)
-                except Exception as e:
-                    logger.warning(f"Erro ao parsear data de resposta: {e}")
-            
-            # Dados do comprador
-            from_data = question_data.get("from", {})
-            
-            # Dados do item
-            item_data = question_data.get("item", {})
-            
-            # Parsear data da pergunta
-            question_date = datetime.now()
-            if question_data.get("date_created"):
-                try:
-                    date_str = question_data["date_created"]
-                    if date_str.endswith("Z"):
-                        date_str = date_str.replace("Z", "+00:00")
-                    question_date = datetime.fromisoformat(date_str)
-                except Exception as e:
-                    logger.warning(f"Erro ao parsear data da pergunta: {e}")
-            
-            if question:
-                # Atualizar existente
-                question.question_text = question_data.get("text", "")
-                question.status = status
-                question.answer_text = answer_text
-                question.answer_status = answer_status
-                question.answered_at = answer_date
-                question.answer_date = answer_date
-                question.buyer_nickname = from_data.get("nickname") if from_data else None
-                question.buyer_answered_questions = from_data.get("answered_questions") if from_data else None
-                question.item_title = item_data.get("title") if item_data else question.item_title
-                question.item_thumbnail = item_data.get("thumbnail") if item_data else question.item_thumbnail
-                question.question_data = question_data
-                question.updated_at = datetime.now()
-                question.last_sync = datetime.now()
-                question.deleted_from_list = question_data.get("deleted_from_list", False)
-                question.hold = question_data.get("hold", False)
-                
-                # Atualizar ml_item_id e ml_seller_id se necessário
-                if item_data and item_data.get("id") and not question.ml_item_id:
-                    question.ml_item_id = str(item_data.get("id"))
-                if question_data.get("seller_id") and not question.ml_seller_id:
-                    question.ml_seller_id = str(question_data.get("seller_id"))
-            else:
-                # Extrair item_id do objeto item
-                item_id = None
-                if item_data and item_data.get("id"):
-                    item_id = str(item_data.get("id"))
-                elif question_data.get("item_id"):
-                    item_id = str(question_data.get("item_id"))
-                
-                # Validar que temos item_id (campo obrigatório)
-                if not item_id:
-                    logger.warning(f"Item ID não encontrado na pergunta {ml_question_id}")
-                    # Tentar usar um valor padrão ou buscar de outra fonte
-                    # Por enquanto, vamos usar "UNKNOWN" para não quebrar o banco
-                    item_id = "UNKNOWN"
-                
-                # Obter seller_id da conta ML (ml_user_id)
-                # Se não estiver disponível na resposta da API, usar o ml_user_id da conta
-                seller_id = ""
-                if question_data.get("seller_id"):
-                    seller_id = str(question_data.get("seller_id"))
-                else:
-                    # Buscar ml_account para obter ml_user_id
-                    ml_account = self.db.query(MLAccount).filter(MLAccount.id == ml_account_id).first()
-                    if ml_account:
-                        seller_id = str(ml_account.ml_user_id)
-                
-                # Validar que temos seller_id (campo obrigatório)
-                if not seller_id:
-                    logger.warning(f"Seller ID não encontrado para pergunta {ml_question_id}")
-                    seller_id = "UNKNOWN"
-                
-                # Criar novo
-                question = MLQuestion(
-                    company_id=company_id,
-                    ml_account_id=ml_account_id,
-                    ml_question_id=ml_question_id,
-                    ml_item_id=item_id,
-                    ml_seller_id=seller_id,
-                    ml_buyer_id=str(from_data.get("id", "")) if from_data and from_data.get("id") else None,
-                    question_text=question_data.get("text", ""),
-                    status=status,
-                    answer_text=answer_text,
-                    answer_status=answer_status,
-                    answered_at=answer_date,
-                    answer_date=answer_date,
-                    item_title=item_data.get("title") if item_data else None,
-                    item_thumbnail=item_data.get("thumbnail") if item_data else None,
-                    buyer_nickname=from_data.get("nickname") if from_data else None,
-                    buyer_answered_questions=from_data.get("answered_questions") if from_data else None,
-                    deleted_from_list=question_data.get("deleted_from_list", False),
-                    hold=question_data.get("hold", False),
-                    question_date=question_date,
-                    question_data=question_data,
-                    last_sync=datetime.now()
-                )
-                self.db.add(question)
-            
-            self.db.commit()
-            self.db.refresh(question)
-            
-            logger.info(f"✅ Pergunta {ml_question_id} salva/atualizada no banco")
+            logger.info(f"✅ Pergunta {question_data['id']} salva/atualizada no banco")
             return question
             
         except Exception as e:
@@ -360,8 +431,15 @@ class MLQuestionsService:
             self.db.rollback()
             return None
     
-    def sync_questions(self, company_id: int, user_id: int, ml_account_id: int = None, status: str = None) -> Dict:
-        """Sincroniza todas as perguntas do vendedor (todas as contas ou uma conta específica)"""
+    def sync_questions(self, company_id: int, user_id: int, ml_account_id: int = None, status: str = None,
+                       full: bool = False) -> Dict:
+        """
+        Sincroniza as perguntas do vendedor (todas as contas ou uma conta específica)
+
+        Incremental por padrão: busca só as perguntas criadas desde o cursor da conta
+        (questions_synced_until, com margem de QUESTIONS_CURSOR_OVERLAP). Sem cursor,
+        com full=True ou com filtro de status, busca a lista completa.
+        """
         try:
             # Obter token
             token_manager = TokenManager(self.db)
@@ -415,8 +493,12 @@ class MLQuestionsService:
                     
                     access_token = token_record.access_token
                     
-                    # Buscar todas as perguntas desta conta
-                    questions = self.get_all_questions(str(ml_account.ml_user_id), access_token, status)
+                    since = None
+                    if not full and not status and ml_account.questions_synced_until:
+                        since = ml_account.questions_synced_until.replace(tzinfo=timezone.utc) - QUESTIONS_CURSOR_OVERLAP
+                    
+                    # Buscar perguntas desta conta (novas desde o cursor ou todas)
+                    questions = self.get_all_questions(str(ml_account.ml_user_id), access_token, status, since=since)
                     
                     if not questions:
                         logger.info(
@@ -426,29 +508,40 @@ class MLQuestionsService:
                             status or "ALL",
                         )
                     
-                    saved_count = 0
-                    error_count = 0
+                    saved_count = self.upsert_questions(questions, company_id, ml_account)
+                    self.enrich_item_details(company_id, ml_account.id, access_token)
                     
-                    for question_data in questions:
-                        result = self.save_question_to_db(question_data, company_id, ml_account.id)
-                        if result:
-                            saved_count += 1
-                        else:
-                            error_count += 1
+                    # O cursor só avança quando a busca não foi filtrada por status
+                    if not status:
+                        newest = max((_utc(q.get("date_created")) for q in questions if q.get("date_created")), default=None)
+                        if newest:
+                            newest = newest.replace(tzinfo=None)
+                            if not ml_account.questions_synced_until or newest > ml_account.questions_synced_until:
+                                ml_account.questions_synced_until = newest
+                    self.db.commit()
                     
+                    error_count = len(questions) - saved_count
                     total_questions += len(questions)
                     total_saved += saved_count
                     total_errors += error_count
                     
+                    logger.info(
+                        f"✅ Perguntas da conta {ml_account.nickname}: {saved_count}/{len(questions)} gravadas "
+                        f"({'incremental desde ' + since.isoformat() if since else 'completa'})"
+                    )
+                    
                     accounts_synced.append({
                         "account_id": ml_account.id,
                         "nickname": ml_account.nickname,
                         "questions": len(questions),
                         "saved": saved_count,
-                        "errors": error_count
+                        "errors": error_count,
+                        "mode": "incremental" if since else "full",
+                        "cursor": ml_account.questions_synced_until.isoformat() if ml_account.questions_synced_until else None
                     })
                     
                 except Exception as e:
+                    self.db.rollback()
                     logger.error(f"Erro ao sincronizar conta ML {ml_account.id}: {e}", exc_info=True)
                     accounts_failed.append({
                         "account_id": ml_account.id,
@@ -473,4 +566,3 @@ class MLQuestionsService:
                 "success": False,
                 "error": str(e)
             }
-
@@ -0,0 +1,386 @@
+"""
+Cache em camadas de respostas GET da API do Mercado Livre
+
+Camadas:
+- memória: LRU por processo (entradas quentes, inclusive vencidas, para revalidar com ETag)
+- tabela `ml_response_cache`: compartilhada entre processos
+- API do ML: só na primeira busca ou na revalidação (If-None-Match -> 304 sem payload)
+
+A chave é a URL normalizada + parâmetros ordenados. Classes compartilhadas
+(highlights, produtos, busca), cujo conteúdo não depende de quem chama, são pedidas
+sem token e servidas a todas as empresas. Nas demais (itens, itens do produto,
+visitas) a visão do dono pode trazer campos privados: a chave inclui o seller
+dono do token (estável quando o token é renovado). Cada classe de endpoint tem sua
+validade; 404 é guardado por pouco tempo e, se a API falhar, a última resposta
+conhecida é servida.
+
+cached_get devolve um objeto com a mesma interface usada de requests.Response
+(status_code, headers, json(), text, raise_for_status()).
+"""
+import copy
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.models.saas_models import MLAccount, MLResponseCache, Token
+
+logger = logging.getLogger(__name__)
+
+# (classe, padrão do caminho, validade em segundos, compartilhada entre empresas)
+ENDPOINT_CLASSES = [
+    ("highlights", re.compile(r"^/highlights/"), 3600, True),
+    ("product_items", re.compile(r"^/products/[^/]+/items$"), 600, False),
+    ("product", re.compile(r"^/products/[^/]+$"), 6 * 3600, True),
+    ("items", re.compile(r"^/items(/[^/]+)?$"), 600, False),
+    ("search", re.compile(r"^/sites/[^/]+/search$"), 300, True),
+    ("visits", re.compile(r"^/users/[^/]+/items_visits"), 3600, False),
+]
+# Validade máxima de respostas 404
+NOT_FOUND_TTL = 300
+# Entradas em memória por processo
+MEMORY_MAX_ENTRIES = 2000
+# Entradas persistidas vencidas há mais que isso são removidas pelo job de limpeza
+PERSISTED_RETENTION = timedelta(days=7)
+# Payloads maiores que isso (caracteres do JSON) ficam só na memória
+MAX_PERSISTED_PAYLOAD = 500_000
+
+_memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+# Token -> escopo (seller dono do token); tokens renovados caem no mesmo escopo
+_token_scopes: "OrderedDict[str, str]" = OrderedDict()
+_token_scopes_lock = threading.Lock()
+TOKEN_SCOPES_MAX_ENTRIES = 1000
+_memory_lock = threading.Lock()
+# Um download por chave por vez (requisições simultâneas do mesmo item esperam a primeira)
+_key_locks: Dict[str, threading.Lock] = {}
+_key_locks_guard = threading.Lock()
+
+_counters = {"memory_hits": 0, "db_hits": 0, "revalidated": 0, "misses": 0, "stale_served": 0, "bypass": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def get_stats() -> Dict[str, int]:
+    """Contadores do processo desde o início"""
+    with _counters_lock:
+        stats = dict(_counters)
+    with _memory_lock:
+        stats["memory_entries"] = len(_memory)
+    return stats
+
+
+def classify(url: str) -> Optional[Tuple[str, int, bool]]:
+    """Classe do endpoint (nome, validade, compartilhada) ou None se não deve ser cacheado"""
+    path = urlsplit(url).path.rstrip("/") or "/"
+    for name, pattern, ttl, shared in ENDPOINT_CLASSES:
+        if pattern.match(path):
+            return name, ttl, shared
+    return None
+
+
+def build_key(url: str, params: Optional[Dict[str, Any]] = None, scope: str = "") -> Tuple[str, str]:
+    """(chave sha256, URL normalizada com os parâmetros ordenados)"""
+    parts = urlsplit(url)
+    path = parts.path.rstrip("/") or "/"
+    query = [(k, v) for k, v in _query_pairs(parts.query)]
+    for k, v in (params or {}).items():
+        if v is not None:
+            query.append((str(k), str(v)))
+    query.sort()
+    normalized = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, "&".join(f"{k}={v}" for k, v in query), ""))
+    raw = f"{normalized}|{scope}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest(), normalized
+
+
+def _query_pairs(query: str):
+    for pair in filter(None, query.split("&")):
+        key, _, value = pair.partition("=")
+        yield key, value
+
+
+def _token_scope(headers: Optional[Dict[str, str]]) -> str:
+    """Escopo da chave para o token enviado: seller da conta ML dona do token"""
+    authorization = (headers or {}).get("Authorization") or ""
+    if not authorization:
+        return ""
+    with _token_scopes_lock:
+        scope = _token_scopes.get(authorization)
+    if scope is not None:
+        return scope
+
+    scope = _seller_scope(authorization.split(" ", 1)[-1])
+    with _token_scopes_lock:
+        _token_scopes[authorization] = scope
+        while len(_token_scopes) > TOKEN_SCOPES_MAX_ENTRIES:
+            _token_scopes.popitem(last=False)
+    return scope
+
+
+def _seller_scope(access_token: str) -> str:
+    from app.config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        ml_user_id = db.query(MLAccount.ml_user_id).join(Token, Token.ml_account_id == MLAccount.id).filter(
+            Token.access_token == access_token
+        ).limit(1).scalar()
+        if ml_user_id:
+            return f"seller:{ml_user_id}"
+    except Exception as e:
+        logger.warning(f"⚠️ Erro ao identificar o seller do token para o cache da API ML: {e}")
+    finally:
+        db.close()
+    # Token desconhecido: escopo pelo próprio token (nunca compartilhado)
+    return "token:" + hashlib.sha256(access_token.encode("utf-8")).hexdigest()[:16]
+
+
+def _key_lock(key: str) -> threading.Lock:
+    with _key_locks_guard:
+        lock = _key_locks.get(key)
+        if lock is None:
+            if len(_key_locks) > MEMORY_MAX_ENTRIES:
+                for old_key in [k for k, v in _key_locks.items() if not v.locked()]:
+                    _key_locks.pop(old_key, None)
+            lock = _key_locks[key] = threading.Lock()
+        return lock
+
+
+class CachedResponse:
+    """Resposta servida (ou gravada) pelo cache, compatível com o uso de requests.Response"""
+
+    def __init__(self, entry: Dict[str, Any], from_cache: bool):
+        self.status_code = entry["status_code"]
+        self.headers = {"ETag": entry["etag"]} if entry.get("etag") else {}
+        self.url = entry["url"]
+        self.from_cache = from_cache
+        self._payload = entry["payload"]
+
+    def json(self) -> Any:
+        # Cópia: chamadores costumam anotar os dicts retornados
+        return copy.deepcopy(self._payload)
+
+    @property
+    def text(self) -> str:
+        return json.dumps(self._payload, ensure_ascii=False)
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+# ----------------------------------------------------------------------
+# Camadas
+# ----------------------------------------------------------------------
+def _memory_get(key: str) -> Optional[Dict[str, Any]]:
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            _memory.move_to_end(key)
+        return entry
+
+
+def _memory_set(key: str, entry: Dict[str, Any]):
+    with _memory_lock:
+        _memory[key] = entry
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def _db_get(key: str) -> Optional[Dict[str, Any]]:
+    from app.config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        row = db.query(MLResponseCache).filter(MLResponseCache.cache_key == key).first()
+        if row is None:
+            return None
+        db.query(MLResponseCache).filter(MLResponseCache.id == row.id).update(
+            {MLResponseCache.hit_count: MLResponseCache.hit_count + 1}, synchronize_session=False
+        )
+        db.commit()
+        return {
+            "url": row.url,
+            "status_code": row.status_code,
+            "etag": row.etag,
+            "payload": row.payload,
+            "expires_at": row.expires_at.timestamp(),
+        }
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"⚠️ Erro ao ler cache persistido da API ML: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def _db_put(key: str, endpoint_class: str, entry: Dict[str, Any], payload_changed: bool = True):
+    from app.config.database import SessionLocal
+
+    now = datetime.now(timezone.utc)
+    values = {
+        "cache_key": key,
+        "endpoint_class": endpoint_class,
+        "url": entry["url"][:1000],
+        "status_code": entry["status_code"],
+        "etag": entry.get("etag"),
+        "payload": entry["payload"],
+        "hit_count": 0,
+        "fetched_at": now,
+        "expires_at": datetime.fromtimestamp(entry["expires_at"], timezone.utc),
+    }
+    if payload_changed and len(json.dumps(entry["payload"], default=str)) > MAX_PERSISTED_PAYLOAD:
+        return
+
+    db = SessionLocal()
+    try:
+        table = MLResponseCache.__table__
+        statement = pg_insert(table).values(values)
+        update_columns = ["fetched_at", "expires_at"]
+        if payload_changed:
+            update_columns += ["status_code", "etag", "payload", "endpoint_class", "url"]
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.cache_key],
+            set_={column: statement.excluded[column] for column in update_columns}
+        )
+        db.execute(statement)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"⚠️ Erro ao gravar cache persistido da API ML: {e}")
+    finally:
+        db.close()
+
+
+# ----------------------------------------------------------------------
+# Leitura
+# ----------------------------------------------------------------------
+def cached_get(url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None,
+               timeout: int = 15, ttl: Optional[int] = None, use_cache: bool = True):
+    """
+    GET com cache em camadas para os endpoints de ENDPOINT_CLASSES
+
+    Outros endpoints (ou use_cache=False) seguem direto para requests.get.
+    """
+    endpoint = classify(url) if use_cache else None
+    if endpoint is None:
+        _count("bypass")
+        return requests.get(url, params=params, headers=headers, timeout=timeout)
+
+    endpoint_class, class_ttl, shared = endpoint
+    ttl = ttl or class_ttl
+    # Classes compartilhadas: pedidas sem token, uma entrada para todas as empresas.
+    # Demais: com token, a resposta pertence ao seller dono dele
+    key, normalized_url = build_key(url, params, "" if shared else _token_scope(headers))
+
+    entry = _memory_get(key)
+    if entry is not None and entry["expires_at"] > time.time():
+        _count("memory_hits")
+        return CachedResponse(entry, from_cache=True)
+
+    with _key_lock(key):
+        # Outra thread pode ter baixado enquanto esperávamos
+        entry = _memory_get(key)
+        if entry is not None and entry["expires_at"] > time.time():
+            _count("memory_hits")
+            return CachedResponse(entry, from_cache=True)
+
+        if entry is None:
+            entry = _db_get(key)
+            if entry is not None:
+                _memory_set(key, entry)
+                if entry["expires_at"] > time.time():
+                    _count("db_hits")
+                    return CachedResponse(entry, from_cache=True)
+
+        request_headers = dict(headers or {})
+        authorization = request_headers.pop("Authorization", None) if shared else None
+        if entry is not None and entry.get("etag") and entry["status_code"] == 200:
+            request_headers["If-None-Match"] = entry["etag"]
+
+        try:
+            response = requests.get(url, params=params, headers=request_headers, timeout=timeout)
+            if authorization and response.status_code in (401, 403):
+                # Recurso que exige token mesmo sem depender de quem chama
+                request_headers["Authorization"] = authorization
+                response = requests.get(url, params=params, headers=request_headers, timeout=timeout)
+        except requests.RequestException:
+            if entry is not None:
+                _count("stale_served")
+                logger.warning(f"⚠️ API ML indisponível, servindo resposta em cache de {normalized_url}")
+                return CachedResponse(entry, from_cache=True)
+            raise
+
+        if response.status_code == 304 and entry is not None:
+            _count("revalidated")
+            entry = {**entry, "expires_at": time.time() + ttl}
+            _memory_set(key, entry)
+            _db_put(key, endpoint_class, entry, payload_changed=False)
+            return CachedResponse(entry, from_cache=True)
+
+        if response.status_code in (200, 404):
+            try:
+                payload = response.json()
+            except ValueError:
+                return response
+            _count("misses")
+            entry = {
+                "url": normalized_url,
+                "status_code": response.status_code,
+                "etag": response.headers.get("ETag") if response.status_code == 200 else None,
+                "payload": payload,
+                "expires_at": time.time() + (ttl if response.status_code == 200 else min(ttl, NOT_FOUND_TTL)),
+            }
+            _memory_set(key, entry)
+            _db_put(key, endpoint_class, entry)
+            return CachedResponse(entry, from_cache=False)
+
+        if entry is not None and (response.status_code == 429 or response.status_code >= 500):
+            _count("stale_served")
+            logger.warning(f"⚠️ API ML retornou {response.status_code}, servindo resposta em cache de {normalized_url}")
+            return CachedResponse(entry, from_cache=True)
+        return response
+
+
+def invalidate_memory_cache() -> None:
+    """Limpa as entradas em memória (as persistidas são mantidas)"""
+    with _memory_lock:
+        _memory.clear()
+
+
+def run_response_cache_cleanup() -> int:
+    """Remove do banco as respostas vencidas há mais de PERSISTED_RETENTION (job agendado)"""
+    from app.config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        deleted = db.query(MLResponseCache).filter(
+            MLResponseCache.expires_at < func.now() - PERSISTED_RETENTION
+        ).delete(synchronize_session=False)
+        db.commit()
+        logger.info(f"♻️ Cache de respostas da API ML: {deleted} entrada(s) removida(s); processo: {get_stats()}")
+        return deleted
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Erro na limpeza do cache de respostas da API ML: {e}")
+        return 0
+    finally:
+        db.close()
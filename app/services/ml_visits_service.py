@@ -2,10 +2,11 @@
 Serviço para gerenciar Visits (visitas) do Mercado Livre
 """
 import logging
-import requests
 from typing import Dict
 from datetime import datetime
 
+from app.services.ml_response_cache_service import cached_get
+
 logger = logging.getLogger(__name__)
 
 class MLVisitsService:
@@ -44,7 +45,7 @@ class MLVisitsService:
             
             logger.info(f"👁️  Buscando visitas dos últimos {days_diff} dias")
             
-            response = requests.get(url, headers=headers, params=params, timeout=30)
+            response = cached_get(url, headers=headers, params=params, timeout=30)
             
             if response.status_code != 200:
                 logger.error(f"Erro ao buscar visitas: {response.status_code} - {response.text}")
@@ -6,7 +6,8 @@ import json
 import time
 import logging
 import re
-from typing import Dict, List, Optional, Any
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Any
 from datetime import datetime
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
@@ -16,9 +17,20 @@ from app.models.saas_models import (
     OpenAIAssistant, OpenAIAssistantThread, OpenAIAssistantUsage, OpenAIAssistantMessage,
     InteractionMode, UsageStatus
 )
+from app.services.ai_tool_executor import ToolExecutionEngine
+from app.services.ai_conversation_context import ConversationContextManager
 
 logger = logging.getLogger(__name__)
 
+# Eventos que encerram um run da Assistants API (modo stream)
+RUN_TERMINAL_EVENTS = {
+    "thread.run.completed", "thread.run.failed", "thread.run.cancelled",
+    "thread.run.expired", "thread.run.incomplete"
+}
+
+# Callback de streaming: recebe eventos {"type": "delta" | "tool_call" | "tool_result", ...}
+StreamCallback = Callable[[Dict], None]
+
 
 class OpenAIAssistantService:
     """Serviço para gerenciar e usar assistentes OpenAI"""
@@ -143,7 +155,10 @@ class OpenAIAssistantService:
         welcome_use_model: Optional[bool] = False,
         welcome_message: Optional[str] = None,
         provider: str = "openai",
-        api_config: Optional[Dict] = None
+        api_config: Optional[Dict] = None,
+        response_cache_enabled: Optional[bool] = None,
+        response_cache_ttl: Optional[int] = None,
+        context_token_budget: Optional[int] = None
     ) -> Dict:
         """Cria um novo assistente na OpenAI e salva no banco de dados"""
         if not self.client:
@@ -247,6 +262,9 @@ class OpenAIAssistantService:
                 welcome_message=welcome_message,
                 provider=provider,
                 api_config=api_config,
+                response_cache_enabled=True if response_cache_enabled is None else bool(response_cache_enabled),
+                response_cache_ttl=response_cache_ttl,
+                context_token_budget=context_token_budget,
                 is_active=True
             )
             
@@ -305,7 +323,10 @@ class OpenAIAssistantService:
         welcome_use_model: Optional[bool] = None,
         welcome_message: Optional[str] = None,
         provider: Optional[str] = None,
-        api_config: Optional[Dict] = None
+        api_config: Optional[Dict] = None,
+        response_cache_enabled: Optional[bool] = None,
+        response_cache_ttl: Optional[int] = None,
+        context_token_budget: Optional[int] = None
     ) -> Dict:
         """Atualiza um assistente existente"""
         if not self.client:
@@ -425,6 +446,14 @@ class OpenAIAssistantService:
                 db_assistant.provider = provider
             if api_config is not None:
                 db_assistant.api_config = api_config
+            if response_cache_enabled is not None:
+                db_assistant.response_cache_enabled = bool(response_cache_enabled)
+            if response_cache_ttl is not None:
+                # 0 volta ao padrão (AGENT_RESPONSE_CACHE_TTL)
+                db_assistant.response_cache_ttl = response_cache_ttl or None
+            if context_token_budget is not None:
+                # 0 volta ao padrão (DEFAULT_CONTEXT_TOKEN_BUDGET)
+                db_assistant.context_token_budget = context_token_budget or None
             
             db_assistant.updated_at = datetime.utcnow()
             
@@ -699,6 +728,7 @@ class OpenAIAssistantService:
                 usage_record.duration_seconds = duration
                 usage_record.request_data_size = request_data_size
                 usage_record.response_data_size = response_data_size
+                usage_record.tool_metrics = response.get("tool_metrics") or None
                 
                 if usage_info:
                     usage_record.prompt_tokens = usage_info.prompt_tokens
@@ -736,9 +766,16 @@ class OpenAIAssistantService:
         message: str,
         thread_id: Optional[str] = None,
         context_data: Optional[Dict] = None,
-        use_case: Optional[str] = None
+        use_case: Optional[str] = None,
+        stream_callback: Optional[StreamCallback] = None
     ) -> Dict:
-        """Usa um assistente em modo chat (conversa contínua)"""
+        """
+        Usa um assistente em modo chat (conversa contínua).
+
+        Com `stream_callback`, os trechos da resposta são repassados conforme o
+        modelo os gera (inclusive durante o loop de ferramentas); o retorno final
+        continua o mesmo.
+        """
         if not self.client:
             return {"success": False, "error": "OpenAI API key não configurada."}
         
@@ -851,205 +888,21 @@ class OpenAIAssistantService:
                 self.db.flush()
             
             # Usar Chat Completions diretamente (não Assistants API)
-            # Buscar histórico de mensagens da thread do banco
-            messages_history = []
-            
-            # Buscar mensagens anteriores da thread no banco
-            previous_messages = self.db.query(OpenAIAssistantMessage).filter(
-                OpenAIAssistantMessage.thread_id == db_thread.id
-            ).order_by(OpenAIAssistantMessage.created_at.asc()).all()
-            
-            # Adicionar instruções do assistente como primeira mensagem do sistema (apenas se não houver histórico)
+            # Histórico da thread: janela recente + resumo acumulado, dentro do orçamento de tokens do agente
             # IMPORTANTE: Usar APENAS as instruções do banco de dados, sem modificações
             # Remover tags HTML se presentes (do editor rich text)
-            if not previous_messages:
-                instructions_clean = self._strip_html_tags(db_assistant.instructions) if db_assistant.instructions else ""
-                messages_history.append({
-                    "role": "system",
-                    "content": instructions_clean
-                })
-            
-            # Adicionar mensagens anteriores do histórico
-            # IMPORTANTE: Reconstruir estrutura correta para tool calls
-            i = 0
-            while i < len(previous_messages):
-                prev_msg = previous_messages[i]
-                
-                # Validar e sanitizar o role
-                role = prev_msg.role
-                if not role or not isinstance(role, str):
-                    logger.warning(f"⚠️ Role inválido na mensagem ID {prev_msg.id}: {role}. Pulando mensagem.")
-                    i += 1
-                    continue
-                
-                role = role.strip().lower()
-                # Validar que o role é um dos valores aceitos pela API
-                valid_roles = ["system", "user", "assistant", "tool"]
-                if role not in valid_roles:
-                    logger.warning(f"⚠️ Role inválido na mensagem ID {prev_msg.id}: '{prev_msg.role}'. Pulando mensagem.")
-                    i += 1
-                    continue
-                
-                msg_dict = {
-                    "role": role,
-                    "content": prev_msg.content
-                }
-                
-                # Se for mensagem 'assistant', verificar se tem tool_calls no content (JSON)
-                if role == "assistant" and prev_msg.content:
-                    try:
-                        content_json = json.loads(prev_msg.content)
-                        if isinstance(content_json, dict) and "tool_calls" in content_json:
-                            # Primeiro, coletar todas as mensagens 'tool' seguintes e extrair seus tool_call_ids
-                            tool_messages = []
-                            tool_call_ids_in_responses = set()
-                            j = i + 1
-                            while j < len(previous_messages) and previous_messages[j].role and previous_messages[j].role.strip().lower() == "tool":
-                                tool_msg = previous_messages[j]
-                                tool_call_id = None
-                                
-                                # Tentar extrair tool_call_id do content
-                                try:
-                                    tool_content = json.loads(tool_msg.content) if tool_msg.content else {}
-                                    if isinstance(tool_content, dict) and "tool_call_id" in tool_content:
-                                        tool_call_id = tool_content.get("tool_call_id")
-                                except (json.JSONDecodeError, TypeError):
-                                    pass
-                                
-                                if tool_call_id:
-                                    tool_call_ids_in_responses.add(tool_call_id)
-                                    tool_messages.append((j, tool_msg, tool_call_id))
-                                
-                                j += 1
-                            
-                            # Reconstruir estrutura com tool_calls - APENAS os que têm respostas
-                            original_tool_calls = content_json["tool_calls"]
-                            msg_dict["tool_calls"] = []
-                            valid_tool_call_ids = []
-                            
-                            for tc in original_tool_calls:
-                                tool_call_id = tc.get("id", "")
-                                # Adicionar apenas tool_calls que têm mensagens 'tool' correspondentes
-                                if tool_call_id in tool_call_ids_in_responses:
-                                    msg_dict["tool_calls"].append({
-                                        "id": tool_call_id,
-                                        "type": "function",
-                                        "function": {
-                                            "name": tc.get("function", {}).get("name", ""),
-                                            "arguments": tc.get("function", {}).get("arguments", "{}")
-                                        }
-                                    })
-                                    valid_tool_call_ids.append(tool_call_id)
-                                else:
-                                    # Tool call sem resposta correspondente - pular
-                                    logger.warning(f"⚠️ Tool call '{tool_call_id}' sem resposta correspondente. Removendo do histórico.")
-                            
-                            # Se não há tool_calls válidos, tratar como mensagem normal
-                            if not msg_dict["tool_calls"]:
-                                logger.warning(f"⚠️ Mensagem assistant com tool_calls sem respostas válidas. Tratando como mensagem normal.")
-                                # Remover campo tool_calls vazio e restaurar content original
-                                msg_dict.pop("tool_calls", None)  # Remove o campo completamente
-                                msg_dict["content"] = prev_msg.content
-                                messages_history.append(msg_dict)
-                                i += 1
-                                continue
-                            
-                            # Se tem tool_calls válidos, content deve ser None
-                            msg_dict["content"] = None
-                            messages_history.append(msg_dict)
-                            
-                            # Adicionar mensagens 'tool' correspondentes aos tool_calls válidos
-                            # Processar na ordem correta (sequencial)
-                            i += 1
-                            processed_tool_call_ids = set()
-                            
-                            while i < len(previous_messages):
-                                tool_msg = previous_messages[i]
-                                
-                                # Validar role da mensagem tool
-                                tool_role = tool_msg.role
-                                if not tool_role or tool_role.strip().lower() != "tool":
-                                    break
-                                
-                                # Tentar extrair tool_call_id do content
-                                tool_call_id = None
-                                tool_name = None
-                                tool_result = None
-                                
-                                try:
-                                    tool_content = json.loads(tool_msg.content) if tool_msg.content else {}
-                                    if isinstance(tool_content, dict):
-                                        if "tool_call_id" in tool_content:
-                                            tool_call_id = tool_content.get("tool_call_id")
-                                            tool_name = tool_content.get("name")
-                                            tool_result = tool_content.get("result")
-                                        else:
-                                            tool_result = tool_content
-                                except (json.JSONDecodeError, TypeError):
-                                    tool_result = tool_msg.content
-                                
-                                # Se não encontrou tool_call_id, tentar usar o próximo tool_call válido não processado
-                                if not tool_call_id:
-                                    for tc in msg_dict["tool_calls"]:
-                                        tc_id = tc.get("id")
-                                        if tc_id not in processed_tool_call_ids:
-                                            tool_call_id = tc_id
-                                            break
-                                
-                                # Validar se tool_call_id está na lista de válidos e não foi processado
-                                if tool_call_id and tool_call_id in valid_tool_call_ids and tool_call_id not in processed_tool_call_ids:
-                                    # Se não encontrou name, buscar do tool_call correspondente
-                                    if not tool_name:
-                                        for tc in msg_dict["tool_calls"]:
-                                            if tc.get("id") == tool_call_id:
-                                                tool_name = tc.get("function", {}).get("name")
-                                                break
-                                    
-                                    # Serializar resultado para content
-                                    if tool_result is not None:
-                                        content_str = json.dumps(tool_result, ensure_ascii=False) if isinstance(tool_result, (dict, list)) else str(tool_result)
-                                    else:
-                                        content_str = tool_msg.content or ""
-                                    
-                                    # Adicionar mensagem tool com estrutura correta
-                                    tool_dict = {
-                                        "role": "tool",
-                                        "content": content_str,
-                                        "tool_call_id": tool_call_id
-                                    }
-                                    if tool_name:
-                                        tool_dict["name"] = tool_name
-                                    
-                                    messages_history.append(tool_dict)
-                                    processed_tool_call_ids.add(tool_call_id)
-                                else:
-                                    # Tool message sem tool_call correspondente ou já processado - pular
-                                    if tool_call_id:
-                                        logger.warning(f"⚠️ Mensagem tool sem tool_call correspondente ou já processado (tool_call_id: {tool_call_id}). Pulando.")
-                                
-                                i += 1
-                            
-                            # Continuar loop (i já foi incrementado adequadamente)
-                            continue
-                    except (json.JSONDecodeError, KeyError, TypeError):
-                        # Não é JSON com tool_calls, tratar como mensagem normal
-                        pass
-                
-                # Mensagem normal (user, assistant sem tool_calls)
-                # Se for mensagem 'tool' isolada (sem assistant anterior com tool_calls), pular
-                if prev_msg.role == "tool":
-                    logger.warning(f"⚠️ Mensagem 'tool' isolada encontrada (índice {i}), pulando. Isso pode indicar dados inconsistentes.")
-                    i += 1
-                    continue
-                
-                messages_history.append(msg_dict)
-                i += 1
+            instructions_clean = self._strip_html_tags(db_assistant.instructions) if db_assistant.instructions else ""
+            conversation = ConversationContextManager(self.db, self.client).build(
+                db_assistant, db_thread, instructions_clean, pending_message=message
+            )
+            messages_history = conversation["messages"]
+            has_history = conversation["has_history"]
             
             # Processar welcome_message se mensagem está vazia e não há mensagens anteriores
             # IMPORTANTE: Verificar se já existe welcome_message salva no banco para evitar duplicação
             is_empty_message = not message or not message.strip()
             has_welcome_in_db = False
-            if is_empty_message and not previous_messages:
+            if is_empty_message and not has_history:
                 # Usar lock para evitar race conditions em requisições simultâneas
                 # Verificar se já existe uma mensagem de boas-vindas salva no banco
                 # Usar with_for_update para lock na linha durante a verificação
@@ -1064,7 +917,7 @@ class OpenAIAssistantService:
                     self.db.flush()
             
             # Se mensagem está vazia, não há mensagens anteriores e welcome está habilitado, processar welcome_message ANTES de adicionar mensagem vazia
-            if is_empty_message and not previous_messages and db_assistant.welcome_enabled and db_assistant.welcome_message and not has_welcome_in_db:
+            if is_empty_message and not has_history and db_assistant.welcome_enabled and db_assistant.welcome_message and not has_welcome_in_db:
                 welcome_text = self._strip_html_tags(db_assistant.welcome_message) if db_assistant.welcome_message else ""
                 if welcome_text.strip():
                     if db_assistant.welcome_use_model:
@@ -1109,6 +962,8 @@ class OpenAIAssistantService:
                         else:
                             logger.info("ℹ️ Welcome message já existe (verificação final), não salvando novamente")
                         
+                        if stream_callback:
+                            stream_callback({"type": "delta", "content": welcome_text})
                         return {
                             "success": True,
                             "response": welcome_text,
@@ -1148,57 +1003,8 @@ class OpenAIAssistantService:
                     else:
                         logger.info(f"ℹ️ Mensagem do usuário já existe no banco, não salvando novamente (thread_id: {db_thread.id})")
             
-            # Validar e limpar mensagens antes de enviar
-            # Remover tool_calls vazios de mensagens assistant
-            # IMPORTANTE: Garantir que cada tool_call tenha uma resposta correspondente
-            cleaned_messages = []
-            for idx, msg in enumerate(messages_history):
-                if msg.get("role") == "assistant" and "tool_calls" in msg:
-                    if not msg["tool_calls"] or len(msg["tool_calls"]) == 0:
-                        # Remover tool_calls vazio
-                        msg_clean = {k: v for k, v in msg.items() if k != "tool_calls"}
-                        # Se não tem content, adicionar string vazia
-                        if "content" not in msg_clean or msg_clean["content"] is None:
-                            msg_clean["content"] = ""
-                        cleaned_messages.append(msg_clean)
-                    else:
-                        # Validar que cada tool_call tem uma resposta correspondente
-                        tool_call_ids = [tc.get("id") for tc in msg["tool_calls"]]
-                        # Verificar se há mensagens tool seguintes com esses tool_call_ids
-                        tool_responses = set()
-                        j = idx + 1
-                        while j < len(messages_history):
-                            next_msg = messages_history[j]
-                            if next_msg.get("role") == "tool":
-                                tool_call_id = next_msg.get("tool_call_id")
-                                if tool_call_id:
-                                    tool_responses.add(tool_call_id)
-                            elif next_msg.get("role") == "assistant":
-                                # Parar quando encontrar próxima mensagem assistant
-                                break
-                            j += 1
-                        
-                        # Filtrar apenas tool_calls que têm respostas
-                        valid_tool_calls = [tc for tc in msg["tool_calls"] if tc.get("id") in tool_responses]
-                        
-                        if len(valid_tool_calls) < len(msg["tool_calls"]):
-                            missing_ids = [tc.get("id") for tc in msg["tool_calls"] if tc.get("id") not in tool_responses]
-                            logger.warning(f"⚠️ Removendo {len(msg['tool_calls']) - len(valid_tool_calls)} tool_call(s) sem resposta: {missing_ids}")
-                            
-                            if valid_tool_calls:
-                                msg_clean = {k: v for k, v in msg.items()}
-                                msg_clean["tool_calls"] = valid_tool_calls
-                                cleaned_messages.append(msg_clean)
-                            else:
-                                # Se não há tool_calls válidos, tratar como mensagem normal
-                                msg_clean = {k: v for k, v in msg.items() if k != "tool_calls"}
-                                if "content" not in msg_clean or msg_clean["content"] is None:
-                                    msg_clean["content"] = ""
-                                cleaned_messages.append(msg_clean)
-                        else:
-                            cleaned_messages.append(msg)
-                else:
-                    cleaned_messages.append(msg)
+            # Pares tool_calls/tool já validados pelo ConversationContextManager
+            cleaned_messages = messages_history
             
             # Preparar parâmetros para Chat Completions
             # IMPORTANTE: Usar o modelo configurado no agente (db_assistant.model)
@@ -1261,7 +1067,8 @@ class OpenAIAssistantService:
                 # Usar Assistants API se o modelo suporta E tem Code Interpreter/File Search
                 logger.info("🔧 Detectado Code Interpreter ou File Search com modelo suportado - usando Assistants API")
                 response = self._use_assistants_api_chat_mode(
-                    db_assistant, db_thread, user_message_content, tools, usage_record, start_time, request_data_size
+                    db_assistant, db_thread, message or "", tools, usage_record, start_time, request_data_size,
+                    stream_callback=stream_callback
                 )
             else:
                 # Usar Chat Completions (GPT-5)
@@ -1278,7 +1085,9 @@ class OpenAIAssistantService:
                 
                 # Fazer chamada ao Chat Completions e processar tool calls se necessário
                 logger.info(f"💬 Enviando mensagem para agente via Chat Completions (GPT-5)...")
-                response = self._process_chat_with_tools(chat_params, tools, db_thread, max_iterations=10)
+                response = self._process_chat_with_tools(
+                    chat_params, tools, db_thread, max_iterations=10, stream_callback=stream_callback
+                )
             
             if response and response.get("success"):
                 response_text = response.get("response", "")
@@ -1303,8 +1112,14 @@ class OpenAIAssistantService:
                 else:
                     logger.info(f"ℹ️ Mensagem do assistente já existe no banco, não salvando novamente (thread_id: {db_thread.id})")
                 
-                # Obter uso de tokens
+                # Obter uso de tokens (inclui a atualização do resumo da conversa, se houve)
                 usage_info_dict = response.get("usage", {})
+                summary_usage = conversation.get("summary_usage")
+                if summary_usage:
+                    usage_info_dict = {
+                        key: (usage_info_dict or {}).get(key, 0) + summary_usage.get(key, 0)
+                        for key in ("prompt_tokens", "completion_tokens", "total_tokens")
+                    }
                 # Criar objeto similar ao usage_info original para compatibilidade
                 class UsageInfo:
                     def __init__(self, data):
@@ -1332,6 +1147,7 @@ class OpenAIAssistantService:
                 usage_record.request_data_size = request_data_size
                 usage_record.response_data_size = response_data_size
                 usage_record.thread_id = openai_thread_id
+                usage_record.tool_metrics = response.get("tool_metrics") or None
                 
                 tokens_balance = None
                 if usage_info:
@@ -1526,14 +1342,18 @@ class OpenAIAssistantService:
         chat_params: Dict, 
         tools: Optional[List[Dict]], 
         db_thread: OpenAIAssistantThread,
-        max_iterations: int = 5
+        max_iterations: int = 5,
+        stream_callback: Optional[StreamCallback] = None
     ) -> Dict:
         """
         Processa chat com suporte a tool calls.
         Faz loop até que o modelo não queira mais chamar ferramentas.
+        Com `stream_callback`, cada iteração usa stream e os eventos de texto e
+        de ferramentas são repassados sem esperar o fim do loop.
         """
         messages = chat_params.get("messages", [])
         total_usage = None
+        tool_metrics = []
         iteration = 0
         
         while iteration < max_iterations:
@@ -1594,14 +1414,11 @@ class OpenAIAssistantService:
             logger.info(f"📤 Parâmetros da chamada: model={chat_params.get('model')}, max_tokens={chat_params.get('max_tokens', 'N/A')}, max_completion_tokens={chat_params.get('max_completion_tokens', 'N/A')}")
             
             # Fazer chamada ao Chat Completions
-            response = self.client.chat.completions.create(**chat_params)
+            message, usage_info = self._create_chat_completion(chat_params, stream_callback)
             
-            if not response.choices or len(response.choices) == 0:
+            if message is None:
                 return {"success": False, "error": "Resposta do agente não encontrada."}
             
-            message = response.choices[0].message
-            usage_info = response.usage if hasattr(response, 'usage') else None
-            
             # Acumular uso de tokens
             if usage_info:
                 if total_usage is None:
@@ -1656,8 +1473,8 @@ class OpenAIAssistantService:
                 self.db.add(assistant_message)
                 self.db.flush()
                 
-                # Processar cada tool call
-                tool_outputs = []
+                # Processar as tool calls do turno (consultas independentes rodam em paralelo)
+                parsed_calls = []
                 for tool_call in message.tool_calls:
                     function_name = tool_call.function.name
                     try:
@@ -1666,38 +1483,32 @@ class OpenAIAssistantService:
                         function_args = {}
                     
                     logger.info(f"⚙️ Processando ferramenta: {function_name} com args: {function_args}")
-                    
-                    # Executar função local (aqui você implementa suas funções)
-                    try:
-                        result = self._execute_tool_function(function_name, function_args, db_thread)
-                    except Exception as tool_error:
-                        logger.error(f"❌ Erro ao executar ferramenta {function_name}: {tool_error}", exc_info=True)
-                        
-                        # Fazer rollback imediatamente se a transação estiver em estado inválido
-                        try:
-                            # Tentar verificar se a transação está válida
-                            from sqlalchemy import text as sql_text
-                            self.db.execute(sql_text("SELECT 1"))
-                        except Exception:
-                            # Transação inválida, fazer rollback
-                            try:
-                                self.db.rollback()
-                                logger.info("🔄 Rollback realizado após erro na ferramenta")
-                            except:
-                                pass
-                        
-                        # Verificar se é erro de autenticação/sessão
-                        error_str = str(tool_error).lower()
-                        if "authentication" in error_str or "unauthorized" in error_str or "session" in error_str or "login" in error_str:
-                            return {
-                                "success": False,
-                                "error": "Sessão expirada. Por favor, faça login novamente.",
-                                "requires_login": True
-                            }
-                        # Outro tipo de erro - criar resultado de erro (sem salvar no banco ainda)
-                        result = {
-                            "error": f"Erro ao executar função: {str(tool_error)[:500]}"  # Limitar tamanho do erro
-                        }
+                    if stream_callback:
+                        stream_callback({"type": "tool_call", "name": function_name})
+                    parsed_calls.append((function_name, function_args))
+                
+                engine = ToolExecutionEngine(self, db_thread)
+                results = engine.execute(parsed_calls)
+                tool_metrics.extend(engine.metrics)
+                
+                # Erro de autenticação em uma ferramenta encerra o turno pedindo novo login
+                auth_failure = next(
+                    (result for result in results if isinstance(result, dict) and result.get("requires_login")), None
+                )
+                if auth_failure:
+                    return auth_failure
+                
+                tool_outputs = []
+                for tool_call, (function_name, _), result, metric in zip(
+                    message.tool_calls, parsed_calls, results, engine.metrics
+                ):
+                    if stream_callback:
+                        stream_callback({
+                            "type": "tool_result",
+                            "name": function_name,
+                            "success": metric["status"] == "ok",
+                            "latency_ms": metric["latency_ms"]
+                        })
                     
                     # Adicionar resultado ao histórico
                     tool_outputs.append({
@@ -1794,7 +1605,8 @@ class OpenAIAssistantService:
                         "prompt_tokens": usage_info.prompt_tokens if usage_info else 0,
                         "completion_tokens": usage_info.completion_tokens if usage_info else 0,
                         "total_tokens": usage_info.total_tokens if usage_info else 0
-                    }
+                    },
+                    "tool_metrics": tool_metrics
                 }
         
         # Se chegou aqui, excedeu o número máximo de iterações
@@ -1815,7 +1627,8 @@ class OpenAIAssistantService:
                                 "prompt_tokens": 0,
                                 "completion_tokens": 0,
                                 "total_tokens": 0
-                            }
+                            },
+                            "tool_metrics": tool_metrics
                         }
         
         return {
@@ -1823,6 +1636,91 @@ class OpenAIAssistantService:
             "error": f"Máximo de iterações ({max_iterations}) atingido. O modelo pode estar em loop."
         }
     
+    def _create_chat_completion(self, chat_params: Dict, stream_callback: Optional[StreamCallback] = None):
+        """
+        Chama o Chat Completions e retorna (message, usage).
+
+        Com `stream_callback`, usa stream=True: repassa os trechos de texto à medida
+        que chegam e remonta os tool_calls fragmentados (por índice), devolvendo uma
+        mensagem com a mesma forma da resposta sem stream.
+        """
+        if not stream_callback:
+            response = self.client.chat.completions.create(**chat_params)
+            if not response.choices:
+                return None, None
+            return response.choices[0].message, getattr(response, 'usage', None)
+        
+        stream = self.client.chat.completions.create(
+            **chat_params, stream=True, stream_options={"include_usage": True}
+        )
+        content_parts = []
+        tool_calls = {}
+        usage_info = None
+        has_choices = False
+        
+        for chunk in stream:
+            if getattr(chunk, 'usage', None):
+                usage_info = chunk.usage
+            if not chunk.choices:
+                continue
+            has_choices = True
+            delta = chunk.choices[0].delta
+            
+            if delta.content:
+                content_parts.append(delta.content)
+                stream_callback({"type": "delta", "content": delta.content})
+            
+            for tc in delta.tool_calls or []:
+                tool_call = tool_calls.setdefault(tc.index, SimpleNamespace(
+                    id=None, type="function", function=SimpleNamespace(name="", arguments="")
+                ))
+                if tc.id:
+                    tool_call.id = tc.id
+                if tc.type:
+                    tool_call.type = tc.type
+                if tc.function:
+                    if tc.function.name:
+                        tool_call.function.name += tc.function.name
+                    if tc.function.arguments:
+                        tool_call.function.arguments += tc.function.arguments
+        
+        if not has_choices:
+            return None, usage_info
+        
+        message = SimpleNamespace(
+            content="".join(content_parts) or None,
+            tool_calls=[tool_calls[index] for index in sorted(tool_calls)] or None
+        )
+        return message, usage_info
+    
+    def _parse_tool_date_range(self, function_args: Dict):
+        """start_date/end_date (YYYY-MM-DD) das ferramentas -> (início, fim exclusivo); inválidas são ignoradas"""
+        from datetime import timedelta
+        since = until = None
+        if function_args.get("start_date"):
+            try:
+                since = datetime.fromisoformat(str(function_args["start_date"])[:10])
+            except ValueError:
+                pass
+        if function_args.get("end_date"):
+            try:
+                until = datetime.fromisoformat(str(function_args["end_date"])[:10]) + timedelta(days=1)
+            except ValueError:
+                pass
+        return since, until
+    
+    def _parse_tool_status_filter(self, status) -> List:
+        """Status (string separada por vírgula ou lista) -> lista de OrderStatus válidos"""
+        if not status:
+            return []
+        from app.models.saas_models import OrderStatus
+        if isinstance(status, str):
+            status_list = [s.strip() for s in status.split(",") if s.strip()]
+        else:
+            status_list = [str(s).strip() for s in status if str(s).strip()]
+        normalized = [self._normalize_order_status(s) for s in status_list]
+        return [OrderStatus[s] for s in normalized if s and s in OrderStatus.__members__]
+    
     def _normalize_order_status(self, status_value: str) -> Optional[str]:
         """
         Normaliza valores de status de pedido para os valores válidos do enum OrderStatus.
@@ -1926,31 +1824,15 @@ class OpenAIAssistantService:
                 if not ml_item_id:
                     return {"error": "ml_item_id é obrigatório"}
                 from datetime import datetime, timedelta
+                from app.services import ai_tool_queries
                 days = int(function_args.get("days", 30))
                 since = datetime.utcnow() - timedelta(days=days)
-                from app.models.saas_models import MLOrder
-                orders = (self.db.query(MLOrder)
-                          .filter(MLOrder.company_id == company_id,
-                                  MLOrder.date_created >= since,
-                                  MLOrder.order_items.isnot(None))
-                          .all())
-                result = []
-                for o in orders:
-                    try:
-                        if any((it.get("item", {}).get("id") == ml_item_id) for it in (o.order_items or [])):
-                            result.append({
-                                "id_pedido": str(o.ml_order_id),  # era "id"
-                                "data": o.date_created.isoformat() if o.date_created else None,  # era "date"
-                                "valor_total": float(o.total_amount) if o.total_amount else 0,  # era "total_amount"
-                                "status": (o.status.value if hasattr(o.status, 'value') else str(o.status)),  # OK manter
-                                "comissoes": float(o.sale_fees) if o.sale_fees else 0,  # era "sale_fees"
-                                "frete": float(o.shipping_cost) if o.shipping_cost else 0,  # era "shipping_cost"
-                                "desconto": float(o.coupon_amount) if o.coupon_amount else 0,  # era "coupon_amount"
-                            })
-                    except Exception:
-                        # Ignorar pedidos malformados
-                        continue
-                return {"pedidos": result}  # era "orders"
+                data = ai_tool_queries.list_orders(
+                    self.db, company_id,
+                    limit=ai_tool_queries.clamp_rows(function_args.get("limit"), ai_tool_queries.MAX_TOOL_ROWS),
+                    since=since, item_ids=[ml_item_id]
+                )
+                return {"pedidos": data["pedidos"], "total_pedidos": data["total_pedidos"]}  # era "orders"
 
             # ========== Sales Aggregates ==========
             if function_name == "get_sales_aggregates":
@@ -1958,33 +1840,13 @@ class OpenAIAssistantService:
                 if not ml_item_id:
                     return {"error": "ml_item_id é obrigatório"}
                 from datetime import datetime, timedelta
+                from app.services import ai_tool_queries
                 days = int(function_args.get("days", 30))
                 since = datetime.utcnow() - timedelta(days=days)
-                from app.models.saas_models import MLOrder
-                orders = (self.db.query(MLOrder)
-                          .filter(MLOrder.company_id == company_id,
-                                  MLOrder.date_created >= since,
-                                  MLOrder.order_items.isnot(None))
-                          .all())
-                total_revenue = 0.0
-                total_qty = 0
-                paid_orders_count = 0
-                for o in orders:
-                    has_item = False
-                    qty_for_order = 0
-                    if o.order_items:
-                        for it in o.order_items:
-                            if it.get("item", {}).get("id") == ml_item_id:
-                                has_item = True
-                                qty_for_order += int(it.get("quantity", 1))
-                    if not has_item:
-                        continue
-                    amount = float(o.total_amount) if o.total_amount else 0.0
-                    total_revenue += amount
-                    total_qty += qty_for_order
-                    status_str = (o.status.value if hasattr(o.status, 'value') else str(o.status))
-                    if status_str in ["paid", "delivered"]:
-                        paid_orders_count += 1
+                totals = ai_tool_queries.item_aggregates(self.db, company_id, ml_item_id, since)
+                total_revenue = totals["revenue"]
+                paid_orders_count = totals["paid_orders"]
+                total_qty = totals["quantity"]
                 ticket_medio_pedido = (total_revenue / paid_orders_count) if paid_orders_count > 0 else 0.0
                 preco_medio_unidade = (total_revenue / total_qty) if total_qty > 0 else 0.0
                 return {
@@ -2001,27 +1863,16 @@ class OpenAIAssistantService:
                 if not ml_item_id:
                     return {"error": "ml_item_id é obrigatório"}
                 from datetime import datetime, timedelta
+                from app.services import ai_tool_queries
                 days = int(function_args.get("days", 30))
                 since = datetime.utcnow() - timedelta(days=days)
-                from app.models.saas_models import MLOrder
-                orders = (self.db.query(MLOrder)
-                          .filter(MLOrder.company_id == company_id,
-                                  MLOrder.date_created >= since,
-                                  MLOrder.order_items.isnot(None))
-                          .all())
-                total_revenue = total_fees = total_shipping = total_discounts = 0.0
-                for o in orders:
-                    if any((it.get("item", {}).get("id") == ml_item_id) for it in (o.order_items or [])):
-                        total_revenue += float(o.total_amount) if o.total_amount else 0.0
-                        total_fees += float(o.sale_fees) if o.sale_fees else 0.0
-                        total_shipping += float(o.shipping_cost) if o.shipping_cost else 0.0
-                        total_discounts += float(o.coupon_amount) if o.coupon_amount else 0.0
-                faturamento_liquido = total_revenue - total_fees - total_shipping - total_discounts
+                totals = ai_tool_queries.item_aggregates(self.db, company_id, ml_item_id, since)
+                faturamento_liquido = totals["revenue"] - totals["fees"] - totals["shipping"] - totals["discounts"]
                 return {
-                    "receita_total": total_revenue,
-                    "comissoes_ml_total": total_fees,
-                    "frete_total": total_shipping,
-                    "descontos_total": total_discounts,
+                    "receita_total": totals["revenue"],
+                    "comissoes_ml_total": totals["fees"],
+                    "frete_total": totals["shipping"],
+                    "descontos_total": totals["discounts"],
                     "faturamento_liquido": faturamento_liquido,
                 }
 
@@ -2038,226 +1889,54 @@ class OpenAIAssistantService:
                   - seller_sku (string) opcional - SKU do produto
                   - is_catalog (boolean) opcional - Se True, apenas produtos de catálogo; Se False, apenas não-catálogo
                   - buyer_nickname (string) opcional
-                  - limit (int) opcional - Se não informado, retorna todos os resultados
+                  - limit (int) opcional - padrão 50, máximo 200 (total_pedidos e resumo cobrem todo o filtro)
                   - offset (int) padrão 0
                 """
-                from app.models.saas_models import MLOrder, MLProduct
-                from sqlalchemy import and_, or_
-                from datetime import datetime, timedelta
-                q = self.db.query(MLOrder).filter(MLOrder.company_id == company_id)
-                # Datas
-                start_date = function_args.get("start_date")
-                end_date = function_args.get("end_date")
-                if start_date:
-                    try:
-                        dt_start = datetime.fromisoformat(str(start_date)[:10])
-                        q = q.filter(MLOrder.date_created >= dt_start)
-                    except Exception:
-                        pass
-                if end_date:
-                    try:
-                        dt_end = datetime.fromisoformat(str(end_date)[:10]) + timedelta(days=1)
-                        q = q.filter(MLOrder.date_created < dt_end)
-                    except Exception:
-                        pass
-                # Status (string único ou lista) - normalizar para valores válidos do enum
-                status = function_args.get("status")
-                if status:
-                    if isinstance(status, str):
-                        status_list = [s.strip() for s in status.split(",") if s.strip()]
-                    else:
-                        status_list = [str(s).strip() for s in (status or []) if str(s).strip()]
-                    
-                    # Normalizar cada status para valores válidos do enum
-                    normalized_statuses = []
-                    for s in status_list:
-                        normalized = self._normalize_order_status(s)
-                        if normalized:
-                            normalized_statuses.append(normalized)
-                    
-                    if normalized_statuses:
-                        try:
-                            from app.models.saas_models import OrderStatus
-                            # Converter strings para valores do enum
-                            enum_statuses = [OrderStatus[s] for s in normalized_statuses if s in [e.name for e in OrderStatus]]
-                            if enum_statuses:
-                                q = q.filter(MLOrder.status.in_(enum_statuses))
-                        except Exception as e:
-                            logger.warning(f"⚠️ Erro ao filtrar por status: {e}")
-                            # fallback: tentar como string (pode não funcionar se o enum for restritivo)
-                            pass
+                from app.services import ai_tool_queries
+                since, until = self._parse_tool_date_range(function_args)
+                statuses = self._parse_tool_status_filter(function_args.get("status"))
+                
                 # Filtrar por item - suporta ml_item_id, product_name, seller_sku e is_catalog
                 ml_item_id = function_args.get("ml_item_id")
                 product_name = function_args.get("product_name")
                 seller_sku = function_args.get("seller_sku")
                 is_catalog = function_args.get("is_catalog")  # True = apenas catálogo, False = apenas não-catálogo, None = todos
                 
-                # Se forneceu nome, SKU ou filtro de catálogo, buscar produtos primeiro
-                ml_item_ids_to_filter = []
+                # Se forneceu nome, SKU ou filtro de catálogo, filtrar pelos anúncios via subquery
+                # (sem teto de anúncios: total_pedidos e resumo cobrem todo o filtro)
+                item_query = None
                 if product_name or seller_sku or is_catalog is not None:
-                    product_query = self.db.query(MLProduct).filter(MLProduct.company_id == company_id)
-                    
-                    if seller_sku:
-                        product_query = product_query.filter(MLProduct.seller_sku == seller_sku)
-                    elif product_name:
-                        # Busca parcial no título
-                        like = f"%{product_name}%"
-                        product_query = product_query.filter(MLProduct.title.ilike(like))
-                    
-                    # Filtro de catálogo
-                    if is_catalog is True:
-                        # Apenas produtos de catálogo
-                        product_query = product_query.filter(
-                            (MLProduct.catalog_listing == True) | (MLProduct.catalog_product_id.isnot(None))
-                        )
-                    elif is_catalog is False:
-                        # Apenas produtos não-catálogo
-                        product_query = product_query.filter(
-                            (MLProduct.catalog_listing == False) & (MLProduct.catalog_product_id.is_(None))
-                        )
-                    
-                    try:
-                        products = product_query.all()
-                        ml_item_ids_to_filter = [p.ml_item_id for p in products if p.ml_item_id]
-                        
-                        if (product_name or seller_sku) and not ml_item_ids_to_filter:
+                    item_query = ai_tool_queries.product_item_ids_query(
+                        company_id, product_name=product_name, seller_sku=seller_sku, is_catalog=is_catalog
+                    )
+                    if product_name or seller_sku:
+                        try:
+                            found = self.db.query(item_query.exists()).scalar()
+                        except Exception as e:
+                            logger.error(f"❌ Erro ao buscar produtos para filtro (product_name={product_name}, seller_sku={seller_sku}, is_catalog={is_catalog}): {e}", exc_info=True)
+                            return {
+                                "orders": [],
+                                "error": f"Erro ao buscar produtos: {str(e)}"
+                            }
+                        if not found:
                             # Produto não encontrado
                             logger.info(f"ℹ️ Produto não encontrado: {'SKU' if seller_sku else 'nome'}='{seller_sku or product_name}', company_id={company_id}")
                             return {
                                 "orders": [],
                                 "message": f"Produto não encontrado com {'SKU' if seller_sku else 'nome'}: {seller_sku or product_name}"
                             }
-                    except Exception as e:
-                        logger.error(f"❌ Erro ao buscar produtos para filtro (product_name={product_name}, seller_sku={seller_sku}, is_catalog={is_catalog}): {e}", exc_info=True)
-                        return {
-                            "orders": [],
-                            "error": f"Erro ao buscar produtos: {str(e)}"
-                        }
                 
-                # Se forneceu ml_item_id diretamente, adicionar à lista
-                if ml_item_id:
-                    ml_item_ids_to_filter.append(ml_item_id)
+                # ml_item_id informado diretamente soma-se ao filtro (OU)
+                ml_item_ids_to_filter = [str(ml_item_id)] if ml_item_id else []
                 
-                # Se há filtro por item, garantir que order_items não seja None
-                if ml_item_ids_to_filter:
-                    q = q.filter(MLOrder.order_items.isnot(None))
-                
-                # Comprador
-                buyer_nickname = function_args.get("buyer_nickname")
-                if buyer_nickname and hasattr(MLOrder, "buyer_nickname"):
-                    like = f"%{buyer_nickname}%"
-                    try:
-                        q = q.filter(MLOrder.buyer_nickname.ilike(like))
-                    except Exception:
-                        pass
-                # IMPORTANTE: Contar total ANTES de aplicar limit/offset e filtros por item
-                # Para filtros por item, precisamos contar depois de filtrar, então vamos fazer isso em duas etapas
-                # Primeiro, vamos buscar todos os pedidos que passam pelos filtros básicos
-                
-                # Ordenação recente
-                if hasattr(MLOrder, "date_created"):
-                    q = q.order_by(MLOrder.date_created.desc())
-                
-                # Limite opcional - se houver filtros além do company_id, não aplicar limite
-                # Filtros considerados: start_date, end_date, status, ml_item_id, product_name, seller_sku, is_catalog, buyer_nickname
-                has_filters = bool(
-                    start_date or end_date or status or ml_item_id or 
-                    product_name or seller_sku or is_catalog is not None or buyer_nickname
+                return ai_tool_queries.list_orders(
+                    self.db, company_id,
+                    limit=ai_tool_queries.clamp_rows(function_args.get("limit")),
+                    offset=max(0, int(function_args.get("offset", 0) or 0)),
+                    since=since, until=until, statuses=statuses,
+                    item_ids=ml_item_ids_to_filter, item_query=item_query,
+                    buyer_nickname=function_args.get("buyer_nickname")
                 )
-                
-                limit = function_args.get("limit")
-                offset = int(function_args.get("offset", 0))
-                
-                # Se há filtro por item, precisamos buscar todos os pedidos primeiro para filtrar depois
-                # Caso contrário, podemos contar diretamente
-                if ml_item_ids_to_filter:
-                    # Com filtro por item: buscar todos os pedidos que passam pelos filtros básicos
-                    # Depois filtrar por item e contar
-                    if has_filters:
-                        all_rows = q.all()
-                    elif limit is not None:
-                        limit = int(limit)
-                        all_rows = q.offset(offset).limit(limit).all()
-                    else:
-                        all_rows = q.offset(offset).limit(1000).all()
-                    
-                    # Filtrar por item e contar
-                    result = []
-                    for o in all_rows:
-                        try:
-                            items = o.order_items or []
-                            has_item = any(
-                                (it.get("item", {}).get("id") in [str(mid) for mid in ml_item_ids_to_filter])
-                                for it in items
-                            )
-                            if not has_item:
-                                continue
-                            
-                            status_str = (o.status.value if hasattr(o.status, "value") else str(o.status)) if getattr(o, "status", None) is not None else None
-                            result.append({
-                                "id_pedido": str(getattr(o, "ml_order_id", getattr(o, "id", None))),
-                                "data": o.date_created.isoformat() if getattr(o, "date_created", None) else None,
-                                "valor_total": float(o.total_amount) if getattr(o, "total_amount", None) else 0.0,
-                                "status": status_str,
-                                "comissoes": float(o.sale_fees) if getattr(o, "sale_fees", None) else 0.0,
-                                "frete": float(o.shipping_cost) if getattr(o, "shipping_cost", None) else 0.0,
-                                "desconto": float(o.coupon_amount) if getattr(o, "coupon_amount", None) else 0.0,
-                                "comprador": getattr(o, "buyer_nickname", None)
-                            })
-                        except Exception as e:
-                            logger.warning(f"⚠️ Erro ao verificar item no pedido {getattr(o, 'ml_order_id', getattr(o, 'id', 'unknown'))}: {e}")
-                            continue
-                    
-                    # Contar total considerando filtros por item
-                    # Para isso, precisamos contar todos os pedidos que passam pelos filtros básicos e têm o item
-                    total_count = 0
-                    for o in q.all():
-                        try:
-                            items = o.order_items or []
-                            has_item = any(
-                                (it.get("item", {}).get("id") in [str(mid) for mid in ml_item_ids_to_filter])
-                                for it in items
-                            )
-                            if has_item:
-                                total_count += 1
-                        except Exception:
-                            continue
-                    
-                    return {
-                        "pedidos": result,
-                        "total_pedidos": total_count  # Total real considerando filtros por item
-                    }
-                else:
-                    # Sem filtro por item: podemos contar diretamente do banco
-                    total_count = q.count()
-                    
-                    # Aplicar limit/offset apenas na busca dos resultados
-                    if has_filters:
-                        rows = q.offset(offset).all()
-                    elif limit is not None:
-                        limit = int(limit)
-                        rows = q.offset(offset).limit(limit).all()
-                    else:
-                        rows = q.offset(offset).limit(1000).all()
-                    
-                    result = []
-                    for o in rows:
-                        status_str = (o.status.value if hasattr(o.status, "value") else str(o.status)) if getattr(o, "status", None) is not None else None
-                        result.append({
-                            "id_pedido": str(getattr(o, "ml_order_id", getattr(o, "id", None))),
-                            "data": o.date_created.isoformat() if getattr(o, "date_created", None) else None,
-                            "valor_total": float(o.total_amount) if getattr(o, "total_amount", None) else 0.0,
-                            "status": status_str,
-                            "comissoes": float(o.sale_fees) if getattr(o, "sale_fees", None) else 0.0,
-                            "frete": float(o.shipping_cost) if getattr(o, "shipping_cost", None) else 0.0,
-                            "desconto": float(o.coupon_amount) if getattr(o, "coupon_amount", None) else 0.0,
-                            "comprador": getattr(o, "buyer_nickname", None)
-                        })
-                    
-                    return {
-                        "pedidos": result,
-                        "total_pedidos": total_count  # Total real do banco, não len(result)
-                    }
 
             # ========== Product Sales (by product or ml_item_id) ==========
             if function_name == "get_product_sales":
@@ -2268,19 +1947,19 @@ class OpenAIAssistantService:
                   - start_date (YYYY-MM-DD) opcional
                   - end_date (YYYY-MM-DD) opcional
                   - status (array|string) opcional (ex.: paid, delivered)
-                  - limit (int) padrão 50
+                  - limit (int) padrão 50, máximo 200
                   - offset (int) padrão 0
                 Retorno: lista de pedidos contendo o item, com quantidade total do item naquele pedido.
                 """
-                from app.models.saas_models import MLOrder, MLProduct
-                from datetime import datetime, timedelta
+                from app.models.saas_models import MLProduct
+                from app.services import ai_tool_queries
                 ml_item_id = function_args.get("ml_item_id")
                 product_id = function_args.get("product_id")
                 # Resolver ml_item_id via product_id se necessário
                 if not ml_item_id and product_id is not None:
                     try:
                         pid = int(product_id)
-                        p = self.db.query(MLProduct).filter(MLProduct.id == pid, MLProduct.company_id == company_id).first()
+                        p = self.db.query(MLProduct.ml_item_id).filter(MLProduct.id == pid, MLProduct.company_id == company_id).first()
                         if not p:
                             return {"error": "Produto não encontrado"}
                         ml_item_id = p.ml_item_id
@@ -2288,72 +1967,14 @@ class OpenAIAssistantService:
                         return {"error": "product_id inválido"}
                 if not ml_item_id:
                     return {"error": "É obrigatório informar product_id ou ml_item_id"}
-                q = self.db.query(MLOrder).filter(MLOrder.company_id == company_id, MLOrder.order_items.isnot(None))
-                # Datas
-                start_date = function_args.get("start_date")
-                end_date = function_args.get("end_date")
-                if start_date:
-                    try:
-                        dt_start = datetime.fromisoformat(str(start_date)[:10])
-                        q = q.filter(MLOrder.date_created >= dt_start)
-                    except Exception:
-                        pass
-                if end_date:
-                    try:
-                        dt_end = datetime.fromisoformat(str(end_date)[:10]) + timedelta(days=1)
-                        q = q.filter(MLOrder.date_created < dt_end)
-                    except Exception:
-                        pass
-                # Status (string ou lista) - normalizar para valores válidos do enum
-                status = function_args.get("status")
-                if status:
-                    if isinstance(status, str):
-                        status_list = [s.strip() for s in status.split(",") if s.strip()]
-                    else:
-                        status_list = [str(s).strip() for s in (status or []) if str(s).strip()]
-                    
-                    # Normalizar cada status para valores válidos do enum
-                    normalized_statuses = []
-                    for s in status_list:
-                        normalized = self._normalize_order_status(s)
-                        if normalized:
-                            normalized_statuses.append(normalized)
-                    
-                    if normalized_statuses:
-                        try:
-                            from app.models.saas_models import OrderStatus
-                            # Converter strings para valores do enum
-                            enum_statuses = [OrderStatus[s] for s in normalized_statuses if s in [e.name for e in OrderStatus]]
-                            if enum_statuses:
-                                q = q.filter(MLOrder.status.in_(enum_statuses))
-                        except Exception as e:
-                            logger.warning(f"⚠️ Erro ao filtrar por status: {e}")
-                            pass
-                # Ordenação e paginação
-                if hasattr(MLOrder, "date_created"):
-                    q = q.order_by(MLOrder.date_created.desc())
-                limit = int(function_args.get("limit", 50))
-                offset = int(function_args.get("offset", 0))
-                rows = q.offset(offset).limit(limit).all()
-                results = []
-                for o in rows:
-                    try:
-                        qty = 0
-                        for it in (o.order_items or []):
-                            if it.get("item", {}).get("id") == str(ml_item_id):
-                                qty += int(it.get("quantity", 1))
-                        if qty <= 0:
-                            continue
-                        status_str = (o.status.value if hasattr(o.status, "value") else str(o.status)) if getattr(o, "status", None) is not None else None
-                        results.append({
-                            "id_pedido": str(getattr(o, "ml_order_id", getattr(o, "id", None))),  # era "order_id"
-                            "data": o.date_created.isoformat() if getattr(o, "date_created", None) else None,  # era "date"
-                            "status": status_str,  # OK manter
-                            "valor_total": float(o.total_amount) if getattr(o, "total_amount", None) else 0.0,  # era "total_amount"
-                            "quantidade": qty  # era "quantity"
-                        })
-                    except Exception:
-                        continue
+                since, until = self._parse_tool_date_range(function_args)
+                results = ai_tool_queries.item_sales(
+                    self.db, company_id, str(ml_item_id),
+                    limit=ai_tool_queries.clamp_rows(function_args.get("limit")),
+                    offset=max(0, int(function_args.get("offset", 0) or 0)),
+                    since=since, until=until,
+                    statuses=self._parse_tool_status_filter(function_args.get("status"))
+                )
                 return {"vendas": results}  # era "sales"
 
             # ========== Catalog Competitors ==========
@@ -2417,36 +2038,12 @@ class OpenAIAssistantService:
                         products_with_ads.update(product_ids_from_campaigns)
                 
                 # Método 2: Buscar produtos com vendas por anúncio (is_advertising_sale = True)
-                orders_query = self.db.query(MLOrder).filter(
-                    MLOrder.company_id == company_id,
-                    MLOrder.is_advertising_sale == True,
-                    MLOrder.order_items.isnot(None)
-                )
-                if ml_account_id:
-                    orders_query = orders_query.filter(MLOrder.ml_account_id == ml_account_id)
-                
-                orders_with_ads = orders_query.all()
-                
-                # Extrair ml_item_ids dos pedidos
-                ml_item_ids_with_ads = set()
-                for order in orders_with_ads:
-                    try:
-                        items = order.order_items or []
-                        for item in items:
-                            item_id = item.get("item", {}).get("id")
-                            if item_id:
-                                ml_item_ids_with_ads.add(str(item_id))
-                    except Exception:
-                        continue
-                
-                # Buscar produtos por ml_item_id
-                if ml_item_ids_with_ads:
-                    products_from_orders = self.db.query(MLProduct).filter(
-                        MLProduct.company_id == company_id,
-                        MLProduct.ml_item_id.in_(list(ml_item_ids_with_ads))
-                    ).all()
-                    product_ids_from_orders = [p.id for p in products_from_orders]
-                    products_with_ads.update(product_ids_from_orders)
+                from app.services import ai_tool_queries
+                products_from_orders = self.db.query(MLProduct.id).filter(
+                    MLProduct.company_id == company_id,
+                    MLProduct.ml_item_id.in_(ai_tool_queries.advertised_item_ids(company_id, ml_account_id))
+                ).all()
+                products_with_ads.update(row.id for row in products_from_orders)
                 
                 # Buscar informações dos produtos
                 if not products_with_ads:
@@ -3480,7 +3077,8 @@ class OpenAIAssistantService:
         tools: List[Dict],
         usage_record: OpenAIAssistantUsage,
         start_time: float,
-        request_data_size: int
+        request_data_size: int,
+        stream_callback: Optional[StreamCallback] = None
     ) -> Dict:
         """
         Usa Assistants API quando Code Interpreter ou File Search estão presentes.
@@ -3601,48 +3199,13 @@ class OpenAIAssistantService:
                     if db_assistant.tools_config.get("verbosity"):
                         run_params["verbosity"] = db_assistant.tools_config["verbosity"]
             
-            try:
-                run = self.client.beta.threads.runs.create(**run_params)
-            except TypeError as e:
-                # Se não suportar no run, criar sem esses parâmetros
-                if "reasoning_effort" in str(e) or "verbosity" in str(e):
-                    logger.warning(f"⚠️ reasoning_effort/verbosity não suportados no run, removendo: {e}")
-                    run_params.pop("reasoning_effort", None)
-                    run_params.pop("verbosity", None)
-                    run = self.client.beta.threads.runs.create(**run_params)
-                else:
-                    raise
-            
-            # Aguardar conclusão do run
-            logger.info(f"⏳ Aguardando conclusão do run {run.id}...")
-            while run.status in ["queued", "in_progress", "requires_action"]:
-                time.sleep(1)
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=openai_thread_id,
-                    run_id=run.id
-                )
-                
-                # Processar tool calls se necessário
-                if run.status == "requires_action":
-                    tool_outputs = []
-                    for tool_call in run.required_action.submit_tool_outputs.tool_calls:
-                        if tool_call.type == "function":
-                            function_name = tool_call.function.name
-                            function_args = json.loads(tool_call.function.arguments)
-                            result = self._execute_tool_function(function_name, function_args, db_thread)
-                            tool_outputs.append({
-                                "tool_call_id": tool_call.id,
-                                "output": json.dumps(result, ensure_ascii=False)
-                            })
-                    
-                    if tool_outputs:
-                        run = self.client.beta.threads.runs.submit_tool_outputs(
-                            thread_id=openai_thread_id,
-                            run_id=run.id,
-                            tool_outputs=tool_outputs
-                        )
+            # Acompanhar o run pelos eventos do stream (sem polling)
+            tool_metrics = []
+            run = self._stream_assistant_run(run_params, db_thread, stream_callback, tool_metrics)
             
             # Verificar resultado
+            if run is None:
+                raise Exception("Stream do run encerrado sem status final")
             if run.status == "completed":
                 # Buscar mensagens da thread (ordenadas por mais recente primeiro)
                 messages = self.client.beta.threads.messages.list(thread_id=openai_thread_id, order="desc")
@@ -3709,6 +3272,7 @@ class OpenAIAssistantService:
                 usage_record.duration_seconds = duration
                 usage_record.response_data_size = len(response_text.encode('utf-8'))
                 usage_record.request_data_size = request_data_size
+                usage_record.tool_metrics = tool_metrics or None
                 
                 if usage_info:
                     usage_record.prompt_tokens = usage_info.prompt_tokens
@@ -3742,6 +3306,97 @@ class OpenAIAssistantService:
             self.db.commit()
             return {"success": False, "error": str(e)}
     
+    def _create_run_stream(self, run_params: Dict):
+        """Cria o run em modo stream (reasoning_effort/verbosity podem não ser suportados)"""
+        try:
+            return self.client.beta.threads.runs.create(**run_params, stream=True)
+        except TypeError as e:
+            # Se não suportar no run, criar sem esses parâmetros
+            if "reasoning_effort" in str(e) or "verbosity" in str(e):
+                logger.warning(f"⚠️ reasoning_effort/verbosity não suportados no run, removendo: {e}")
+                run_params.pop("reasoning_effort", None)
+                run_params.pop("verbosity", None)
+                return self.client.beta.threads.runs.create(**run_params, stream=True)
+            raise
+    
+    def _stream_assistant_run(
+        self,
+        run_params: Dict,
+        db_thread: OpenAIAssistantThread,
+        stream_callback: Optional[StreamCallback] = None,
+        tool_metrics: Optional[List[Dict]] = None
+    ):
+        """
+        Executa um run da Assistants API consumindo os eventos do stream.
+
+        - thread.message.delta: repassa o texto ao `stream_callback`
+        - thread.run.requires_action: executa as ferramentas locais (ToolExecutionEngine,
+          latências em `tool_metrics`) e envia os resultados com
+          submit_tool_outputs(stream=True), seguindo no novo stream
+        - eventos terminais: devolve o run final (None se o stream acabar antes)
+        """
+        openai_thread_id = run_params["thread_id"]
+        stream = self._create_run_stream(run_params)
+        run = None
+        
+        while stream is not None:
+            next_stream = None
+            with stream:
+                for event in stream:
+                    if event.event == "thread.run.created":
+                        logger.info(f"📡 Acompanhando run {event.data.id} via stream...")
+                    elif event.event == "thread.message.delta":
+                        if stream_callback:
+                            for part in event.data.delta.content or []:
+                                text = getattr(getattr(part, "text", None), "value", None)
+                                if text:
+                                    stream_callback({"type": "delta", "content": text})
+                    elif event.event == "thread.run.requires_action":
+                        run = event.data
+                        function_calls = [
+                            tool_call for tool_call in run.required_action.submit_tool_outputs.tool_calls
+                            if tool_call.type == "function"
+                        ]
+                        if stream_callback:
+                            for tool_call in function_calls:
+                                stream_callback({"type": "tool_call", "name": tool_call.function.name})
+                        
+                        engine = ToolExecutionEngine(self, db_thread)
+                        results = engine.execute([
+                            (tool_call.function.name, json.loads(tool_call.function.arguments))
+                            for tool_call in function_calls
+                        ])
+                        if tool_metrics is not None:
+                            tool_metrics.extend(engine.metrics)
+                        
+                        tool_outputs = []
+                        for tool_call, result, metric in zip(function_calls, results, engine.metrics):
+                            if stream_callback:
+                                stream_callback({
+                                    "type": "tool_result",
+                                    "name": tool_call.function.name,
+                                    "success": metric["status"] == "ok",
+                                    "latency_ms": metric["latency_ms"]
+                                })
+                            tool_outputs.append({
+                                "tool_call_id": tool_call.id,
+                                "output": json.dumps(result, ensure_ascii=False)
+                            })
+                        
+                        if tool_outputs:
+                            next_stream = self.client.beta.threads.runs.submit_tool_outputs(
+                                thread_id=openai_thread_id,
+                                run_id=run.id,
+                                tool_outputs=tool_outputs,
+                                stream=True
+                            )
+                        break
+                    elif event.event in RUN_TERMINAL_EVENTS:
+                        run = event.data
+            stream = next_stream
+        
+        return run
+    
     def _use_assistants_api_report_mode(
         self,
         db_assistant: OpenAIAssistant,
@@ -3848,48 +3503,12 @@ class OpenAIAssistantService:
                     if db_assistant.tools_config.get("verbosity"):
                         run_params["verbosity"] = db_assistant.tools_config["verbosity"]
             
-            try:
-                run = self.client.beta.threads.runs.create(**run_params)
-            except TypeError as e:
-                # Se não suportar no run, criar sem esses parâmetros
-                if "reasoning_effort" in str(e) or "verbosity" in str(e):
-                    logger.warning(f"⚠️ reasoning_effort/verbosity não suportados no run, removendo: {e}")
-                    run_params.pop("reasoning_effort", None)
-                    run_params.pop("verbosity", None)
-                    run = self.client.beta.threads.runs.create(**run_params)
-                else:
-                    raise
-            
-            # Aguardar conclusão do run
-            logger.info(f"⏳ Aguardando conclusão do run {run.id}...")
-            while run.status in ["queued", "in_progress", "requires_action"]:
-                time.sleep(1)
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=openai_thread_id,
-                    run_id=run.id
-                )
-                
-                # Processar tool calls se necessário
-                if run.status == "requires_action":
-                    tool_outputs = []
-                    for tool_call in run.required_action.submit_tool_outputs.tool_calls:
-                        if tool_call.type == "function":
-                            function_name = tool_call.function.name
-                            function_args = json.loads(tool_call.function.arguments)
-                            result = self._execute_tool_function(function_name, function_args, db_thread)
-                            tool_outputs.append({
-                                "tool_call_id": tool_call.id,
-                                "output": json.dumps(result, ensure_ascii=False)
-                            })
-                    
-                    if tool_outputs:
-                        run = self.client.beta.threads.runs.submit_tool_outputs(
-                            thread_id=openai_thread_id,
-                            run_id=run.id,
-                            tool_outputs=tool_outputs
-                        )
+            # Acompanhar o run pelos eventos do stream (sem polling)
+            run = self._stream_assistant_run(run_params, db_thread)
             
             # Verificar resultado
+            if run is None:
+                raise Exception("Stream do run encerrado sem status final")
             if run.status == "completed":
                 # Buscar mensagens da thread (ordenadas por mais recente primeiro)
                 messages = self.client.beta.threads.messages.list(thread_id=openai_thread_id, order="desc")
@@ -0,0 +1,295 @@
+"""
+Simulação de preços e margens do catálogo inteiro da empresa
+
+- anúncios vinculados, produtos internos e custos vêm de uma única query
+- as taxas do ML vêm das tabelas em cache do MLPricingService, consultadas uma
+  vez por (categoria, tipo de anúncio, faixa de preço) e não por anúncio
+- os cálculos são feitos em colunas (listas paralelas), uma passada por etapa,
+  para o cenário atual e para o cenário simulado
+- cenários: variação de preço (±%), nova alíquota de imposto, novo percentual
+  de custo de anúncio (marketing) e frete fixo por venda
+"""
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from app.models.saas_models import Company, InternalProduct, MLProduct, MLProductStatus, SKUManagement
+from app.services.ml_pricing_service import MLPricingService, price_band
+
+logger = logging.getLogger(__name__)
+
+# Preço a partir do qual o vendedor paga o frete (mesma regra de MLPricingService._calculate_shipping_cost)
+FREE_SHIPPING_THRESHOLD = 79.90
+ESTIMATED_SHIPPING_COST = 12.0
+# Margem (%) abaixo da qual o anúncio é considerado com margem baixa
+LOW_MARGIN_THRESHOLD = 10.0
+
+
+def company_default_tax_rate(company: Optional[Company]) -> float:
+    """Alíquota padrão da empresa: aliquota_simples ou a média das alíquotas informadas"""
+    if not company:
+        return 0.0
+    if company.aliquota_simples:
+        return float(company.aliquota_simples)
+    aliquotas = [
+        float(value) for value in (
+            company.aliquota_ir, company.aliquota_csll, company.aliquota_pis,
+            company.aliquota_cofins, company.aliquota_icms, company.aliquota_iss
+        ) if value
+    ]
+    return sum(aliquotas) / len(aliquotas) if aliquotas else 0.0
+
+
+def compute_margins(
+    prices: List[float],
+    costs: List[float],
+    tax_rates: List[float],
+    marketing: List[float],
+    fees: Optional[List[float]] = None,
+    shipping: Optional[List[float]] = None
+) -> Dict[str, List[float]]:
+    """
+    Impostos, custo total, lucro e margem (%) por linha, em colunas
+
+    Args:
+        prices: preço de venda
+        costs: custo do produto + outros custos
+        tax_rates: alíquota (%) sobre o preço
+        marketing: custo de marketing em R$
+        fees: taxas do ML em R$ (opcional)
+        shipping: frete pago pelo vendedor em R$ (opcional)
+    """
+    zeros = [0.0] * len(prices)
+    fees = fees or zeros
+    shipping = shipping or zeros
+    tax_amount = [p * t / 100 for p, t in zip(prices, tax_rates)]
+    total_costs = [c + m + f + s for c, m, f, s in zip(costs, marketing, fees, shipping)]
+    total_with_tax = [tc + ta for tc, ta in zip(total_costs, tax_amount)]
+    profit = [p - t for p, t in zip(prices, total_with_tax)]
+    margin = [(pr / p * 100) if p > 0 else 0.0 for pr, p in zip(profit, prices)]
+    return {
+        "tax_amount": tax_amount,
+        "total_costs": total_costs,
+        "total_costs_with_tax": total_with_tax,
+        "profit": profit,
+        "profit_margin": margin
+    }
+
+
+def _to_float(value: Any) -> float:
+    if value is None or value == "":
+        return 0.0
+    try:
+        return float(str(value).replace("R$", "").strip().replace(",", ".") if isinstance(value, str) else value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class PricingSimulationService:
+    """Simulador de preços/margens sobre todos os anúncios vinculados da empresa"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.pricing_service = MLPricingService(db)
+        # Tabelas de taxas distintas consultadas (cache ou API)
+        self.fee_lookups = 0
+
+    def simulate(
+        self,
+        company_id: int,
+        user_id: Optional[int] = None,
+        price_change_pct: float = 0.0,
+        tax_rate: Optional[float] = None,
+        marketing_pct: Optional[float] = None,
+        shipping_cost: Optional[float] = None,
+        limit: Optional[int] = 100
+    ) -> Dict[str, Any]:
+        """
+        Compara o cenário atual com o simulado para todos os anúncios ativos vinculados
+
+        Args:
+            user_id: usuário com conta ML, para consultar as taxas reais (sem ele usa as padrão)
+            price_change_pct: variação do preço de venda em % (ex.: -5 ou 10)
+            tax_rate: nova alíquota (%) para todos os produtos (regime tributário)
+            marketing_pct: novo custo de anúncio em % do preço
+            shipping_cost: frete fixo (R$) pago pelo vendedor por venda
+            limit: linhas devolvidas (piores margens simuladas primeiro); None = todas
+        """
+        try:
+            started_at = time.monotonic()
+            self.fee_lookups = 0
+            company = self.db.query(Company).filter(Company.id == company_id).first()
+            if not company:
+                return {"success": False, "error": "Empresa não encontrada"}
+
+            rows = self._load_catalog(company_id)
+            if not rows:
+                return {"success": True, "summary": {"total_listings": 0}, "rows": []}
+            load_seconds = time.monotonic() - started_at
+
+            columns = self._build_columns(rows, company)
+            factor = 1 + (price_change_pct or 0.0) / 100
+            scenario_prices = [round(p * factor, 2) for p in columns["price"]]
+
+            current = self._evaluate(columns, columns["price"], user_id)
+            scenario = self._evaluate(
+                columns, scenario_prices, user_id,
+                tax_rate=tax_rate, marketing_pct=marketing_pct, shipping_cost=shipping_cost
+            )
+
+            result_rows = [
+                {
+                    "ml_item_id": columns["ml_item_id"][i],
+                    "title": columns["title"][i],
+                    "internal_sku": columns["internal_sku"][i],
+                    "current_price": columns["price"][i],
+                    "simulated_price": scenario_prices[i],
+                    "current_margin": round(current["profit_margin"][i], 2),
+                    "simulated_margin": round(scenario["profit_margin"][i], 2),
+                    "current_profit": round(current["profit"][i], 2),
+                    "simulated_profit": round(scenario["profit"][i], 2),
+                    "simulated_ml_fees": round(scenario["fees"][i], 2),
+                    "simulated_tax_amount": round(scenario["tax_amount"][i], 2),
+                    "simulated_shipping": round(scenario["shipping"][i], 2),
+                    "simulated_marketing": round(scenario["marketing"][i], 2)
+                }
+                for i in range(len(rows))
+            ]
+            result_rows.sort(key=lambda r: r["simulated_margin"])
+
+            elapsed = round(time.monotonic() - started_at, 3)
+            logger.info(
+                f"📊 Simulação de preços da empresa {company_id}: {len(rows)} anúncio(s) em {elapsed}s "
+                f"({self.fee_lookups} tabela(s) de taxas)"
+            )
+            return {
+                "success": True,
+                "scenario": {
+                    "price_change_pct": price_change_pct,
+                    "tax_rate": tax_rate,
+                    "marketing_pct": marketing_pct,
+                    "shipping_cost": shipping_cost
+                },
+                "summary": {
+                    "total_listings": len(rows),
+                    "current": self._summarize(columns["price"], current),
+                    "simulated": self._summarize(scenario_prices, scenario)
+                },
+                "rows": result_rows[:limit] if limit else result_rows,
+                "fee_tables": self.fee_lookups,
+                "timings": {
+                    "load_seconds": round(load_seconds, 3),
+                    "total_seconds": elapsed
+                }
+            }
+        except Exception as e:
+            logger.error(f"❌ Erro na simulação de preços da empresa {company_id}: {e}", exc_info=True)
+            return {"success": False, "error": str(e)}
+
+    def _load_catalog(self, company_id: int) -> List[Any]:
+        """Anúncios ativos vinculados a produtos internos, com custos (uma query, primeiro vínculo vence)"""
+        rows = self.db.query(
+            MLProduct.ml_item_id,
+            MLProduct.title,
+            MLProduct.price,
+            MLProduct.category_id,
+            MLProduct.listing_type_id,
+            MLProduct.is_fulfillment,
+            InternalProduct.internal_sku,
+            InternalProduct.cost_price,
+            InternalProduct.other_costs,
+            InternalProduct.tax_rate,
+            InternalProduct.marketing_cost
+        ).join(
+            SKUManagement,
+            and_(SKUManagement.platform_item_id == MLProduct.ml_item_id, SKUManagement.company_id == company_id)
+        ).join(
+            InternalProduct,
+            and_(InternalProduct.id == SKUManagement.internal_product_id, InternalProduct.company_id == company_id)
+        ).filter(
+            MLProduct.company_id == company_id,
+            MLProduct.status == MLProductStatus.ACTIVE,
+            SKUManagement.status == "active"
+        ).order_by(SKUManagement.id).all()
+
+        catalog: Dict[str, Any] = {}
+        for row in rows:
+            catalog.setdefault(row.ml_item_id, row)
+        return list(catalog.values())
+
+    @staticmethod
+    def _build_columns(rows: List[Any], company: Company) -> Dict[str, List]:
+        default_tax = company_default_tax_rate(company)
+        return {
+            "ml_item_id": [r.ml_item_id for r in rows],
+            "title": [r.title for r in rows],
+            "internal_sku": [r.internal_sku for r in rows],
+            "category_id": [r.category_id for r in rows],
+            "listing_type_id": [r.listing_type_id or "gold_special" for r in rows],
+            "is_fulfillment": [bool(r.is_fulfillment) for r in rows],
+            "price": [_to_float(r.price) for r in rows],
+            "cost": [_to_float(r.cost_price) + _to_float(r.other_costs) for r in rows],
+            "tax_rate": [_to_float(r.tax_rate) or default_tax for r in rows],
+            # Marketing: valor fixo do produto; sem ele, percentual da empresa sobre o preço
+            "marketing_cost": [_to_float(r.marketing_cost) for r in rows],
+            "company_marketing_pct": _to_float(company.percentual_marketing)
+        }
+
+    def _fee_percent_and_fixed(self, user_id: Optional[int], columns: Dict[str, List], prices: List[float]):
+        """Taxa percentual e fixa por linha, consultando cada tabela distinta uma única vez"""
+        schedules: Dict[tuple, Dict[str, Any]] = {}
+        keys = [
+            (category_id, listing_type_id, price_band(price))
+            for category_id, listing_type_id, price in zip(columns["category_id"], columns["listing_type_id"], prices)
+        ]
+        for key, price in zip(keys, prices):
+            if key not in schedules:
+                schedules[key] = self.pricing_service.get_fee_schedule(user_id, price, key[0], key[1])
+                self.fee_lookups += 1
+        percent = [schedules[key]["percentage_fee"] for key in keys]
+        fixed = [schedules[key]["fixed_fee"] + schedules[key]["listing_fee"] for key in keys]
+        return percent, fixed
+
+    def _evaluate(self, columns: Dict[str, List], prices: List[float], user_id: Optional[int],
+                  tax_rate: Optional[float] = None, marketing_pct: Optional[float] = None,
+                  shipping_cost: Optional[float] = None) -> Dict[str, List[float]]:
+        fee_percent, fee_fixed = self._fee_percent_and_fixed(user_id, columns, prices)
+        fees = [p * pct / 100 + fx for p, pct, fx in zip(prices, fee_percent, fee_fixed)]
+
+        if shipping_cost is not None:
+            shipping = [float(shipping_cost)] * len(prices)
+        else:
+            shipping = [ESTIMATED_SHIPPING_COST if p >= FREE_SHIPPING_THRESHOLD else 0.0 for p in prices]
+
+        if marketing_pct is not None:
+            marketing = [p * marketing_pct / 100 for p in prices]
+        else:
+            company_pct = columns["company_marketing_pct"]
+            marketing = [
+                fixed if fixed else p * company_pct / 100
+                for fixed, p in zip(columns["marketing_cost"], prices)
+            ]
+
+        tax_rates = [float(tax_rate)] * len(prices) if tax_rate is not None else columns["tax_rate"]
+        result = compute_margins(prices, columns["cost"], tax_rates, marketing, fees, shipping)
+        result.update({"fees": fees, "shipping": shipping, "marketing": marketing})
+        return result
+
+    @staticmethod
+    def _summarize(prices: List[float], result: Dict[str, List[float]]) -> Dict[str, Any]:
+        revenue = sum(prices)
+        profit = sum(result["profit"])
+        margins = result["profit_margin"]
+        return {
+            "revenue_per_unit_sold": round(revenue, 2),
+            "profit_per_unit_sold": round(profit, 2),
+            "weighted_margin": round(profit / revenue * 100, 2) if revenue else 0.0,
+            "average_margin": round(sum(margins) / len(margins), 2) if margins else 0.0,
+            "negative_margin_count": sum(1 for m in margins if m < 0),
+            "low_margin_count": sum(1 for m in margins if 0 <= m < LOW_MARGIN_THRESHOLD),
+            "total_ml_fees": round(sum(result["fees"]), 2),
+            "total_tax_amount": round(sum(result["tax_amount"]), 2)
+        }
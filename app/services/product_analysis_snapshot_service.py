@@ -0,0 +1,193 @@
+"""
+Snapshot dos insumos da análise IA de produtos
+
+Vendas, métricas de Product Ads, concorrentes do catálogo e análise de custos
+ficam em product_analysis_snapshots (uma linha por anúncio):
+- pedidos: só os alterados desde a última atualização (ml_orders.updated_at) são
+  buscados, filtrados pelo anúncio no banco (containment JSONB em order_items)
+- marketing: chamada à API do ML apenas quando o TTL expira; em caso de falha
+  o valor anterior é mantido
+- catálogo e pricing: guardados quando enviados pela tela e reaproveitados
+  nas análises seguintes
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.saas_models import MLOrder, MLProduct, ProductAnalysisSnapshot
+from app.services.ai_tool_queries import order_has_items, status_value
+
+logger = logging.getLogger(__name__)
+
+# Janela de vendas usada na análise
+ANALYSIS_WINDOW_DAYS = 30
+# Intervalo mínimo entre buscas incrementais de pedidos
+ORDERS_REFRESH_INTERVAL = timedelta(minutes=5)
+# Validade das métricas de Product Ads
+MARKETING_TTL = timedelta(hours=6)
+# Validade dos concorrentes do catálogo guardados
+CATALOG_TTL = timedelta(hours=24)
+
+
+class ProductAnalysisSnapshotService:
+    """Mantém e serve o snapshot de insumos da análise IA de um anúncio"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_features(self, product: MLProduct, catalog_data: Optional[List] = None,
+                     pricing_analysis: Optional[Dict] = None, force_refresh: bool = False) -> Dict:
+        """
+        Retorna os insumos atualizados da análise do produto.
+
+        Args:
+            product: Produto analisado
+            catalog_data: Concorrentes enviados pela tela (substituem os guardados)
+            pricing_analysis: Análise de custos enviada pela tela (substitui a guardada)
+            force_refresh: Ignora TTLs e reconstrói a janela de pedidos
+
+        Returns:
+            Dict com orders, marketing_metrics, catalog_data e pricing_analysis
+        """
+        now = datetime.now()
+        snapshot = self._get_or_create(product)
+
+        if force_refresh or snapshot.window_days != ANALYSIS_WINDOW_DAYS:
+            snapshot.orders = None
+            snapshot.orders_watermark = None
+            snapshot.window_days = ANALYSIS_WINDOW_DAYS
+
+        if (force_refresh or snapshot.orders is None or not snapshot.orders_refreshed_at
+                or now - snapshot.orders_refreshed_at >= ORDERS_REFRESH_INTERVAL):
+            self._refresh_orders(snapshot, product, now)
+
+        if (force_refresh or not snapshot.marketing_fetched_at
+                or now - snapshot.marketing_fetched_at >= MARKETING_TTL):
+            self._refresh_marketing(snapshot, product, now)
+
+        if catalog_data:
+            snapshot.catalog_data = catalog_data
+            snapshot.catalog_fetched_at = now
+
+        if pricing_analysis:
+            snapshot.pricing_analysis = pricing_analysis
+            snapshot.pricing_updated_at = now
+
+        try:
+            self.db.commit()
+        except Exception as e:
+            logger.error(f"❌ Erro ao salvar snapshot de análise do produto {product.id}: {e}")
+            self.db.rollback()
+
+        catalog_fresh = bool(snapshot.catalog_fetched_at and now - snapshot.catalog_fetched_at < CATALOG_TTL)
+        return {
+            "orders": self._orders_in_window(snapshot.orders or [], now),
+            "marketing_metrics": dict(snapshot.marketing_metrics) if snapshot.marketing_metrics else {"has_advertising": False},
+            "catalog_data": catalog_data or (snapshot.catalog_data if catalog_fresh else None),
+            "pricing_analysis": pricing_analysis or snapshot.pricing_analysis,
+        }
+
+    def _get_or_create(self, product: MLProduct) -> ProductAnalysisSnapshot:
+        snapshot = self.db.query(ProductAnalysisSnapshot).filter(
+            ProductAnalysisSnapshot.ml_product_id == product.id
+        ).first()
+        if snapshot and snapshot.ml_item_id != product.ml_item_id:
+            # Produto religado a outro anúncio: histórico anterior não serve mais
+            snapshot.ml_item_id = product.ml_item_id
+            snapshot.orders = None
+            snapshot.orders_watermark = None
+            snapshot.marketing_fetched_at = None
+        if not snapshot:
+            snapshot = ProductAnalysisSnapshot(
+                ml_product_id=product.id,
+                company_id=product.company_id,
+                ml_item_id=product.ml_item_id,
+                window_days=ANALYSIS_WINDOW_DAYS
+            )
+            self.db.add(snapshot)
+        return snapshot
+
+    def _refresh_orders(self, snapshot: ProductAnalysisSnapshot, product: MLProduct, now: datetime):
+        """Incorpora os pedidos do anúncio criados/alterados desde a última atualização"""
+        since = now - timedelta(days=ANALYSIS_WINDOW_DAYS)
+        query = self.db.query(MLOrder).filter(
+            MLOrder.company_id == product.company_id,
+            MLOrder.date_created >= since,
+            order_has_items([product.ml_item_id])
+        )
+        watermark = snapshot.orders_watermark if snapshot.orders is not None else None
+        if watermark:
+            query = query.filter(MLOrder.updated_at > watermark)
+
+        changed = query.all()
+        rows = {row["id_pedido"]: row for row in (snapshot.orders or []) if watermark}
+        for order in changed:
+            row = self._order_row(order, product.ml_item_id)
+            rows[row["id_pedido"]] = row
+            if order.updated_at and (not watermark or order.updated_at > watermark):
+                watermark = order.updated_at
+
+        if not watermark:
+            watermark = self.db.query(func.max(MLOrder.updated_at)).filter(
+                MLOrder.company_id == product.company_id
+            ).scalar()
+
+        snapshot.orders = sorted(
+            self._orders_in_window(list(rows.values()), now),
+            key=lambda row: row["data"] or "",
+            reverse=True
+        )
+        snapshot.orders_watermark = watermark
+        snapshot.orders_refreshed_at = now
+        logger.info(
+            f"📦 Snapshot de análise {product.ml_item_id}: {len(changed)} pedido(s) novo(s)/alterado(s), "
+            f"{len(snapshot.orders)} na janela de {ANALYSIS_WINDOW_DAYS} dias"
+        )
+
+    def _refresh_marketing(self, snapshot: ProductAnalysisSnapshot, product: MLProduct, now: datetime):
+        """Busca as métricas de Product Ads na API do ML, mantendo as anteriores em caso de falha"""
+        try:
+            from app.services.ml_product_ads_service import MLProductAdsService
+            metrics = MLProductAdsService(self.db).get_product_advertising_metrics(
+                ml_item_id=product.ml_item_id,
+                ml_account_id=product.ml_account_id,
+                days=ANALYSIS_WINDOW_DAYS
+            )
+            snapshot.marketing_metrics = metrics or {"has_advertising": False}
+            snapshot.marketing_fetched_at = now
+        except Exception as e:
+            logger.warning(f"⚠️ Não foi possível atualizar métricas de marketing de {product.ml_item_id}: {e}")
+            if snapshot.marketing_metrics is None:
+                snapshot.marketing_metrics = {"has_advertising": False}
+
+    @staticmethod
+    def _orders_in_window(rows: List[Dict], now: datetime) -> List[Dict]:
+        since = (now - timedelta(days=ANALYSIS_WINDOW_DAYS)).isoformat()
+        return [row for row in rows if row.get("data") and row["data"] >= since]
+
+    @staticmethod
+    def _order_row(order: MLOrder, ml_item_id: str) -> Dict:
+        """Linha do pedido no formato do historico_pedidos da análise"""
+        quantity = 1
+        unit_price = 0
+        for item in order.order_items or []:
+            if item.get('item', {}).get('id') == ml_item_id:
+                quantity = item.get('quantity', 1)
+                unit_price = item.get('unit_price', 0)
+                break
+
+        # Valores já estão em reais (não dividir por 100)
+        return {
+            "id_pedido": str(order.ml_order_id),
+            "data": order.date_created.isoformat() if order.date_created else None,
+            "quantidade": quantity,
+            "preco_unitario": float(unit_price) if unit_price else 0,
+            "total_pago": float(order.total_amount) if order.total_amount else 0,
+            "comissao_ml": float(order.sale_fees) if order.sale_fees else 0,
+            "frete": float(order.shipping_cost) if order.shipping_cost else 0,
+            "desconto": float(order.coupon_amount) if order.coupon_amount else 0,
+            "status": status_value(order.status)
+        }
@@ -2,9 +2,9 @@
 Serviço para gerenciar movimentações de estoque
 """
 import logging
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc
+from sqlalchemy import String, and_, cast, desc, insert, or_, text
 from decimal import Decimal
 from datetime import datetime, timedelta
 from app.models.saas_models import (
@@ -14,6 +14,14 @@ from app.utils.notification_logger import global_logger
 
 logger = logging.getLogger(__name__)
 
+# Linhas por comando nas operações em lote (IN, VALUES e INSERT)
+BULK_CHUNK_SIZE = 1000
+
+
+def _chunks(values: list, size: int):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
 
 class StockMovementService:
     """Serviço para gerenciar movimentações de estoque"""
@@ -216,7 +224,6 @@ class StockMovementService:
         try:
             from app.models.saas_models import MLOrder, SKUManagement, MLProduct, MLAccount, MLAccountStatus
             from app.services.stock_service import StockService
-            import json
             
             # Verificar se pedido existe e pertence à empresa
             order = self.db.query(MLOrder).filter(
@@ -272,28 +279,10 @@ class StockMovementService:
                 )
             
             # Identificar se produto é Full (fulfillment)
-            is_fulfillment = False
-            ml_product = self.db.query(MLProduct).filter(
+            is_fulfillment = bool(self.db.query(MLProduct.is_fulfillment).filter(
                 MLProduct.ml_item_id == ml_item_id,
                 MLProduct.company_id == company_id
-            ).first()
-            
-            if ml_product and ml_product.shipping:
-                shipping_data = ml_product.shipping
-                if isinstance(shipping_data, str):
-                    try:
-                        shipping_data = json.loads(shipping_data)
-                    except:
-                        shipping_data = {}
-                
-                if shipping_data.get("logistic_type") == "fulfillment":
-                    is_fulfillment = True
-            
-            # Verificar também nas tags
-            if not is_fulfillment and ml_product and ml_product.tags:
-                tags_list = ml_product.tags if isinstance(ml_product.tags, list) else []
-                if any(tag in ["fulfillment", "meli_fulfillment", "FULL"] for tag in tags_list):
-                    is_fulfillment = True
+            ).scalar())
             
             # Se não especificou warehouse, tentar encontrar por ml_item_id ou internal_product_id
             logger.info(f"🔍 [ESTOQUE] Buscando warehouse para ml_item_id={ml_item_id}, internal_product_id={internal_product_id}")
@@ -731,6 +720,356 @@ class StockMovementService:
                 "error": f"Erro ao sincronizar venda: {str(e)}"
             }
     
+    def sync_sales_to_stock_bulk(
+        self,
+        company_id: int,
+        sales: List[Tuple[int, str, int]],
+        sales_channel: str = "Mercado Livre",
+        commit: bool = True
+    ) -> Dict[str, Any]:
+        """Dá baixa de vários itens vendidos de uma vez (importações e webhooks)
+        
+        Mesmas regras de sync_sale_to_stock, em passadas por conjunto:
+        - pedidos, mapeamentos de SKU, flags Full e estoques são lidos com uma consulta cada
+        - as baixas são aplicadas com um único UPDATE ... FROM (VALUES ...)
+        - as movimentações são inseridas em lote
+        
+        Idempotente por pedido: pedidos que já têm movimentação de venda são ignorados.
+        Os pedidos são travados (FOR UPDATE) durante a verificação para que webhook e
+        importação simultâneos não registrem a mesma venda duas vezes.
+        
+        Args:
+            sales: tuplas (MLOrder.id, ml_item_id, quantidade)
+            commit: Se False, apenas executa na sessão (commit fica com o chamador)
+        
+        Returns:
+            Resumo com contadores, erros por item e ml_sync_targets (produtos internos
+            cujo estoque compartilhado mudou; o chamador envia aos anúncios do ML após o commit)
+        """
+        from app.models.saas_models import MLOrder, SKUManagement, MLProduct
+
+        summary = {
+            "success": True,
+            "orders_processed": 0,
+            "orders_skipped": 0,
+            "movements_created": 0,
+            "stock_decreased": 0,
+            "stock_failed": 0,
+            "errors": [],
+            "ml_sync_targets": []
+        }
+
+        sales = [
+            (int(order_id), str(ml_item_id), int(quantity))
+            for order_id, ml_item_id, quantity in sales or []
+            if order_id and ml_item_id and ml_item_id != "None" and quantity and int(quantity) > 0
+        ]
+        if not sales:
+            return summary
+
+        try:
+            order_ids = sorted({sale[0] for sale in sales})
+
+            # Pedidos da empresa, travados até o commit (ordem fixa de ids evita deadlock)
+            orders = {}
+            for chunk in _chunks(order_ids, BULK_CHUNK_SIZE):
+                for row in self.db.query(MLOrder.id, MLOrder.ml_order_id, MLOrder.date_created).filter(
+                    MLOrder.id.in_(chunk),
+                    MLOrder.company_id == company_id
+                ).order_by(MLOrder.id).with_for_update():
+                    orders[row.id] = row
+
+            # Idempotência: pedidos que já tiveram baixa
+            already_synced = set()
+            for chunk in _chunks(list(orders), BULK_CHUNK_SIZE):
+                already_synced.update(
+                    row[0] for row in self.db.query(StockMovement.ml_order_id).filter(
+                        StockMovement.ml_order_id.in_(chunk),
+                        cast(StockMovement.movement_type, String) == StockMovementType.SALE.value
+                    ).distinct()
+                )
+
+            pending = []
+            for order_id, ml_item_id, quantity in sales:
+                if order_id not in orders:
+                    summary["errors"].append({"order_id": order_id, "ml_item_id": ml_item_id, "error": "Pedido não encontrado"})
+                elif order_id in already_synced:
+                    continue
+                else:
+                    pending.append((order_id, ml_item_id, quantity))
+            summary["orders_skipped"] = len(already_synced)
+
+            if not pending:
+                return self._finish_bulk_sale_sync(company_id, summary, commit)
+
+            # Ordem cronológica: previous/new das movimentações seguem a sequência das vendas
+            pending.sort(key=lambda sale: (orders[sale[0]].date_created or datetime.min, sale[0]))
+            item_ids = sorted({sale[1] for sale in pending})
+
+            # SKU -> produto interno (primeiro mapeamento ativo por anúncio)
+            internal_by_item = {}
+            for chunk in _chunks(item_ids, BULK_CHUNK_SIZE):
+                for platform_item_id, internal_product_id in self.db.query(
+                    SKUManagement.platform_item_id, SKUManagement.internal_product_id
+                ).filter(
+                    SKUManagement.platform_item_id.in_(chunk),
+                    SKUManagement.company_id == company_id,
+                    SKUManagement.status == "active"
+                ).order_by(SKUManagement.id):
+                    internal_by_item.setdefault(platform_item_id, internal_product_id)
+
+            fulfillment_items = set()
+            for chunk in _chunks(item_ids, BULK_CHUNK_SIZE):
+                fulfillment_items.update(
+                    row[0] for row in self.db.query(MLProduct.ml_item_id).filter(
+                        MLProduct.ml_item_id.in_(chunk),
+                        MLProduct.company_id == company_id,
+                        MLProduct.is_fulfillment == True
+                    )
+                )
+
+            # Estoques candidatos: específicos dos anúncios e compartilhados dos produtos internos
+            internal_ids = sorted({pid for pid in internal_by_item.values() if pid})
+            stock_conditions = [ProductStock.ml_item_id.in_(item_ids)]
+            if internal_ids:
+                stock_conditions.append(and_(
+                    ProductStock.internal_product_id.in_(internal_ids),
+                    ProductStock.ml_item_id.is_(None)
+                ))
+            stocks = {}  # id -> estado em memória
+            item_stock = {}  # ml_item_id -> primeiro estoque do anúncio (qualquer depósito)
+            shared_stock = {}  # internal_product_id -> primeiro estoque compartilhado
+            by_key = {}
+            for row in self.db.query(
+                ProductStock.id, ProductStock.warehouse_id, ProductStock.internal_product_id,
+                ProductStock.ml_item_id, ProductStock.quantity, ProductStock.reserved_quantity
+            ).filter(
+                ProductStock.company_id == company_id,
+                or_(*stock_conditions)
+            ).order_by(ProductStock.id).with_for_update():
+                stock = {
+                    "id": row.id,
+                    "warehouse_id": row.warehouse_id,
+                    "internal_product_id": row.internal_product_id,
+                    "ml_item_id": row.ml_item_id,
+                    "quantity": Decimal(row.quantity or 0),
+                    "reserved_quantity": Decimal(row.reserved_quantity or 0),
+                    "delta": Decimal("0")
+                }
+                stocks[row.id] = stock
+                if row.ml_item_id:
+                    item_stock.setdefault(row.ml_item_id, stock)
+                    by_key.setdefault(("item", row.warehouse_id, row.ml_item_id), stock)
+                    if row.internal_product_id is None:
+                        by_key.setdefault(("item_only", row.warehouse_id, row.ml_item_id), stock)
+                else:
+                    shared_stock.setdefault(row.internal_product_id, stock)
+                    by_key.setdefault(("shared", row.warehouse_id, row.internal_product_id), stock)
+
+            fulfillment_warehouse_id = None
+            fulfillment_warehouse_loaded = False
+
+            # Resolver depósito e estoque de cada venda
+            resolved = []
+            missing_stocks = {}
+            for order_id, ml_item_id, quantity in pending:
+                internal_product_id = internal_by_item.get(ml_item_id)
+                is_fulfillment = ml_item_id in fulfillment_items
+
+                if ml_item_id in item_stock:
+                    warehouse_id = item_stock[ml_item_id]["warehouse_id"]
+                elif internal_product_id and internal_product_id in shared_stock:
+                    warehouse_id = shared_stock[internal_product_id]["warehouse_id"]
+                elif internal_product_id:
+                    if not fulfillment_warehouse_loaded:
+                        fulfillment_warehouse_id = self.db.query(Warehouse.id).filter(
+                            cast(Warehouse.type, String) == WarehouseType.FULFILLMENT.value,
+                            Warehouse.is_shared == True
+                        ).order_by(Warehouse.id).limit(1).scalar()
+                        fulfillment_warehouse_loaded = True
+                    warehouse_id = fulfillment_warehouse_id
+                else:
+                    warehouse_id = None
+
+                if not warehouse_id:
+                    summary["errors"].append({
+                        "order_id": order_id,
+                        "ml_item_id": ml_item_id,
+                        "error": f"Depósito não encontrado (internal_product_id={internal_product_id})"
+                    })
+                    continue
+
+                if is_fulfillment:
+                    key = ("item", warehouse_id, ml_item_id)
+                    new_row = {"internal_product_id": internal_product_id, "ml_item_id": ml_item_id}
+                elif not internal_product_id:
+                    key = ("item_only", warehouse_id, ml_item_id)
+                    new_row = {"internal_product_id": None, "ml_item_id": ml_item_id}
+                else:
+                    key = ("shared", warehouse_id, internal_product_id)
+                    new_row = {"internal_product_id": internal_product_id, "ml_item_id": None}
+
+                if key not in by_key:
+                    missing_stocks.setdefault(key, {
+                        "company_id": company_id,
+                        "warehouse_id": warehouse_id,
+                        "quantity": Decimal("0"),
+                        "reserved_quantity": Decimal("0"),
+                        **new_row
+                    })
+                resolved.append((order_id, ml_item_id, quantity, key, is_fulfillment, internal_product_id))
+
+            # Estoques que ainda não existem: criados em um único INSERT
+            if missing_stocks:
+                table = ProductStock.__table__
+                inserted = self.db.execute(
+                    insert(table)
+                    .values(list(missing_stocks.values()))
+                    .returning(table.c.id, table.c.warehouse_id, table.c.internal_product_id, table.c.ml_item_id)
+                ).all()
+                for row in inserted:
+                    if row.ml_item_id is None:
+                        key = ("shared", row.warehouse_id, row.internal_product_id)
+                    elif ("item", row.warehouse_id, row.ml_item_id) in missing_stocks:
+                        key = ("item", row.warehouse_id, row.ml_item_id)
+                    else:
+                        key = ("item_only", row.warehouse_id, row.ml_item_id)
+                    stock = {
+                        "id": row.id,
+                        "warehouse_id": row.warehouse_id,
+                        "internal_product_id": row.internal_product_id,
+                        "ml_item_id": row.ml_item_id,
+                        "quantity": Decimal("0"),
+                        "reserved_quantity": Decimal("0"),
+                        "delta": Decimal("0")
+                    }
+                    stocks[row.id] = stock
+                    by_key[key] = stock
+
+            # Aplicar as vendas em memória, na ordem, montando as movimentações
+            movements = []
+            orders_with_movement = set()
+            for order_id, ml_item_id, quantity, key, is_fulfillment, internal_product_id in resolved:
+                stock = by_key[key]
+                previous = stock["quantity"] + stock["delta"]
+                amount = Decimal(quantity)
+
+                if is_fulfillment:
+                    new = max(Decimal("0"), previous - amount)
+                elif not internal_product_id:
+                    # Sem produto interno: apenas histórico, não gerencia quantidade
+                    new = previous
+                elif previous - amount < 0:
+                    new = previous
+                    summary["stock_failed"] += 1
+                    summary["errors"].append({
+                        "order_id": order_id,
+                        "ml_item_id": ml_item_id,
+                        "error": "Estoque insuficiente - movimentação registrada sem baixa"
+                    })
+                else:
+                    new = previous - amount
+
+                if new != previous:
+                    stock["delta"] += new - previous
+                    summary["stock_decreased"] += 1
+
+                order = orders[order_id]
+                order_dt = order.date_created.strftime("%d/%m/%Y %H:%M") if order.date_created else ""
+                notes = f"Pedido {order.ml_order_id} - {order_dt} - {sales_channel} - {quantity} unidade(s)"
+                if is_fulfillment:
+                    notes += " (Fulfillment - estoque gerenciado pelo ML)"
+
+                movements.append({
+                    "company_id": company_id,
+                    "warehouse_id": stock["warehouse_id"],
+                    "product_stock_id": stock["id"],
+                    "movement_type": StockMovementType.SALE,
+                    "quantity": -amount,
+                    "previous_quantity": previous,
+                    "new_quantity": new,
+                    "reference_type": "order",
+                    "reference_id": order_id,
+                    "ml_order_id": order_id,
+                    "notes": notes
+                })
+                orders_with_movement.add(order_id)
+
+            # Baixas: UPDATE ... FROM (VALUES ...) com o delta acumulado de cada estoque
+            changed = [stock for stock in stocks.values() if stock["delta"] != 0]
+            now = datetime.utcnow()
+            for chunk in _chunks(changed, BULK_CHUNK_SIZE):
+                params = {"company_id": company_id, "now": now}
+                values = []
+                for idx, stock in enumerate(chunk):
+                    params[f"id_{idx}"] = stock["id"]
+                    params[f"delta_{idx}"] = stock["delta"]
+                    values.append(f"(CAST(:id_{idx} AS INTEGER), CAST(:delta_{idx} AS NUMERIC))")
+                self.db.execute(text(f"""
+                    UPDATE product_stocks AS ps
+                    SET quantity = ps.quantity + v.delta,
+                        last_movement_date = :now,
+                        updated_at = now()
+                    FROM (VALUES {", ".join(values)}) AS v(id, delta)
+                    WHERE ps.id = v.id AND ps.company_id = :company_id
+                """), params)
+
+            for chunk in _chunks(movements, BULK_CHUNK_SIZE):
+                self.db.execute(insert(StockMovement), chunk)
+
+            summary["movements_created"] = len(movements)
+            summary["orders_processed"] = len(orders_with_movement)
+            summary["ml_sync_targets"] = [
+                {
+                    "internal_product_id": stock["internal_product_id"],
+                    "warehouse_id": stock["warehouse_id"],
+                    "available_quantity": float(stock["quantity"] + stock["delta"] - stock["reserved_quantity"])
+                }
+                for stock in changed
+                if stock["internal_product_id"] and stock["ml_item_id"] is None
+            ]
+
+            return self._finish_bulk_sale_sync(company_id, summary, commit)
+
+        except Exception as e:
+            if commit:
+                self.db.rollback()
+            logger.error(f"❌ Erro na baixa em lote de vendas: {str(e)}", exc_info=True)
+            global_logger.log_event(
+                event_type="stock_sync/error",
+                data={"action": "bulk_sync_failed", "sales_count": len(sales), "error": str(e)},
+                company_id=company_id,
+                success=False,
+                error_message=str(e)
+            )
+            return {
+                "success": False,
+                "error": f"Erro na baixa em lote de vendas: {str(e)}"
+            }
+
+    def _finish_bulk_sale_sync(self, company_id: int, summary: Dict[str, Any], commit: bool) -> Dict[str, Any]:
+        """Commit opcional e um único evento de log para o lote"""
+        if commit:
+            self.db.commit()
+
+        logger.info(
+            f"📦 [ESTOQUE] Baixa em lote: {summary['orders_processed']} pedido(s), "
+            f"{summary['movements_created']} movimentação(ões), {summary['orders_skipped']} já sincronizado(s), "
+            f"{len(summary['errors'])} erro(s)"
+        )
+        global_logger.log_event(
+            event_type="stock_sync/bulk_completed",
+            data={
+                "action": "bulk_sales_synced",
+                **{k: v for k, v in summary.items() if k not in ("errors", "ml_sync_targets", "success")},
+                "errors": summary["errors"][:50]
+            },
+            company_id=company_id,
+            success=not summary["errors"],
+            error_message=f"{len(summary['errors'])} item(s) com erro" if summary["errors"] else None
+        )
+        return summary
+    
     def get_sales_by_period(
         self,
         company_id: int,
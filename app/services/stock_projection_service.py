@@ -12,6 +12,7 @@ from app.models.saas_models import (
     StockProjection, ProductStock, StockMovement, StockMovementType,
     InternalProduct, Warehouse
 )
+from app.utils.batch_loader import BatchLoader, query_budget
 
 logger = logging.getLogger(__name__)
 
@@ -471,13 +472,18 @@ class StockProjectionService:
             if warehouse_id:
                 query = query.filter(StockProjection.warehouse_id == warehouse_id)
             
-            projections = query.order_by(StockProjection.recommended_reorder_date).limit(limit).all()
+            with query_budget(self.db, 3, "stock_projection.reorder_recommendations"):
+                projections = query.order_by(StockProjection.recommended_reorder_date).limit(limit).all()
+                
+                # Produtos e depósitos de todas as projeções em uma query cada
+                loader = BatchLoader(self.db)
+                products = loader.load_many(InternalProduct.id, [proj.internal_product_id for proj in projections])
+                warehouses = loader.load_many(Warehouse.id, [proj.warehouse_id for proj in projections])
             
             recommendations = []
             for proj in projections:
-                product = self.db.query(InternalProduct).filter(
-                    InternalProduct.id == proj.internal_product_id
-                ).first()
+                product = products.get(proj.internal_product_id)
+                warehouse = warehouses.get(proj.warehouse_id)
                 
                 if product:
                     recommendations.append({
@@ -485,7 +491,7 @@ class StockProjectionService:
                         "product_name": product.name,
                         "product_sku": product.internal_sku,
                         "warehouse_id": proj.warehouse_id,
-                        "warehouse_name": proj.warehouse.name if proj.warehouse else None,
+                        "warehouse_name": warehouse.name if warehouse else None,
                         "current_stock": float(proj.current_stock),
                         "recommended_quantity": float(proj.recommended_quantity) if proj.recommended_quantity else 0,
                         "recommended_reorder_date": proj.recommended_reorder_date.isoformat() if proj.recommended_reorder_date else None,
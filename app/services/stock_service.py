@@ -3,7 +3,7 @@ Serviço para gerenciar estoque e depósitos
 """
 import logging
 import requests
-from typing import List, Optional, Dict, Any
+from typing import Callable, List, Optional, Dict, Any
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func
 from decimal import Decimal
@@ -1081,27 +1081,7 @@ class StockService:
             # Determinar se é anúncio Full (fulfillment)
             is_fulfillment = False
             if ml_product:
-                # Verificar no campo shipping (JSON)
-                if ml_product.shipping:
-                    import json
-                    if isinstance(ml_product.shipping, str):
-                        try:
-                            shipping_data = json.loads(ml_product.shipping)
-                        except:
-                            shipping_data = {}
-                    else:
-                        shipping_data = ml_product.shipping
-                    
-                    logistic_type = shipping_data.get("logistic_type")
-                    if logistic_type == "fulfillment":
-                        is_fulfillment = True
-                
-                # Verificar também nas tags
-                if not is_fulfillment and ml_product.tags:
-                    tags_list = ml_product.tags if isinstance(ml_product.tags, list) else []
-                    if any(tag in ["fulfillment", "meli_fulfillment", "FULL"] for tag in tags_list):
-                        is_fulfillment = True
-                
+                is_fulfillment = bool(ml_product.is_fulfillment)
                 logger.info(f"🔍 Anúncio {ml_item_id}: is_fulfillment={is_fulfillment}, warehouse_id={warehouse_id}")
             
             # Para anúncios Full: estoque individual por ml_item_id
@@ -1369,135 +1349,18 @@ class StockService:
         self,
         company_id: int,
         warehouse_id_fulfillment: Optional[int] = None,
-        warehouse_id_normal: Optional[int] = None
+        warehouse_id_normal: Optional[int] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
     ) -> Dict[str, Any]:
-        """Configura depósitos em massa para TODOS os anúncios da empresa"""
+        """Configura depósitos em massa para TODOS os anúncios da empresa (em lotes, ver WarehouseBulkConfigService)"""
         try:
-            from app.models.saas_models import SKUManagement, MLProduct
-            
-            # Buscar todos os SKUManagement ativos da empresa
-            sku_managements = self.db.query(SKUManagement).filter(
-                and_(
-                    SKUManagement.company_id == company_id,
-                    SKUManagement.status == "active",
-                    SKUManagement.platform_item_id.isnot(None)
-                )
-            ).all()
-            
-            if not sku_managements:
-                return {
-                    "success": True,
-                    "message": "Nenhum anúncio encontrado para configurar",
-                    "success_count": 0,
-                    "error_count": 0,
-                    "total_processed": 0
-                }
-            
-            # Coletar todos os ml_item_ids únicos
-            ml_item_ids = list(set([sm.platform_item_id for sm in sku_managements if sm.platform_item_id]))
-            
-            # Buscar todos os MLProducts da empresa
-            ml_products = self.db.query(MLProduct).filter(
-                and_(
-                    MLProduct.company_id == company_id,
-                    MLProduct.ml_item_id.in_(ml_item_ids)
-                )
-            ).all()
-            
-            # Criar um mapa de ml_item_id -> (internal_product_id, is_fulfillment)
-            announcements_map = {}
-            for ml_product in ml_products:
-                # Buscar o internal_product_id via SKUManagement
-                sku_mgmt = next((sm for sm in sku_managements if sm.platform_item_id == ml_product.ml_item_id), None)
-                if sku_mgmt and sku_mgmt.internal_product_id:
-                    # Determinar se é fulfillment
-                    is_fulfillment = False
-                    
-                    # Verificar no campo shipping (JSON)
-                    if ml_product.shipping:
-                        import json
-                        if isinstance(ml_product.shipping, str):
-                            try:
-                                shipping_data = json.loads(ml_product.shipping)
-                            except:
-                                shipping_data = {}
-                        else:
-                            shipping_data = ml_product.shipping
-                        
-                        logistic_type = shipping_data.get("logistic_type")
-                        if logistic_type == "fulfillment":
-                            is_fulfillment = True
-                    
-                    # Verificar também nas tags
-                    if not is_fulfillment and ml_product.tags:
-                        tags_list = ml_product.tags if isinstance(ml_product.tags, list) else []
-                        if any(tag in ["fulfillment", "meli_fulfillment", "FULL"] for tag in tags_list):
-                            is_fulfillment = True
-                    
-                    announcements_map[ml_product.ml_item_id] = {
-                        "internal_product_id": sku_mgmt.internal_product_id,
-                        "is_fulfillment": is_fulfillment
-                    }
-            
-            logger.info(f"📊 Total de anúncios mapeados: {len(announcements_map)}")
-            full_count = sum(1 for data in announcements_map.values() if data.get("is_fulfillment", False))
-            normal_count = len(announcements_map) - full_count
-            logger.info(f"📊 Anúncios Full: {full_count}, Anúncios normais: {normal_count}")
-            
-            success_count = 0
-            error_count = 0
-            errors = []
-            
-            # Processar anúncios Full
-            if warehouse_id_fulfillment:
-                full_announcements = [ml_id for ml_id, data in announcements_map.items() if data.get("is_fulfillment", False)]
-                logger.info(f"🔧 Configurando {len(full_announcements)} anúncios Full para warehouse {warehouse_id_fulfillment}")
-                
-                for ml_item_id in full_announcements:
-                    data = announcements_map[ml_item_id]
-                    result = self.configure_announcement_warehouse(
-                        company_id=company_id,
-                        internal_product_id=data["internal_product_id"],
-                        ml_item_id=ml_item_id,
-                        warehouse_id=warehouse_id_fulfillment
-                    )
-                    
-                    if result.get("success"):
-                        success_count += 1
-                    else:
-                        error_count += 1
-                        errors.append(f"Anúncio {ml_item_id}: {result.get('error', 'Erro desconhecido')}")
-            
-            # Processar anúncios não-Full
-            if warehouse_id_normal:
-                normal_announcements = [ml_id for ml_id, data in announcements_map.items() if not data.get("is_fulfillment", False)]
-                
-                for ml_item_id in normal_announcements:
-                    data = announcements_map[ml_item_id]
-                    result = self.configure_announcement_warehouse(
-                        company_id=company_id,
-                        internal_product_id=data["internal_product_id"],
-                        ml_item_id=ml_item_id,
-                        warehouse_id=warehouse_id_normal
-                    )
-                    
-                    if result.get("success"):
-                        success_count += 1
-                    else:
-                        error_count += 1
-                        errors.append(f"Anúncio {ml_item_id}: {result.get('error', 'Erro desconhecido')}")
-            
-            logger.info(f"✅ Configuração em massa (todos os anúncios) concluída: {success_count} sucesso(s), {error_count} erro(s)")
-            
-            return {
-                "success": True,
-                "message": f"Configuração em massa concluída: {success_count} anúncio(s) configurado(s) com sucesso",
-                "success_count": success_count,
-                "error_count": error_count,
-                "total_processed": success_count + error_count,
-                "errors": errors if errors else None
-            }
-            
+            from app.services.warehouse_bulk_config_service import WarehouseBulkConfigService
+            return WarehouseBulkConfigService(self.db).configure_all(
+                company_id=company_id,
+                warehouse_id_fulfillment=warehouse_id_fulfillment,
+                warehouse_id_normal=warehouse_id_normal,
+                progress_callback=progress_callback
+            )
         except Exception as e:
             self.db.rollback()
             logger.error(f"❌ Erro ao configurar depósitos em massa (todos os anúncios): {str(e)}")
@@ -1938,10 +1801,13 @@ class StockService:
             else:
                 logger.warning(f"⚠️ Anúncio MLB4295303609 NÃO encontrado na SKUManagement. ml_item_ids: {ml_item_ids}")
             
+            # Apenas anúncios normais (não-Full) e ativos: Full tem estoque gerenciado pelo ML
             ml_products = self.db.query(MLProduct).filter(
                 and_(
                     MLProduct.ml_item_id.in_(ml_item_ids),
-                    MLProduct.company_id == company_id
+                    MLProduct.company_id == company_id,
+                    MLProduct.is_fulfillment == False,
+                    MLProduct.status.notin_([MLProductStatus.CLOSED, MLProductStatus.PAUSED, MLProductStatus.INACTIVE])
                 )
             ).all()
             
@@ -1983,61 +1849,26 @@ class StockService:
                     }
             
             for ml_product in ml_products:
-                # Verificar status do produto - ignorar fechados, pausados e inativos
-                if ml_product.status in [MLProductStatus.CLOSED, MLProductStatus.PAUSED, MLProductStatus.INACTIVE]:
-                    logger.debug(f"⏭️ Anúncio {ml_product.ml_item_id} ignorado (status: {ml_product.status.value})")
-                    continue
-                
-                # Verificar se é Full (fulfillment)
-                is_fulfillment = False
-                
-                # Verificar no campo shipping
-                if ml_product.shipping:
-                    import json
-                    if isinstance(ml_product.shipping, str):
-                        try:
-                            shipping_data = json.loads(ml_product.shipping)
-                        except:
-                            shipping_data = {}
-                    else:
-                        shipping_data = ml_product.shipping
-                    
-                    logistic_type = shipping_data.get("logistic_type")
-                    if logistic_type == "fulfillment":
-                        is_fulfillment = True
-                
-                # Verificar também nas tags
-                if not is_fulfillment and ml_product.tags:
-                    tags_list = ml_product.tags if isinstance(ml_product.tags, list) else []
-                    if any(tag in ["fulfillment", "meli_fulfillment", "FULL"] for tag in tags_list):
-                        is_fulfillment = True
-                
-                # Adicionar apenas anúncios normais
-                if not is_fulfillment:
-                    # Se warehouse_id foi fornecido, só adicionar se há estoque compartilhado neste warehouse
-                    # (todos os anúncios normais compartilham o mesmo estoque, então se há estoque neste warehouse,
-                    # todos os anúncios normais que compartilham esse estoque devem ser sincronizados)
-                    if warehouse_id:
-                        if has_warehouse_stock:
-                            normal_announcements.append(ml_product)
-                            if ml_product.ml_item_id == "MLB4295303609":
-                                logger.info(f"✅ Anúncio MLB4295303609 será sincronizado (warehouse {warehouse_id})")
-                            else:
-                                logger.debug(f"✅ Anúncio {ml_product.ml_item_id} será sincronizado (warehouse {warehouse_id})")
+                # Se warehouse_id foi fornecido, só adicionar se há estoque compartilhado neste warehouse
+                # (todos os anúncios normais compartilham o mesmo estoque, então se há estoque neste warehouse,
+                # todos os anúncios normais que compartilham esse estoque devem ser sincronizados)
+                if warehouse_id:
+                    if has_warehouse_stock:
+                        normal_announcements.append(ml_product)
+                        if ml_product.ml_item_id == "MLB4295303609":
+                            logger.info(f"✅ Anúncio MLB4295303609 será sincronizado (warehouse {warehouse_id})")
                         else:
-                            if ml_product.ml_item_id == "MLB4295303609":
-                                logger.warning(f"⚠️ Anúncio MLB4295303609 ignorado (sem estoque no warehouse {warehouse_id})")
-                            else:
-                                logger.debug(f"⏭️ Anúncio {ml_product.ml_item_id} ignorado (sem estoque no warehouse {warehouse_id})")
+                            logger.debug(f"✅ Anúncio {ml_product.ml_item_id} será sincronizado (warehouse {warehouse_id})")
                     else:
-                        # Se warehouse_id não foi fornecido, sincronizar todos os anúncios normais
-                        normal_announcements.append(ml_product)
                         if ml_product.ml_item_id == "MLB4295303609":
-                            logger.info(f"✅ Anúncio MLB4295303609 será sincronizado (sem filtro de warehouse)")
+                            logger.warning(f"⚠️ Anúncio MLB4295303609 ignorado (sem estoque no warehouse {warehouse_id})")
+                        else:
+                            logger.debug(f"⏭️ Anúncio {ml_product.ml_item_id} ignorado (sem estoque no warehouse {warehouse_id})")
                 else:
-                    # Log para anúncios Full que são ignorados
+                    # Se warehouse_id não foi fornecido, sincronizar todos os anúncios normais
+                    normal_announcements.append(ml_product)
                     if ml_product.ml_item_id == "MLB4295303609":
-                        logger.info(f"ℹ️ Anúncio MLB4295303609 é Full (fulfillment) e será ignorado na sincronização")
+                        logger.info(f"✅ Anúncio MLB4295303609 será sincronizado (sem filtro de warehouse)")
             
             if not normal_announcements:
                 logger.info(f"ℹ️ Nenhum anúncio normal encontrado para produto interno {internal_product_id} (apenas Full)")
@@ -9,6 +9,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_, desc, func
 from app.models.saas_models import SupportTicket, SupportTicketStatus, SupportTicketMessage, SupportTicketAttachment, User
 from app.config.settings import settings
+from app.services.manual_index_service import get_manual_index
 
 logger = logging.getLogger(__name__)
 
@@ -19,45 +20,17 @@ class SupportService:
     def __init__(self, db: Session):
         self.db = db
         self.manuals_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "Manuais")
+        self.manual_index = get_manual_index(self.manuals_path)
     
     def list_manuals(self) -> List[Dict[str, Any]]:
         """Lista todos os manuais disponíveis"""
         try:
-            manuals = []
-            
             if not os.path.exists(self.manuals_path):
                 logger.warning(f"⚠️ Diretório de manuais não encontrado: {self.manuals_path}")
-                return manuals
-            
-            # Listar arquivos .md no diretório Manuais
-            for filename in os.listdir(self.manuals_path):
-                if filename.endswith('.md') and not filename.startswith('.'):
-                    # Excluir o índice geral do sistema CELX
-                    if filename == '00_INDICE_GERAL.md':
-                        continue
-                    
-                    filepath = os.path.join(self.manuals_path, filename)
-                    if os.path.isfile(filepath):
-                        # Ler título do arquivo (primeira linha após #)
-                        title = filename.replace('.md', '').replace('_', ' ').title()
-                        try:
-                            with open(filepath, 'r', encoding='utf-8') as f:
-                                first_line = f.readline().strip()
-                                if first_line.startswith('#'):
-                                    title = first_line.replace('#', '').strip()
-                        except Exception as e:
-                            logger.warning(f"Erro ao ler título do manual {filename}: {e}")
-                        
-                        manuals.append({
-                            "filename": filename,
-                            "title": title,
-                            "path": filepath
-                        })
-            
-            # Ordenar por nome do arquivo
-            manuals.sort(key=lambda x: x['filename'])
-            
-            return manuals
+                return []
+            
+            # Excluir o índice geral do sistema CELX
+            return self.manual_index.list_manuals(exclude=('00_INDICE_GERAL.md',))
         except Exception as e:
             logger.error(f"Erro ao listar manuais: {e}", exc_info=True)
             return []
@@ -65,88 +38,19 @@ class SupportService:
     def get_manual_content(self, filename: str) -> Optional[Dict[str, Any]]:
         """Obtém o conteúdo de um manual específico"""
         try:
-            filepath = os.path.join(self.manuals_path, filename)
-            
-            if not os.path.exists(filepath) or not filename.endswith('.md'):
+            if not filename.endswith('.md'):
                 return None
-            
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Extrair título
-            title = filename.replace('.md', '').replace('_', ' ').title()
-            lines = content.split('\n')
-            for line in lines[:5]:
-                if line.strip().startswith('#'):
-                    title = line.replace('#', '').strip()
-                    break
-            
-            return {
-                "filename": filename,
-                "title": title,
-                "content": content
-            }
+            return self.manual_index.get(filename)
         except Exception as e:
             logger.error(f"Erro ao ler manual {filename}: {e}", exc_info=True)
             return None
     
-    def search_manuals(self, query: str) -> List[Dict[str, Any]]:
-        """Busca nos manuais por termo"""
+    def search_manuals(self, query: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Busca nos manuais por termo (índice invertido, mais relevantes primeiro)"""
         try:
-            results = []
-            query_lower = query.lower()
-            
             if not os.path.exists(self.manuals_path):
-                return results
-            
-            for filename in os.listdir(self.manuals_path):
-                if filename.endswith('.md') and not filename.startswith('.'):
-                    filepath = os.path.join(self.manuals_path, filename)
-                    if os.path.isfile(filepath):
-                        try:
-                            with open(filepath, 'r', encoding='utf-8') as f:
-                                content = f.read()
-                                content_lower = content.lower()
-                                
-                                # Verificar se o termo está no conteúdo
-                                if query_lower in content_lower:
-                                    # Extrair título
-                                    title = filename.replace('.md', '').replace('_', ' ').title()
-                                    lines = content.split('\n')
-                                    for line in lines[:5]:
-                                        if line.strip().startswith('#'):
-                                            title = line.replace('#', '').strip()
-                                            break
-                                    
-                                    # Encontrar contexto (linha onde aparece)
-                                    lines_list = content.split('\n')
-                                    matches = []
-                                    for i, line in enumerate(lines_list):
-                                        if query_lower in line.lower():
-                                            # Pegar contexto (linha anterior e posterior)
-                                            context_start = max(0, i - 1)
-                                            context_end = min(len(lines_list), i + 2)
-                                            context = '\n'.join(lines_list[context_start:context_end])
-                                            matches.append({
-                                                "line": i + 1,
-                                                "context": context
-                                            })
-                                            if len(matches) >= 3:  # Limitar a 3 matches por arquivo
-                                                break
-                                    
-                                    results.append({
-                                        "filename": filename,
-                                        "title": title,
-                                        "matches": matches,
-                                        "match_count": len(matches)
-                                    })
-                        except Exception as e:
-                            logger.warning(f"Erro ao buscar no manual {filename}: {e}")
-            
-            # Ordenar por número de matches (mais relevantes primeiro)
-            results.sort(key=lambda x: x['match_count'], reverse=True)
-            
-            return results
+                return []
+            return self.manual_index.search(query, limit=limit)
         except Exception as e:
             logger.error(f"Erro ao buscar manuais: {e}", exc_info=True)
             return []
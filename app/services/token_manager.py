@@ -1,10 +1,17 @@
 """
 Token Manager - Classe centralizada para gerenciamento de tokens do Mercado Livre
+
+Mantém em memória (por processo) o mapa conta ML → (access_token, expires_at,
+seller_id) e a identidade de cada token já conhecido, para que os serviços não
+consultem /users/me nem o banco a cada chamada. Renovações são feitas antes do
+vencimento e serializadas por conta (single-flight), evitando que webhooks
+simultâneos disparem vários POST /oauth/token para a mesma conta.
 """
 import requests
 import logging
+import threading
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 
@@ -12,6 +19,110 @@ from app.models.saas_models import Token, MLAccount, MLAccountStatus
 
 logger = logging.getLogger(__name__)
 
+# Tokens que vencem dentro desta margem são renovados antes do uso
+TOKEN_REFRESH_MARGIN = timedelta(minutes=10)
+# Validade da identidade de um token quando o vencimento não é conhecido
+TOKEN_IDENTITY_TTL = timedelta(minutes=30)
+# Intervalo para reconferir se o token em cache ainda é o registro ativo da conta
+# (gravações feitas por outro processo, ex.: reconexão OAuth em outro worker)
+TOKEN_CACHE_RECHECK = timedelta(seconds=60)
+
+# access_token -> (seller_id, expires_at)
+_token_identities: Dict[str, Tuple[str, datetime]] = {}
+# ml_account_id -> {"access_token", "expires_at", "seller_id", "company_id", "token_id", "checked_at"}
+_account_tokens: Dict[int, Dict[str, Any]] = {}
+_cache_lock = threading.Lock()
+_refresh_locks: Dict[int, threading.RLock] = {}
+
+
+def _remember_token(access_token: str, seller_id: Optional[str], expires_at: Optional[datetime] = None) -> None:
+    if not access_token or not seller_id:
+        return
+    with _cache_lock:
+        _token_identities[access_token] = (str(seller_id), expires_at or datetime.utcnow() + TOKEN_IDENTITY_TTL)
+
+
+def _known_token_owner(access_token: str) -> Optional[str]:
+    """seller_id de um token já conhecido e ainda dentro da validade"""
+    with _cache_lock:
+        entry = _token_identities.get(access_token)
+        if not entry:
+            return None
+        seller_id, expires_at = entry
+        if expires_at <= datetime.utcnow():
+            _token_identities.pop(access_token, None)
+            return None
+        return seller_id
+
+
+def _cached_account_token(ml_account_id: int, company_id: Optional[int]) -> Optional[Dict[str, Any]]:
+    with _cache_lock:
+        entry = _account_tokens.get(ml_account_id)
+        if not entry:
+            return None
+        if company_id is not None and entry["company_id"] != company_id:
+            return None
+        if entry["expires_at"] - TOKEN_REFRESH_MARGIN <= datetime.utcnow():
+            return None
+        return dict(entry)
+
+
+def _account_refresh_lock(ml_account_id: int) -> threading.RLock:
+    with _cache_lock:
+        return _refresh_locks.setdefault(ml_account_id, threading.RLock())
+
+
+def _needs_refresh(expires_at: Optional[datetime]) -> bool:
+    return expires_at is not None and expires_at - TOKEN_REFRESH_MARGIN <= datetime.utcnow()
+
+
+def invalidate_account_token(ml_account_id: int) -> None:
+    """Descarta o token em cache da conta (ex.: após um 401 da API ou reconexão)"""
+    with _cache_lock:
+        entry = _account_tokens.pop(ml_account_id, None)
+        if entry:
+            _token_identities.pop(entry["access_token"], None)
+
+
+def invalidate_access_token(access_token: str) -> None:
+    """Descarta do cache um token recusado pela API (401), qualquer que seja a conta"""
+    if not access_token:
+        return
+    with _cache_lock:
+        _token_identities.pop(access_token, None)
+        for ml_account_id in [k for k, v in _account_tokens.items() if v["access_token"] == access_token]:
+            _account_tokens.pop(ml_account_id, None)
+
+
+def resolve_token_owner(access_token: str) -> Optional[str]:
+    """
+    Retorna o seller_id (user_id do ML) dono do token.
+
+    Tokens conhecidos são resolvidos pelo cache; apenas tokens nunca vistos
+    consultam /users/me, uma única vez.
+    """
+    if not access_token:
+        return None
+    owner_id = _known_token_owner(access_token)
+    if owner_id:
+        return owner_id
+    try:
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json",
+        }
+        response = requests.get("https://api.mercadolibre.com/users/me", headers=headers, timeout=10)
+        if response.status_code == 200:
+            user_data = response.json()
+            owner_id = str(user_data.get("id")) if user_data.get("id") else None
+            _remember_token(access_token, owner_id)
+            return owner_id
+        return None
+    except Exception as e:
+        logger.error(f"Erro ao obter owner do token: {e}")
+        return None
+
+
 class TokenManager:
     """Gerenciador centralizado de tokens do Mercado Livre"""
     
@@ -174,6 +285,8 @@ class TokenManager:
             
             self.db.add(new_token)
             self.db.commit()
+            _remember_token(new_token.access_token, token_data.get("user_id"), new_token.expires_at)
+            invalidate_account_token(ml_account_id)
             
             logger.info(f"Novo token salvo para user_id: {user_id} (tokens antigos deletados)")
             return token_data["access_token"]
@@ -213,6 +326,9 @@ class TokenManager:
             self.db.add(new_token)
             self.db.commit()
             self.db.refresh(new_token)
+            # A resposta do /oauth/token já informa o dono do token
+            _remember_token(new_token.access_token, token_data.get("user_id"), new_token.expires_at)
+            invalidate_account_token(ml_account_id)
             logger.info(f"Novo token salvo para user_id: {user_id} (via refresh)")
             return new_token
 
@@ -222,7 +338,31 @@ class TokenManager:
             return None
 
     def _refresh_token_for_record(self, token_record: Token) -> Optional[Token]:
-        """Renova token a partir de um registro existente"""
+        """
+        Renova token a partir de um registro existente.
+
+        Apenas uma renovação por conta roda por vez; quem espera o lock reaproveita
+        o token que a renovação concorrente acabou de gravar.
+        """
+        ml_account_id = token_record.ml_account_id
+        with _account_refresh_lock(ml_account_id):
+            fresh = (
+                self.db.query(Token)
+                .filter(
+                    Token.ml_account_id == ml_account_id,
+                    Token.is_active == True,
+                    Token.id != token_record.id,
+                    Token.expires_at > datetime.utcnow() + TOKEN_REFRESH_MARGIN,
+                )
+                .order_by(Token.expires_at.desc())
+                .first()
+            )
+            if fresh and fresh.access_token:
+                logger.info("Token já renovado por outra requisição para ml_account_id=%s", ml_account_id)
+                return fresh
+            return self._refresh_token_record_unlocked(token_record)
+
+    def _refresh_token_record_unlocked(self, token_record: Token) -> Optional[Token]:
         refresh_token = token_record.refresh_token
         if not refresh_token:
             logger.warning(
@@ -245,21 +385,81 @@ class TokenManager:
         return self._save_new_token_record(token_record, token_data)
 
     def _get_token_owner_user_id(self, access_token: str) -> Optional[str]:
-        """Retorna o user_id associado ao access_token consultando /users/me."""
-        try:
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json",
+        """Retorna o user_id associado ao access_token (cache; /users/me só para tokens novos)."""
+        return resolve_token_owner(access_token)
+
+    def get_account_credentials(
+        self,
+        ml_account_id: int,
+        company_id: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Retorna {"access_token", "expires_at", "seller_id", "company_id"} da conta ML.
+
+        Servido da memória enquanto o token estiver fora da margem de renovação;
+        caso contrário resolve (e renova, se preciso) uma única vez por conta.
+        """
+        cached = self._checked_cache_entry(ml_account_id, company_id)
+        if cached:
+            return cached
+
+        with _account_refresh_lock(ml_account_id):
+            # Outra requisição pode ter resolvido enquanto esperávamos o lock
+            cached = self._checked_cache_entry(ml_account_id, company_id)
+            if cached:
+                return cached
+
+            account = self.db.query(MLAccount).filter(MLAccount.id == ml_account_id).first()
+            if not account or (company_id is not None and account.company_id != company_id):
+                logger.warning("Conta ML %s não encontrada ao buscar token (company=%s)", ml_account_id, company_id)
+                return None
+
+            expected_seller_id = str(account.ml_user_id) if account.ml_user_id else None
+            token_record = self.get_token_record_for_account(
+                ml_account_id, account.company_id, expected_ml_user_id=expected_seller_id
+            )
+            if not token_record or not token_record.access_token:
+                return None
+
+            entry = {
+                "access_token": token_record.access_token,
+                "expires_at": token_record.expires_at or datetime.utcnow() + TOKEN_IDENTITY_TTL,
+                "seller_id": _known_token_owner(token_record.access_token) or expected_seller_id,
+                "company_id": account.company_id,
+                "token_id": token_record.id,
+                "checked_at": datetime.utcnow(),
             }
-            response = requests.get("https://api.mercadolibre.com/users/me", headers=headers, timeout=10)
-            if response.status_code == 200:
-                user_data = response.json()
-                return str(user_data.get("id")) if user_data.get("id") else None
-            return None
-        except Exception as e:
-            logger.error(f"Erro ao obter owner do token: {e}")
+            with _cache_lock:
+                _account_tokens[ml_account_id] = entry
+            return dict(entry)
+
+    def _checked_cache_entry(self, ml_account_id: int, company_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Entrada do cache, reconferida contra o registro ativo a cada TOKEN_CACHE_RECHECK"""
+        cached = _cached_account_token(ml_account_id, company_id)
+        if not cached or cached["checked_at"] + TOKEN_CACHE_RECHECK > datetime.utcnow():
+            return cached
+
+        still_active = self.db.query(Token.id).filter(
+            Token.id == cached["token_id"],
+            Token.is_active == True
+        ).scalar()
+        if not still_active:
+            invalidate_account_token(ml_account_id)
             return None
 
+        now = datetime.utcnow()
+        with _cache_lock:
+            entry = _account_tokens.get(ml_account_id)
+            if entry and entry["token_id"] == cached["token_id"]:
+                entry["checked_at"] = now
+        cached["checked_at"] = now
+        return cached
+
+    def get_access_token_for_account(self, ml_account_id: int, company_id: Optional[int] = None) -> Optional[str]:
+        """Access token válido da conta ML (cache em memória + renovação automática)"""
+        credentials = self.get_account_credentials(ml_account_id, company_id)
+        return credentials["access_token"] if credentials else None
+
     def get_token_record_for_account(
         self,
         ml_account_id: int,
@@ -348,6 +548,12 @@ class TokenManager:
                 if not record.access_token:
                     continue
 
+                if _needs_refresh(record.expires_at) and record.refresh_token:
+                    # Renovar antes do vencimento em vez de descobrir pelo 401
+                    refreshed = self._refresh_token_for_record(record)
+                    if refreshed and refreshed.access_token:
+                        record = refreshed
+
                 owner_id = self._get_token_owner_user_id(record.access_token)
 
                 if owner_id is None:
@@ -439,19 +645,8 @@ class TokenManager:
             return None
     
     def test_token(self, token: str) -> bool:
-        """Testa se o token está funcionando"""
-        try:
-            headers = {
-                'Authorization': f'Bearer {token}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.get('https://api.mercadolibre.com/users/me', headers=headers, timeout=10)
-            return response.status_code == 200
-            
-        except Exception as e:
-            logger.error(f"Erro ao testar token: {e}")
-            return False
+        """Testa se o token está funcionando (tokens já conhecidos não vão à API)"""
+        return resolve_token_owner(token) is not None
     
     def test_token_permissions(self, token: str, user_id: str) -> Dict[str, bool]:
         """Testa se o token tem permissões específicas necessárias"""
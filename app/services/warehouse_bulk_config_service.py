@@ -0,0 +1,311 @@
+"""
+Configuração de depósitos em massa para todos os anúncios da empresa
+
+- Anúncios, vínculos de SKU e produtos internos são resolvidos em uma única
+  query (join em SQL), indexada em dicionário por ml_item_id
+- Estoques existentes da empresa são carregados uma vez (projeção) e indexados
+  por (produto interno, anúncio) para Full e por produto interno para normais
+- As alterações são aplicadas em lotes: INSERT em massa dos estoques novos,
+  UPDATE em massa por id e INSERT em massa das movimentações de importação,
+  com commit por lote (sem uma transação longa para a empresa inteira)
+- O progresso é registrado a cada lote e pode ser acompanhado por callback
+"""
+import logging
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, insert, or_, update
+from sqlalchemy.orm import Session
+
+from app.models.saas_models import (
+    InternalProduct, MLProduct, ProductStock, SKUManagement, StockMovement, StockMovementType, Warehouse
+)
+
+logger = logging.getLogger(__name__)
+
+# Anúncios aplicados por transação
+BULK_CONFIG_CHUNK_SIZE = 500
+
+
+class WarehouseBulkConfigService:
+    """Aplica o depósito de Full / normais a todos os anúncios vinculados da empresa"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def configure_all(
+        self,
+        company_id: int,
+        warehouse_id_fulfillment: Optional[int] = None,
+        warehouse_id_normal: Optional[int] = None,
+        progress_callback: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Configura os depósitos de todos os anúncios vinculados a produtos internos.
+
+        Mantém as regras de configure_announcement_warehouse:
+        - Full: estoque individual por anúncio; normais: estoque compartilhado do produto
+        - estoque com saldo em outro depósito é transferido para o depósito escolhido
+        - estoque vazio importa a quantidade disponível do anúncio no ML
+
+        Args:
+            progress_callback: chamado com (anúncios processados, total) após cada lote
+        """
+        started_at = time.monotonic()
+
+        for warehouse_id in (warehouse_id_fulfillment, warehouse_id_normal):
+            if warehouse_id and not self._warehouse_accessible(company_id, warehouse_id):
+                return {
+                    "success": False,
+                    "error": f"Depósito {warehouse_id} não encontrado ou sem permissão"
+                }
+
+        announcements = self._load_announcements(company_id)
+        if not announcements:
+            return {
+                "success": True,
+                "message": "Nenhum anúncio encontrado para configurar",
+                "success_count": 0,
+                "error_count": 0,
+                "total_processed": 0
+            }
+
+        full_count = sum(1 for ann in announcements.values() if ann["is_fulfillment"])
+        normal_count = len(announcements) - full_count
+        logger.info(f"📊 Total de anúncios mapeados: {len(announcements)} (Full: {full_count}, normais: {normal_count})")
+
+        units = self._build_units(announcements, warehouse_id_fulfillment, warehouse_id_normal)
+        total = sum(len(unit["ml_item_ids"]) for unit in units)
+        stocks = self._load_stocks(company_id)
+
+        success_count = 0
+        error_count = 0
+        errors: List[str] = []
+        processed = 0
+
+        for start in range(0, len(units), BULK_CONFIG_CHUNK_SIZE):
+            chunk = units[start:start + BULK_CONFIG_CHUNK_SIZE]
+            chunk_size = sum(len(unit["ml_item_ids"]) for unit in chunk)
+            try:
+                self._apply_chunk(company_id, chunk, stocks)
+                self.db.commit()
+                success_count += chunk_size
+            except Exception as e:
+                self.db.rollback()
+                # Estoques do lote podem ter ficado com valores não gravados: recarrega o índice
+                stocks = self._load_stocks(company_id)
+                error_count += chunk_size
+                errors.append(f"Lote de {chunk_size} anúncio(s) ({', '.join(chunk[0]['ml_item_ids'][:3])}...): {e}")
+                logger.error(f"❌ Erro ao aplicar lote da configuração em massa: {e}", exc_info=True)
+
+            processed += chunk_size
+            logger.info(f"🔧 Configuração de depósitos: {processed}/{total} anúncio(s)")
+            if progress_callback:
+                try:
+                    progress_callback(processed, total)
+                except Exception as e:
+                    logger.warning(f"⚠️ Erro no callback de progresso: {e}")
+
+        elapsed = round(time.monotonic() - started_at, 2)
+        logger.info(
+            f"✅ Configuração em massa (todos os anúncios) concluída em {elapsed}s: "
+            f"{success_count} sucesso(s), {error_count} erro(s)"
+        )
+        return {
+            "success": True,
+            "message": f"Configuração em massa concluída: {success_count} anúncio(s) configurado(s) com sucesso",
+            "success_count": success_count,
+            "error_count": error_count,
+            "total_processed": success_count + error_count,
+            "full_count": full_count,
+            "normal_count": normal_count,
+            "elapsed_seconds": elapsed,
+            "errors": errors if errors else None
+        }
+
+    def _warehouse_accessible(self, company_id: int, warehouse_id: int) -> bool:
+        return self.db.query(Warehouse.id).filter(
+            Warehouse.id == warehouse_id,
+            or_(Warehouse.company_id == company_id, Warehouse.is_shared == True),
+            Warehouse.status == "active"
+        ).first() is not None
+
+    def _load_announcements(self, company_id: int) -> Dict[str, Dict]:
+        """ml_item_id -> produto interno, quantidade no ML e se é Full (um join, primeiro vínculo vence)"""
+        rows = self.db.query(
+            SKUManagement.platform_item_id,
+            SKUManagement.internal_product_id,
+            MLProduct.available_quantity,
+            MLProduct.is_fulfillment
+        ).join(
+            MLProduct,
+            and_(MLProduct.ml_item_id == SKUManagement.platform_item_id, MLProduct.company_id == company_id)
+        ).join(
+            InternalProduct,
+            and_(InternalProduct.id == SKUManagement.internal_product_id, InternalProduct.company_id == company_id)
+        ).filter(
+            SKUManagement.company_id == company_id,
+            SKUManagement.status == "active",
+            SKUManagement.platform_item_id.isnot(None)
+        ).order_by(SKUManagement.id).all()
+
+        announcements: Dict[str, Dict] = {}
+        for row in rows:
+            if row.platform_item_id in announcements:
+                continue
+            announcements[row.platform_item_id] = {
+                "internal_product_id": row.internal_product_id,
+                "available_quantity": Decimal(str(row.available_quantity or 0)),
+                "is_fulfillment": bool(row.is_fulfillment)
+            }
+        return announcements
+
+    @staticmethod
+    def _build_units(announcements: Dict[str, Dict], warehouse_id_fulfillment: Optional[int],
+                     warehouse_id_normal: Optional[int]) -> List[Dict]:
+        """
+        Unidades de trabalho: cada anúncio Full é uma; os normais de um mesmo produto
+        interno formam uma só, pois compartilham o estoque
+        """
+        units: List[Dict] = []
+        shared: Dict[int, Dict] = {}
+        for ml_item_id, ann in announcements.items():
+            if ann["is_fulfillment"]:
+                if warehouse_id_fulfillment:
+                    units.append({
+                        "key": (ann["internal_product_id"], ml_item_id),
+                        "internal_product_id": ann["internal_product_id"],
+                        "ml_item_id": ml_item_id,
+                        "ml_item_ids": [ml_item_id],
+                        "warehouse_id": warehouse_id_fulfillment,
+                        "available_quantity": ann["available_quantity"]
+                    })
+            elif warehouse_id_normal:
+                unit = shared.get(ann["internal_product_id"])
+                if unit is None:
+                    unit = {
+                        "key": (ann["internal_product_id"], None),
+                        "internal_product_id": ann["internal_product_id"],
+                        "ml_item_id": None,
+                        "ml_item_ids": [],
+                        "warehouse_id": warehouse_id_normal,
+                        "available_quantity": Decimal("0")
+                    }
+                    shared[ann["internal_product_id"]] = unit
+                    units.append(unit)
+                unit["ml_item_ids"].append(ml_item_id)
+                # Estoque vazio importa a quantidade do primeiro anúncio com saldo
+                if unit["available_quantity"] == 0 and ann["available_quantity"] > 0:
+                    unit["available_quantity"] = ann["available_quantity"]
+                    unit["source_ml_item_id"] = ml_item_id
+        return units
+
+    def _load_stocks(self, company_id: int) -> Dict[tuple, List[Dict]]:
+        """(produto interno, ml_item_id ou None) -> estoques (por id), como dicionários"""
+        rows = self.db.query(
+            ProductStock.id,
+            ProductStock.warehouse_id,
+            ProductStock.internal_product_id,
+            ProductStock.ml_item_id,
+            ProductStock.quantity,
+            ProductStock.reserved_quantity,
+            ProductStock.last_movement_date
+        ).filter(
+            ProductStock.company_id == company_id,
+            ProductStock.internal_product_id.isnot(None)
+        ).order_by(ProductStock.id).all()
+
+        stocks: Dict[tuple, List[Dict]] = {}
+        for row in rows:
+            stocks.setdefault((row.internal_product_id, row.ml_item_id), []).append({
+                "id": row.id,
+                "warehouse_id": row.warehouse_id,
+                "quantity": row.quantity or Decimal("0"),
+                "reserved_quantity": row.reserved_quantity or Decimal("0"),
+                "last_movement_date": row.last_movement_date
+            })
+        return stocks
+
+    def _apply_chunk(self, company_id: int, units: List[Dict], stocks: Dict[tuple, List[Dict]]):
+        """Calcula as alterações do lote em memória e grava com INSERT/UPDATE em massa"""
+        now = datetime.utcnow()
+        new_stocks: List[Dict] = []
+        changed: Dict[int, Dict] = {}
+        imports: List[tuple] = []  # (estoque, quantidade anterior, unidade)
+
+        for unit in units:
+            candidates = stocks.setdefault(unit["key"], [])
+            warehouse_id = unit["warehouse_id"]
+            target = next((s for s in candidates if s["warehouse_id"] == warehouse_id), None)
+            source = next((s for s in candidates if s["warehouse_id"] != warehouse_id and s["quantity"] > 0), None)
+
+            if target is None:
+                target = {
+                    "id": None,
+                    "warehouse_id": warehouse_id,
+                    "internal_product_id": unit["internal_product_id"],
+                    "ml_item_id": unit["ml_item_id"],
+                    "quantity": Decimal("0"),
+                    "reserved_quantity": Decimal("0"),
+                    "last_movement_date": None
+                }
+                candidates.append(target)
+                new_stocks.append(target)
+
+            if source is not None:
+                # Transfere o saldo do depósito anterior
+                target["quantity"] = source["quantity"]
+                target["reserved_quantity"] = source["reserved_quantity"]
+                source["quantity"] = Decimal("0")
+                source["reserved_quantity"] = Decimal("0")
+                changed[source["id"]] = source
+
+            if target["quantity"] == 0 and unit["available_quantity"] > 0:
+                imports.append((target, target["quantity"], unit))
+                target["quantity"] = unit["available_quantity"]
+                target["last_movement_date"] = now
+
+            if target["id"] is not None:
+                changed[target["id"]] = target
+
+        if new_stocks:
+            ids = self.db.execute(
+                insert(ProductStock).returning(ProductStock.id, sort_by_parameter_order=True),
+                [{
+                    "company_id": company_id,
+                    "warehouse_id": stock["warehouse_id"],
+                    "internal_product_id": stock["internal_product_id"],
+                    "ml_item_id": stock["ml_item_id"],
+                    "quantity": stock["quantity"],
+                    "reserved_quantity": stock["reserved_quantity"],
+                    "last_movement_date": stock["last_movement_date"]
+                } for stock in new_stocks]
+            ).scalars().all()
+            for stock, stock_id in zip(new_stocks, ids):
+                stock["id"] = stock_id
+
+        if changed:
+            self.db.execute(update(ProductStock), [{
+                "id": stock["id"],
+                "quantity": stock["quantity"],
+                "reserved_quantity": stock["reserved_quantity"],
+                "last_movement_date": stock["last_movement_date"],
+                "updated_at": now
+            } for stock in changed.values()])
+
+        if imports:
+            self.db.execute(insert(StockMovement), [{
+                "company_id": company_id,
+                "warehouse_id": stock["warehouse_id"],
+                "product_stock_id": stock["id"],
+                "movement_type": StockMovementType.IN,
+                "quantity": unit["available_quantity"],
+                "previous_quantity": previous,
+                "new_quantity": stock["quantity"],
+                "notes": (
+                    "Importação automática da quantidade do anúncio ML "
+                    f"({unit['ml_item_id'] or unit.get('source_ml_item_id')})"
+                )
+            } for stock, previous, unit in imports])
@@ -0,0 +1,167 @@
+"""
+Carregamento em lote (dataloader) e orçamento de queries por listagem
+
+- BatchLoader agrupa chaves em uma única query IN / COUNT agrupado por requisição
+- query_budget conta as queries executadas em um bloco e, em modo de teste
+  (QUERY_BUDGET_STRICT=true), falha quando a listagem excede o orçamento
+"""
+import contextvars
+import logging
+import os
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Tamanho máximo da lista de um IN (...) em uma única query
+IN_CHUNK_SIZE = 1000
+
+
+def _unique_keys(keys: Iterable[Any]) -> List[Any]:
+    """Remove duplicadas e None preservando a ordem"""
+    seen = set()
+    unique = []
+    for key in keys:
+        if key is None or key in seen:
+            continue
+        seen.add(key)
+        unique.append(key)
+    return unique
+
+
+def _chunks(items: List[Any], size: int = IN_CHUNK_SIZE) -> Iterator[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _cache_key(kind: str, key_column, criteria) -> Optional[tuple]:
+    """Chave de cache estável (SQL literal dos filtros); None desativa o cache"""
+    try:
+        compiled = tuple(
+            str(criterion.compile(compile_kwargs={"literal_binds": True}))
+            for criterion in criteria
+        )
+    except Exception:
+        return None
+    return (kind, str(key_column), compiled)
+
+
+class BatchLoader:
+    """
+    Dataloader por requisição: resolve várias chaves com uma query por lote.
+
+    Os resultados ficam em cache na instância, então chamadas repetidas com as
+    mesmas chaves (ex.: em loops de serialização) não voltam ao banco.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._cache: Dict[Any, Dict[Any, Any]] = {}
+
+    def load_many(self, key_column, keys: Iterable[Any], *criteria) -> Dict[Any, Any]:
+        """Retorna {chave: registro} buscando todas as chaves em um IN"""
+        entity = key_column.class_
+        cache_key = _cache_key("load", key_column, criteria)
+        cache = self._cache.setdefault(cache_key, {}) if cache_key else {}
+        missing = [key for key in _unique_keys(keys) if key not in cache]
+
+        for chunk in _chunks(missing):
+            rows = self.db.query(entity).filter(key_column.in_(chunk), *criteria).all()
+            for row in rows:
+                cache[getattr(row, key_column.key)] = row
+
+        return {key: cache[key] for key in _unique_keys(keys) if key in cache}
+
+    def group_many(self, key_column, keys: Iterable[Any], *criteria, order_by=None) -> Dict[Any, List[Any]]:
+        """Retorna {chave: [registros]} para relações 1:N em um único IN"""
+        entity = key_column.class_
+        cache_key = _cache_key("group", key_column, criteria + ((order_by,) if order_by is not None else ()))
+        cache = self._cache.setdefault(cache_key, {}) if cache_key else {}
+        missing = [key for key in _unique_keys(keys) if key not in cache]
+
+        for chunk in _chunks(missing):
+            query = self.db.query(entity).filter(key_column.in_(chunk), *criteria)
+            if order_by is not None:
+                query = query.order_by(order_by)
+            for key in chunk:
+                cache[key] = []
+            for row in query.all():
+                cache[getattr(row, key_column.key)].append(row)
+
+        return {key: cache.get(key, []) for key in _unique_keys(keys)}
+
+    def count_many(self, key_column, keys: Iterable[Any], *criteria) -> Dict[Any, int]:
+        """Retorna {chave: quantidade} com um único COUNT ... GROUP BY"""
+        cache_key = _cache_key("count", key_column, criteria)
+        cache = self._cache.setdefault(cache_key, {}) if cache_key else {}
+        missing = [key for key in _unique_keys(keys) if key not in cache]
+
+        for chunk in _chunks(missing):
+            for key in chunk:
+                cache[key] = 0
+            rows = self.db.query(key_column, func.count()).filter(
+                key_column.in_(chunk), *criteria
+            ).group_by(key_column).all()
+            for key, total in rows:
+                cache[key] = total
+
+        return {key: cache.get(key, 0) for key in _unique_keys(keys)}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Listagem executou mais queries do que o orçamento permite"""
+
+
+_active_counter: contextvars.ContextVar[Optional[Dict[str, int]]] = contextvars.ContextVar(
+    "query_budget_counter", default=None
+)
+_instrumented_engines = set()
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _active_counter.get()
+    if counter is not None:
+        counter["queries"] += 1
+
+
+def _instrument(db: Session) -> None:
+    engine = db.get_bind()
+    engine = getattr(engine, "engine", engine)
+    if id(engine) in _instrumented_engines:
+        return
+    event.listen(engine, "before_cursor_execute", _count_query)
+    _instrumented_engines.add(id(engine))
+
+
+def is_strict_mode() -> bool:
+    """Modo de teste: orçamento excedido gera exceção em vez de aviso"""
+    return os.getenv("QUERY_BUDGET_STRICT", "false").lower() == "true"
+
+
+@contextmanager
+def query_budget(db: Session, max_queries: int, label: str) -> Iterator[Dict[str, int]]:
+    """
+    Conta as queries executadas no bloco.
+
+    Fora do modo de teste apenas registra um aviso quando o orçamento é excedido.
+    Queries de blocos aninhados também somam no bloco externo.
+    """
+    _instrument(db)
+    counter = {"queries": 0}
+    token = _active_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _active_counter.reset(token)
+        parent = _active_counter.get()
+        if parent is not None:
+            parent["queries"] += counter["queries"]
+
+    if counter["queries"] > max_queries:
+        message = f"{label}: {counter['queries']} queries executadas (orçamento: {max_queries})"
+        if is_strict_mode():
+            raise QueryBudgetExceeded(message)
+        logger.warning(f"⚠️ Orçamento de queries excedido - {message}")
@@ -0,0 +1,76 @@
+"""
+Tipo logístico de anúncios e pedidos do Mercado Livre
+
+Regras únicas usadas para preencher as colunas logistic_type / is_fulfillment
+(ml_products) e shipping_type / is_fulfillment (ml_orders), mantidas na gravação
+dos modelos, na importação em massa e pelos webhooks. As telas e os serviços
+filtram por essas colunas em SQL em vez de interpretar o JSON de envio.
+"""
+import json
+from typing import Any, Dict, Iterable, Optional
+
+FULFILLMENT = "fulfillment"
+# Tags que também marcam um anúncio como Full
+FULFILLMENT_TAGS = {"fulfillment", "meli_fulfillment", "FULL"}
+
+# Rótulos exibidos para cada logistic_type (mesmos de MLProductService._process_shipping_info)
+LOGISTIC_TYPE_LABELS = {
+    "fulfillment": "Full Mercado Livre",
+    "cross_docking": "Mercado Envios",
+    "xd_drop_off": "Agência",
+    "drop_off": "Correios",
+}
+
+
+def _as_dict(data: Any) -> Dict:
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except (json.JSONDecodeError, TypeError):
+            return {}
+    return data if isinstance(data, dict) else {}
+
+
+def product_logistic_type(shipping: Any) -> Optional[str]:
+    """logistic_type do campo shipping do anúncio (dict ou JSON)"""
+    return _as_dict(shipping).get("logistic_type") or None
+
+
+def product_is_fulfillment(logistic_type: Optional[str], tags: Optional[Iterable] = None) -> bool:
+    """Anúncio Full: logistic_type fulfillment ou tag de fulfillment"""
+    if logistic_type == FULFILLMENT:
+        return True
+    if isinstance(tags, list):
+        return any(tag in FULFILLMENT_TAGS for tag in tags)
+    return False
+
+
+def order_logistic_type(shipping_details: Any, shipping_type: Optional[str] = None) -> Optional[str]:
+    """logistic_type do envio do pedido (shipping_details), com shipping_type como reserva"""
+    details = _as_dict(shipping_details)
+    logistic_type = (
+        details.get("logistic_type")
+        or (details.get("logistic") or {}).get("type")
+        or (details.get("shipping_option") or {}).get("logistic_type")
+    )
+    return logistic_type or shipping_type or None
+
+
+def order_is_fulfillment(shipping_details: Any, shipping_type: Optional[str] = None) -> bool:
+    if (shipping_type or "").lower() == FULFILLMENT:
+        return True
+    return str(order_logistic_type(shipping_details) or "").lower() == FULFILLMENT
+
+
+def logistic_type_label(logistic_type: Optional[str]) -> Optional[str]:
+    if not logistic_type:
+        return None
+    return LOGISTIC_TYPE_LABELS.get(logistic_type, logistic_type.replace("_", " ").title())
+
+
+def logistic_type_from_filter(value: str) -> str:
+    """Aceita o logistic_type ou o rótulo antigo do filtro (ex.: 'Full Mercado Livre')"""
+    for logistic_type, label in LOGISTIC_TYPE_LABELS.items():
+        if value == label:
+            return logistic_type
+    return value
@@ -0,0 +1,233 @@
+"""
+Paginação compartilhada para as APIs de listagem
+
+- Paginação por keyset/cursor em (coluna de ordenação, id), sem OFFSET
+- Contagem exata, estimada (via EXPLAIN do PostgreSQL) ou desligada
+- Exportação em streaming (NDJSON/CSV) para "traga tudo" sem materializar o resultado
+"""
+import base64
+import csv
+import io
+import json
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+logger = logging.getLogger(__name__)
+
+# Tamanho máximo de página aceito pelas APIs de listagem
+MAX_PAGE_SIZE = 500
+
+# Tamanho dos lotes lidos do banco durante exportações
+EXPORT_CHUNK_SIZE = 1000
+
+# Abaixo deste valor a estimativa do planner é substituída pela contagem exata
+ESTIMATED_COUNT_EXACT_THRESHOLD = 1000
+
+COUNT_MODES = ("exact", "estimated", "none")
+
+
+def _dump_value(value: Any) -> Any:
+    """Converte um valor de coluna para algo serializável no cursor"""
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    if isinstance(value, Enum):
+        return {"enum": value.name}
+    return value
+
+
+def _load_value(column, raw: Any) -> Any:
+    """Reconstrói o valor original de um cursor para comparar com a coluna"""
+    if not isinstance(raw, dict):
+        return raw
+    if "dt" in raw:
+        return datetime.fromisoformat(raw["dt"])
+    if "d" in raw:
+        return date.fromisoformat(raw["d"])
+    if "dec" in raw:
+        return Decimal(raw["dec"])
+    if "enum" in raw:
+        enum_class = getattr(column.type, "enum_class", None)
+        return enum_class[raw["enum"]] if enum_class else raw["enum"]
+    return raw
+
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    """Gera um cursor opaco a partir do último registro da página"""
+    payload = json.dumps({"s": _dump_value(sort_value), "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Decodifica um cursor; retorna None se estiver ausente ou inválido"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        if not isinstance(payload, dict) or "id" not in payload:
+            return None
+        return payload
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Cursor de paginação inválido: {e}")
+        return None
+
+
+def clamp_limit(limit: Optional[int], default: int = 50) -> int:
+    """Limita o tamanho da página ao intervalo aceito"""
+    if not limit or limit < 1:
+        return default
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def keyset_paginate(query: Query, sort_column, id_column, limit: int,
+                    cursor: Optional[str] = None, descending: bool = True) -> Dict[str, Any]:
+    """
+    Pagina uma query por keyset em (sort_column, id_column).
+
+    A ordenação existente da query é substituída por (sort_column, id_column),
+    com NULLs sempre no final. Retorna os itens da página e o cursor da próxima.
+    """
+    limit = clamp_limit(limit)
+    same_column = sort_column is id_column
+
+    decoded = decode_cursor(cursor)
+    if decoded is not None:
+        last_id = decoded["id"]
+        if same_column:
+            query = query.filter(id_column < last_id if descending else id_column > last_id)
+        else:
+            last_value = _load_value(sort_column, decoded.get("s"))
+            id_after = id_column < last_id if descending else id_column > last_id
+            if last_value is None:
+                # Já estamos no bloco de NULLs (sempre no final)
+                query = query.filter(and_(sort_column.is_(None), id_after))
+            else:
+                value_after = sort_column < last_value if descending else sort_column > last_value
+                query = query.filter(or_(
+                    value_after,
+                    and_(sort_column == last_value, id_after),
+                    sort_column.is_(None)
+                ))
+
+    if same_column:
+        ordering = [id_column.desc() if descending else id_column.asc()]
+    else:
+        sort_order = sort_column.desc() if descending else sort_column.asc()
+        ordering = [sort_order.nullslast(), id_column.desc() if descending else id_column.asc()]
+
+    rows = query.order_by(None).order_by(*ordering).limit(limit + 1).all()
+    has_next = len(rows) > limit
+    items = rows[:limit]
+
+    next_cursor = None
+    if has_next and items:
+        last = items[-1]
+        next_cursor = encode_cursor(
+            getattr(last, sort_column.key) if not same_column else None,
+            getattr(last, id_column.key)
+        )
+
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "has_next": has_next,
+        "limit": limit
+    }
+
+
+def estimated_count(query: Query) -> Optional[int]:
+    """
+    Estimativa de linhas segundo o planner do PostgreSQL (EXPLAIN, sem executar).
+
+    Retorna None se não for possível estimar (outro dialeto ou erro).
+    """
+    session = query.session
+    bind = session.get_bind()
+    if bind.dialect.name != "postgresql":
+        return None
+    try:
+        compiled = query.order_by(None).statement.compile(dialect=bind.dialect)
+        result = session.connection().exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+        ).scalar()
+        plan = result if isinstance(result, list) else json.loads(result)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception as e:
+        logger.warning(f"Não foi possível estimar contagem: {e}")
+        return None
+
+
+def count_rows(query: Query, mode: str = "exact") -> Optional[int]:
+    """
+    Conta as linhas de uma query conforme o modo:
+
+    - exact: COUNT(*) real
+    - estimated: estimativa do planner; contagem exata se a estimativa for pequena
+    - none: não conta (retorna None)
+    """
+    if mode == "none":
+        return None
+    if mode == "estimated":
+        estimate = estimated_count(query)
+        if estimate is not None and estimate >= ESTIMATED_COUNT_EXACT_THRESHOLD:
+            return estimate
+    return query.order_by(None).count()
+
+
+def iter_query_chunks(query: Query, id_column, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Any]:
+    """
+    Percorre todos os registros de uma query em lotes por keyset no id.
+
+    Cada lote é removido da sessão após ser consumido, mantendo a memória
+    constante independentemente do tamanho do resultado.
+    """
+    session = query.session
+    last_id = None
+    while True:
+        chunk_query = query.order_by(None)
+        if last_id is not None:
+            chunk_query = chunk_query.filter(id_column > last_id)
+        rows = chunk_query.order_by(id_column.asc()).limit(chunk_size).all()
+        if not rows:
+            break
+        for row in rows:
+            yield row
+        last_id = getattr(rows[-1], id_column.key)
+        session.expunge_all()
+        if len(rows) < chunk_size:
+            break
+
+
+def stream_ndjson(rows: Iterable[Any], serializer: Callable[[Any], Dict[str, Any]]) -> Iterator[str]:
+    """Gera uma linha JSON por registro (application/x-ndjson)"""
+    for row in rows:
+        yield json.dumps(serializer(row), ensure_ascii=False, default=str) + "\n"
+
+
+def stream_csv(rows: Iterable[Any], serializer: Callable[[Any], Dict[str, Any]],
+               fieldnames: List[str]) -> Iterator[str]:
+    """Gera um CSV linha a linha; valores não escalares são serializados em JSON"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate(0)
+        data = serializer(row)
+        writer.writerow({
+            key: json.dumps(value, ensure_ascii=False, default=str) if isinstance(value, (dict, list)) else value
+            for key, value in data.items()
+        })
+        yield buffer.getvalue()
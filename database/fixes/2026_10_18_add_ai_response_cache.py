@@ -0,0 +1,44 @@
+"""
+Migration: Cache de respostas dos agentes IA (modo report)
+- openai_assistants.response_cache_enabled / response_cache_ttl: opt-out e validade por agente
+- openai_assistant_usage.cache_hit: execuções servidas do cache (sem tokens)
+- ai_response_cache: criada pelo create_all na inicialização; aqui apenas garantida
+"""
+import sys
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.config.database import SessionLocal, engine
+from app.models.saas_models import AIResponseCache
+from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
+
+def add_ai_response_cache():
+    """Adiciona as colunas do cache de respostas e cria a tabela ai_response_cache"""
+    db = SessionLocal()
+    try:
+        logger.info("🔧 Adicionando colunas do cache de respostas...")
+        
+        db.execute(text("ALTER TABLE openai_assistants ADD COLUMN IF NOT EXISTS response_cache_enabled BOOLEAN NOT NULL DEFAULT TRUE"))
+        db.execute(text("ALTER TABLE openai_assistants ADD COLUMN IF NOT EXISTS response_cache_ttl INTEGER"))
+        db.execute(text("ALTER TABLE openai_assistant_usage ADD COLUMN IF NOT EXISTS cache_hit BOOLEAN DEFAULT FALSE"))
+        
+        db.commit()
+        
+        AIResponseCache.__table__.create(bind=engine, checkfirst=True)
+        logger.info("✅ Cache de respostas configurado com sucesso!")
+        
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Erro ao configurar cache de respostas: {e}")
+        raise e
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_ai_response_cache()
@@ -0,0 +1,48 @@
+"""
+Migration: Índices para o fluxo de caixa calculado no banco
+- Data efetiva (paid_date, ou due_date se ainda não pago) de contas a receber/pagar por empresa
+- date_closed dos pedidos ML por empresa
+"""
+import sys
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.config.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_accounts_receivable_company_flow_date "
+    "ON accounts_receivable (company_id, (COALESCE(paid_date, due_date)))",
+    "CREATE INDEX IF NOT EXISTS ix_accounts_payable_company_flow_date "
+    "ON accounts_payable (company_id, (COALESCE(paid_date, due_date)))",
+    "CREATE INDEX IF NOT EXISTS ix_ml_orders_company_date_closed "
+    "ON ml_orders (company_id, date_closed)",
+]
+
+def add_cashflow_indexes():
+    """Cria os índices usados pelo fluxo de caixa"""
+    db = SessionLocal()
+    try:
+        logger.info("🔧 Criando índices do fluxo de caixa...")
+        
+        for statement in INDEXES:
+            db.execute(text(statement))
+        
+        db.commit()
+        logger.info("✅ Índices do fluxo de caixa criados com sucesso!")
+        
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Erro ao criar índices do fluxo de caixa: {e}")
+        raise e
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_cashflow_indexes()
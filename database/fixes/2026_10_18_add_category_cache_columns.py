@@ -0,0 +1,65 @@
+"""
+Migration: Adicionar colunas de cache da API do ML na tabela categories
+- site_id: site da categoria (MLB...)
+- data / etag / fetched_at: payload de /categories/{id} (ou /sites/{id}/categories)
+- attributes / attributes_etag / attributes_fetched_at: payload de /categories/{id}/attributes
+"""
+import sys
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.config.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = {
+    "site_id": "VARCHAR(10)",
+    "data": "JSON",
+    "etag": "VARCHAR(255)",
+    "fetched_at": "TIMESTAMP",
+    "attributes": "JSON",
+    "attributes_etag": "VARCHAR(255)",
+    "attributes_fetched_at": "TIMESTAMP",
+}
+
+def add_category_cache_columns():
+    """Adiciona as colunas de cache na tabela categories"""
+    db = SessionLocal()
+    try:
+        logger.info("🔧 Adicionando colunas de cache na tabela categories...")
+        
+        check_query = text("""
+            SELECT column_name 
+            FROM information_schema.columns 
+            WHERE table_name = 'categories'
+        """)
+        existing_columns = [row[0] for row in db.execute(check_query).fetchall()]
+        
+        for column_name, column_type in COLUMNS.items():
+            if column_name not in existing_columns:
+                db.execute(text(f"ALTER TABLE categories ADD COLUMN {column_name} {column_type}"))
+                logger.info(f"✅ Coluna {column_name} adicionada")
+            else:
+                logger.info(f"ℹ️ Coluna {column_name} já existe")
+        
+        db.execute(text("CREATE INDEX IF NOT EXISTS ix_categories_site_id ON categories(site_id)"))
+        db.execute(text("CREATE INDEX IF NOT EXISTS ix_categories_fetched_at ON categories(fetched_at)"))
+        logger.info("✅ Índices criados")
+        
+        db.commit()
+        logger.info("✅ Colunas de cache de categorias adicionadas com sucesso!")
+        
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Erro ao adicionar colunas de cache de categorias: {e}")
+        raise e
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_category_cache_columns()
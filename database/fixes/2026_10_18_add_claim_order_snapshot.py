@@ -0,0 +1,47 @@
+"""
+Migration: Adicionar dados do pedido consultado na API à tabela ml_claims
+- order_total_amount: valor do pedido (quando ele não está em ml_orders)
+- order_date_closed: data de fechamento do pedido
+- order_checked_at: quando o pedido foi consultado (também marca pedidos não encontrados)
+"""
+import sys
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.config.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = {
+    "order_total_amount": "NUMERIC(10, 2)",
+    "order_date_closed": "TIMESTAMP",
+    "order_checked_at": "TIMESTAMP",
+}
+
+def add_claim_order_snapshot():
+    """Adiciona as colunas com os dados do pedido na tabela ml_claims"""
+    db = SessionLocal()
+    try:
+        logger.info("🔧 Adicionando dados do pedido na tabela ml_claims...")
+        
+        for column_name, column_type in COLUMNS.items():
+            db.execute(text(f"ALTER TABLE ml_claims ADD COLUMN IF NOT EXISTS {column_name} {column_type}"))
+            logger.info(f"✅ Coluna {column_name} verificada/adicionada")
+        
+        db.commit()
+        logger.info("✅ Dados do pedido adicionados com sucesso!")
+        
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Erro ao adicionar dados do pedido: {e}")
+        raise e
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_claim_order_snapshot()
@@ -0,0 +1,45 @@
+"""
+Migration: Contexto das conversas dos agentes (modo chat)
+- openai_assistants.context_token_budget: orçamento de tokens do histórico por agente
+- openai_assistant_threads.context_summary / context_summary_until_id: resumo acumulado dos turnos antigos
+- índice (thread_id, id) em openai_assistant_messages para carregar apenas a janela recente
+"""
+import sys
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.config.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
+
+def add_conversation_context_columns():
+    """Adiciona as colunas de orçamento/resumo de contexto e o índice da janela de mensagens"""
+    db = SessionLocal()
+    try:
+        logger.info("🔧 Adicionando colunas de contexto das conversas...")
+        
+        db.execute(text("ALTER TABLE openai_assistants ADD COLUMN IF NOT EXISTS context_token_budget INTEGER"))
+        db.execute(text("ALTER TABLE openai_assistant_threads ADD COLUMN IF NOT EXISTS context_summary TEXT"))
+        db.execute(text("ALTER TABLE openai_assistant_threads ADD COLUMN IF NOT EXISTS context_summary_until_id INTEGER"))
+        db.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_openai_assistant_messages_thread_id_id
+            ON openai_assistant_messages (thread_id, id)
+        """))
+        
+        db.commit()
+        logger.info("✅ Colunas de contexto das conversas adicionadas com sucesso!")
+        
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Erro ao adicionar colunas de contexto das conversas: {e}")
+        raise e
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_conversation_context_columns()
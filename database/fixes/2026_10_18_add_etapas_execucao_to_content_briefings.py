@@ -0,0 +1,37 @@
+"""
+Migration: Adicionar coluna etapas_execucao na tabela content_briefings
+- etapas_execucao: estado e resultado de cada agente da cadeia, usado para retomar cadeias com falha
+"""
+import sys
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.config.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
+
+def add_etapas_execucao_column():
+    """Adiciona a coluna etapas_execucao em content_briefings"""
+    db = SessionLocal()
+    try:
+        logger.info("🔧 Adicionando coluna etapas_execucao em content_briefings...")
+        
+        db.execute(text("ALTER TABLE content_briefings ADD COLUMN IF NOT EXISTS etapas_execucao JSONB"))
+        
+        db.commit()
+        logger.info("✅ Coluna etapas_execucao adicionada com sucesso!")
+        
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Erro ao adicionar coluna etapas_execucao: {e}")
+        raise e
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_etapas_execucao_column()
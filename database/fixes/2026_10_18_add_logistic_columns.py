@@ -0,0 +1,108 @@
+"""
+Migration: Tipo logístico desnormalizado em anúncios e pedidos
+- ml_products.logistic_type / is_fulfillment (antes lidos do JSON shipping e das tags)
+- ml_orders.is_fulfillment (shipping_type já guarda o logistic_type do envio)
+- índices compostos por empresa para filtrar Full / tipo de envio em SQL
+- backfill único em lotes por id, a partir de shipping / tags / shipping_details
+"""
+import sys
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.config.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Linhas atualizadas por transação no backfill
+BACKFILL_BATCH_SIZE = 10000
+
+PRODUCTS_BACKFILL = """
+    UPDATE ml_products SET
+        logistic_type = shipping->>'logistic_type',
+        is_fulfillment = COALESCE(
+            shipping->>'logistic_type' = 'fulfillment'
+            OR (json_typeof(tags) = 'array' AND tags::jsonb ?| array['fulfillment', 'meli_fulfillment', 'FULL']),
+            false
+        )
+    WHERE id >= :start AND id < :end
+"""
+
+ORDERS_BACKFILL = """
+    UPDATE ml_orders SET
+        shipping_type = COALESCE(
+            shipping_type,
+            LEFT(COALESCE(
+                shipping_details->>'logistic_type',
+                shipping_details->'logistic'->>'type',
+                shipping_details->'shipping_option'->>'logistic_type'
+            ), 20)
+        ),
+        is_fulfillment = COALESCE(
+            LOWER(shipping_type) = 'fulfillment'
+            OR LOWER(COALESCE(
+                shipping_details->>'logistic_type',
+                shipping_details->'logistic'->>'type',
+                shipping_details->'shipping_option'->>'logistic_type'
+            )) = 'fulfillment',
+            false
+        )
+    WHERE id >= :start AND id < :end
+"""
+
+
+def _backfill(db, table: str, statement: str):
+    max_id = db.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {table}")).scalar()
+    for start in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+        db.execute(text(statement), {"start": start, "end": start + BACKFILL_BATCH_SIZE})
+        db.commit()
+        logger.info(f"📦 Backfill {table}: até id {min(start + BACKFILL_BATCH_SIZE, max_id)}/{max_id}")
+
+
+def add_logistic_columns():
+    """Adiciona as colunas de tipo logístico, os índices e preenche os registros existentes"""
+    db = SessionLocal()
+    try:
+        logger.info("🔧 Adicionando colunas de tipo logístico...")
+
+        db.execute(text("ALTER TABLE ml_products ADD COLUMN IF NOT EXISTS logistic_type VARCHAR(50)"))
+        db.execute(text("ALTER TABLE ml_products ADD COLUMN IF NOT EXISTS is_fulfillment BOOLEAN NOT NULL DEFAULT false"))
+        db.execute(text("ALTER TABLE ml_orders ADD COLUMN IF NOT EXISTS is_fulfillment BOOLEAN NOT NULL DEFAULT false"))
+        db.commit()
+
+        _backfill(db, "ml_products", PRODUCTS_BACKFILL)
+        _backfill(db, "ml_orders", ORDERS_BACKFILL)
+
+        db.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_ml_products_company_fulfillment
+            ON ml_products (company_id, is_fulfillment)
+        """))
+        db.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_ml_products_company_logistic_type
+            ON ml_products (company_id, logistic_type)
+        """))
+        db.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_ml_orders_company_fulfillment
+            ON ml_orders (company_id, is_fulfillment)
+        """))
+        db.execute(text("""
+            CREATE INDEX IF NOT EXISTS ix_ml_orders_company_shipping_type
+            ON ml_orders (company_id, shipping_type)
+        """))
+
+        db.commit()
+        logger.info("✅ Colunas de tipo logístico adicionadas e preenchidas com sucesso!")
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Erro ao adicionar colunas de tipo logístico: {e}")
+        raise e
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_logistic_columns()
@@ -0,0 +1,45 @@
+"""
+Migration: Adicionar cursores da sincronização incremental na tabela ml_accounts
+- messages_synced_until: data (UTC) do pedido/pack mais recente já sincronizado nas mensagens
+- questions_synced_until: data (UTC) da pergunta mais recente já sincronizada
+"""
+import sys
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.config.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = {
+    "messages_synced_until": "TIMESTAMP",
+    "questions_synced_until": "TIMESTAMP",
+}
+
+def add_ml_account_sync_cursors():
+    """Adiciona as colunas de cursor de sincronização na tabela ml_accounts"""
+    db = SessionLocal()
+    try:
+        logger.info("🔧 Adicionando cursores de sincronização na tabela ml_accounts...")
+        
+        for column_name, column_type in COLUMNS.items():
+            db.execute(text(f"ALTER TABLE ml_accounts ADD COLUMN IF NOT EXISTS {column_name} {column_type}"))
+            logger.info(f"✅ Coluna {column_name} verificada/adicionada")
+        
+        db.commit()
+        logger.info("✅ Cursores de sincronização adicionados com sucesso!")
+        
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Erro ao adicionar cursores de sincronização: {e}")
+        raise e
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_ml_account_sync_cursors()
@@ -0,0 +1,47 @@
+"""
+Migration: Índices das ferramentas de pedidos dos agentes de IA
+- GIN (jsonb_path_ops) sobre order_items::jsonb para o filtro por anúncio
+  (order_items::jsonb @> '[{"item": {"id": "MLB..."}}]')
+- (company_id, date_created) para as janelas de período por empresa
+"""
+import sys
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.config.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_ml_orders_order_items_jsonb "
+    "ON ml_orders USING gin ((order_items::jsonb) jsonb_path_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_ml_orders_company_date_created "
+    "ON ml_orders (company_id, date_created)",
+]
+
+def add_ml_orders_tool_indexes():
+    """Cria os índices usados pelas ferramentas de pedidos"""
+    db = SessionLocal()
+    try:
+        logger.info("🔧 Criando índices das ferramentas de pedidos...")
+        
+        for statement in INDEXES:
+            db.execute(text(statement))
+        
+        db.commit()
+        logger.info("✅ Índices das ferramentas de pedidos criados com sucesso!")
+        
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Erro ao criar índices das ferramentas de pedidos: {e}")
+        raise e
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_ml_orders_tool_indexes()
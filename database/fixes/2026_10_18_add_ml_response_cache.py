@@ -0,0 +1,29 @@
+"""
+Migration: Cache compartilhado de respostas da API pública do ML
+- ml_response_cache: criada pelo create_all na inicialização; aqui apenas garantida
+"""
+import sys
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.config.database import engine
+from app.models.saas_models import MLResponseCache
+import logging
+
+logger = logging.getLogger(__name__)
+
+def add_ml_response_cache():
+    """Cria a tabela ml_response_cache"""
+    try:
+        logger.info("🔧 Criando tabela ml_response_cache...")
+        MLResponseCache.__table__.create(bind=engine, checkfirst=True)
+        logger.info("✅ Tabela ml_response_cache configurada com sucesso!")
+    except Exception as e:
+        logger.error(f"❌ Erro ao criar tabela ml_response_cache: {e}")
+        raise e
+
+if __name__ == "__main__":
+    add_ml_response_cache()
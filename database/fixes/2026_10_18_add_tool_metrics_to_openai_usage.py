@@ -0,0 +1,37 @@
+"""
+Migration: Adicionar coluna tool_metrics na tabela openai_assistant_usage
+- tool_metrics: latência e status de cada chamada de ferramenta da execução
+"""
+import sys
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.config.database import SessionLocal
+from sqlalchemy import text
+import logging
+
+logger = logging.getLogger(__name__)
+
+def add_tool_metrics_column():
+    """Adiciona a coluna tool_metrics em openai_assistant_usage"""
+    db = SessionLocal()
+    try:
+        logger.info("🔧 Adicionando coluna tool_metrics em openai_assistant_usage...")
+        
+        db.execute(text("ALTER TABLE openai_assistant_usage ADD COLUMN IF NOT EXISTS tool_metrics JSON"))
+        
+        db.commit()
+        logger.info("✅ Coluna tool_metrics adicionada com sucesso!")
+        
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Erro ao adicionar coluna tool_metrics: {e}")
+        raise e
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    add_tool_metrics_column()
@@ -0,0 +1,57 @@
+"""
+Migration: Razão das contas financeiras
+- Monta financial_ledger_entries (saldo inicial + transações existentes) para as
+  contas que ainda não têm razão
+- Informa as contas cujo current_balance diverge do razão (sem alterar o saldo)
+"""
+import sys
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+root_dir = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(root_dir))
+
+from app.config.database import SessionLocal, engine
+from app.models.financial_models import FinancialAccount, FinancialLedgerCheckpoint, FinancialLedgerEntry
+from app.services.financial_ledger_service import FinancialLedgerService
+import logging
+
+logger = logging.getLogger(__name__)
+
+def backfill_financial_ledger():
+    """Cria as tabelas do razão e monta o histórico das contas existentes"""
+    FinancialLedgerEntry.__table__.create(bind=engine, checkfirst=True)
+    FinancialLedgerCheckpoint.__table__.create(bind=engine, checkfirst=True)
+    
+    db = SessionLocal()
+    try:
+        service = FinancialLedgerService(db)
+        account_ids = [row.id for row in db.query(FinancialAccount.id).order_by(FinancialAccount.id)]
+        logger.info(f"🔧 Montando razão de {len(account_ids)} conta(s)...")
+        
+        built = 0
+        for account_id in account_ids:
+            if service.get_balance(account_id) is not None:
+                continue
+            entries = service.rebuild_account(account_id)
+            db.commit()
+            built += 1
+            logger.info(f"  ✅ Conta {account_id}: {entries} lançamento(s)")
+        
+        result = service.reconcile()
+        logger.info(f"✅ Razão montado para {built} conta(s); {len(result['drifted'])} com saldo divergente")
+        for item in result["drifted"]:
+            logger.warning(
+                f"⚠️ Conta {item['account_id']} ({item['account_name']}): "
+                f"current_balance R$ {item['current_balance']:.2f} x razão R$ {item['ledger_balance']:.2f}"
+            )
+        
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ Erro ao montar razão das contas: {e}")
+        raise e
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    backfill_financial_ledger()
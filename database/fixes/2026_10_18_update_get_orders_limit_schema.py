@@ -0,0 +1,58 @@
+"""
+Atualiza o parâmetro limit da ferramenta get_orders:
+o limite passa a valer sempre (padrão 50, máximo 200); total_pedidos e resumo
+continuam cobrindo todos os pedidos do filtro
+"""
+import json
+from sqlalchemy import text
+
+
+def run(db=None):
+    """
+    Atualiza json_schema.properties.limit da ferramenta get_orders na tabela openai_tools
+    """
+    try:
+        if db is None:
+            from app.config.database import SessionLocal
+            db = SessionLocal()
+        
+        limit_schema = {
+            "type": "integer",
+            "minimum": 1,
+            "maximum": 200,
+            "description": "Quantidade de pedidos na lista (padrão 50, máximo 200). total_pedidos e resumo (valor_total, comissoes, frete, desconto) sempre consideram todos os pedidos do filtro; use offset para paginar quando tem_mais=true."
+        }
+        
+        update_query = text("""
+            UPDATE openai_tools
+            SET json_schema = jsonb_set(CAST(json_schema AS JSONB), '{properties,limit}', CAST(:limit_schema AS JSONB))
+            WHERE name = 'get_orders'
+            RETURNING id, name
+        """)
+        
+        result = db.execute(update_query, {"limit_schema": json.dumps(limit_schema, ensure_ascii=False)}).fetchone()
+        
+        if result:
+            tool_id, tool_name = result
+            print(f"✅ [FIX] Parâmetro 'limit' da ferramenta '{tool_name}' (ID: {tool_id}) atualizado")
+            db.commit()
+            return True
+        else:
+            print("⚠️ [FIX] Ferramenta 'get_orders' não encontrada na tabela openai_tools")
+            db.rollback()
+            return False
+            
+    except Exception as e:
+        print(f"❌ [FIX] Erro ao atualizar schema da ferramenta get_orders: {e}")
+        if db:
+            db.rollback()
+        raise
+
+
+if __name__ == "__main__":
+    from app.config.database import SessionLocal
+    db = SessionLocal()
+    try:
+        run(db)
+    finally:
+        db.close()